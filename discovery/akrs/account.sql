@@ -8,6 +8,8 @@ SELECT  Id
       , Anvil__Engagement_Level__c
       , Anvil__Org_Type__c
       , Anvil__Org_Sub_Type__c
+      , Name
+      , Phone
       , BillingPostalCode
 FROM Account 
 WHERE OwnerId != '0053o000007F2ldAAC' --Ignore system user
\ No newline at end of file
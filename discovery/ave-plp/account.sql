@@ -8,6 +8,8 @@ SELECT  Id
       , Anvil__Engagement_Level__c
       , Anvil__Org_Type__c
       , Anvil__Org_Sub_Type__c
+      , Name
+      , Phone
       , BillingPostalCode
 FROM Account 
 WHERE OwnerId != '0058Z0000088DPsQAM' --Ignore system user
\ No newline at end of file
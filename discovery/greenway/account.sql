@@ -8,5 +8,7 @@ SELECT  Id
       , Anvil__Engagement_Level__c
       , Anvil__Org_Type__c
       , Anvil__Org_Sub_Type__c
+      , Name
+      , Phone
       , BillingPostalCode
 FROM Account 
\ No newline at end of file
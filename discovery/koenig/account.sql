@@ -13,6 +13,8 @@ SELECT  Id
       , Anvil__Call_Status__c
       , Anvil__Trade_Type__c
       , Anvil__Engagement_Level__c
+      , Name
+      , Phone
       , BillingPostalCode
 FROM Account 
 WHERE OwnerId != '0055f000000wHZ1AAM'  -- Exclude Anvil Admin as owner
\ No newline at end of file
@@ -0,0 +1,171 @@
+"""Benchmarks recall and latency of the catalog ANN index against brute force."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.transformation.ann_index import AnnIndex, brute_force_query
+
+log = logging.getLogger(__name__)
+
+
+def make_clustered_embeddings(
+    n_rows: int,
+    n_queries: int,
+    dim: int,
+    seed: int = 0,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Generate catalog-like embeddings and nearby queries.
+
+    Catalog descriptions cluster by category/subcategory, so vectors are drawn
+    around a few hundred centres. Queries are perturbed catalog vectors, like a
+    dealer description of a catalog machine.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of catalog embeddings.
+    n_queries : int
+        The number of query embeddings.
+    dim : int
+        The embedding dimension.
+    seed : int
+        Seed for the random generator.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        The catalog embeddings and the query embeddings.
+
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(max(1, n_rows // 500), dim)).astype(np.float32)
+    catalog = centres[rng.integers(0, centres.shape[0], n_rows)]
+    catalog += 0.4 * rng.normal(size=catalog.shape).astype(np.float32)
+    queries = catalog[rng.integers(0, n_rows, n_queries)]
+    queries += 0.2 * rng.normal(size=queries.shape).astype(np.float32)
+    return catalog, queries
+
+
+def recall_at_k(approx_ids: np.ndarray, exact_ids: np.ndarray) -> float:
+    """Compute the mean fraction of exact neighbours found by the index.
+
+    Parameters
+    ----------
+    approx_ids : np.ndarray
+        Neighbour ids from the ANN index, shape (n_queries, k).
+    exact_ids : np.ndarray
+        Neighbour ids from brute force, shape (n_queries, k).
+
+    Returns
+    -------
+    float
+        Recall@k averaged over queries.
+
+    """
+    hits = [
+        np.intersect1d(approx, exact).size / exact.size
+        for approx, exact in zip(approx_ids, exact_ids, strict=True)
+    ]
+    return float(np.mean(hits))
+
+
+def run_benchmark(
+    n_rows: int,
+    n_queries: int,
+    dim: int,
+    k: int,
+    n_probes: list[int],
+) -> dict:
+    """Time index build and queries and measure recall for each n_probe.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of catalog embeddings.
+    n_queries : int
+        The number of queries in the batch.
+    dim : int
+        The embedding dimension.
+    k : int
+        The number of neighbours per query.
+    n_probes : list[int]
+        The n_probe settings to evaluate.
+
+    Returns
+    -------
+    dict
+        Build time, brute-force latency and per n_probe recall and latency.
+
+    """
+    catalog, queries = make_clustered_embeddings(n_rows, n_queries, dim)
+
+    start = time.perf_counter()
+    index = AnnIndex().build(catalog)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    exact_ids, _ = brute_force_query(catalog, queries, k)
+    brute_force_seconds = time.perf_counter() - start
+
+    results = {
+        "n_rows": n_rows,
+        "n_queries": n_queries,
+        "dim": dim,
+        "k": k,
+        "n_lists": index.n_lists,
+        "build_seconds": build_seconds,
+        "brute_force_ms_per_query": 1000 * brute_force_seconds / n_queries,
+        "ann": [],
+    }
+    for n_probe in n_probes:
+        start = time.perf_counter()
+        approx_ids, _ = index.query(queries, k=k, n_probe=n_probe)
+        query_seconds = time.perf_counter() - start
+        results["ann"].append(
+            {
+                "n_probe": n_probe,
+                "recall_at_k": recall_at_k(approx_ids, exact_ids),
+                "ms_per_query": 1000 * query_seconds / n_queries,
+                "speedup": brute_force_seconds / query_seconds,
+            },
+        )
+        log.info("n_probe=%d: %s", n_probe, results["ann"][-1])
+    return results
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the catalog ANN index.")
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--n-probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--output", type=str, default="", help="Optional JSON path")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the ANN benchmark and print or save the results."""
+    args = parse_inputs()
+    results = run_benchmark(args.rows, args.queries, args.dim, args.k, args.n_probe)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
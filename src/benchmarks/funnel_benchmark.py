@@ -0,0 +1,166 @@
+"""Benchmarks how quote-to-sale funnel features scale with quote volume."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.features.funnel import funnel_features, link_quotes_to_sales
+from src.features.rfm import monthly_cutoffs
+
+log = logging.getLogger(__name__)
+
+START_DATE = date(2015, 1, 1)
+N_DAYS = 365 * 8
+
+
+def make_funnel_events(
+    n_quotes: int,
+    quotes_per_account: int = 4,
+    sales_per_quote: float = 0.5,
+    seed: int = 0,
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Generate random quotes and sales of the same accounts.
+
+    Parameters
+    ----------
+    n_quotes : int
+        The number of quotes.
+    quotes_per_account : int
+        The mean number of quotes per account.
+    sales_per_quote : float
+        The number of sales per quote.
+    seed : int
+        Seed for the random generator.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, pl.DataFrame]
+        Quotes as from `quote_events` and sales as from `stock_unit_sales`.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_accounts = max(1, n_quotes // quotes_per_account)
+    n_sales = int(n_quotes * sales_per_quote)
+
+    def day(column: str) -> pl.Expr:
+        return (pl.lit(START_DATE) + pl.duration(days=pl.col(column))).alias(column)
+
+    quotes = pl.DataFrame(
+        {
+            "quote_id": np.arange(n_quotes).astype(str),
+            "account_id": rng.integers(0, n_accounts, n_quotes).astype(str),
+            "quote_date": rng.integers(0, N_DAYS, n_quotes),
+        },
+    ).with_columns(day("quote_date"))
+    sales = pl.DataFrame(
+        {
+            "account_id": rng.integers(0, n_accounts, n_sales).astype(str),
+            "event_date": rng.integers(0, N_DAYS, n_sales),
+        },
+    ).with_columns(day("event_date"))
+    return quotes, sales
+
+
+def run_benchmark(
+    quote_counts: list[int],
+    n_cutoffs: int,
+    quotes_per_account: int = 4,
+) -> dict:
+    """Time linking and feature computation for growing quote volumes.
+
+    The number of accounts grows with the quotes, so a join of every quote
+    with every sale of its account would also grow linearly; a cross join of
+    quotes and sales would grow quadratically. Constant time per quote across
+    volumes shows the sorted as-of joins scale linearly.
+
+    Parameters
+    ----------
+    quote_counts : list[int]
+        The quote volumes to time.
+    n_cutoffs : int
+        The number of monthly cutoffs per account in the spine.
+    quotes_per_account : int
+        The mean number of quotes per account.
+
+    Returns
+    -------
+    dict
+        Per quote volume the link and feature seconds and the microseconds
+        per quote.
+
+    """
+    cutoffs = pl.Series(
+        "cutoff",
+        monthly_cutoffs(date(2020, 1, 1), date(2022, 12, 31))[-n_cutoffs:],
+    )
+    results = {"n_cutoffs": cutoffs.len(), "runs": []}
+    for n_quotes in quote_counts:
+        quotes, sales = make_funnel_events(n_quotes, quotes_per_account)
+        spine = (
+            quotes.select("account_id").unique().join(cutoffs.to_frame(), how="cross")
+        )
+
+        start = time.perf_counter()
+        links = link_quotes_to_sales(quotes, sales).collect()
+        link_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        features = funnel_features(links, spine).collect()
+        feature_seconds = time.perf_counter() - start
+
+        results["runs"].append(
+            {
+                "n_quotes": n_quotes,
+                "n_sales": sales.height,
+                "n_spine_rows": features.height,
+                "link_seconds": link_seconds,
+                "feature_seconds": feature_seconds,
+                "us_per_quote": 1e6 * (link_seconds + feature_seconds) / n_quotes,
+            },
+        )
+        log.info("%d quotes: %s", n_quotes, results["runs"][-1])
+    return results
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark the scaling of the quote funnel features.",
+    )
+    parser.add_argument(
+        "--quotes",
+        type=int,
+        nargs="+",
+        default=[100_000, 300_000, 1_000_000, 3_000_000],
+    )
+    parser.add_argument("--cutoffs", type=int, default=12)
+    parser.add_argument("--quotes-per-account", type=int, default=4)
+    parser.add_argument("--output", type=str, default="", help="Optional JSON path")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the funnel benchmark and print or save the results."""
+    args = parse_inputs()
+    results = run_benchmark(args.quotes, args.cutoffs, args.quotes_per_account)
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
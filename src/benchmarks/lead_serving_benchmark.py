@@ -0,0 +1,235 @@
+"""Load-tests lead-list lookups and reports their latency percentiles.
+
+A synthetic scored table is published with `publish_lead_index`, then random
+(dealer, store, rep, product group) lists are looked up either in process or
+over HTTP from several client threads. A second snapshot is published while
+the clients run, so the run also covers a hot reload; every lookup must still
+return a complete list.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import tempfile
+import threading
+import time
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlencode
+
+import numpy as np
+import polars as pl
+
+from src.models.lead_serving import (
+    SERVING_GROUPS,
+    LeadServer,
+    make_http_server,
+    publish_lead_index,
+)
+
+DEFAULT_ACCOUNTS = 1_000_000
+DEFAULT_REQUESTS = 20_000
+DEFAULT_THREADS = 4
+DEFAULT_K = 25
+PRODUCT_GROUPS = ("COMBINES", "LARGE TRACTOR", "HAY", "TILLAGE", "SPRAYERS")
+
+log = logging.getLogger(__name__)
+
+
+def make_scores(n_accounts: int, seed: int = 0) -> pl.DataFrame:
+    """Generate scored leads spread over dealers, stores, reps and groups.
+
+    Parameters
+    ----------
+    n_accounts : int
+        The number of accounts, each scored for every product group.
+    seed : int
+        Seed for the random generator.
+
+    Returns
+    -------
+    pl.DataFrame
+        One row per account and product group with the serving groups.
+
+    """
+    rng = np.random.default_rng(seed)
+    reps = rng.integers(0, max(n_accounts // 500, 1), n_accounts)
+    accounts = pl.DataFrame(
+        {
+            "account_id": [f"A{i}" for i in range(n_accounts)],
+            "dealer": rng.choice(["koenig", "ave-plp", "greenway", "akrs"], n_accounts),
+            "primary_store_location": [f"Store {rep % 20}" for rep in reps],
+            "account_owner_id": [f"U{rep}" for rep in reps],
+        },
+    )
+    groups = pl.DataFrame({"product_group": PRODUCT_GROUPS})
+    scores = accounts.join(groups, how="cross")
+    return scores.with_columns(pl.Series("score", rng.random(scores.height)))
+
+
+def percentiles(latencies: list[float]) -> dict:
+    """Summarize lookup latencies in milliseconds."""
+    milliseconds = np.array(latencies) * 1000
+    return {
+        "requests": len(milliseconds),
+        "mean_ms": float(milliseconds.mean()),
+        "p50_ms": float(np.percentile(milliseconds, 50)),
+        "p95_ms": float(np.percentile(milliseconds, 95)),
+        "p99_ms": float(np.percentile(milliseconds, 99)),
+        "max_ms": float(milliseconds.max()),
+    }
+
+
+def run_benchmark(  # noqa: PLR0913
+    n_accounts: int,
+    n_requests: int,
+    n_threads: int,
+    k: int,
+    *,
+    http: bool = False,
+    seed: int = 0,
+) -> dict:
+    """Publish lead lists, look up random lists and hot-reload meanwhile.
+
+    Parameters
+    ----------
+    n_accounts : int
+        The number of synthetic accounts.
+    n_requests : int
+        The total number of lookups.
+    n_threads : int
+        The number of concurrent client threads.
+    k : int
+        The number of leads requested per lookup.
+    http : bool
+        Whether to look up over HTTP instead of in process.
+    seed : int
+        Seed for the scores and the requests.
+
+    Returns
+    -------
+    dict
+        Publish and load times, latency percentiles and the number of
+        incomplete answers.
+
+    """
+    scores = make_scores(n_accounts, seed)
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        publish_lead_index(scores, directory, k)
+        publish_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        server = LeadServer(directory, check_interval=0.05)
+        load_seconds = time.perf_counter() - start
+        keys = list(server.index.lists)
+        rng = np.random.default_rng(seed)
+        requests = [keys[i] for i in rng.integers(0, len(keys), n_requests)]
+        expected = {key: min(server.index.lists[key][1], k) for key in keys}
+
+        http_server = None
+        if http:
+            http_server = make_http_server(server, port=0)
+            threading.Thread(target=http_server.serve_forever, daemon=True).start()
+            url = f"http://127.0.0.1:{http_server.server_port}/leads?"
+
+        def lookup(key: tuple) -> int:
+            if http_server is None:
+                return server.lookup(key, k).num_rows
+            query = urlencode(
+                dict(zip(SERVING_GROUPS, key, strict=True)) | {"k": k},
+            )
+            with urllib.request.urlopen(url + query) as response:  # noqa: S310
+                return len(json.load(response)["leads"])
+
+        latencies: list[float] = []
+        incomplete = []
+
+        def client(chunk: list[tuple]) -> None:
+            for key in chunk:
+                start = time.perf_counter()
+                rows = lookup(key)
+                latencies.append(time.perf_counter() - start)
+                if rows != expected[key]:
+                    incomplete.append(key)
+
+        threads = [
+            threading.Thread(target=client, args=([requests[i] for i in chunk],))
+            for chunk in np.array_split(np.arange(n_requests), n_threads)
+        ]
+        # Republish while the clients run, the lists keep their lengths
+        threads.append(
+            threading.Thread(
+                target=publish_lead_index,
+                args=(scores.with_columns(pl.col("score") * 0.5), directory, k),
+            ),
+        )
+        first_version = server.version
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        time.sleep(server.check_interval)
+        reloaded = server.snapshot().version != first_version
+        if http_server is not None:
+            http_server.shutdown()
+            http_server.server_close()
+
+    results = {
+        "accounts": n_accounts,
+        "lists": len(keys),
+        "threads": n_threads,
+        "k": k,
+        "http": http,
+        "publish_seconds": publish_seconds,
+        "load_seconds": load_seconds,
+        "reloaded": reloaded,
+        "incomplete_answers": len(incomplete),
+        **percentiles(latencies),
+    }
+    log.info(
+        "%d lookups: p50 %.3f ms, p99 %.3f ms",
+        results["requests"],
+        results["p50_ms"],
+        results["p99_ms"],
+    )
+    return results
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Load-test lead-list lookups.")
+    parser.add_argument("--accounts", type=int, default=DEFAULT_ACCOUNTS)
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS)
+    parser.add_argument("--k", type=int, default=DEFAULT_K)
+    parser.add_argument("--http", action="store_true", help="Look up over HTTP")
+    parser.add_argument("--output", type=str, default="", help="Optional JSON path")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the load test and print or save the results."""
+    args = parse_inputs()
+    results = run_benchmark(
+        args.accounts,
+        args.requests,
+        args.threads,
+        args.k,
+        http=args.http,
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,501 @@
+"""Benchmarks the transformation and make/model matching hot paths offline.
+
+Synthetic dealer exports from `src.synthetic.dealer_data` are timed through
+`translate_csv_to_common_model`, `translate_columns` and `eda_polars` at every
+requested scale. `create_aggregated_data` and `clean_make_model_batch` run
+against a fake catalog snapshot with `HashingSentenceModel` standing in for the
+sentence encoder, so nothing touches Databricks or downloads a model. Results
+are saved as JSON and compared to the baseline stored next to this module,
+`pipeline_baseline.json`, by default; a throughput drop larger than the
+threshold fails the run. Rewrite the baseline with `--output` after an
+intended change or on new reference hardware.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import logging
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import polars as pl
+
+from src.pipelines.eda_quality_pipeline import eda_polars
+from src.synthetic.dealer_data import (
+    SEMANTIC_LAYER_PATH,
+    generate_object,
+    load_semantic_layer,
+    make_fake_catalog,
+)
+from src.transformation.catalog import CompactCatalog
+from src.transformation.category import CleanMakeModelData
+from src.transformation.embedding import BatchEncoder
+from src.transformation.normalize import make_model_key
+from src.transformation.translate import (
+    create_column_mapping,
+    translate_columns,
+    translate_csv_to_common_model,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+DEFAULT_SCALES = (10_000, 100_000, 1_000_000)
+DEFAULT_DEALER = "koenig"
+DEFAULT_OBJECT = "dealer_stock_unit"
+DEFAULT_MATCH_ROWS = 10_000
+DEFAULT_CATALOG_ROWS = 50_000
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.2
+HASHING_DIMENSION = 64
+BASELINE_PATH = str(Path(__file__).with_name("pipeline_baseline.json"))
+
+log = logging.getLogger(__name__)
+
+
+class HashingSentenceModel:
+    """Offline stand-in for a SentenceTransformer that hashes word tokens.
+
+    Strings sharing words get similar vectors, which is enough to exercise the
+    semantic matching code paths with realistic call patterns.
+    """
+
+    def __init__(self, dimension: int = HASHING_DIMENSION) -> None:
+        """Initialize the HashingSentenceModel class.
+
+        Parameters
+        ----------
+        dimension : int
+            The embedding dimension.
+
+        """
+        self.dimension = dimension
+
+    def _embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for token in text.lower().replace("-", " ").split():
+            digest = hashlib.blake2b(token.encode(), digest_size=8).digest()
+            vector[int.from_bytes(digest, "little") % self.dimension] += 1
+        return vector
+
+    def encode(
+        self,
+        sentences: list[str],
+        *,
+        normalize_embeddings: bool = False,
+        **_: object,
+    ) -> np.ndarray:
+        """Embed strings, accepting the SentenceTransformer keyword arguments.
+
+        Parameters
+        ----------
+        sentences : list[str]
+            The strings to embed.
+        normalize_embeddings : bool
+            Whether to L2-normalize the embeddings.
+
+        Returns
+        -------
+        np.ndarray
+            One embedding per string.
+
+        """
+        if not sentences:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        embeddings = np.stack([self._embed(text) for text in sentences])
+        if normalize_embeddings:
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1
+            embeddings = embeddings / norms
+        return embeddings
+
+
+def time_best(
+    function: Callable[..., object],
+    repeats: int,
+    setup: Callable[[], object] | None = None,
+) -> float:
+    """Return the fastest wall-clock time of several calls, in seconds.
+
+    `setup` runs untimed before every call and its result is passed to
+    `function`, so each call can start from fresh state and cold caches.
+    """
+    timings = []
+    for _ in range(repeats):
+        arguments = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        function(*arguments)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _result(name: str, n_rows: int, seconds: float, scale: int | None = None) -> dict:
+    # The scale is the generated row count, which identifies a result even
+    # when fewer rows are timed
+    result = {
+        "name": name,
+        "scale": scale or n_rows,
+        "rows": n_rows,
+        "seconds": seconds,
+        "rows_per_second": n_rows / seconds,
+    }
+    log.info(
+        "%s at %d rows: %.3fs (%.0f rows/s)",
+        name,
+        n_rows,
+        seconds,
+        result["rows_per_second"],
+    )
+    return result
+
+
+def benchmark_translation(
+    dealer: str,
+    object_type: str,
+    n_rows: int,
+    work_dir: Path,
+    repeats: int,
+    seed: int = 0,
+) -> list[dict]:
+    """Time CSV translation, column typing and EDA for one scale.
+
+    Parameters
+    ----------
+    dealer : str
+        The dealer whose `api_name` columns are generated.
+    object_type : str
+        The semantic layer object to generate.
+    n_rows : int
+        The number of generated rows.
+    work_dir : Path
+        Directory for the generated CSV.
+    repeats : int
+        Calls per benchmark; the fastest is kept.
+    seed : int
+        Seed for the data generator.
+
+    Returns
+    -------
+    list[dict]
+        One result per benchmarked function.
+
+    """
+    semantic_layer = load_semantic_layer()
+    csv_path = work_dir / f"{dealer}_{object_type}_{n_rows}.csv"
+    generate_object(semantic_layer, dealer, object_type, n_rows, seed).write_csv(
+        csv_path,
+    )
+
+    def translate() -> pl.DataFrame:
+        return translate_csv_to_common_model(
+            str(csv_path),
+            dealer,
+            SEMANTIC_LAYER_PATH,
+            object_type,
+        )
+
+    column_mapping, column_types = create_column_mapping(
+        semantic_layer[object_type],
+        dealer,
+    )
+    raw = pl.read_csv(csv_path, ignore_errors=True)
+    renamed = raw.rename(
+        {col: column_mapping[col] for col in raw.columns if col in column_mapping},
+    )
+    translated = translate()
+    return [
+        _result(
+            "translate_csv_to_common_model",
+            n_rows,
+            time_best(translate, repeats),
+        ),
+        _result(
+            "translate_columns",
+            n_rows,
+            time_best(lambda: translate_columns(renamed, column_types), repeats),
+        ),
+        _result(
+            "eda_polars",
+            n_rows,
+            time_best(
+                lambda: eda_polars(translated, semantic_layer, dealer, object_type),
+                repeats,
+            ),
+        ),
+    ]
+
+
+def benchmark_matching(
+    n_rows: int,
+    match_rows: int,
+    catalog_rows: int,
+    work_dir: Path,
+    repeats: int,
+    seed: int = 0,
+) -> list[dict]:
+    """Time aggregated data creation and make/model resolution.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of generated dealer stock unit rows.
+    match_rows : int
+        The number of rows resolved with `clean_make_model_batch`.
+    catalog_rows : int
+        The number of rows in the fake catalog.
+    work_dir : Path
+        Directory for the fake catalog snapshot.
+    repeats : int
+        Calls per benchmark, each with a fresh matcher and cold caches;
+            the fastest is kept.
+    seed : int
+        Seed for the data generator.
+
+    Returns
+    -------
+    list[dict]
+        One result per benchmarked function.
+
+    """
+    snapshot_path = work_dir / f"catalog_{catalog_rows}"
+    if not snapshot_path.exists():
+        CompactCatalog.from_frame(make_fake_catalog(catalog_rows, seed)).save(
+            str(snapshot_path),
+        )
+
+    def fresh_matcher() -> CleanMakeModelData:
+        # Every repeat starts with cold key, embedding and score caches, as a
+        # pipeline run does
+        make_model_key.cache_clear()
+        # The synthetic snapshot never goes stale, it must not be refetched
+        return CleanMakeModelData(
+            str(snapshot_path),
+            snapshot_max_age_days=None,
+            encoder=BatchEncoder(HashingSentenceModel()),
+        )
+
+    semantic_layer = load_semantic_layer()
+    column_mapping, column_types = create_column_mapping(
+        semantic_layer[DEFAULT_OBJECT],
+        DEFAULT_DEALER,
+    )
+    stock_units = translate_columns(
+        generate_object(semantic_layer, DEFAULT_DEALER, DEFAULT_OBJECT, n_rows, seed)
+        .rename(column_mapping)
+        .select("dsu_make", "dsu_model", "dsu_group"),
+        {col: column_types[col] for col in ("dsu_make", "dsu_model", "dsu_group")},
+    )
+    aggregated_seconds = time_best(
+        lambda matcher: matcher.create_aggregated_data(stock_units),
+        repeats,
+        fresh_matcher,
+    )
+    clean_make_model = fresh_matcher()
+    clean_make_model.create_aggregated_data(stock_units)
+    aggregated_data = clean_make_model.aggregated_data
+
+    rows = [
+        (make, model, group or "")
+        for make, model, group in stock_units.head(match_rows).rows()
+        if make and model
+    ]
+    makes, models, groups = (list(values) for values in zip(*rows, strict=True))
+
+    def resolver() -> CleanMakeModelData:
+        matcher = fresh_matcher()
+        matcher.aggregated_data = aggregated_data
+        return matcher
+
+    return [
+        _result("create_aggregated_data", n_rows, aggregated_seconds),
+        _result(
+            "clean_make_model_batch",
+            len(rows),
+            time_best(
+                lambda matcher: matcher.clean_make_model_batch(makes, models, groups),
+                repeats,
+                resolver,
+            ),
+            n_rows,
+        ),
+    ]
+
+
+def run_benchmark(
+    scales: list[int],
+    match_rows: int = DEFAULT_MATCH_ROWS,
+    catalog_rows: int = DEFAULT_CATALOG_ROWS,
+    repeats: int = DEFAULT_REPEATS,
+    seed: int = 0,
+) -> dict:
+    """Run every benchmark at every scale.
+
+    Parameters
+    ----------
+    scales : list[int]
+        The generated row counts, e.g. 10k to 10M.
+    match_rows : int
+        The number of rows resolved with `clean_make_model_batch` per scale.
+    catalog_rows : int
+        The number of rows in the fake catalog.
+    repeats : int
+        Calls per benchmark; the fastest is kept.
+    seed : int
+        Seed for the data generator.
+
+    Returns
+    -------
+    dict
+        The environment and one result per benchmark and scale.
+
+    """
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        work_dir = Path(tmp)
+        for n_rows in scales:
+            results += benchmark_translation(
+                DEFAULT_DEALER,
+                DEFAULT_OBJECT,
+                n_rows,
+                work_dir,
+                repeats,
+                seed,
+            )
+            results += benchmark_matching(
+                n_rows,
+                min(match_rows, n_rows),
+                catalog_rows,
+                work_dir,
+                repeats,
+                seed,
+            )
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "polars": pl.__version__,
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+        },
+        "settings": {
+            "match_rows": match_rows,
+            "catalog_rows": catalog_rows,
+            "repeats": repeats,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """Compare throughput against a baseline run.
+
+    Parameters
+    ----------
+    results : dict
+        The output of `run_benchmark`.
+    baseline : dict
+        A previous output of `run_benchmark`.
+    threshold : float
+        The allowed relative throughput drop, e.g. 0.2 for 20%.
+
+    Returns
+    -------
+    list[str]
+        A message per benchmark and scale that slowed down by more than the
+        threshold. Benchmarks missing from the baseline are skipped.
+
+    """
+    baseline_throughput = {
+        (result["name"], result["scale"]): result["rows_per_second"]
+        for result in baseline["results"]
+    }
+    regressions = []
+    for result in results["results"]:
+        reference = baseline_throughput.get((result["name"], result["scale"]))
+        if reference is None:
+            continue
+        change = result["rows_per_second"] / reference - 1
+        if change < -threshold:
+            regressions.append(
+                f"{result['name']} at {result['scale']} rows: "
+                f"{result['rows_per_second']:.0f} rows/s vs {reference:.0f} "
+                f"baseline ({change:.1%})",
+            )
+    return regressions
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline.")
+    parser.add_argument(
+        "--scales",
+        type=str,
+        default=",".join(str(scale) for scale in DEFAULT_SCALES),
+        help="Comma separated row counts, e.g. 10000,100000,10000000",
+    )
+    parser.add_argument("--match-rows", type=int, default=DEFAULT_MATCH_ROWS)
+    parser.add_argument("--catalog-rows", type=int, default=DEFAULT_CATALOG_ROWS)
+    parser.add_argument("--repeats", type=int, default=DEFAULT_REPEATS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=str, default="", help="Optional JSON path")
+    parser.add_argument(
+        "--baseline",
+        type=str,
+        default=BASELINE_PATH,
+        help="Baseline JSON to check for regressions, empty to skip the check",
+    )
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the pipeline benchmarks and fail on regressions."""
+    args = parse_inputs()
+    results = run_benchmark(
+        [int(scale) for scale in args.scales.split(",")],
+        args.match_rows,
+        args.catalog_rows,
+        args.repeats,
+        args.seed,
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+    if args.baseline:
+        with Path(args.baseline).open(encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline.get("settings") != results["settings"]:
+            log.warning(
+                "Settings %s differ from the baseline's %s, throughput may not "
+                "be comparable",
+                results["settings"],
+                baseline.get("settings"),
+            )
+        regressions = find_regressions(results, baseline, args.threshold)
+        for regression in regressions:
+            log.error("Regression: %s", regression)
+        if regressions:
+            sys.exit(1)
+        log.info(
+            "No regressions over %.0f%% against %s",
+            args.threshold * 100,
+            args.baseline,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,204 @@
+"""Benchmarks semantic matching throughput, per-row versus batched encoding."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import time
+from pathlib import Path
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from src.transformation.embedding import BatchEncoder, torch_threads
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+GROUP_WORDS = [
+    "ROW CROP TRACTOR",
+    "COMBINE",
+    "PLANTER",
+    "SPRAYER",
+    "GATOR",
+    "LAWN TRACTOR",
+    "SKID STEER",
+    "ROUND BALER",
+    "DISK",
+    "CORN HEAD",
+]
+SUBCATEGORY_WORDS = [
+    "Tractors-Row Crop Tractors",
+    "Tractors-4WD Tractors",
+    "Harvesting-Combines",
+    "Harvesting-Corn Heads",
+    "Planting-Planters",
+    "Application-Self-Propelled Sprayers",
+    "Utility Vehicles-Utility Vehicles",
+    "Lawn & Garden-Lawn Tractors",
+    "Construction-Skid Steers",
+    "Hay & Forage-Round Balers",
+    "Tillage-Disks",
+]
+
+log = logging.getLogger(__name__)
+
+
+def make_rows(
+    n_rows: int,
+    n_groups: int,
+    seed: int = 0,
+) -> tuple[list[str], list[list[str]]]:
+    """Generate dealer groups and candidate subcategories per row.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of rows needing semantic matching.
+    n_groups : int
+        The number of distinct dealer group strings.
+    seed : int
+        Seed for the random generator.
+
+    Returns
+    -------
+    tuple[list[str], list[list[str]]]
+        The group of every row and the candidate subcategories of every row.
+
+    """
+    rng = np.random.default_rng(seed)
+    distinct_groups = [
+        f"{GROUP_WORDS[i % len(GROUP_WORDS)]} {i // len(GROUP_WORDS)}"
+        for i in range(n_groups)
+    ]
+    groups = [distinct_groups[i] for i in rng.integers(0, n_groups, n_rows)]
+    candidates = [
+        list(rng.choice(SUBCATEGORY_WORDS, size=rng.integers(2, 6), replace=False))
+        for _ in range(n_rows)
+    ]
+    return groups, candidates
+
+
+def per_row_rows_per_second(
+    model: SentenceTransformer,
+    groups: list[str],
+    candidates: list[list[str]],
+) -> float:
+    """Time the per-row approach that encodes the group and each candidate."""
+    start = time.perf_counter()
+    for group, subcats in zip(groups, candidates, strict=True):
+        group_embedding = model.encode(group, normalize_embeddings=True)
+        for subcat in subcats:
+            float(group_embedding @ model.encode(subcat, normalize_embeddings=True))
+    return len(groups) / (time.perf_counter() - start)
+
+
+def batched_rows_per_second(
+    encoder: BatchEncoder,
+    groups: list[str],
+    candidates: list[list[str]],
+) -> float:
+    """Time batch encoding of distinct strings plus one score matrix."""
+    start = time.perf_counter()
+    distinct_groups = list(dict.fromkeys(groups))
+    distinct_subcats = list(dict.fromkeys(s for row in candidates for s in row))
+    scores = encoder.similarity(distinct_groups, distinct_subcats)
+    group_positions = {group: i for i, group in enumerate(distinct_groups)}
+    subcat_positions = {subcat: i for i, subcat in enumerate(distinct_subcats)}
+    for group, subcats in zip(groups, candidates, strict=True):
+        row_scores = scores[
+            group_positions[group],
+            [subcat_positions[subcat] for subcat in subcats],
+        ]
+        int(np.argmax(row_scores))
+    return len(groups) / (time.perf_counter() - start)
+
+
+def run_benchmark(
+    model_name: str,
+    n_rows: int,
+    n_groups: int,
+    per_row_sample: int,
+    num_threads: int | None,
+) -> dict:
+    """Compare per-row and batched semantic matching throughput on CPU.
+
+    Parameters
+    ----------
+    model_name : str
+        The sentence-transformers model to load.
+    n_rows : int
+        The number of rows needing semantic matching.
+    n_groups : int
+        The number of distinct dealer group strings.
+    per_row_sample : int
+        The number of rows timed with the slow per-row approach.
+    num_threads : int | None
+        The CPU thread count for torch.
+
+    Returns
+    -------
+    dict
+        Rows per second for both approaches and the tuned batch size.
+
+    """
+    model = SentenceTransformer(model_name, device="cpu")
+    groups, candidates = make_rows(n_rows, n_groups)
+    encoder = BatchEncoder(model, num_threads=num_threads)
+    batch_size = encoder.tune_batch_size(list(dict.fromkeys(groups))[:512])
+
+    with torch_threads(num_threads):
+        per_row = per_row_rows_per_second(
+            model,
+            groups[:per_row_sample],
+            candidates[:per_row_sample],
+        )
+    batched = batched_rows_per_second(encoder, groups, candidates)
+    results = {
+        "model": model_name,
+        "n_rows": n_rows,
+        "n_groups": n_groups,
+        "num_threads": num_threads,
+        "batch_size": batch_size,
+        "per_row_rows_per_second": per_row,
+        "batched_rows_per_second": batched,
+        "speedup": batched / per_row,
+    }
+    log.info("Semantic matching throughput: %s", results)
+    return results
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Benchmark semantic matching.")
+    parser.add_argument("--model", type=str, default=DEFAULT_MODEL)
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--groups", type=int, default=2_000)
+    parser.add_argument("--per-row-sample", type=int, default=500)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", type=str, default="", help="Optional JSON path")
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Run the semantic matching benchmark and print or save the results."""
+    args = parse_inputs()
+    results = run_benchmark(
+        args.model,
+        args.rows,
+        args.groups,
+        args.per_row_sample,
+        args.threads,
+    )
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output, encoding="utf-8")
+    else:
+        print(output)  # noqa: T201
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
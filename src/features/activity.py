@@ -0,0 +1,447 @@
+"""Contains rolling-window engagement features from tasks and service requests.
+
+The Koenig dataset notebook collapses tasks to a count and first and last
+date per account with one eager `group_by`, and does not look at service
+requests at all. Here both are bucketed into daily activity per account, and
+service requests also per equipment unit, with a sorted `group_by_dynamic`.
+The daily buckets and the ids of the events in them are the only state kept:
+events not seen before are added to the bucket of their day, however late
+they arrive, and the rest of the history is not touched.
+
+Windowed features are differences of running totals: the activity in the
+30 days before a cutoff is the running total before the cutoff minus the one
+before `cutoff - 30d`, each found with the feature store's as-of lookup, so
+every window length costs one as-of join over the buckets rather than a scan
+of the events.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, replace
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+from src.features.feature_store import (
+    ACCOUNT,
+    CUTOFF,
+    LAST_DATE_SUFFIX,
+    totals_before,
+)
+from src.features.rfm import KEY_ID, as_of_position
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+ACCOUNT_LEVEL = "account"
+EQUIPMENT_LEVEL = "equipment"
+LEVEL_KEYS = {ACCOUNT_LEVEL: ACCOUNT, EQUIPMENT_LEVEL: "customer_equipment_id"}
+ENTITY = "entity_id"
+DAY = "day"
+WINDOW_DAYS = (30, 90, 365)
+STATE_FILE_NAME = "activity_state.parquet"
+EVENTS_FILE_NAME = "activity_events.parquet"
+EVENT_ID = "event_id"
+EVENTS_SCHEMA = {"source": pl.Utf8, EVENT_ID: pl.Utf8}
+STATE_SCHEMA = {
+    "level": pl.Utf8,
+    "source": pl.Utf8,
+    ENTITY: pl.Utf8,
+    DAY: pl.Date,
+    "count": pl.Int64,
+    "amount": pl.Float64,
+}
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ActivitySource:
+    """An activity table bucketed by day per account and equipment unit."""
+
+    name: str
+    object: str
+    event_id: str
+    keys: dict[str, str]
+    event_date: str
+    amount: str | None = None
+    filter: pl.Expr | None = None
+    fallback_event_date: str | None = None
+
+    def resolve(self, columns: list[str]) -> ActivitySource | None:
+        """Fit the source to the columns of its object.
+
+        Parameters
+        ----------
+        columns : list[str]
+            The columns of the dealer's translated object.
+
+        Returns
+        -------
+        ActivitySource | None
+            The source with only the levels whose key is mapped, reading the
+            fallback event date when the event date is not mapped, or None
+            when no level, the event id, the date, the amount or a filter
+            column is missing.
+
+        """
+        event_date = self.event_date
+        if event_date not in columns and self.fallback_event_date:
+            event_date = self.fallback_event_date
+        keys = {level: key for level, key in self.keys.items() if key in columns}
+        required = [self.event_id, event_date]
+        if self.amount:
+            required.append(self.amount)
+        if self.filter is not None:
+            required.extend(self.filter.meta.root_names())
+        if not keys or any(column not in columns for column in required):
+            return None
+        return replace(self, keys=keys, event_date=event_date)
+
+
+ACTIVITY_SOURCES = (
+    ActivitySource(
+        "task",
+        "task",
+        "task_id",
+        {ACCOUNT_LEVEL: "task_account_id"},
+        "task_activity_date",
+    ),
+    ActivitySource(
+        "service",
+        "service_requests",
+        "service_order_id",
+        {
+            ACCOUNT_LEVEL: "service_account_id",
+            EQUIPMENT_LEVEL: "service_customer_equipment_id",
+        },
+        "service_open_date",
+        "service_invoice_value",
+        fallback_event_date="service_close_date",
+    ),
+)
+
+
+def daily_activity(
+    source: ActivitySource,
+    events: pl.DataFrame | pl.LazyFrame,
+    level: str,
+) -> pl.LazyFrame:
+    """Bucket a source's events into daily activity per entity.
+
+    Parameters
+    ----------
+    source : ActivitySource
+        The activity source.
+    events : pl.DataFrame | pl.LazyFrame
+        The source's translated object.
+    level : str
+        The entity level, `account` or `equipment`.
+
+    Returns
+    -------
+    pl.LazyFrame
+        Per entity and day with activity, the number of events and their
+        summed amount (the event count when the source has no amount).
+
+    """
+    events = events.lazy()
+    if source.filter is not None:
+        events = events.filter(source.filter)
+    return (
+        events.select(
+            pl.col(source.keys[level]).cast(pl.Utf8).alias(ENTITY),
+            # Dates become midnight, datetimes are truncated to their day
+            pl.col(source.event_date).cast(pl.Datetime("us")).alias(DAY),
+            (
+                pl.col(source.amount).cast(pl.Float64).fill_null(0)
+                if source.amount
+                else pl.lit(1.0, dtype=pl.Float64)
+            ).alias("amount"),
+        )
+        .drop_nulls([ENTITY, DAY])
+        .sort(ENTITY, DAY)
+        .group_by_dynamic(DAY, every="1d", group_by=ENTITY)
+        .agg(pl.len().cast(pl.Int64).alias("count"), pl.col("amount").sum())
+        .select(
+            pl.lit(level).alias("level"),
+            pl.lit(source.name).alias("source"),
+            ENTITY,
+            pl.col(DAY).cast(pl.Date),
+            "count",
+            "amount",
+        )
+    )
+
+
+class ActivityAggregator:
+    """Incrementally maintained daily activity and its windowed features."""
+
+    def __init__(
+        self,
+        state: pl.DataFrame | None = None,
+        sources: tuple[ActivitySource, ...] = ACTIVITY_SOURCES,
+        window_days: tuple[int, ...] = WINDOW_DAYS,
+        events: pl.DataFrame | None = None,
+    ) -> None:
+        """Initialize the ActivityAggregator class.
+
+        Parameters
+        ----------
+        state : pl.DataFrame | None
+            The daily activity of earlier events, e.g. from `load`. None
+            starts without history.
+        sources : tuple[ActivitySource, ...]
+            The activity sources.
+        window_days : tuple[int, ...]
+            The window lengths in days activity is counted over.
+        events : pl.DataFrame | None
+            The source and id of the events already in `state`. None starts
+            without any.
+
+        """
+        self.state = pl.DataFrame(schema=STATE_SCHEMA) if state is None else state
+        self.sources = sources
+        self.window_days = window_days
+        self.events = pl.DataFrame(schema=EVENTS_SCHEMA) if events is None else events
+
+    def unseen(
+        self,
+        source: ActivitySource,
+        events: pl.DataFrame | pl.LazyFrame,
+        as_of: date,
+    ) -> pl.LazyFrame:
+        """Keep a source's events not added yet and dated up to the run date.
+
+        Parameters
+        ----------
+        source : ActivitySource
+            The activity source, fitted to the object's columns.
+        events : pl.DataFrame | pl.LazyFrame
+            The source's translated object.
+        as_of : date
+            The run date. Later events, e.g. tasks scheduled ahead, are held
+            back until their day has come.
+
+        Returns
+        -------
+        pl.LazyFrame
+            The events whose id was not added before. Events without an id
+            cannot be told apart and are dropped.
+
+        """
+        events = events.lazy()
+        if source.filter is not None:
+            events = events.filter(source.filter)
+        events = events.with_columns(pl.col(source.event_id).cast(pl.Utf8))
+        without_id = events.select(pl.col(source.event_id).null_count())
+        if without_id := without_id.collect().item():
+            log.warning(
+                "Leaving out %d %s events without an id",
+                without_id,
+                source.name,
+            )
+        seen = self.events.lazy().filter(pl.col("source") == source.name)
+        return (
+            events.drop_nulls(source.event_id)
+            .filter(pl.col(source.event_date).cast(pl.Date) <= as_of)
+            .join(seen, left_on=source.event_id, right_on=EVENT_ID, how="anti")
+        )
+
+    def append(
+        self,
+        objects: dict[str, pl.DataFrame | pl.LazyFrame],
+        as_of: date | None = None,
+    ) -> int:
+        """Add the events not seen before to the buckets of their days.
+
+        Events are told apart by their id, so late or backdated events are
+        added to their own day's bucket rather than dropped.
+
+        Parameters
+        ----------
+        objects : dict[str, pl.DataFrame | pl.LazyFrame]
+            The dealer's translated objects by name. Sources whose object or
+            columns are missing, and levels whose key is missing, are skipped.
+        as_of : date | None
+            The run date, events after it are added on a later run. None uses
+            today.
+
+        Returns
+        -------
+        int
+            The number of events added.
+
+        """
+        as_of = as_of or date.today()  # noqa: DTZ011
+        buckets = []
+        new_ids = []
+        for configured_source in self.sources:
+            if configured_source.object not in objects:
+                continue
+            columns = objects[configured_source.object].lazy().collect_schema()
+            source = configured_source.resolve(columns.names())
+            if source is None:
+                log.warning(
+                    "%s does not map the columns of %s activity, skipping it",
+                    configured_source.object,
+                    configured_source.name,
+                )
+                continue
+            for level in configured_source.keys.keys() - source.keys.keys():
+                log.warning(
+                    "%s does not map %s, skipping %s activity per %s",
+                    source.object,
+                    configured_source.keys[level],
+                    source.name,
+                    level,
+                )
+            events = self.unseen(source, objects[source.object], as_of).collect().lazy()
+            buckets.extend(
+                daily_activity(source, events, level) for level in source.keys
+            )
+            new_ids.append(
+                events.select(
+                    pl.lit(source.name).alias("source"),
+                    pl.col(source.event_id).alias(EVENT_ID),
+                ),
+            )
+        if not new_ids:
+            return 0
+        new_events = pl.concat(new_ids).collect()
+        self.events = pl.concat([self.events, new_events])
+        # Late events land in buckets that may already exist, so add them up
+        self.state = (
+            pl.concat([self.state, pl.concat(buckets).collect().cast(STATE_SCHEMA)])
+            .group_by("level", "source", ENTITY, DAY, maintain_order=True)
+            .agg(pl.col("count", "amount").sum())
+            .select(list(STATE_SCHEMA))
+        )
+        return new_events.height
+
+    def features(
+        self,
+        spine: pl.DataFrame | pl.LazyFrame,
+        level: str = ACCOUNT_LEVEL,
+    ) -> pl.LazyFrame:
+        """Compute windowed activity features before each cutoff.
+
+        Parameters
+        ----------
+        spine : pl.DataFrame | pl.LazyFrame
+            The entity key and `cutoff` rows, e.g. account_id and cutoff.
+        level : str
+            The entity level, `account` or `equipment`.
+
+        Returns
+        -------
+        pl.LazyFrame
+            Per spine row and source, `<source>_<n>d_count` and, for sources
+            with an amount such as service spend, `<source>_<n>d_amount` for
+            every window, plus `<source>_activity_last_date` and
+            `<source>_activity_days_since_last`. Only events strictly before
+            the cutoff count.
+
+        """
+        key = LEVEL_KEYS[level]
+        # The feature store's as-of lookups are keyed by account id, so
+        # entities of every level take that name while looking up
+        spine = spine.lazy().select(pl.col(key).cast(pl.Utf8).alias(ACCOUNT), CUTOFF)
+        # Collected once, so the spine and the running totals share key ids
+        key_table = (
+            spine.select(ACCOUNT).unique().with_row_index(KEY_ID).collect().lazy()
+        )
+        spine = spine.join(key_table, on=ACCOUNT)
+        features = spine.select(ACCOUNT, CUTOFF)
+        for source in self.sources:
+            if level not in source.keys:
+                continue
+            running = (
+                self.state.lazy()
+                .filter(pl.col("level") == level, pl.col("source") == source.name)
+                .join(key_table, left_on=ENTITY, right_on=ACCOUNT)
+                .sort(KEY_ID, DAY)
+                .select(
+                    pl.col(KEY_ID).alias(f"{KEY_ID}_right"),
+                    as_of_position(pl.col(DAY)),
+                    pl.col(DAY).alias("last_date"),
+                    pl.col("count").cum_sum().over(KEY_ID),
+                    pl.col("amount").cum_sum().over(KEY_ID),
+                )
+                .collect()
+                .lazy()
+            )
+            features = features.join(
+                self._source_features(source, running, spine),
+                on=[ACCOUNT, CUTOFF],
+                how="left",
+            )
+        return features.rename({ACCOUNT: key})
+
+    def feature_function(self) -> Callable[[dict, pl.LazyFrame], pl.LazyFrame]:
+        """Return the account features for `FeatureStore.register`."""
+        return lambda _objects, spine: self.features(spine, ACCOUNT_LEVEL)
+
+    def save(self, path: str) -> None:
+        """Save the daily activity and the ids of its events to `path`."""
+        Path(path).mkdir(parents=True, exist_ok=True)
+        for df, file_name in (
+            (self.state, STATE_FILE_NAME),
+            (self.events, EVENTS_FILE_NAME),
+        ):
+            temporary_path = Path(path) / f".{file_name}.tmp"
+            df.write_parquet(temporary_path)
+            temporary_path.replace(Path(path) / file_name)
+
+    @classmethod
+    def load(cls, path: str) -> ActivityAggregator:
+        """Load the daily activity saved in `path`, or start empty."""
+        state_path = Path(path) / STATE_FILE_NAME
+        events_path = Path(path) / EVENTS_FILE_NAME
+        if not state_path.exists():
+            return cls()
+        if not events_path.exists():
+            # Without the event ids every event would be added again
+            log.warning("No event ids saved in %s, rebuilding the activity", path)
+            return cls()
+        return cls(pl.read_parquet(state_path), events=pl.read_parquet(events_path))
+
+    def _source_features(
+        self,
+        source: ActivitySource,
+        running: pl.LazyFrame,
+        spine: pl.LazyFrame,
+    ) -> pl.LazyFrame:
+        name = source.name
+        before_cutoff = totals_before(running, spine, pl.col(CUTOFF))
+        columns = [
+            pl.col("last_date").alias(f"{name}_activity{LAST_DATE_SUFFIX}"),
+            (pl.col(CUTOFF) - pl.col("last_date"))
+            .dt.total_days()
+            .alias(f"{name}_activity_days_since_last"),
+        ]
+        for days in self.window_days:
+            window_start = pl.col(CUTOFF) - pl.duration(days=days)
+            before_cutoff = before_cutoff.join(
+                totals_before(running, spine, window_start).select(
+                    ACCOUNT,
+                    CUTOFF,
+                    pl.col("count", "amount").name.suffix(f"_{days}"),
+                ),
+                on=[ACCOUNT, CUTOFF],
+            )
+            columns.append(
+                (pl.col("count") - pl.col(f"count_{days}")).alias(
+                    f"{name}_{days}d_count",
+                ),
+            )
+            if source.amount:
+                columns.append(
+                    (pl.col("amount") - pl.col(f"amount_{days}")).alias(
+                        f"{name}_{days}d_amount",
+                    ),
+                )
+        return before_cutoff.select(ACCOUNT, CUTOFF, *columns)
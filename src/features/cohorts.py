@@ -0,0 +1,300 @@
+"""Contains first-purchase cohorts and repurchase intervals per product group.
+
+The cohort notebook filters, copies and re-sorts the whole invoice frame for
+every product group it looks at. Here invoices are sorted once by account,
+product group and date, and window functions over (account, product group)
+give every invoice its cohort, purchase number and gap to the previous
+purchase of the same group, for all groups at once.
+
+Each (account, product group) also keeps a small state row with its first
+and last purchase and running interval sums. New invoices only need that
+state to get their intervals, and cohort averages are computed from the state
+rather than from the invoice history. The ids of the invoices added are kept
+too, so re-reading the full history only adds the invoices not seen before.
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import polars as pl
+
+from src.features.rfm import ACCOUNT, AMOUNT, EVENT_DATE, INVOICE, PRODUCT_GROUP
+
+KEYS = [ACCOUNT, PRODUCT_GROUP]
+STATE_FILE_NAME = "cohort_state.parquet"
+INVOICES_FILE_NAME = "cohort_invoices.parquet"
+INVOICE_SCHEMA = {INVOICE: pl.Utf8, EVENT_DATE: pl.Date}
+STATE_SCHEMA = {
+    ACCOUNT: pl.Utf8,
+    PRODUCT_GROUP: pl.Utf8,
+    "first_purchase_date": pl.Date,
+    "first_group_purchase_date": pl.Date,
+    "last_purchase_date": pl.Date,
+    "purchases": pl.UInt32,
+    "days_between_purchases": pl.Int64,
+    "years_between_purchases": pl.Int64,
+}
+
+log = logging.getLogger(__name__)
+
+
+def cohort_expr(first_purchase_date: pl.Expr) -> list[pl.Expr]:
+    """Build the cohort year and cohort id of a first purchase date.
+
+    Parameters
+    ----------
+    first_purchase_date : pl.Expr
+        The account's first purchase date.
+
+    Returns
+    -------
+    list[pl.Expr]
+        `cohort_year` and `cohort_id`, e.g. "2015_Q3", as in the notebook.
+
+    """
+    return [
+        first_purchase_date.dt.year().alias("cohort_year"),
+        pl.concat_str(
+            first_purchase_date.dt.year(),
+            pl.lit("_Q"),
+            first_purchase_date.dt.quarter(),
+        ).alias("cohort_id"),
+    ]
+
+
+class CohortAnalysis:
+    """Incrementally maintained purchase cohorts per account and product group."""
+
+    def __init__(
+        self,
+        state: pl.DataFrame | None = None,
+        invoices: pl.DataFrame | None = None,
+    ) -> None:
+        """Initialize the CohortAnalysis class.
+
+        Parameters
+        ----------
+        state : pl.DataFrame | None
+            The state of earlier invoices, e.g. from `load`. None starts
+            without history.
+        invoices : pl.DataFrame | None
+            The invoice id and date of the earlier invoices that had an id.
+            None starts without any.
+
+        """
+        self.state = pl.DataFrame(schema=STATE_SCHEMA) if state is None else state
+        self.invoices = (
+            pl.DataFrame(schema=INVOICE_SCHEMA) if invoices is None else invoices
+        )
+
+    def unseen(self, events: pl.DataFrame | pl.LazyFrame) -> pl.LazyFrame:
+        """Keep the invoices not added yet.
+
+        An invoice whose date changed, e.g. a unit sold again, counts as new.
+
+        Parameters
+        ----------
+        events : pl.DataFrame | pl.LazyFrame
+            Purchase events with an `invoice_id` column, e.g. the dealer's
+            full history from `stock_unit_sales`.
+
+        Returns
+        -------
+        pl.LazyFrame
+            The events whose invoice id and date were not added before.
+            Events without an id cannot be told apart and are dropped.
+
+        """
+        events = events.lazy().with_columns(
+            pl.col(INVOICE).cast(pl.Utf8),
+            pl.col(EVENT_DATE).cast(pl.Date),
+        )
+        without_id = events.select(pl.col(INVOICE).null_count()).collect().item()
+        if without_id:
+            log.warning("Leaving out %d invoices without an id", without_id)
+        return events.drop_nulls(INVOICE).join(
+            self.invoices.lazy(),
+            on=[INVOICE, EVENT_DATE],
+            how="anti",
+        )
+
+    def update(self, events: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+        """Add invoices and compute their cohorts and repurchase intervals.
+
+        Parameters
+        ----------
+        events : pl.DataFrame | pl.LazyFrame
+            Purchase events with account id, product group, event date and
+            amount columns, e.g. from `stock_unit_sales`. They must not predate
+            the last purchase already recorded for their account and group.
+            Ids in an `invoice_id` column are recorded for `unseen`.
+
+        Returns
+        -------
+        pl.DataFrame
+            The events sorted by account, product group and date, with the
+            account's `first_purchase_date`, `cohort_year` and `cohort_id`,
+            the `purchase_number` within the group, `previous_purchase_date`,
+            `days_from_previous_purchase` and `years_from_previous_purchase`.
+
+        """
+        events = events.lazy()
+        has_invoices = INVOICE in events.collect_schema().names()
+        events = (
+            events.select(
+                pl.col(ACCOUNT).cast(pl.Utf8),
+                pl.col(PRODUCT_GROUP).cast(pl.Utf8).fill_null("unknown"),
+                pl.col(EVENT_DATE).cast(pl.Date),
+                pl.col(AMOUNT).cast(pl.Float64),
+                *([pl.col(INVOICE).cast(pl.Utf8)] if has_invoices else []),
+            )
+            .drop_nulls([ACCOUNT, EVENT_DATE])
+            .sort(*KEYS, EVENT_DATE)
+        )
+        state = self.state.lazy()
+        account_first = state.group_by(ACCOUNT).agg(
+            pl.col("first_purchase_date").first().alias("known_first_date"),
+        )
+        intervals = (
+            events.join(
+                state.select(*KEYS, "last_purchase_date", "purchases"),
+                on=KEYS,
+                how="left",
+            )
+            .join(account_first, on=ACCOUNT, how="left")
+            .with_columns(
+                pl.min_horizontal(
+                    pl.col(EVENT_DATE).min().over(ACCOUNT),
+                    "known_first_date",
+                ).alias("first_purchase_date"),
+                (
+                    pl.int_range(1, pl.len() + 1, dtype=pl.UInt32).over(KEYS)
+                    + pl.col("purchases").fill_null(0)
+                ).alias("purchase_number"),
+                pl.col(EVENT_DATE)
+                .shift(1)
+                .over(KEYS)
+                .fill_null(pl.col("last_purchase_date"))
+                .alias("previous_purchase_date"),
+            )
+            .with_columns(
+                *cohort_expr(pl.col("first_purchase_date")),
+                (pl.col(EVENT_DATE) - pl.col("previous_purchase_date"))
+                .dt.total_days()
+                .alias("days_from_previous_purchase"),
+                (
+                    pl.col(EVENT_DATE).dt.year().cast(pl.Int64)
+                    - pl.col("previous_purchase_date").dt.year()
+                ).alias("years_from_previous_purchase"),
+            )
+            .collect()
+        )
+        late = intervals.filter(
+            (pl.col(EVENT_DATE) < pl.col("last_purchase_date"))
+            | (pl.col(EVENT_DATE) < pl.col("known_first_date")),
+        )
+        if late.height:
+            error_message = (
+                f"{late.height} invoices predate purchases already in the cohort "
+                "state, rebuild it from the full history instead."
+            )
+            raise ValueError(error_message)
+        self.state = self._merge_state(intervals)
+        if has_invoices:
+            self.invoices = pl.concat(
+                [
+                    self.invoices,
+                    intervals.select(INVOICE, EVENT_DATE).drop_nulls(INVOICE),
+                ],
+            ).unique()
+        return intervals.drop("last_purchase_date", "purchases", "known_first_date")
+
+    def _merge_state(self, intervals: pl.DataFrame) -> pl.DataFrame:
+        new_state = intervals.group_by(KEYS).agg(
+            pl.col("first_purchase_date").first(),
+            pl.col(EVENT_DATE).first().alias("first_group_purchase_date"),
+            pl.col(EVENT_DATE).last().alias("last_purchase_date"),
+            pl.len().cast(pl.UInt32).alias("purchases"),
+            pl.col("days_from_previous_purchase").sum().alias("days_between_purchases"),
+            pl.col("years_from_previous_purchase")
+            .sum()
+            .alias("years_between_purchases"),
+        )
+        return (
+            pl.concat(
+                [self.state, new_state.select(list(STATE_SCHEMA)).cast(STATE_SCHEMA)],
+            )
+            .group_by(KEYS, maintain_order=True)
+            .agg(
+                pl.col("first_purchase_date").min(),
+                pl.col("first_group_purchase_date").min(),
+                pl.col("last_purchase_date").max(),
+                pl.col("purchases").sum(),
+                pl.col("days_between_purchases").sum(),
+                pl.col("years_between_purchases").sum(),
+            )
+        )
+
+    def summary(self, product_groups: list[str] | None = None) -> pl.DataFrame:
+        """Summarize every cohort year and product group from the state.
+
+        Parameters
+        ----------
+        product_groups : list[str] | None
+            The product groups to summarize, e.g. ["LARGE TRACTOR",
+            "COMBINES"]. All of them when None.
+
+        Returns
+        -------
+        pl.DataFrame
+            Per product group and cohort year, the number of accounts, of
+            repeat accounts with more than one purchase, of purchases and the
+            mean days and years between consecutive purchases.
+
+        """
+        state = self.state.lazy()
+        if product_groups is not None:
+            state = state.filter(pl.col(PRODUCT_GROUP).is_in(product_groups))
+        intervals = (pl.col("purchases") - 1).sum()
+        return (
+            state.with_columns(*cohort_expr(pl.col("first_purchase_date")))
+            .group_by(PRODUCT_GROUP, "cohort_year")
+            .agg(
+                pl.len().alias("accounts"),
+                (pl.col("purchases") > 1).sum().alias("repeat_accounts"),
+                pl.col("purchases").sum(),
+                (pl.col("days_between_purchases").sum() / intervals).alias(
+                    "mean_days_between_purchases",
+                ),
+                (pl.col("years_between_purchases").sum() / intervals).alias(
+                    "mean_years_between_purchases",
+                ),
+            )
+            .sort(PRODUCT_GROUP, "cohort_year")
+            .collect()
+        )
+
+    def save(self, path: str) -> None:
+        """Save the state and the invoices added to `path`."""
+        Path(path).mkdir(parents=True, exist_ok=True)
+        for df, file_name in (
+            (self.state, STATE_FILE_NAME),
+            (self.invoices, INVOICES_FILE_NAME),
+        ):
+            temporary_path = Path(path) / f".{file_name}.tmp"
+            df.write_parquet(temporary_path)
+            temporary_path.replace(Path(path) / file_name)
+
+    @classmethod
+    def load(cls, path: str) -> CohortAnalysis:
+        """Load the state saved in `path`, or start empty if there is none."""
+        state_path = Path(path) / STATE_FILE_NAME
+        if not state_path.exists():
+            return cls()
+        invoices_path = Path(path) / INVOICES_FILE_NAME
+        return cls(
+            pl.read_parquet(state_path),
+            pl.read_parquet(invoices_path) if invoices_path.exists() else None,
+        )
@@ -0,0 +1,580 @@
+"""Contains a point-in-time correct feature store keyed by (account, cutoff).
+
+The propensity and CLV notebooks split events into pre and post windows by
+hand around `MAX_DATE`. Here a spine of (account, cutoff) rows is built once,
+and every event table is attached to it with an as-of join that only sees
+events strictly before the cutoff. Labels look forward from the cutoff and are
+kept in `label_` columns next to the features.
+
+Features are stored as Parquet partitioned by cutoff (`cutoff=YYYY-MM-DD/`),
+so adding a cutoff only computes and writes that cutoff. Before anything is
+written, `check_point_in_time` verifies that no feature used an event on or
+after its cutoff, and raises `LeakageError` if one did.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, replace
+from datetime import date
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+from src.features.rfm import KEY_ID, NON_SALE_INVOICES, POSITION, as_of_position
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+ACCOUNT = "account_id"
+CUTOFF = "cutoff"
+LAST_DATE_SUFFIX = "_last_date"
+LABEL_PREFIX = "label_"
+PARTITION_FILE_NAME = "features.parquet"
+DEFAULT_LABEL_HORIZON_MONTHS = 12
+
+log = logging.getLogger(__name__)
+
+
+class LeakageError(ValueError):
+    """A feature was built from events on or after its cutoff."""
+
+
+@dataclass(frozen=True)
+class EventSource:
+    """An event table attached to the spine by account and event date.
+
+    Dealers that do not map `event_date` use `fallback_event_date` instead,
+    e.g. the close date of service requests when the open date is unknown.
+    """
+
+    name: str
+    object: str
+    account: str
+    event_date: str
+    amount: str | None = None
+    filter: pl.Expr | None = None
+    fallback_event_date: str | None = None
+
+    def resolve(self, columns: list[str]) -> EventSource | None:
+        """Fit the source to the columns of its object.
+
+        Parameters
+        ----------
+        columns : list[str]
+            The columns of the dealer's translated object.
+
+        Returns
+        -------
+        EventSource | None
+            The source, reading the fallback event date when the event date
+            is not mapped, or None when a required column is missing.
+
+        """
+        source = self
+        if self.event_date not in columns and self.fallback_event_date:
+            source = replace(self, event_date=self.fallback_event_date)
+        required = [source.account, source.event_date]
+        if source.amount:
+            required.append(source.amount)
+        if source.filter is not None:
+            required.extend(source.filter.meta.root_names())
+        if any(column not in columns for column in required):
+            return None
+        return source
+
+
+EVENT_SOURCES = (
+    EventSource(
+        "stock_unit_sales",
+        "dealer_stock_unit",
+        "dsu_account_id",
+        "dsu_sales_date",
+        "dsu_sale_price",
+        filter=~pl.col("dsu_invoice_number")
+        .is_in(NON_SALE_INVOICES)
+        .fill_null(value=False),
+    ),
+    EventSource("tasks", "task", "task_account_id", "task_activity_date"),
+    EventSource(
+        "service_requests",
+        "service_requests",
+        "service_account_id",
+        "service_open_date",
+        "service_invoice_value",
+        fallback_event_date="service_close_date",
+    ),
+    EventSource("quotes", "quote", "quote_customer_account_id", "quote_created_date"),
+)
+
+
+def source_events(
+    source: EventSource,
+    objects: dict[str, pl.DataFrame | pl.LazyFrame],
+) -> pl.LazyFrame:
+    """Select the account, event date and amount of a source's events.
+
+    Parameters
+    ----------
+    source : EventSource
+        The event source.
+    objects : dict[str, pl.DataFrame | pl.LazyFrame]
+        The dealer's translated objects by name.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The account id, the event day and the amount (1 per event when the
+        source has no amount) of every event with an account and a date.
+
+    """
+    events = objects[source.object].lazy()
+    if source.filter is not None:
+        events = events.filter(source.filter)
+    return events.select(
+        pl.col(source.account).cast(pl.Utf8).alias(ACCOUNT),
+        pl.col(source.event_date).cast(pl.Date).alias("event_date"),
+        (
+            pl.col(source.amount).cast(pl.Float64)
+            if source.amount
+            else pl.lit(1.0, dtype=pl.Float64)
+        ).alias("amount"),
+    ).drop_nulls([ACCOUNT, "event_date"])
+
+
+def running_totals(events: pl.LazyFrame, spine: pl.LazyFrame) -> pl.LazyFrame:
+    """Sum the running event count and amount per account, by event day.
+
+    Parameters
+    ----------
+    events : pl.LazyFrame
+        Events from `source_events`.
+    spine : pl.LazyFrame
+        The spine, whose account key ids the events are keyed by. Events of
+        other accounts are dropped.
+
+    Returns
+    -------
+    pl.LazyFrame
+        Per account key and event day, the as-of position and the count and
+        amount of the events up to and including that day.
+
+    """
+    return (
+        events.join(spine.select(ACCOUNT, KEY_ID).unique(), on=ACCOUNT)
+        .group_by(KEY_ID, "event_date")
+        .agg(pl.len().alias("count"), pl.col("amount").sum())
+        .sort(KEY_ID, "event_date")
+        .select(
+            pl.col(KEY_ID).alias(f"{KEY_ID}_right"),
+            as_of_position(pl.col("event_date")),
+            pl.col("event_date").alias("last_date"),
+            pl.col("count").cum_sum().over(KEY_ID),
+            pl.col("amount").cum_sum().over(KEY_ID),
+        )
+    )
+
+
+def totals_before(
+    running: pl.LazyFrame,
+    spine: pl.LazyFrame,
+    boundary: pl.Expr,
+) -> pl.LazyFrame:
+    """Look up each spine row's running totals strictly before a boundary day.
+
+    Parameters
+    ----------
+    running : pl.LazyFrame
+        The running totals from `running_totals`.
+    spine : pl.LazyFrame
+        The account id, account key id and cutoff rows to look up.
+    boundary : pl.Expr
+        The day, computed from the spine row, whose earlier events count.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The account id, cutoff, count, amount and date of the last event
+        before the boundary. Counts are zero and dates null without events.
+
+    """
+    matched = pl.col(f"{KEY_ID}_right") == pl.col(KEY_ID)
+    return (
+        # Backward as-of on the day before the boundary only sees earlier events
+        spine.select(
+            ACCOUNT,
+            CUTOFF,
+            KEY_ID,
+            as_of_position(boundary - pl.duration(days=1)),
+        )
+        .sort(POSITION)
+        .join_asof(running, on=POSITION, strategy="backward")
+        .select(
+            ACCOUNT,
+            CUTOFF,
+            pl.when(matched).then(pl.col("count", "amount")).otherwise(0),
+            pl.when(matched).then(pl.col("last_date")),
+        )
+    )
+
+
+def as_of_features(
+    source: EventSource,
+    running: pl.LazyFrame,
+    spine: pl.LazyFrame,
+) -> pl.LazyFrame:
+    """Summarize a source's events before each cutoff of the spine.
+
+    Parameters
+    ----------
+    source : EventSource
+        The event source, whose name prefixes the feature columns.
+    running : pl.LazyFrame
+        The source's running totals from `running_totals`.
+    spine : pl.LazyFrame
+        The account id, account key id and cutoff rows to summarize.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The account id, cutoff, `<name>_count`, `<name>_amount` (when the
+        source has an amount), `<name>_last_date` and
+        `<name>_days_since_last`.
+
+    """
+    features = totals_before(running, spine, pl.col(CUTOFF)).select(
+        ACCOUNT,
+        CUTOFF,
+        pl.col("count").alias(f"{source.name}_count"),
+        pl.col("amount").alias(f"{source.name}_amount"),
+        pl.col("last_date").alias(f"{source.name}{LAST_DATE_SUFFIX}"),
+        (pl.col(CUTOFF) - pl.col("last_date"))
+        .dt.total_days()
+        .alias(f"{source.name}_days_since_last"),
+    )
+    if source.amount is None:
+        return features.drop(f"{source.name}_amount")
+    return features
+
+
+def purchase_labels(
+    events: pl.LazyFrame,
+    running: pl.LazyFrame,
+    spine: pl.LazyFrame,
+    horizon_months: int = DEFAULT_LABEL_HORIZON_MONTHS,
+) -> pl.LazyFrame:
+    """Label whether each account buys in the months after each cutoff.
+
+    Parameters
+    ----------
+    events : pl.LazyFrame
+        Purchase events from `source_events`.
+    running : pl.LazyFrame
+        The running totals of the purchase events from `running_totals`.
+    spine : pl.LazyFrame
+        The account id, account key id and cutoff rows to label.
+    horizon_months : int
+        The number of months after the cutoff a purchase counts.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The account id, cutoff, `label_purchase` and `label_purchase_amount`.
+        Labels are null when the horizon runs past the last recorded event,
+        since the outcome is not known yet.
+
+    """
+    horizon_end = pl.col(CUTOFF).dt.offset_by(f"{horizon_months}mo")
+    observed_until = events.select(pl.col("event_date").max().alias("observed_until"))
+    known = horizon_end <= pl.col("observed_until") + pl.duration(days=1)
+    # Totals up to the end of the horizon minus those up to the cutoff
+    return (
+        totals_before(running, spine, horizon_end)
+        .join(
+            totals_before(running, spine, pl.col(CUTOFF)),
+            on=[ACCOUNT, CUTOFF],
+            suffix="_before",
+        )
+        .join(observed_until, how="cross")
+        .select(
+            ACCOUNT,
+            CUTOFF,
+            pl.when(known)
+            .then(pl.col("count") > pl.col("count_before"))
+            .alias(f"{LABEL_PREFIX}purchase"),
+            pl.when(known)
+            .then(pl.col("amount") - pl.col("amount_before"))
+            .alias(f"{LABEL_PREFIX}purchase_amount"),
+        )
+    )
+
+
+def check_point_in_time(features: pl.DataFrame) -> None:
+    """Fail if any feature was built from events on or after its cutoff.
+
+    Every feature set records the date of the latest event it used in a
+    `<name>_last_date` column, which must fall before the row's cutoff.
+
+    Parameters
+    ----------
+    features : pl.DataFrame
+        Features with a cutoff column and `_last_date` columns.
+
+    """
+    last_date_columns = [
+        column for column in features.columns if column.endswith(LAST_DATE_SUFFIX)
+    ]
+    leaks = (
+        features.select(
+            (pl.col(column) >= pl.col(CUTOFF)).sum().alias(column)
+            for column in last_date_columns
+        ).row(0, named=True)
+        if last_date_columns
+        else {}
+    )
+    leaked = {column: count for column, count in leaks.items() if count}
+    if leaked:
+        error_message = (
+            f"Features use events on or after their cutoff (rows per column): {leaked}."
+        )
+        raise LeakageError(error_message)
+
+
+class FeatureStore:
+    """Point-in-time features per (account, cutoff) stored as partitioned Parquet."""
+
+    def __init__(
+        self,
+        path: str,
+        sources: tuple[EventSource, ...] = EVENT_SOURCES,
+        label_source: str = "stock_unit_sales",
+        label_horizon_months: int = DEFAULT_LABEL_HORIZON_MONTHS,
+    ) -> None:
+        """Initialize the FeatureStore class.
+
+        Parameters
+        ----------
+        path : str
+            The directory holding one `cutoff=YYYY-MM-DD` partition per cutoff.
+        sources : tuple[EventSource, ...]
+            The event sources to build features from.
+        label_source : str
+            The name of the source whose events are the purchases labelled.
+        label_horizon_months : int
+            The number of months after the cutoff a purchase is labelled for.
+
+        """
+        self.path = Path(path)
+        self.sources = sources
+        self.label_source = label_source
+        self.label_horizon_months = label_horizon_months
+        self.feature_functions: list[Callable[[dict, pl.LazyFrame], pl.LazyFrame]] = []
+
+    def cutoffs(self) -> list[date]:
+        """List the cutoffs already materialized, oldest first."""
+        if not self.path.exists():
+            return []
+        return sorted(
+            date.fromisoformat(partition.name.removeprefix(f"{CUTOFF}="))
+            for partition in self.path.glob(f"{CUTOFF}=*")
+            if (partition / PARTITION_FILE_NAME).exists()
+        )
+
+    def compute(
+        self,
+        objects: dict[str, pl.DataFrame | pl.LazyFrame],
+        accounts: list[str] | pl.Series,
+        cutoffs: list[date],
+    ) -> pl.DataFrame:
+        """Compute features and labels for every account at every cutoff.
+
+        Parameters
+        ----------
+        objects : dict[str, pl.DataFrame | pl.LazyFrame]
+            The dealer's translated objects by name. Sources whose object or
+            columns are missing are skipped.
+        accounts : list[str] | pl.Series
+            The account ids to build rows for.
+        cutoffs : list[date]
+            The cutoffs to build rows for.
+
+        Returns
+        -------
+        pl.DataFrame
+            One row per account and cutoff with the features of every source,
+            the output of every registered feature function and the labels.
+
+        Raises
+        ------
+        ValueError
+            If a registered feature function returns no `_last_date` column.
+        LeakageError
+            If a feature used events on or after its cutoff.
+
+        """
+        spine = (
+            pl.LazyFrame({ACCOUNT: pl.Series(accounts, dtype=pl.Utf8)})
+            .unique(maintain_order=True)
+            .with_row_index(KEY_ID)
+            .join(
+                pl.LazyFrame({CUTOFF: cutoffs}, schema={CUTOFF: pl.Date}),
+                how="cross",
+            )
+        )
+        dataset = spine.drop(KEY_ID)
+        for configured_source in self.sources:
+            if configured_source.object not in objects:
+                log.warning(
+                    "No %s object, skipping %s features",
+                    configured_source.object,
+                    configured_source.name,
+                )
+                continue
+            columns = objects[configured_source.object].lazy().collect_schema()
+            source = configured_source.resolve(columns.names())
+            if source is None:
+                log.warning(
+                    "%s does not map the columns of %s, skipping its features",
+                    configured_source.object,
+                    configured_source.name,
+                )
+                continue
+            if source.event_date != configured_source.event_date:
+                log.info(
+                    "Dating %s by %s, %s is not mapped",
+                    source.name,
+                    source.event_date,
+                    configured_source.event_date,
+                )
+            events = source_events(source, objects)
+            running = running_totals(events, spine).collect().lazy()
+            dataset = dataset.join(
+                as_of_features(source, running, spine),
+                on=[ACCOUNT, CUTOFF],
+                how="left",
+            )
+            if source.name == self.label_source:
+                dataset = dataset.join(
+                    purchase_labels(
+                        events,
+                        running,
+                        spine,
+                        self.label_horizon_months,
+                    ),
+                    on=[ACCOUNT, CUTOFF],
+                    how="left",
+                )
+        for feature_function in self.feature_functions:
+            function_features = feature_function(objects, spine.drop(KEY_ID))
+            if not any(
+                column.endswith(LAST_DATE_SUFFIX)
+                for column in function_features.collect_schema().names()
+            ):
+                name = getattr(feature_function, "__qualname__", repr(feature_function))
+                error_message = (
+                    f"Feature function {name} has no `{LAST_DATE_SUFFIX}` column, "
+                    "so its features cannot be checked for leakage."
+                )
+                raise ValueError(error_message)
+            dataset = dataset.join(
+                function_features,
+                on=[ACCOUNT, CUTOFF],
+                how="left",
+            )
+        features = dataset.sort(CUTOFF, ACCOUNT).collect()
+        check_point_in_time(features)
+        return features
+
+    def register(
+        self,
+        feature_function: Callable[[dict, pl.LazyFrame], pl.LazyFrame],
+    ) -> None:
+        """Add a feature function to every computation.
+
+        Parameters
+        ----------
+        feature_function : Callable[[dict, pl.LazyFrame], pl.LazyFrame]
+            Called with the objects and the (account, cutoff) spine, returns
+            features keyed by account id and cutoff. It must report the latest
+            event its features used in a `<name>_last_date` column so
+            `check_point_in_time` can verify it, `compute` raises a
+            ValueError otherwise.
+
+        """
+        self.feature_functions.append(feature_function)
+
+    def update(
+        self,
+        objects: dict[str, pl.DataFrame | pl.LazyFrame],
+        accounts: list[str] | pl.Series,
+        cutoffs: list[date],
+        *,
+        overwrite: bool = False,
+    ) -> list[date]:
+        """Compute and write the cutoffs not materialized yet.
+
+        Parameters
+        ----------
+        objects : dict[str, pl.DataFrame | pl.LazyFrame]
+            The dealer's translated objects by name.
+        accounts : list[str] | pl.Series
+            The account ids to build rows for.
+        cutoffs : list[date]
+            The cutoffs wanted in the store.
+        overwrite : bool
+            Whether to recompute cutoffs that are already materialized, e.g.
+            to fill in labels whose horizon has since passed.
+
+        Returns
+        -------
+        list[date]
+            The cutoffs computed.
+
+        """
+        existing = set() if overwrite else set(self.cutoffs())
+        new_cutoffs = sorted(set(cutoffs) - existing)
+        if not new_cutoffs:
+            log.info("All %d cutoffs are already materialized", len(cutoffs))
+            return []
+        features = self.compute(objects, accounts, new_cutoffs)
+        for (cutoff,), partition in features.group_by(CUTOFF):
+            self._write_partition(cutoff, partition.drop(CUTOFF))
+        log.info(
+            "Materialized %d cutoffs (%d rows) in %s",
+            len(new_cutoffs),
+            features.height,
+            self.path,
+        )
+        return new_cutoffs
+
+    def read(self, cutoffs: list[date] | None = None) -> pl.LazyFrame:
+        """Scan the materialized features.
+
+        Parameters
+        ----------
+        cutoffs : list[date] | None
+            The cutoffs to read, all of them when None.
+
+        Returns
+        -------
+        pl.LazyFrame
+            The features with the cutoff column restored from the partitions.
+
+        """
+        features = pl.scan_parquet(
+            self.path / f"{CUTOFF}=*" / PARTITION_FILE_NAME,
+            hive_partitioning=True,
+            hive_schema={CUTOFF: pl.Date},
+        )
+        if cutoffs is not None:
+            features = features.filter(pl.col(CUTOFF).is_in(cutoffs))
+        return features
+
+    def _write_partition(self, cutoff: date, partition: pl.DataFrame) -> None:
+        partition_path = self.path / f"{CUTOFF}={cutoff.isoformat()}"
+        partition_path.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a half-written partition
+        temporary_path = partition_path / f".{PARTITION_FILE_NAME}.tmp"
+        partition.write_parquet(temporary_path)
+        temporary_path.replace(partition_path / PARTITION_FILE_NAME)
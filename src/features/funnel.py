@@ -0,0 +1,258 @@
+"""Contains quote-to-sale funnel features.
+
+Quotes are mapped in the semantic layer but no notebook uses them, although
+an open quote is one of the strongest buying signals there is. Here every
+quote is linked to the first stock-unit sale of its account on or after the
+quote date with a forward as-of join over positions sorted by account and
+day, so linking is a sort and a merge rather than a quotes x sales join.
+
+A quote is open from its creation until it converts or, without a sale
+within `max_lag_days`, expires. Its creation and its closing are then two
+dated events, and the number of open quotes before a cutoff is the running
+count of creations minus the running count of closings, both found with one
+backward as-of lookup per cutoff.
+
+Whether a quote has a purchase order is left out: only its current PO number
+is exported, not when it was attached, so for an earlier cutoff the flag
+would leak a later PO into the features.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+from src.features.feature_store import ACCOUNT, CUTOFF, LAST_DATE_SUFFIX
+from src.features.rfm import (
+    EVENT_DATE,
+    KEY_ID,
+    POSITION,
+    as_of_position,
+    stock_unit_sales,
+)
+
+if TYPE_CHECKING:
+    from collections.abc import Callable
+
+QUOTE_ID = "quote_id"
+QUOTE_DATE = "quote_date"
+SALE_DATE = "sale_date"
+CLOSE_DATE = "close_date"
+CONVERSION_LAG = "conversion_lag_days"
+DEFAULT_MAX_LAG_DAYS = 365
+RUNNING_COLUMNS = ("created", "closed", "converted", "lag_days")
+
+
+def quote_events(quote: pl.DataFrame | pl.LazyFrame) -> pl.LazyFrame:
+    """Select the id, account and day of every quote.
+
+    Parameters
+    ----------
+    quote : pl.DataFrame | pl.LazyFrame
+        The translated quote object.
+
+    Returns
+    -------
+    pl.LazyFrame
+        One row per quote with an account and a creation date.
+
+    """
+    return (
+        quote.lazy()
+        .select(
+            pl.col("quote_id").cast(pl.Utf8).alias(QUOTE_ID),
+            pl.col("quote_customer_account_id").cast(pl.Utf8).alias(ACCOUNT),
+            pl.col("quote_created_date").cast(pl.Date).alias(QUOTE_DATE),
+        )
+        .drop_nulls([ACCOUNT, QUOTE_DATE])
+    )
+
+
+def link_quotes_to_sales(
+    quotes: pl.DataFrame | pl.LazyFrame,
+    sales: pl.DataFrame | pl.LazyFrame,
+    max_lag_days: int = DEFAULT_MAX_LAG_DAYS,
+) -> pl.LazyFrame:
+    """Find the first sale of each quote's account on or after the quote.
+
+    Parameters
+    ----------
+    quotes : pl.DataFrame | pl.LazyFrame
+        Quotes from `quote_events`.
+    sales : pl.DataFrame | pl.LazyFrame
+        Sale events with account id and event date, e.g. from
+        `stock_unit_sales`.
+    max_lag_days : int
+        The number of days after the quote a sale still converts it.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The quotes with the `sale_date` and `conversion_lag_days` of the sale
+        converting them, both null if none did, and the `close_date` on which
+        the quote converted or expired.
+
+    """
+    quotes = quotes.lazy()
+    sales = (
+        sales.lazy()
+        .select(pl.col(ACCOUNT).cast(pl.Utf8), pl.col(EVENT_DATE).cast(pl.Date))
+        .drop_nulls()
+    )
+    # Collected once, so quotes and sales share key ids
+    key_table = quotes.select(ACCOUNT).unique().with_row_index(KEY_ID).collect().lazy()
+    sale_positions = (
+        sales.join(key_table, on=ACCOUNT)
+        .select(
+            pl.col(KEY_ID).alias(f"{KEY_ID}_right"),
+            as_of_position(pl.col(EVENT_DATE)),
+            pl.col(EVENT_DATE).alias(SALE_DATE),
+        )
+        .unique(POSITION)
+        .sort(POSITION)
+    )
+    matched = pl.col(f"{KEY_ID}_right") == pl.col(KEY_ID)
+    lag = (pl.col(SALE_DATE) - pl.col(QUOTE_DATE)).dt.total_days()
+    return (
+        quotes.join(key_table, on=ACCOUNT)
+        .with_columns(as_of_position(pl.col(QUOTE_DATE)))
+        .sort(POSITION)
+        .join_asof(sale_positions, on=POSITION, strategy="forward")
+        .with_columns(
+            pl.when(matched & (lag <= max_lag_days)).then(pl.col(SALE_DATE)),
+        )
+        .with_columns(
+            lag.alias(CONVERSION_LAG),
+            pl.coalesce(
+                SALE_DATE,
+                pl.col(QUOTE_DATE) + pl.duration(days=max_lag_days + 1),
+            ).alias(CLOSE_DATE),
+        )
+        .drop(KEY_ID, f"{KEY_ID}_right", POSITION)
+    )
+
+
+def funnel_features(
+    links: pl.DataFrame | pl.LazyFrame,
+    spine: pl.DataFrame | pl.LazyFrame,
+) -> pl.LazyFrame:
+    """Summarize each account's quote funnel before each cutoff.
+
+    Parameters
+    ----------
+    links : pl.DataFrame | pl.LazyFrame
+        Quotes linked to sales by `link_quotes_to_sales`.
+    spine : pl.DataFrame | pl.LazyFrame
+        The account id and cutoff rows to summarize.
+
+    Returns
+    -------
+    pl.LazyFrame
+        The account id, cutoff, `open_quotes`, the `converted_quotes` and
+        `expired_quotes` closed before the cutoff, the
+        `quote_conversion_rate` among them, `mean_conversion_lag_days` and
+        `quote_funnel_last_date`, the last quote date used. Only quotes and
+        sales strictly before the cutoff count.
+
+    """
+    links = links.lazy()
+    spine = spine.lazy().select(pl.col(ACCOUNT).cast(pl.Utf8), CUTOFF)
+    key_table = spine.select(ACCOUNT).unique().with_row_index(KEY_ID).collect().lazy()
+    converted = pl.col(SALE_DATE).is_not_null()
+    # A quote counts once when created and once when closed
+    events = pl.concat(
+        [
+            links.select(
+                ACCOUNT,
+                pl.col(QUOTE_DATE).alias(EVENT_DATE),
+                pl.lit(1).alias("created"),
+                pl.lit(0).alias("closed"),
+                pl.lit(0).alias("converted"),
+                pl.lit(0).alias("lag_days"),
+                pl.col(QUOTE_DATE).alias("last_quote_date"),
+            ),
+            links.select(
+                ACCOUNT,
+                pl.col(CLOSE_DATE).alias(EVENT_DATE),
+                pl.lit(0).alias("created"),
+                pl.lit(1).alias("closed"),
+                converted.cast(pl.Int64).alias("converted"),
+                pl.col(CONVERSION_LAG).fill_null(0).alias("lag_days"),
+                pl.lit(None, dtype=pl.Date).alias("last_quote_date"),
+            ),
+        ],
+        how="vertical_relaxed",
+    )
+    running = (
+        events.join(key_table, on=ACCOUNT)
+        .group_by(KEY_ID, EVENT_DATE)
+        .agg(
+            *[pl.col(column).sum() for column in RUNNING_COLUMNS],
+            pl.col("last_quote_date").max(),
+        )
+        .sort(KEY_ID, EVENT_DATE)
+        .select(
+            pl.col(KEY_ID).alias(f"{KEY_ID}_right"),
+            as_of_position(pl.col(EVENT_DATE)),
+            *[pl.col(column).cum_sum().over(KEY_ID) for column in RUNNING_COLUMNS],
+            pl.col("last_quote_date").forward_fill().over(KEY_ID),
+        )
+        .collect()
+        .lazy()
+    )
+    matched = pl.col(f"{KEY_ID}_right") == pl.col(KEY_ID)
+    totals = (
+        spine.join(key_table, on=ACCOUNT)
+        .with_columns(as_of_position(pl.col(CUTOFF) - pl.duration(days=1)))
+        .sort(POSITION)
+        .join_asof(running, on=POSITION, strategy="backward")
+        .select(
+            ACCOUNT,
+            CUTOFF,
+            *[
+                pl.when(matched).then(pl.col(column)).otherwise(0).alias(column)
+                for column in RUNNING_COLUMNS
+            ],
+            pl.when(matched).then(pl.col("last_quote_date")).alias("last_quote_date"),
+        )
+    )
+    return totals.select(
+        ACCOUNT,
+        CUTOFF,
+        (pl.col("created") - pl.col("closed")).alias("open_quotes"),
+        pl.col("converted").alias("converted_quotes"),
+        (pl.col("closed") - pl.col("converted")).alias("expired_quotes"),
+        (pl.col("converted") / pl.col("closed")).alias("quote_conversion_rate"),
+        (pl.col("lag_days") / pl.col("converted")).alias("mean_conversion_lag_days"),
+        pl.col("last_quote_date").alias(f"quote_funnel{LAST_DATE_SUFFIX}"),
+    )
+
+
+def funnel_feature_function(
+    max_lag_days: int = DEFAULT_MAX_LAG_DAYS,
+) -> Callable[[dict, pl.LazyFrame], pl.LazyFrame]:
+    """Return the funnel features for `FeatureStore.register`.
+
+    Parameters
+    ----------
+    max_lag_days : int
+        The number of days after the quote a sale still converts it.
+
+    Returns
+    -------
+    Callable[[dict, pl.LazyFrame], pl.LazyFrame]
+        Builds the funnel features from the quote and dealer_stock_unit
+        objects for an (account, cutoff) spine.
+
+    """
+
+    def feature_function(objects: dict, spine: pl.LazyFrame) -> pl.LazyFrame:
+        links = link_quotes_to_sales(
+            quote_events(objects["quote"]),
+            stock_unit_sales(objects["dealer_stock_unit"]),
+            max_lag_days,
+        )
+        return funnel_features(links, spine)
+
+    return feature_function
@@ -0,0 +1,291 @@
+"""Contains a recency, frequency and monetary (RFM) feature engine.
+
+The segmentation notebooks compute RFM for a single cutoff with one
+sort-group-merge chain per measure. Here every (account, product group) gets
+running purchase counts and amounts in one sorted pass, and the value of a
+running total at any cutoff is an as-of lookup into it. Features for many
+cutoffs therefore cost one as-of join per window boundary, whatever the number
+of cutoffs, and come out as a long (account, product group, cutoff, feature,
+value) table.
+
+Only events strictly before a cutoff count towards its features.
+"""
+
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+if TYPE_CHECKING:
+    from datetime import date
+
+ACCOUNT = "account_id"
+PRODUCT_GROUP = "product_group"
+EVENT_DATE = "event_date"
+AMOUNT = "amount"
+INVOICE = "invoice_id"
+CUTOFF = "cutoff"
+FEATURE = "feature"
+VALUE = "value"
+KEY_ID = "key_id"
+POSITION = "position"
+DAYS_PER_KEY = 1_000_000
+DAY_OFFSET = 500_000
+
+# Product group every event also counts towards
+ALL_GROUPS = "all"
+# Trailing windows in months, on top of the lifetime features
+DEFAULT_WINDOWS = (3, 12, 36)
+# Invoices the dealers use for internal stock moves, not sales
+NON_SALE_INVOICES = ["NOTAVA", "EQPADD", "N/A"]
+SALES_HISTORY_GROUPS = {
+    "sales_history_parts_sales": "parts",
+    "sales_history_service_sales": "service",
+    "sales_history_rental_sales": "rental",
+    "sales_history_wholegood_sales": "wholegoods",
+}
+
+
+def stock_unit_sales(
+    dealer_stock_unit: pl.DataFrame | pl.LazyFrame,
+    *,
+    with_invoice_id: bool = False,
+) -> pl.LazyFrame:
+    """Turn translated stock units into sale events.
+
+    Parameters
+    ----------
+    dealer_stock_unit : pl.DataFrame | pl.LazyFrame
+        The translated dealer_stock_unit object.
+    with_invoice_id : bool
+        Whether to keep the stock unit id as the event's `invoice_id`.
+
+    Returns
+    -------
+    pl.LazyFrame
+        One event per sold unit with the buying account, the sales date, the
+        sale price and the unit's group as product group.
+
+    """
+    return (
+        dealer_stock_unit.lazy()
+        .filter(
+            ~pl.col("dsu_invoice_number")
+            .is_in(NON_SALE_INVOICES)
+            .fill_null(value=False),
+        )
+        .select(
+            pl.col("dsu_account_id").alias(ACCOUNT),
+            pl.col("dsu_group").alias(PRODUCT_GROUP),
+            pl.col("dsu_sales_date").cast(pl.Date).alias(EVENT_DATE),
+            pl.col("dsu_sale_price").cast(pl.Float64).alias(AMOUNT),
+            *(
+                [pl.col("dealer_stock_unit_id").cast(pl.Utf8).alias(INVOICE)]
+                if with_invoice_id
+                else []
+            ),
+        )
+    )
+
+
+def sales_history_sales(sales_history: pl.DataFrame | pl.LazyFrame) -> pl.LazyFrame:
+    """Turn translated yearly sales history into sale events.
+
+    A year's sales are only known once the year is over, so each is dated on
+    the last day of its year.
+
+    Parameters
+    ----------
+    sales_history : pl.DataFrame | pl.LazyFrame
+        The translated sales_history object.
+
+    Returns
+    -------
+    pl.LazyFrame
+        One event per account, year and sales type (parts, service, rental,
+        wholegoods) with non-zero sales.
+
+    """
+    return (
+        sales_history.lazy()
+        .select(
+            pl.col("sales_history_account_id").alias(ACCOUNT),
+            pl.date(pl.col("sales_history_year"), 12, 31).alias(EVENT_DATE),
+            *[pl.col(column).cast(pl.Float64) for column in SALES_HISTORY_GROUPS],
+        )
+        .unpivot(
+            index=[ACCOUNT, EVENT_DATE],
+            variable_name=PRODUCT_GROUP,
+            value_name=AMOUNT,
+        )
+        .with_columns(pl.col(PRODUCT_GROUP).replace_strict(SALES_HISTORY_GROUPS))
+        .filter(pl.col(AMOUNT).fill_null(0) != 0)
+    )
+
+
+def monthly_cutoffs(start: date, end: date, every: str = "1mo") -> list[date]:
+    """List evenly spaced cutoff dates.
+
+    Parameters
+    ----------
+    start : date
+        The first cutoff.
+    end : date
+        The last possible cutoff.
+    every : str
+        The spacing as a Polars duration, e.g. "1mo" or "1q".
+
+    Returns
+    -------
+    list[date]
+        The cutoffs from `start` to `end`.
+
+    """
+    return pl.date_range(start, end, every, eager=True).to_list()
+
+
+def _running_totals(events: pl.LazyFrame) -> pl.LazyFrame:
+    """Sum the running count and amount per key, sorted by as-of position."""
+    return (
+        events.group_by(KEY_ID, EVENT_DATE)
+        .agg(pl.len().alias("count"), pl.col(AMOUNT).sum())
+        .sort(KEY_ID, EVENT_DATE)
+        .select(
+            KEY_ID,
+            as_of_position(pl.col(EVENT_DATE)),
+            pl.col(EVENT_DATE).alias("last_date"),
+            pl.col("count").cum_sum().over(KEY_ID).alias("running_count"),
+            pl.col(AMOUNT).cum_sum().over(KEY_ID).alias("running_amount"),
+        )
+    )
+
+
+def as_of_position(day: pl.Expr) -> pl.Expr:
+    """Position of a day of a group key, ordered by key and then by day.
+
+    As-of joins on the position find the latest event of the same key without
+    a `by` join, which is far cheaper with many keys. A match from a previous
+    key is discarded by comparing key ids.
+    """
+    return (
+        pl.col(KEY_ID).cast(pl.Int64) * DAYS_PER_KEY
+        + day.cast(pl.Int32).cast(pl.Int64)
+        + DAY_OFFSET
+    ).alias(POSITION)
+
+
+def rfm_features(
+    events: pl.DataFrame | pl.LazyFrame,
+    cutoffs: list[date],
+    windows: tuple[int, ...] = DEFAULT_WINDOWS,
+) -> pl.DataFrame:
+    """Compute RFM features for many cutoffs and product groups at once.
+
+    Parameters
+    ----------
+    events : pl.DataFrame | pl.LazyFrame
+        Sale events with account id, product group, event date and amount
+        columns, e.g. from `stock_unit_sales` or `sales_history_sales`.
+    cutoffs : list[date]
+        The observation cutoffs.
+    windows : tuple[int, ...]
+        Trailing windows in months for windowed frequency and monetary value.
+
+    Returns
+    -------
+    pl.DataFrame
+        A long table with account id, product group, cutoff, feature and
+        value. For every account and group with a purchase before a cutoff
+        it holds `recency_days`, `tenure_days`, `frequency`, `monetary` and
+        `frequency_<w>m` / `monetary_<w>m` per window. Product group "all"
+        covers every group.
+
+    """
+    keys = [ACCOUNT, PRODUCT_GROUP]
+    events = (
+        events.lazy()
+        .select(*keys, pl.col(EVENT_DATE).cast(pl.Date), AMOUNT)
+        .drop_nulls([ACCOUNT, EVENT_DATE])
+        .with_columns(pl.col(PRODUCT_GROUP).fill_null("unknown"))
+    )
+    events = pl.concat(
+        [events, events.with_columns(pl.lit(ALL_GROUPS).alias(PRODUCT_GROUP))],
+    )
+    # Integer ids for the (account, group) keys keep the joins cheap
+    key_table = (
+        events.group_by(keys)
+        .agg(pl.col(EVENT_DATE).min().alias("first_date"))
+        .sort(keys)
+        .with_row_index(KEY_ID)
+        .collect()
+    )
+    running = (
+        _running_totals(events.join(key_table.lazy().select(*keys, KEY_ID), on=keys))
+        .collect()
+        .lazy()
+    )
+    grid = (
+        key_table.lazy()
+        .select(KEY_ID, "first_date")
+        .join(
+            pl.LazyFrame({CUTOFF: sorted(cutoffs)}, schema={CUTOFF: pl.Date}),
+            how="cross",
+        )
+        .filter(pl.col("first_date") < pl.col(CUTOFF))
+    )
+
+    def totals_before(boundary: pl.Expr, suffix: str) -> pl.LazyFrame:
+        # Backward as-of on the day before gives the totals strictly before
+        lookups = grid.select(
+            KEY_ID,
+            CUTOFF,
+            as_of_position(boundary - pl.duration(days=1)),
+        ).sort(POSITION)
+        matched = pl.col(f"{KEY_ID}_right") == pl.col(KEY_ID)
+        return lookups.join_asof(
+            running.rename({KEY_ID: f"{KEY_ID}_right"}),
+            on=POSITION,
+            strategy="backward",
+        ).select(
+            KEY_ID,
+            CUTOFF,
+            *[
+                pl.when(matched).then(pl.col(column)).alias(f"{column}{suffix}")
+                for column in ("running_count", "running_amount", "last_date")
+            ],
+        )
+
+    wide = totals_before(pl.col(CUTOFF), "").join(
+        grid.select(KEY_ID, CUTOFF, "first_date"),
+        on=[KEY_ID, CUTOFF],
+    )
+    features = [
+        (pl.col(CUTOFF) - pl.col("last_date")).dt.total_days().alias("recency_days"),
+        (pl.col(CUTOFF) - pl.col("first_date")).dt.total_days().alias("tenure_days"),
+        pl.col("running_count").alias("frequency"),
+        pl.col("running_amount").alias("monetary"),
+    ]
+    for window in windows:
+        suffix = f"_{window}m"
+        wide = wide.join(
+            totals_before(pl.col(CUTOFF).dt.offset_by(f"-{window}mo"), suffix),
+            on=[KEY_ID, CUTOFF],
+        )
+        features += [
+            (
+                pl.col("running_count") - pl.col(f"running_count{suffix}").fill_null(0)
+            ).alias(f"frequency{suffix}"),
+            (
+                pl.col("running_amount")
+                - pl.col(f"running_amount{suffix}").fill_null(0)
+            ).alias(f"monetary{suffix}"),
+        ]
+    feature_names = [feature.meta.output_name() for feature in features]
+    return (
+        wide.join(key_table.lazy().select(KEY_ID, *keys), on=KEY_ID)
+        .select(*keys, CUTOFF, *[feature.cast(pl.Float64) for feature in features])
+        .unpivot(index=[*keys, CUTOFF], variable_name=FEATURE, value_name=VALUE)
+        .with_columns(pl.col(FEATURE).cast(pl.Enum(feature_names)))
+        .collect()
+    )
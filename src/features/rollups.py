@@ -0,0 +1,337 @@
+"""Contains fiscal-year revenue rollups of stock-unit sales.
+
+The CLV notebook rolls stock-unit sales up to Koenig's November-October fiscal
+year in one cell, and joins the result against `sales_history` in another to
+find accounts whose yearly figures disagree. Here every dealer's sales are
+rolled up to account x fiscal year x product group once, with the dealer's own
+fiscal calendar, and kept in a Parquet table partitioned by dealer and fiscal
+year. Updates compare a content hash per fiscal year and only rewrite the years
+whose rows changed, late invoices and reversals included, so reconciliation and
+CLV features read the small rollup instead of rescanning the stock-unit
+history.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import polars as pl
+
+from src.features.rfm import NON_SALE_INVOICES
+
+DEALER = "dealer"
+ACCOUNT = "account_id"
+FISCAL_YEAR = "fiscal_year"
+PRODUCT_GROUP = "product_group"
+KEYS = [DEALER, ACCOUNT, FISCAL_YEAR, PRODUCT_GROUP]
+PARTITION_FILE_NAME = "rollup.parquet"
+HASHES_FILE_NAME = "fiscal_year_hashes.json"
+# Most dealers run their fiscal year from November to October
+DEFAULT_FISCAL_YEAR_FIRST_MONTH = 11
+FISCAL_YEAR_FIRST_MONTHS: dict[str, int] = {}
+DISCREPANCY_THRESHOLD = 0.85
+
+log = logging.getLogger(__name__)
+
+
+def fiscal_year_expr(
+    date: str | pl.Expr,
+    first_month: int = DEFAULT_FISCAL_YEAR_FIRST_MONTH,
+) -> pl.Expr:
+    """Build an expression giving the fiscal year of a date.
+
+    Parameters
+    ----------
+    date : str | pl.Expr
+        The date column name or an expression evaluating to the date.
+    first_month : int
+        The first month of the fiscal year, 1 for calendar years. Fiscal years
+        are named after the calendar year they end in.
+
+    Returns
+    -------
+    pl.Expr
+        The fiscal year as Int64.
+
+    """
+    date_expr = pl.col(date) if isinstance(date, str) else date
+    year = date_expr.dt.year().cast(pl.Int64)
+    if first_month == 1:
+        return year
+    return year + (date_expr.dt.month() >= first_month).cast(pl.Int64)
+
+
+def fiscal_year_first_month(dealer: str) -> int:
+    """Return the first month of a dealer's fiscal year."""
+    return FISCAL_YEAR_FIRST_MONTHS.get(dealer, DEFAULT_FISCAL_YEAR_FIRST_MONTH)
+
+
+def stock_unit_rollup(
+    dealer_stock_unit: pl.DataFrame | pl.LazyFrame,
+    dealer: str,
+    first_month: int | None = None,
+    since_fiscal_year: int | None = None,
+) -> pl.LazyFrame:
+    """Roll a dealer's stock-unit sales up to account, fiscal year and group.
+
+    Parameters
+    ----------
+    dealer_stock_unit : pl.DataFrame | pl.LazyFrame
+        The translated dealer_stock_unit object.
+    dealer : str
+        The dealer name.
+    first_month : int | None
+        The first month of the fiscal year, the dealer's own when None.
+    since_fiscal_year : int | None
+        Only roll up this fiscal year and later ones.
+
+    Returns
+    -------
+    pl.LazyFrame
+        Per dealer, account, fiscal year and product group the number of
+        units sold, their summed sale price and invoice amount and the last
+        sales date.
+
+    """
+    first_month = first_month or fiscal_year_first_month(dealer)
+    sales = (
+        dealer_stock_unit.lazy()
+        .filter(
+            ~pl.col("dsu_invoice_number")
+            .is_in(NON_SALE_INVOICES)
+            .fill_null(value=False),
+        )
+        .select(
+            pl.col("dsu_account_id").cast(pl.Utf8).alias(ACCOUNT),
+            fiscal_year_expr(pl.col("dsu_sales_date").cast(pl.Date), first_month).alias(
+                FISCAL_YEAR,
+            ),
+            pl.col("dsu_group").cast(pl.Utf8).alias(PRODUCT_GROUP),
+            pl.col("dsu_sales_date").cast(pl.Date),
+            pl.col("dsu_sale_price").cast(pl.Float64),
+            pl.col("dsu_invoice_amount").cast(pl.Float64),
+        )
+        .drop_nulls([ACCOUNT, FISCAL_YEAR])
+    )
+    if since_fiscal_year is not None:
+        sales = sales.filter(pl.col(FISCAL_YEAR) >= since_fiscal_year)
+    return (
+        sales.group_by(ACCOUNT, FISCAL_YEAR, PRODUCT_GROUP)
+        .agg(
+            pl.len().cast(pl.Int64).alias("units"),
+            pl.col("dsu_sale_price").sum().alias("sale_price"),
+            pl.col("dsu_invoice_amount").sum().alias("invoice_amount"),
+            pl.col("dsu_sales_date").max().alias("last_sales_date"),
+        )
+        .select(pl.lit(dealer).alias(DEALER), pl.all())
+    )
+
+
+class RevenueRollup:
+    """Incrementally maintained revenue rollups partitioned by dealer and year."""
+
+    def __init__(self, path: str) -> None:
+        """Initialize the RevenueRollup class.
+
+        Parameters
+        ----------
+        path : str
+            The directory holding `dealer=<dealer>/fiscal_year=<year>/`
+            partitions.
+
+        """
+        self.path = Path(path)
+
+    def fiscal_years(self, dealer: str) -> list[int]:
+        """List the fiscal years stored for a dealer, oldest first."""
+        dealer_path = self.path / f"{DEALER}={dealer}"
+        if not dealer_path.exists():
+            return []
+        return sorted(
+            int(partition.name.removeprefix(f"{FISCAL_YEAR}="))
+            for partition in dealer_path.glob(f"{FISCAL_YEAR}=*")
+            if (partition / PARTITION_FILE_NAME).exists()
+        )
+
+    def update(
+        self,
+        dealer: str,
+        dealer_stock_unit: pl.DataFrame | pl.LazyFrame,
+        first_month: int | None = None,
+        *,
+        rebuild: bool = False,
+    ) -> list[int]:
+        """Roll a dealer's sales up again and rewrite the years that changed.
+
+        Every fiscal year is rolled up, and its rows are hashed. Years whose
+        hash differs from the stored one are rewritten, so late invoices and
+        reversals in earlier years are picked up. Years without sales any
+        more are deleted, and unchanged years are left untouched.
+
+        Parameters
+        ----------
+        dealer : str
+            The dealer name.
+        dealer_stock_unit : pl.DataFrame | pl.LazyFrame
+            The dealer's translated dealer_stock_unit object.
+        first_month : int | None
+            The first month of the fiscal year, the dealer's own when None.
+        rebuild : bool
+            Whether to drop the dealer's rollup and rewrite every year, e.g.
+            after changing its fiscal calendar.
+
+        Returns
+        -------
+        list[int]
+            The fiscal years written.
+
+        """
+        dealer_path = self.path / f"{DEALER}={dealer}"
+        if rebuild:
+            shutil.rmtree(dealer_path, ignore_errors=True)
+        stored = set(self.fiscal_years(dealer))
+        stored_hashes = self._read_hashes(dealer)
+        rollup = stock_unit_rollup(dealer_stock_unit, dealer, first_month).collect()
+        hashes = {}
+        written = []
+        for (fiscal_year,), partition in rollup.group_by(FISCAL_YEAR):
+            rows = partition.sort(ACCOUNT, PRODUCT_GROUP)
+            year = str(fiscal_year)
+            hashes[year] = hashlib.blake2b(
+                rows.write_csv().encode(),
+                digest_size=16,
+            ).hexdigest()
+            if fiscal_year in stored and stored_hashes.get(year) == hashes[year]:
+                continue
+            self._write_partition(dealer, fiscal_year, rows)
+            written.append(fiscal_year)
+        removed = sorted(stored - {int(year) for year in hashes})
+        for fiscal_year in removed:
+            shutil.rmtree(dealer_path / f"{FISCAL_YEAR}={fiscal_year}")
+        if removed:
+            log.warning("Deleted %s fiscal years %s without sales", dealer, removed)
+        self._write_hashes(dealer, hashes)
+        written.sort()
+        log.info("Rewrote %s fiscal years %s", dealer, written)
+        return written
+
+    def read(
+        self,
+        dealers: list[str] | None = None,
+        fiscal_years: list[int] | None = None,
+    ) -> pl.LazyFrame:
+        """Scan the rollup, pruning partitions by dealer and fiscal year.
+
+        Parameters
+        ----------
+        dealers : list[str] | None
+            The dealers to read, all of them when None.
+        fiscal_years : list[int] | None
+            The fiscal years to read, all of them when None.
+
+        Returns
+        -------
+        pl.LazyFrame
+            The rollup rows with the dealer and fiscal year columns.
+
+        """
+        rollup = pl.scan_parquet(
+            self.path / f"{DEALER}=*" / f"{FISCAL_YEAR}=*" / PARTITION_FILE_NAME,
+            hive_partitioning=True,
+            hive_schema={DEALER: pl.Utf8, FISCAL_YEAR: pl.Int64},
+        )
+        if dealers is not None:
+            rollup = rollup.filter(pl.col(DEALER).is_in(dealers))
+        if fiscal_years is not None:
+            rollup = rollup.filter(pl.col(FISCAL_YEAR).is_in(fiscal_years))
+        return rollup
+
+    def _read_hashes(self, dealer: str) -> dict[str, str]:
+        hashes_path = self.path / f"{DEALER}={dealer}" / HASHES_FILE_NAME
+        if not hashes_path.exists():
+            return {}
+        with hashes_path.open() as f:
+            return json.load(f)
+
+    def _write_hashes(self, dealer: str, hashes: dict[str, str]) -> None:
+        dealer_path = self.path / f"{DEALER}={dealer}"
+        dealer_path.mkdir(parents=True, exist_ok=True)
+        temporary_path = dealer_path / f".{HASHES_FILE_NAME}.tmp"
+        with temporary_path.open("w") as f:
+            json.dump(hashes, f, indent=2, sort_keys=True)
+        temporary_path.replace(dealer_path / HASHES_FILE_NAME)
+
+    def _write_partition(
+        self,
+        dealer: str,
+        fiscal_year: int,
+        partition: pl.DataFrame,
+    ) -> None:
+        partition_path = (
+            self.path / f"{DEALER}={dealer}" / f"{FISCAL_YEAR}={fiscal_year}"
+        )
+        partition_path.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a half-written partition
+        temporary_path = partition_path / f".{PARTITION_FILE_NAME}.tmp"
+        partition.drop(DEALER, FISCAL_YEAR).write_parquet(temporary_path)
+        temporary_path.replace(partition_path / PARTITION_FILE_NAME)
+
+
+def reconcile_sales_history(
+    rollup: pl.DataFrame | pl.LazyFrame,
+    sales_history: pl.DataFrame | pl.LazyFrame,
+    threshold: float = DISCREPANCY_THRESHOLD,
+) -> pl.DataFrame:
+    """Find account fiscal years whose stock-unit and wholegood sales disagree.
+
+    Parameters
+    ----------
+    rollup : pl.DataFrame | pl.LazyFrame
+        The revenue rollup of one dealer.
+    sales_history : pl.DataFrame | pl.LazyFrame
+        The dealer's translated sales_history object, one row per account and
+        fiscal year.
+    threshold : float
+        The relative difference above which a year is flagged.
+
+    Returns
+    -------
+    pl.DataFrame
+        Per account and fiscal year with wholegood sales, the wholegood sales,
+        the rolled-up invoice amount and units and their relative difference,
+        for the years differing by more than the threshold.
+
+    """
+    yearly = (
+        rollup.lazy()
+        .group_by(ACCOUNT, FISCAL_YEAR)
+        .agg(pl.col("invoice_amount").sum(), pl.col("units").sum())
+    )
+    wholegood_sales = pl.col("sales_history_wholegood_sales")
+    return (
+        sales_history.lazy()
+        .select(
+            pl.col("sales_history_account_id").cast(pl.Utf8).alias(ACCOUNT),
+            pl.col("sales_history_year").cast(pl.Int64).alias(FISCAL_YEAR),
+            wholegood_sales.cast(pl.Float64),
+        )
+        .filter(wholegood_sales != 0)
+        .join(yearly, on=[ACCOUNT, FISCAL_YEAR], how="left")
+        .with_columns(
+            pl.col("invoice_amount").fill_null(0),
+            pl.col("units").fill_null(0),
+        )
+        .with_columns(
+            (
+                (wholegood_sales - pl.col("invoice_amount")).abs()
+                / wholegood_sales.abs()
+            ).alias("relative_difference"),
+        )
+        .filter(pl.col("relative_difference") > threshold)
+        .sort(ACCOUNT, FISCAL_YEAR)
+        .collect()
+    )
@@ -0,0 +1,281 @@
+"""Contains a bagged ensemble of balanced logistic regressions.
+
+The purchase notebook trains ten logistic regressions in a loop, each on all
+buyers plus an equal-sized sample of non-buyers, re-concatenating and
+re-shuffling pandas frames every time. Here the scaled feature matrix is
+written once to a NumPy memmap, every member is described only by the row
+indices of its balanced bootstrap sample, and members are fitted in a process
+pool whose workers map the same file instead of receiving copies.
+
+All members share one scaler, so the fitted ensemble is just a matrix of
+member coefficients: scoring is one matrix product and a mean, however many
+members there are.
+"""
+
+from __future__ import annotations
+
+import logging
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+from joblib import Parallel, delayed, effective_n_jobs
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+
+from src.models.propensity import FEATURE_COLUMNS, LABEL, classification_metrics
+
+DEFAULT_MEMBERS = 100
+PREDICT_BLOCK_SIZE = 65_536
+MEMMAP_FILE_NAME = "features.f64"
+
+log = logging.getLogger(__name__)
+
+
+class BaggedLogisticEnsemble:
+    """Average the purchase probabilities of many logistic regressions."""
+
+    def __init__(
+        self,
+        mean: np.ndarray,
+        scale: np.ndarray,
+        coefficients: np.ndarray,
+        intercepts: np.ndarray,
+    ) -> None:
+        """Initialize the BaggedLogisticEnsemble class.
+
+        Parameters
+        ----------
+        mean : np.ndarray
+            The per-feature mean subtracted before scoring.
+        scale : np.ndarray
+            The per-feature standard deviation divided by before scoring.
+        coefficients : np.ndarray
+            The member coefficients, one row per member.
+        intercepts : np.ndarray
+            The member intercepts.
+
+        """
+        self.mean = mean
+        self.scale = scale
+        self.coefficients = coefficients
+        self.intercepts = intercepts
+
+    def __len__(self) -> int:
+        """Return the number of members."""
+        return len(self.intercepts)
+
+    def member_probabilities(self, x: np.ndarray) -> np.ndarray:
+        """Return every member's purchase probability, one column per member."""
+        logits = ((x - self.mean) / self.scale) @ self.coefficients.T
+        logits += self.intercepts
+        # Sigmoid in place, the logits are the largest array in scoring
+        np.negative(logits, out=logits)
+        np.exp(logits, out=logits)
+        logits += 1
+        return np.reciprocal(logits, out=logits)
+
+    def predict_proba(self, x: np.ndarray) -> np.ndarray:
+        """Return the averaged probabilities like scikit-learn classifiers do.
+
+        Rows are scored in blocks, so memory stays bounded by
+        `PREDICT_BLOCK_SIZE` rows times the number of members.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The unscaled features, one row per account.
+
+        Returns
+        -------
+        np.ndarray
+            Two columns: the probability of not buying and of buying.
+
+        """
+        probabilities = np.empty(len(x))
+        for start in range(0, len(x), PREDICT_BLOCK_SIZE):
+            block = slice(start, start + PREDICT_BLOCK_SIZE)
+            probabilities[block] = self.member_probabilities(x[block]).mean(axis=1)
+        return np.column_stack([1 - probabilities, probabilities])
+
+
+def balanced_bootstrap_indices(
+    labels: np.ndarray,
+    n_members: int,
+    random_state: int = 69,
+) -> np.ndarray:
+    """Draw a balanced bootstrap sample of row indices per member.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        The label of every row, 1 for buyers.
+    n_members : int
+        The number of samples to draw.
+    random_state : int
+        Seed for the draws.
+
+    Returns
+    -------
+    np.ndarray
+        One row of indices per member, half buyers and half non-buyers, each
+        drawn with replacement, as many of each as the smaller class has.
+
+    """
+    positives = np.flatnonzero(labels == 1)
+    negatives = np.flatnonzero(labels != 1)
+    if not len(positives) or not len(negatives):
+        error_message = "Balanced bootstrap samples need both buyers and non-buyers."
+        raise ValueError(error_message)
+    size = min(len(positives), len(negatives))
+    rng = np.random.default_rng(random_state)
+    return np.hstack(
+        [
+            rng.choice(positives, (n_members, size)),
+            rng.choice(negatives, (n_members, size)),
+        ],
+    )
+
+
+def _fit_members(
+    path: str,
+    shape: tuple[int, int],
+    labels: np.ndarray,
+    indices: np.ndarray,
+    random_state: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    x = np.memmap(path, dtype=np.float64, mode="r", shape=shape)
+    coefficients, intercepts = [], []
+    for member_indices in indices:
+        model = LogisticRegression(random_state=random_state)
+        model.fit(x[member_indices], labels[member_indices])
+        coefficients.append(model.coef_[0])
+        intercepts.append(model.intercept_[0])
+    return np.array(coefficients), np.array(intercepts)
+
+
+def fit_bagged_ensemble(
+    x: np.ndarray,
+    labels: np.ndarray,
+    *,
+    n_members: int = DEFAULT_MEMBERS,
+    n_jobs: int = -1,
+    random_state: int = 69,
+) -> BaggedLogisticEnsemble:
+    """Fit balanced logistic regressions in a process pool.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        The unscaled features, one row per account.
+    labels : np.ndarray
+        The label of every row, 1 for buyers.
+    n_members : int
+        The number of members.
+    n_jobs : int
+        The number of worker processes, -1 for one per core.
+    random_state : int
+        Seed for the samples and the members.
+
+    Returns
+    -------
+    BaggedLogisticEnsemble
+        The fitted ensemble.
+
+    """
+    mean = x.mean(axis=0)
+    scale = x.std(axis=0)
+    scale[scale == 0] = 1
+    indices = balanced_bootstrap_indices(labels, n_members, random_state)
+    n_tasks = min(n_members, effective_n_jobs(n_jobs) * 4)
+    with tempfile.TemporaryDirectory() as directory:
+        path = str(Path(directory) / MEMMAP_FILE_NAME)
+        scaled = np.memmap(path, dtype=np.float64, mode="w+", shape=x.shape)
+        np.subtract(x, mean, out=scaled)
+        scaled /= scale
+        scaled.flush()
+        del scaled
+        # Members go out in chunks, so each task maps the file only once
+        results = Parallel(n_jobs=n_jobs)(
+            delayed(_fit_members)(path, x.shape, labels, chunk, random_state)
+            for chunk in np.array_split(indices, n_tasks)
+        )
+    coefficients, intercepts = zip(*results, strict=True)
+    return BaggedLogisticEnsemble(
+        mean,
+        scale,
+        np.vstack(coefficients),
+        np.concatenate(intercepts),
+    )
+
+
+def train_bagged_model(  # noqa: PLR0913
+    table: pl.DataFrame,
+    feature_columns: tuple[str, ...] = FEATURE_COLUMNS,
+    label: str = LABEL,
+    *,
+    n_members: int = DEFAULT_MEMBERS,
+    n_jobs: int = -1,
+    test_size: float = 0.2,
+    random_state: int = 69,
+) -> tuple[BaggedLogisticEnsemble, dict]:
+    """Fit a bagged ensemble on a train split and score it on the rest.
+
+    Parameters
+    ----------
+    table : pl.DataFrame
+        The training table with the feature columns and a boolean label.
+        Rows with a null label are dropped.
+    feature_columns : tuple[str, ...]
+        The model's feature columns.
+    label : str
+        The label column.
+    n_members : int
+        The number of members.
+    n_jobs : int
+        The number of worker processes, -1 for one per core.
+    test_size : float
+        The share of rows held out for the metrics.
+    random_state : int
+        Seed for the split, the samples and the members.
+
+    Returns
+    -------
+    tuple[BaggedLogisticEnsemble, dict]
+        The ensemble and its training time and held-out metrics.
+
+    """
+    start = time.perf_counter()
+    table = table.drop_nulls(label)
+    features = table.select(feature_columns).fill_null(0).to_numpy().astype(np.float64)
+    labels = table[label].cast(pl.Int8).to_numpy()
+    x_train, x_test, y_train, y_test = train_test_split(
+        features,
+        labels,
+        test_size=test_size,
+        random_state=random_state,
+        stratify=labels,
+    )
+    ensemble = fit_bagged_ensemble(
+        x_train,
+        y_train,
+        n_members=n_members,
+        n_jobs=n_jobs,
+        random_state=random_state,
+    )
+    metrics = {
+        "train_rows": len(y_train),
+        "members": len(ensemble),
+        "seconds": time.perf_counter() - start,
+        **classification_metrics(y_test, ensemble.predict_proba(x_test)[:, 1]),
+    }
+    log.info(
+        "Fitted %d members on %d rows in %.1fs, ROC AUC %.3f",
+        metrics["members"],
+        metrics["train_rows"],
+        metrics["seconds"],
+        metrics["roc_auc"],
+    )
+    return ensemble, metrics
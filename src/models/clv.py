@@ -0,0 +1,492 @@
+"""Contains the customer lifetime value (CLV) feature table and training.
+
+The CLV notebook builds one "previous three years / next three years" frame
+per anchor year by hand and cross-validates an XGBoost pipeline that
+re-encodes the categorical columns in every fold. Here all anchor years come
+out of one query over `sales_history` and the precomputed fiscal-year rollup
+of `dealer_stock_unit`, the design matrix is encoded once and cached on disk,
+and the folds of every hyperparameter trial run in parallel worker processes
+sharing that matrix.
+
+The model is scikit-learn's `HistGradientBoostingRegressor`, which handles the
+categorical columns natively and stops early on a validation split.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+from dataclasses import dataclass
+from itertools import product
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import joblib
+import numpy as np
+import polars as pl
+from joblib import Parallel, delayed
+from sklearn.compose import ColumnTransformer
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error
+from sklearn.model_selection import GroupKFold
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import OrdinalEncoder
+
+from src.features.rollups import ACCOUNT, FISCAL_YEAR, PRODUCT_GROUP
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+ANCHOR_YEAR = "anchor_year"
+TARGET = "future_total_sales"
+SALES_COLUMNS = {
+    "sales_history_parts_sales": "parts_sales",
+    "sales_history_service_sales": "service_sales",
+    "sales_history_rental_sales": "rental_sales",
+    "sales_history_wholegood_sales": "wholegood_sales",
+    "sales_history_total_sales": "total_sales",
+}
+CONTINUOUS_COLUMNS = (
+    "parts_sales",
+    "service_sales",
+    "rental_sales",
+    "wholegood_sales",
+)
+CATEGORICAL_COLUMNS = (
+    "customer_segment",
+    "type_of_equipment",
+    "customer_loyalty",
+    "most_common_group",
+    "largest_sales_group",
+)
+ACCOUNT_COLUMNS = ("customer_segment", "type_of_equipment", "customer_loyalty")
+EXCLUDED_GROUPS = ["AMS COMPONENTS"]
+DEFAULT_PARAM_GRID = {
+    "learning_rate": [0.05, 0.1],
+    "max_leaf_nodes": [15, 31],
+    "l2_regularization": [0.0, 1.0],
+}
+MAX_ITER = 1000
+N_ITER_NO_CHANGE = 20
+VALIDATION_FRACTION = 0.1
+
+log = logging.getLogger(__name__)
+
+
+def stock_unit_groups(
+    rollup: pl.DataFrame | pl.LazyFrame,
+    anchor_years: list[int],
+) -> pl.LazyFrame:
+    """Find each account's dominant product groups up to each anchor year.
+
+    Parameters
+    ----------
+    rollup : pl.DataFrame | pl.LazyFrame
+        The dealer's revenue rollup, e.g. from `RevenueRollup.read`.
+    anchor_years : list[int]
+        The fiscal years the groups are computed at.
+
+    Returns
+    -------
+    pl.LazyFrame
+        Per account and anchor year, the group bought most often
+        (`most_common_group`) and the one with the highest sales
+        (`largest_sales_group`) over all fiscal years up to the anchor.
+
+    """
+    yearly = (
+        rollup.lazy()
+        .filter(~pl.col(PRODUCT_GROUP).is_in(EXCLUDED_GROUPS).fill_null(value=False))
+        .select(
+            pl.col(ACCOUNT),
+            pl.col(FISCAL_YEAR),
+            pl.col(PRODUCT_GROUP).alias("dsu_group"),
+            pl.col("units").alias("count"),
+            pl.col("sale_price").alias("sales"),
+        )
+        .drop_nulls([ACCOUNT, FISCAL_YEAR, "dsu_group"])
+    )
+    totals = (
+        yearly.join(
+            pl.LazyFrame({ANCHOR_YEAR: anchor_years}, schema={ANCHOR_YEAR: pl.Int64}),
+            how="cross",
+        )
+        .filter(pl.col(FISCAL_YEAR) <= pl.col(ANCHOR_YEAR))
+        .group_by(ACCOUNT, ANCHOR_YEAR, "dsu_group")
+        .agg(pl.col("count").sum(), pl.col("sales").sum())
+    )
+    # Ties break on the other measure, then alphabetically, as in the notebook
+    return totals.group_by(ACCOUNT, ANCHOR_YEAR).agg(
+        pl.col("dsu_group")
+        .sort_by(["count", "sales", "dsu_group"], descending=[True, True, False])
+        .first()
+        .alias("most_common_group"),
+        pl.col("dsu_group")
+        .sort_by(["sales", "count", "dsu_group"], descending=[True, True, False])
+        .first()
+        .alias("largest_sales_group"),
+    )
+
+
+def clv_feature_table(  # noqa: PLR0913
+    sales_history: pl.DataFrame | pl.LazyFrame,
+    rollup: pl.DataFrame | pl.LazyFrame,
+    account: pl.DataFrame | pl.LazyFrame,
+    anchor_years: list[int],
+    *,
+    lookback_years: int = 3,
+    horizon_years: int = 3,
+) -> pl.DataFrame:
+    """Build the CLV training table for several anchor years at once.
+
+    Parameters
+    ----------
+    sales_history : pl.DataFrame | pl.LazyFrame
+        The translated sales_history object, one row per account and fiscal
+        year.
+    rollup : pl.DataFrame | pl.LazyFrame
+        The dealer's revenue rollup of stock-unit sales, with the same fiscal
+        calendar as `sales_history`.
+    account : pl.DataFrame | pl.LazyFrame
+        The translated account object. Account categories the dealer does
+        not map are Unknown.
+    anchor_years : list[int]
+        The last fiscal year of each lookback window.
+    lookback_years : int
+        The number of fiscal years summed into the features, anchor included.
+    horizon_years : int
+        The number of fiscal years after the anchor summed into the target.
+
+    Returns
+    -------
+    pl.DataFrame
+        One row per account and anchor year with sales in both windows, the
+        summed sales per type, the account and product group categories and
+        the `future_total_sales` target. Rows without future sales are
+        dropped, as in the notebook.
+
+    """
+    anchors = pl.LazyFrame({ANCHOR_YEAR: anchor_years}, schema={ANCHOR_YEAR: pl.Int64})
+    yearly = (
+        sales_history.lazy()
+        .select(
+            pl.col("sales_history_account_id").cast(pl.Utf8).alias(ACCOUNT),
+            pl.col("sales_history_year").cast(pl.Int64).alias(FISCAL_YEAR),
+            *[
+                pl.col(column).cast(pl.Float64).fill_null(0).alias(name)
+                for column, name in SALES_COLUMNS.items()
+            ],
+        )
+        .join(anchors, how="cross")
+        .with_columns((pl.col(FISCAL_YEAR) - pl.col(ANCHOR_YEAR)).alias("offset"))
+    )
+    in_lookback = pl.col("offset").is_between(1 - lookback_years, 0)
+    in_horizon = pl.col("offset").is_between(1, horizon_years)
+    windows = (
+        yearly.filter(in_lookback | in_horizon)
+        .group_by(ACCOUNT, ANCHOR_YEAR)
+        .agg(
+            *[
+                pl.col(name).filter(in_lookback).sum()
+                for name in SALES_COLUMNS.values()
+            ],
+            pl.col("total_sales").filter(in_horizon).sum().alias(TARGET),
+            in_lookback.any().alias("has_history"),
+            in_horizon.any().alias("has_future"),
+        )
+        .filter(pl.col("has_history"), pl.col("has_future"), pl.col(TARGET) > 0)
+        .drop("has_history", "has_future")
+    )
+    account = account.lazy()
+    mapped = account.collect_schema().names()
+    unmapped = [column for column in ACCOUNT_COLUMNS if column not in mapped]
+    if unmapped:
+        log.warning("The account object does not map %s, using Unknown", unmapped)
+    accounts = account.select(
+        pl.col(ACCOUNT).cast(pl.Utf8),
+        *[
+            pl.col(column).cast(pl.Utf8)
+            if column in mapped
+            else pl.lit(None, dtype=pl.Utf8).alias(column)
+            for column in ACCOUNT_COLUMNS
+        ],
+    )
+    return (
+        windows.join(accounts, on=ACCOUNT)
+        .join(
+            stock_unit_groups(rollup, anchor_years),
+            on=[ACCOUNT, ANCHOR_YEAR],
+            how="left",
+        )
+        .with_columns(pl.col(CATEGORICAL_COLUMNS).fill_null("Unknown"))
+        .sort(ACCOUNT, ANCHOR_YEAR)
+        .collect()
+    )
+
+
+@dataclass
+class DesignMatrix:
+    """The encoded CLV features shared by every fold and trial."""
+
+    x: np.ndarray
+    y: np.ndarray
+    groups: np.ndarray
+    encoder: ColumnTransformer
+    categorical: np.ndarray
+
+
+def make_encoder() -> ColumnTransformer:
+    """Build the encoder putting categorical codes first, then sales."""
+    return ColumnTransformer(
+        [
+            (
+                "categorical",
+                OrdinalEncoder(
+                    handle_unknown="use_encoded_value",
+                    unknown_value=np.nan,
+                    encoded_missing_value=np.nan,
+                ),
+                list(CATEGORICAL_COLUMNS),
+            ),
+            ("continuous", "passthrough", list(CONTINUOUS_COLUMNS)),
+        ],
+    )
+
+
+def encode_design_matrix(
+    table: pl.DataFrame,
+    cache_dir: str | None = None,
+) -> DesignMatrix:
+    """Encode the feature table once, reusing a cached encoding if present.
+
+    The encoder does not look at the target, so fitting it on the whole
+    table leaks nothing into the folds.
+
+    Parameters
+    ----------
+    table : pl.DataFrame
+        The CLV feature table from `clv_feature_table`.
+    cache_dir : str | None
+        Directory for the encoded arrays and the fitted encoder, keyed by a
+        hash of the table's contents. The arrays are memory-mapped when read
+        back. No caching when None.
+
+    Returns
+    -------
+    DesignMatrix
+        The float32 design matrix, the target, the account of every row for
+        grouping folds, the fitted encoder and the categorical column mask.
+
+    """
+    columns = [*CATEGORICAL_COLUMNS, *CONTINUOUS_COLUMNS]
+    features = table.select(columns)
+    categorical = np.array([column in CATEGORICAL_COLUMNS for column in columns])
+    groups = table[ACCOUNT].rank("dense").to_numpy()
+    y = table[TARGET].to_numpy()
+    # The CSV text of the rows is stable across Polars versions, unlike
+    # `hash_rows`, so the cache survives upgrades
+    key = hashlib.blake2b(
+        table.select([ACCOUNT, ANCHOR_YEAR, TARGET, *columns]).write_csv().encode(),
+        digest_size=16,
+    ).hexdigest()
+    cache_path = Path(cache_dir) / f"clv_design_{key}.npy" if cache_dir else None
+    encoder_path = cache_path and cache_path.with_name(f"clv_encoder_{key}.joblib")
+    if cache_path is not None and cache_path.exists() and encoder_path.exists():
+        log.info("Reusing the cached design matrix %s", cache_path)
+        x = np.load(cache_path, mmap_mode="r")
+        encoder = joblib.load(encoder_path)
+    else:
+        encoder = make_encoder()
+        x = encoder.fit_transform(features).astype(np.float32)
+        if cache_path is not None:
+            cache_path.parent.mkdir(parents=True, exist_ok=True)
+            joblib.dump(encoder, encoder_path)
+            np.save(cache_path, x)
+    return DesignMatrix(x, y, groups, encoder, categorical)
+
+
+def predict_clv(model: Pipeline, table: pl.DataFrame) -> np.ndarray:
+    """Predict the future total sales of every row of a CLV feature table."""
+    return model.predict(table.select(*CATEGORICAL_COLUMNS, *CONTINUOUS_COLUMNS))
+
+
+def parameter_trials(param_grid: dict[str, list]) -> list[dict]:
+    """List every combination of a hyperparameter grid."""
+    names = list(param_grid)
+    return [
+        dict(zip(names, values, strict=True))
+        for values in product(*param_grid.values())
+    ]
+
+
+def make_model(
+    params: dict,
+    categorical: np.ndarray,
+    random_state: int,
+) -> HistGradientBoostingRegressor:
+    """Build the gradient-boosted regressor with early stopping."""
+    return HistGradientBoostingRegressor(
+        max_iter=MAX_ITER,
+        early_stopping=True,
+        validation_fraction=VALIDATION_FRACTION,
+        n_iter_no_change=N_ITER_NO_CHANGE,
+        categorical_features=categorical,
+        random_state=random_state,
+        **params,
+    )
+
+
+def _fit_fold(
+    matrix: DesignMatrix,
+    train: np.ndarray,
+    test: np.ndarray,
+    params: dict,
+    random_state: int,
+) -> dict:
+    model = make_model(params, matrix.categorical, random_state)
+    model.fit(matrix.x[train], matrix.y[train])
+    predictions = model.predict(matrix.x[test])
+    return {
+        "mse": mean_squared_error(matrix.y[test], predictions),
+        "mae": mean_absolute_error(matrix.y[test], predictions),
+        "iterations": model.n_iter_,
+    }
+
+
+def _folds(
+    matrix: DesignMatrix,
+    n_splits: int,
+) -> Iterator[tuple[np.ndarray, np.ndarray]]:
+    # Every anchor year of an account lands in the same fold
+    return GroupKFold(n_splits=n_splits).split(matrix.x, matrix.y, matrix.groups)
+
+
+def cross_validate(
+    matrix: DesignMatrix,
+    *,
+    param_grid: dict[str, list] | None = None,
+    n_splits: int = 5,
+    n_jobs: int = -1,
+    random_state: int = 69,
+) -> pl.DataFrame:
+    """Cross-validate every hyperparameter trial with folds run in parallel.
+
+    Parameters
+    ----------
+    matrix : DesignMatrix
+        The encoded features from `encode_design_matrix`.
+    param_grid : dict[str, list] | None
+        Values to try per `HistGradientBoostingRegressor` parameter, the
+        `DEFAULT_PARAM_GRID` when None.
+    n_splits : int
+        The number of folds, split by account.
+    n_jobs : int
+        The number of worker processes, -1 for one per core. Workers share
+        the design matrix through a memory map instead of copies.
+    random_state : int
+        Seed for the models.
+
+    Returns
+    -------
+    pl.DataFrame
+        One row per trial with its parameters, the mean and standard
+        deviation of the fold MSE, the mean MAE and the mean number of
+        boosting iterations before early stopping, best trial first.
+
+    """
+    trials = parameter_trials(param_grid or DEFAULT_PARAM_GRID)
+    folds = list(_folds(matrix, n_splits))
+    tasks = [
+        (trial, fold) for trial in range(len(trials)) for fold in range(len(folds))
+    ]
+    results = Parallel(n_jobs=n_jobs, max_nbytes="1M")(
+        delayed(_fit_fold)(matrix, *folds[fold], trials[trial], random_state)
+        for trial, fold in tasks
+    )
+    scores = pl.DataFrame(
+        [
+            {"trial": trial, "fold": fold, **result}
+            for (trial, fold), result in zip(tasks, results, strict=True)
+        ],
+    )
+    return (
+        scores.group_by("trial")
+        .agg(
+            pl.col("mse").mean().alias("mean_mse"),
+            pl.col("mse").std().alias("std_mse"),
+            pl.col("mae").mean().alias("mean_mae"),
+            pl.col("iterations").mean().alias("mean_iterations"),
+        )
+        .with_columns(
+            pl.col("trial")
+            .map_elements(lambda trial: str(trials[trial]), return_dtype=pl.Utf8)
+            .alias("params"),
+        )
+        .sort("mean_mse")
+    )
+
+
+def train_clv_model(  # noqa: PLR0913
+    table: pl.DataFrame,
+    *,
+    param_grid: dict[str, list] | None = None,
+    n_splits: int = 5,
+    n_jobs: int = -1,
+    cache_dir: str | None = None,
+    random_state: int = 69,
+) -> tuple[Pipeline, dict]:
+    """Pick hyperparameters by cross-validation and fit the final model.
+
+    Parameters
+    ----------
+    table : pl.DataFrame
+        The CLV feature table from `clv_feature_table`.
+    param_grid : dict[str, list] | None
+        Values to try per regressor parameter, `DEFAULT_PARAM_GRID` when None.
+    n_splits : int
+        The number of folds.
+    n_jobs : int
+        The number of worker processes, -1 for one per core.
+    cache_dir : str | None
+        Directory caching the encoded design matrix between runs.
+    random_state : int
+        Seed for the models.
+
+    Returns
+    -------
+    tuple[Pipeline, dict]
+        The encoder and regressor fitted on all rows, predicting from the
+        feature table's columns, and the metrics: rows, folds, the chosen
+        parameters, every trial's scores and the seconds spent.
+
+    """
+    start = time.perf_counter()
+    trials = parameter_trials(param_grid or DEFAULT_PARAM_GRID)
+    matrix = encode_design_matrix(table, cache_dir)
+    scores = cross_validate(
+        matrix,
+        param_grid=param_grid,
+        n_splits=n_splits,
+        n_jobs=n_jobs,
+        random_state=random_state,
+    )
+    best = trials[scores["trial"][0]]
+    log.info(
+        "Best of %d trials: %s, MSE %.4g",
+        len(trials),
+        best,
+        scores["mean_mse"][0],
+    )
+    regressor = make_model(best, matrix.categorical, random_state)
+    regressor.fit(matrix.x, matrix.y)
+    model = Pipeline([("encoder", matrix.encoder), ("regressor", regressor)])
+    metrics = {
+        "rows": len(matrix.y),
+        "folds": n_splits,
+        "best_params": best,
+        "iterations": regressor.n_iter_,
+        "trials": scores.drop("trial").to_dicts(),
+        "seconds": time.perf_counter() - start,
+    }
+    return model, metrics
@@ -0,0 +1,334 @@
+"""Contains the in-process and HTTP serving path for ranked lead lists.
+
+Scoring ranks every lead within its (dealer, store, rep, product group) list
+and publishes the top-k of each list as one uncompressed Arrow IPC file,
+sorted by list and rank, next to a small file of list offsets. The server
+memory-maps the leads file, so loading a new snapshot is a few page-table
+entries rather than a read, and a lookup is one dict access plus a zero-copy
+slice of the mapped columns.
+
+Every publish goes to a new version directory and then atomically swaps the
+`CURRENT` pointer file, so a running server picks up the nightly scores on its
+next check without ever seeing a half-written snapshot. Lookups already
+holding the previous snapshot keep using it until they finish.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import shutil
+import threading
+import time
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import TYPE_CHECKING
+from urllib.parse import parse_qs, urlparse
+
+import polars as pl
+import pyarrow as pa
+
+from src.models.propensity import DEFAULT_TOP_K, rank_leads
+
+if TYPE_CHECKING:
+    from collections.abc import Sequence
+
+STORE = "primary_store_location"
+REP = "account_owner_id"
+SERVING_GROUPS = ("dealer", STORE, REP, "product_group")
+LEADS_FILE_NAME = "leads.arrow"
+LISTS_FILE_NAME = "lists.arrow"
+CURRENT_FILE_NAME = "CURRENT"
+KEPT_VERSIONS = 2
+DEFAULT_CHECK_INTERVAL = 1.0
+
+log = logging.getLogger(__name__)
+
+
+def lead_owners(account: pl.DataFrame | pl.LazyFrame) -> pl.DataFrame:
+    """Select the rep and store each account's leads are listed under.
+
+    Parameters
+    ----------
+    account : pl.DataFrame | pl.LazyFrame
+        The translated account object.
+
+    Returns
+    -------
+    pl.DataFrame
+        One row per account id with its rep and store. The store is null for
+        dealers that do not map it, so their lists are keyed without one.
+
+    """
+    account = account.lazy()
+    if STORE in account.collect_schema().names():
+        store = pl.col(STORE).cast(pl.Utf8)
+    else:
+        log.info("The account object does not map %s, listing leads without it", STORE)
+        store = pl.lit(None, dtype=pl.Utf8).alias(STORE)
+    return (
+        account.select(pl.col("account_id").cast(pl.Utf8), REP, store)
+        .unique("account_id")
+        .collect()
+    )
+
+
+def publish_lead_index(
+    scores: pl.DataFrame,
+    path: str,
+    top_k: int | None = DEFAULT_TOP_K,
+    groups: tuple[str, ...] = SERVING_GROUPS,
+) -> Path:
+    """Rank scored leads and publish them as a new serving snapshot.
+
+    Parameters
+    ----------
+    scores : pl.DataFrame
+        Scored rows with the group columns, e.g. account id, product group,
+        score, dealer, store and rep.
+    path : str
+        The serving directory holding the versions and `CURRENT`.
+    top_k : int | None
+        The number of leads kept per list, all of them when None.
+    groups : tuple[str, ...]
+        The columns defining a lead list.
+
+    Returns
+    -------
+    Path
+        The directory of the published version.
+
+    """
+    leads = rank_leads(scores, groups, top_k)
+    lists = (
+        leads.with_row_index("offset")
+        .group_by(groups, maintain_order=True)
+        .agg(pl.col("offset").first(), pl.len().alias("length"))
+    )
+    root = Path(path)
+    version = root / f"v{time.time_ns()}"
+    version.mkdir(parents=True)
+    for df, file_name in ((leads, LEADS_FILE_NAME), (lists, LISTS_FILE_NAME)):
+        # Uncompressed, so the server can map the columns without decoding
+        df.write_ipc(version / file_name, compression="uncompressed")
+    temporary_path = root / f".{CURRENT_FILE_NAME}.tmp"
+    temporary_path.write_text(version.name)
+    temporary_path.replace(root / CURRENT_FILE_NAME)
+    log.info(
+        "Published %d leads in %d lists to %s",
+        leads.height,
+        lists.height,
+        version,
+    )
+
+    # Servers may still be mapping the previous version, so it is kept
+    for stale in sorted(root.glob("v*"))[:-KEPT_VERSIONS]:
+        shutil.rmtree(stale, ignore_errors=True)
+    return version
+
+
+class LeadIndex:
+    """An immutable, memory-mapped snapshot of published lead lists."""
+
+    def __init__(
+        self,
+        leads: pa.Table,
+        lists: dict[tuple, tuple[int, int]],
+        groups: tuple[str, ...],
+        version: str = "",
+    ) -> None:
+        """Initialize the LeadIndex class.
+
+        Parameters
+        ----------
+        leads : pa.Table
+            The leads sorted by list and rank.
+        lists : dict[tuple, tuple[int, int]]
+            The offset and length of every list in `leads`, by group values.
+        groups : tuple[str, ...]
+            The columns defining a lead list.
+        version : str
+            The published version the snapshot was loaded from.
+
+        """
+        self.leads = leads
+        self.lists = lists
+        self.groups = groups
+        self.version = version
+
+    def __len__(self) -> int:
+        """Return the number of lists."""
+        return len(self.lists)
+
+    @classmethod
+    def load(cls, path: str) -> LeadIndex:
+        """Map the snapshot published in a version directory."""
+        version = Path(path)
+        leads = pa.ipc.open_file(
+            pa.memory_map(str(version / LEADS_FILE_NAME)),
+        ).read_all()
+        lists = pl.read_ipc(version / LISTS_FILE_NAME, memory_map=False)
+        groups = tuple(lists.columns[:-2])
+        offsets = dict(
+            zip(
+                lists.select(groups).iter_rows(),
+                zip(lists["offset"].to_list(), lists["length"].to_list(), strict=True),
+                strict=True,
+            ),
+        )
+        return cls(leads, offsets, groups, version.name)
+
+    def lookup(self, key: Sequence, k: int | None = None) -> pa.Table:
+        """Return the best leads of one list as an Arrow slice.
+
+        Parameters
+        ----------
+        key : Sequence
+            The group values, e.g. ("koenig", "Store 1", "U1", "COMBINES").
+        k : int | None
+            The number of leads, all published ones when None.
+
+        Returns
+        -------
+        pa.Table
+            The leads in rank order, empty for unknown lists.
+
+        """
+        offset, length = self.lists.get(tuple(key), (0, 0))
+        if k is not None:
+            length = min(length, k)
+        return self.leads.slice(offset, length)
+
+    def top_k(self, key: Sequence, k: int | None = None) -> pl.DataFrame:
+        """Return the best leads of one list, see `lookup`."""
+        return pl.from_arrow(self.lookup(key, k))
+
+
+class LeadServer:
+    """Serve lookups from the current snapshot and hot-reload new ones."""
+
+    def __init__(
+        self,
+        path: str,
+        check_interval: float = DEFAULT_CHECK_INTERVAL,
+    ) -> None:
+        """Initialize the LeadServer class.
+
+        Parameters
+        ----------
+        path : str
+            The serving directory `publish_lead_index` writes to.
+        check_interval : float
+            The minimum number of seconds between checks for a new version.
+
+        """
+        self.path = Path(path)
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._checked = float("-inf")
+        self.index = self._load_current()
+
+    @property
+    def version(self) -> str:
+        """Return the version being served."""
+        return self.index.version
+
+    def reload(self) -> bool:
+        """Swap in the published version if it changed.
+
+        Returns
+        -------
+        bool
+            Whether a new version was loaded.
+
+        """
+        with self._lock:
+            self._checked = time.monotonic()
+            current = (self.path / CURRENT_FILE_NAME).read_text().strip()
+            if current == self.index.version:
+                return False
+            # The swap is a single reference assignment, so concurrent
+            # lookups see either the old or the new snapshot
+            self.index = LeadIndex.load(str(self.path / current))
+        log.info("Reloaded lead lists version %s", current)
+        return True
+
+    def snapshot(self) -> LeadIndex:
+        """Return the latest snapshot, checking for a new version if due."""
+        if time.monotonic() - self._checked >= self.check_interval:
+            self.reload()
+        return self.index
+
+    def lookup(self, key: Sequence, k: int | None = None) -> pa.Table:
+        """Return the best leads of one list from the latest snapshot."""
+        return self.snapshot().lookup(key, k)
+
+    def top_k(self, key: Sequence, k: int | None = None) -> pl.DataFrame:
+        """Return the best leads of one list as a DataFrame, see `lookup`."""
+        return pl.from_arrow(self.lookup(key, k))
+
+    def _load_current(self) -> LeadIndex:
+        current_path = self.path / CURRENT_FILE_NAME
+        if not current_path.exists():
+            error_message = f"No lead lists were published to {self.path}."
+            raise FileNotFoundError(error_message)
+        self._checked = time.monotonic()
+        return LeadIndex.load(str(self.path / current_path.read_text().strip()))
+
+
+def make_http_server(
+    server: LeadServer,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+) -> ThreadingHTTPServer:
+    """Build an HTTP server answering `GET /leads` from a lead server.
+
+    The query string names the group values and the number of leads, e.g.
+    `/leads?dealer=koenig&primary_store_location=Store+1&account_owner_id=U1&product_group=COMBINES&k=10`.
+    Missing group values match leads without one.
+
+    Parameters
+    ----------
+    server : LeadServer
+        The lead server to query.
+    host : str
+        The interface to listen on.
+    port : int
+        The port to listen on, 0 picks a free one.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The server, started with `serve_forever`.
+
+    """
+
+    class LeadHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            url = urlparse(self.path)
+            if url.path != "/leads":
+                self.send_error(HTTPStatus.NOT_FOUND)
+                return
+            query = {name: values[0] for name, values in parse_qs(url.query).items()}
+            try:
+                k = int(query["k"]) if "k" in query else None
+            except ValueError:
+                self.send_error(HTTPStatus.BAD_REQUEST, "k must be an integer")
+                return
+            index = server.snapshot()
+            leads = index.lookup([query.get(group) for group in index.groups], k)
+            body = json.dumps(
+                {"version": index.version, "leads": leads.to_pylist()},
+                default=str,
+            ).encode()
+            self.send_response(HTTPStatus.OK)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+            log.debug(format, *args)
+
+    return ThreadingHTTPServer((host, port), LeadHandler)
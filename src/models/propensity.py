@@ -0,0 +1,316 @@
+"""Contains the "will this account buy in the next 12 months" propensity model.
+
+The notebook fits a `StandardScaler` on the train split and a second one on
+the test split, and only scores the frame it trained on. Here the scaler and
+the logistic regression are fitted together as one scikit-learn pipeline on
+the train split, persisted with joblib next to the feature columns they
+expect, and applied unchanged to anything scored later.
+
+Scoring reads the feature table with Arrow in record batches, so millions of
+(account, product group) rows are scored with one vectorized
+`predict_proba` per batch while memory stays bounded by the batch size.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import resource
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import joblib
+import polars as pl
+import pyarrow.parquet as pq
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import accuracy_score, f1_score, roc_auc_score
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+    import numpy as np
+    from sklearn.pipeline import Pipeline
+
+SCORE = "score"
+RANK = "rank"
+LABEL = "label_purchase"
+KEY_COLUMNS = ("account_id", "product_group")
+# Frequency, recency and monetary value, as in the notebook
+FEATURE_COLUMNS = ("frequency", "recency_days", "monetary")
+LEAD_GROUPS = ("dealer", "account_owner_id", "product_group")
+MODEL_FILE_NAME = "model.joblib"
+METRICS_FILE_NAME = "metrics.json"
+DEFAULT_BATCH_SIZE = 250_000
+DEFAULT_TOP_K = 100
+
+log = logging.getLogger(__name__)
+
+
+def train_propensity_model(
+    table: pl.DataFrame,
+    feature_columns: tuple[str, ...] = FEATURE_COLUMNS,
+    label: str = LABEL,
+    test_size: float = 0.2,
+    random_state: int = 69,
+) -> tuple[Pipeline, dict]:
+    """Fit the scaler and logistic regression on a train split.
+
+    Parameters
+    ----------
+    table : pl.DataFrame
+        The training table with the feature columns and a boolean label.
+        Rows with a null label are dropped.
+    feature_columns : tuple[str, ...]
+        The model's feature columns.
+    label : str
+        The label column.
+    test_size : float
+        The share of rows held out for the metrics.
+    random_state : int
+        Seed for the split and the model.
+
+    Returns
+    -------
+    tuple[Pipeline, dict]
+        The fitted pipeline and its accuracy, F1 score and ROC AUC on the
+        held-out rows.
+
+    """
+    table = table.drop_nulls(label)
+    features = table.select(feature_columns).fill_null(0).to_numpy()
+    labels = table[label].cast(pl.Int8).to_numpy()
+    x_train, x_test, y_train, y_test = train_test_split(
+        features,
+        labels,
+        test_size=test_size,
+        random_state=random_state,
+        stratify=labels,
+    )
+    # Class weights balance buyers and non-buyers without dropping rows
+    model = make_pipeline(
+        StandardScaler(),
+        LogisticRegression(class_weight="balanced", random_state=random_state),
+    )
+    model.fit(x_train, y_train)
+    metrics = {
+        "train_rows": len(y_train),
+        **classification_metrics(y_test, model.predict_proba(x_test)[:, 1]),
+    }
+    return model, metrics
+
+
+def classification_metrics(labels: np.ndarray, probabilities: np.ndarray) -> dict:
+    """Score predicted purchase probabilities against held-out labels.
+
+    Parameters
+    ----------
+    labels : np.ndarray
+        The held-out labels, 1 for buyers.
+    probabilities : np.ndarray
+        The predicted purchase probabilities.
+
+    Returns
+    -------
+    dict
+        The number of rows, the accuracy and F1 score at a 0.5 threshold and
+        the ROC AUC.
+
+    """
+    predictions = probabilities > 0.5  # noqa: PLR2004
+    return {
+        "test_rows": len(labels),
+        "accuracy": accuracy_score(labels, predictions),
+        "f1": f1_score(labels, predictions),
+        "roc_auc": roc_auc_score(labels, probabilities),
+    }
+
+
+def save_model(
+    model: Pipeline,
+    path: str,
+    feature_columns: tuple[str, ...] = FEATURE_COLUMNS,
+    metrics: dict | None = None,
+) -> None:
+    """Persist a fitted model with its feature columns and metrics.
+
+    Parameters
+    ----------
+    model : Pipeline
+        The fitted model, anything with `predict_proba`.
+    path : str
+        The directory to write `model.joblib` and `metrics.json` to.
+    feature_columns : tuple[str, ...]
+        The feature columns in the order the model expects them.
+    metrics : dict | None
+        Evaluation metrics saved next to the model.
+
+    """
+    Path(path).mkdir(parents=True, exist_ok=True)
+    joblib.dump(
+        {"model": model, "feature_columns": list(feature_columns)},
+        Path(path) / MODEL_FILE_NAME,
+    )
+    with (Path(path) / METRICS_FILE_NAME).open("w") as f:
+        json.dump(metrics or {}, f, indent=2)
+
+
+def peak_memory_mb() -> float:
+    """Return the peak resident memory of the process in MB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class PropensityScorer:
+    """Score feature tables in vectorized chunks with a persisted model."""
+
+    def __init__(self, model: Pipeline, feature_columns: tuple[str, ...]) -> None:
+        """Initialize the PropensityScorer class.
+
+        Parameters
+        ----------
+        model : Pipeline
+            The fitted model, anything with `predict_proba`.
+        feature_columns : tuple[str, ...]
+            The feature columns in the order the model expects them.
+
+        """
+        self.model = model
+        self.feature_columns = tuple(feature_columns)
+        self.metrics: dict = {}
+
+    @classmethod
+    def load(cls, path: str) -> PropensityScorer:
+        """Load the model saved by `save_model` in `path`."""
+        artifact = joblib.load(Path(path) / MODEL_FILE_NAME)
+        return cls(artifact["model"], artifact["feature_columns"])
+
+    def score(self, features: pl.DataFrame) -> np.ndarray:
+        """Return the purchase probability of every row, nulls counting as 0."""
+        x = features.select(self.feature_columns).fill_null(0).to_numpy()
+        return self.model.predict_proba(x)[:, 1]
+
+    def score_batches(
+        self,
+        path: str,
+        key_columns: tuple[str, ...] = KEY_COLUMNS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> Iterator[pl.DataFrame]:
+        """Score a Parquet feature table one record batch at a time.
+
+        Parameters
+        ----------
+        path : str
+            The Parquet feature table.
+        key_columns : tuple[str, ...]
+            The columns identifying a row, kept next to the score.
+        batch_size : int
+            The maximum number of rows read and scored at once.
+
+        Yields
+        ------
+        pl.DataFrame
+            The key columns and the score of each batch's rows.
+
+        """
+        parquet_file = pq.ParquetFile(path)
+        columns = list(dict.fromkeys([*key_columns, *self.feature_columns]))
+        for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+            features = pl.from_arrow(batch)
+            yield features.select(key_columns).with_columns(
+                pl.Series(SCORE, self.score(features)),
+            )
+
+    def score_table(
+        self,
+        path: str,
+        key_columns: tuple[str, ...] = KEY_COLUMNS,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+    ) -> pl.DataFrame:
+        """Score a whole Parquet feature table and record throughput.
+
+        Parameters
+        ----------
+        path : str
+            The Parquet feature table.
+        key_columns : tuple[str, ...]
+            The columns identifying a row, kept next to the score.
+        batch_size : int
+            The maximum number of rows read and scored at once.
+
+        Returns
+        -------
+        pl.DataFrame
+            The key columns and the score of every row. `metrics` holds the
+            rows, batches, seconds, rows per second and peak memory.
+
+        """
+        start = time.perf_counter()
+        batches = list(self.score_batches(path, key_columns, batch_size))
+        scores = pl.concat(batches) if batches else pl.DataFrame()
+        seconds = time.perf_counter() - start
+        self.metrics = {
+            "rows": scores.height,
+            "batches": len(batches),
+            "seconds": seconds,
+            "rows_per_second": scores.height / seconds if seconds else 0.0,
+            "peak_memory_mb": peak_memory_mb(),
+        }
+        log.info(
+            "Scored %d rows in %d batches at %.0f rows/s, peak memory %.0f MB",
+            self.metrics["rows"],
+            self.metrics["batches"],
+            self.metrics["rows_per_second"],
+            self.metrics["peak_memory_mb"],
+        )
+        return scores
+
+
+def rank_leads(
+    scores: pl.DataFrame,
+    groups: tuple[str, ...] = LEAD_GROUPS,
+    top_k: int | None = DEFAULT_TOP_K,
+) -> pl.DataFrame:
+    """Rank scored rows within each lead list.
+
+    Parameters
+    ----------
+    scores : pl.DataFrame
+        Scored rows with the group columns.
+    groups : tuple[str, ...]
+        The columns defining a lead list, e.g. dealer, rep and product group.
+    top_k : int | None
+        The number of leads kept per list, all of them when None.
+
+    Returns
+    -------
+    pl.DataFrame
+        The leads sorted by list and rank, 1 being the likeliest buyer.
+
+    """
+    leads = scores.with_columns(
+        pl.col(SCORE)
+        .rank("ordinal", descending=True)
+        .over(groups)
+        .cast(pl.UInt32)
+        .alias(RANK),
+    )
+    if top_k is not None:
+        leads = leads.filter(pl.col(RANK) <= top_k)
+    return leads.sort(*groups, RANK, nulls_last=True)
+
+
+def write_lead_lists(leads: pl.DataFrame, path: str) -> None:
+    """Write ranked leads as one Parquet partition per dealer and rep.
+
+    Parameters
+    ----------
+    leads : pl.DataFrame
+        The ranked leads from `rank_leads`.
+    path : str
+        The directory to write `dealer=<dealer>/account_owner_id=<rep>/` to.
+
+    """
+    leads.write_parquet(path, partition_by=list(LEAD_GROUPS[:2]))
@@ -0,0 +1,136 @@
+"""Trains a dealer's customer lifetime value (CLV) model."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src.features.rollups import RevenueRollup
+from src.models.clv import (
+    CATEGORICAL_COLUMNS,
+    CONTINUOUS_COLUMNS,
+    clv_feature_table,
+    train_clv_model,
+)
+from src.models.propensity import save_model
+from src.transformation.dataset_builder import load_objects
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+
+
+def main() -> None:
+    """Build the CLV feature table, cross-validate and save the model."""
+    args = parse_inputs()
+    dealership_name = args.dealership_name
+    dealer_path = f"data/dealers/{dealership_name}"
+
+    objects = load_objects(
+        dealership_name,
+        ["sales_history", "account"],
+        dealer_path,
+        SEMANTIC_LAYER_PATH,
+    )
+    log.info("Finished translating CSV files to common model")
+
+    rollup = RevenueRollup(args.rollup_path).read([dealership_name])
+    table = clv_feature_table(
+        objects["sales_history"],
+        rollup,
+        objects["account"],
+        args.anchor_years,
+        lookback_years=args.lookback_years,
+        horizon_years=args.horizon_years,
+    )
+    log.info("Built the CLV feature table with %d rows", table.height)
+
+    model, metrics = train_clv_model(
+        table,
+        n_splits=args.folds,
+        n_jobs=args.n_jobs,
+        cache_dir=args.cache_dir or f"{dealer_path}/cache",
+    )
+    output = args.output or f"{dealer_path}/models/clv"
+    save_model(
+        model,
+        output,
+        (*CATEGORICAL_COLUMNS, *CONTINUOUS_COLUMNS),
+        metrics,
+    )
+    log.info("Saved the CLV model to %s in %.0fs", output, metrics["seconds"])
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Train a dealer's CLV model.")
+    parser.add_argument(
+        "--dealership-name",
+        "-d",
+        type=str,
+        required=True,
+        choices=["koenig", "ave-plp", "greenway", "akrs"],
+        help="Name of the dealership",
+    )
+    parser.add_argument(
+        "--anchor-years",
+        "-a",
+        type=int,
+        nargs="+",
+        default=[2018, 2019, 2020, 2021],
+        help="Last fiscal year of each lookback window",
+    )
+    parser.add_argument(
+        "--lookback-years",
+        type=int,
+        default=3,
+        help="Fiscal years summed into the features",
+    )
+    parser.add_argument(
+        "--horizon-years",
+        type=int,
+        default=3,
+        help="Fiscal years after the anchor summed into the target",
+    )
+    parser.add_argument(
+        "--rollup-path",
+        type=str,
+        default="data/rollups",
+        help="Directory of the revenue rollups written by the rollup pipeline",
+    )
+    parser.add_argument(
+        "--folds",
+        "-k",
+        type=int,
+        default=5,
+        help="Number of cross-validation folds",
+    )
+    parser.add_argument(
+        "--n-jobs",
+        "-j",
+        type=int,
+        default=-1,
+        help="Worker processes for the folds, -1 for one per core",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default="",
+        help="Directory caching the design matrix, defaults to the dealer's data",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="",
+        help="Directory of the model, defaults to the dealer's data directory",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,79 @@
+"""Adds a dealer's new stock-unit sales to its purchase cohorts."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src.features.cohorts import CohortAnalysis
+from src.features.rfm import stock_unit_sales
+from src.transformation.dataset_builder import load_objects
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+
+
+def main() -> None:
+    """Update a dealer's cohort state with the sales not added yet."""
+    args = parse_inputs()
+    dealership_name = args.dealership_name
+    output = args.output or f"data/dealers/{dealership_name}/cohorts"
+
+    objects = load_objects(
+        dealership_name,
+        ["dealer_stock_unit"],
+        f"data/dealers/{dealership_name}",
+        SEMANTIC_LAYER_PATH,
+    )
+    cohorts = CohortAnalysis.load(output)
+    # Late invoices are kept, so update fails on them rather than losing them
+    events = cohorts.unseen(
+        stock_unit_sales(objects["dealer_stock_unit"], with_invoice_id=True),
+    )
+    intervals = cohorts.update(events)
+    cohorts.save(output)
+    log.info("Added %d new sales", intervals.height)
+
+    summary = cohorts.summary(args.product_groups or None)
+    summary.write_csv(f"{output}/cohort_summary.csv")
+    log.info("Cohort summary:\n%s", summary)
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Update purchase cohorts with a dealer's new sales.",
+    )
+    parser.add_argument(
+        "--dealership-name",
+        "-d",
+        type=str,
+        required=True,
+        choices=["koenig", "ave-plp", "greenway", "akrs"],
+        help="Name of the dealership",
+    )
+    parser.add_argument(
+        "--product-groups",
+        "-p",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Product groups to summarize, e.g. 'LARGE TRACTOR' COMBINES",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="",
+        help="Directory of the cohort state, defaults to the dealer's data directory",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,74 @@
+"""Builds the account-level modeling table for a dealer."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from src.transformation.dataset_builder import (
+    ACCOUNT_DATASET,
+    DatasetBuilder,
+    load_objects,
+)
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+
+
+def main() -> None:
+    """Translate a dealer's objects and build its modeling table."""
+    args = parse_inputs()
+    dealership_name = args.dealership_name
+
+    with Path(SEMANTIC_LAYER_PATH).open("rb") as f:
+        semantic_layer = json.load(f)
+    spec = ACCOUNT_DATASET
+    object_names = [
+        spec.root,
+        *[step.object for step in spec.joins],
+        *[aggregation.object for aggregation in spec.aggregations],
+    ]
+    objects = load_objects(
+        dealership_name,
+        object_names,
+        f"data/dealers/{dealership_name}",
+        SEMANTIC_LAYER_PATH,
+    )
+    log.info("Finished translating CSV files to common model")
+
+    dataset = DatasetBuilder(semantic_layer, dealership_name).build(spec, objects)
+    output = args.output or f"data/dealers/{dealership_name}/modeling_table.parquet"
+    dataset.write_parquet(output)
+    log.info("Saved %d rows x %d columns to %s", *dataset.shape, output)
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Build a dealer's modeling table.")
+    parser.add_argument(
+        "--dealership-name",
+        "-d",
+        type=str,
+        required=True,
+        choices=["koenig", "ave-plp", "greenway", "akrs"],
+        help="Name of the dealership",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="",
+        help="Path of the Parquet file, defaults to the dealer's data directory",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
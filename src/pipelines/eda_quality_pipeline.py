@@ -14,10 +14,24 @@ import polars as pl
 from pandas import ExcelWriter
 
 from src.transformation.category import CleanMakeModelData
+from src.transformation.dataset_builder import foreign_keys
+from src.transformation.quality_rules import default_rules, evaluate_rules
+from src.transformation.referential_integrity import (
+    EXTRA_JOIN_KEYS,
+    profile_foreign_keys,
+)
+from src.transformation.serial_linkage import (
+    SOURCE_FIELDS,
+    conflict_summary,
+    link_serials,
+)
 from src.transformation.translate import translate_csv_to_common_model
 
 log = logging.getLogger(__name__)
 
+CATALOG_INDEX_PATH = "data/catalog_index.npz"
+CATALOG_SNAPSHOT_PATH = "data/catalog_snapshot"
+MAPPING_CHUNK_SIZE = 5000
 
 MAPPING_OBJECTS = {
     "koenig": [
@@ -99,6 +113,12 @@ def main() -> None:
 
     dealership_name = args.dealership_name
     mapping_flag = args.mapping_check
+    metrics_flag = args.match_metrics
+    refresh_flag = args.refresh_catalog
+    encoder_threads = args.encoder_threads
+    linkage_flag = args.serial_linkage
+    rules_flag = args.quality_rules
+    coverage_flag = args.join_coverage
 
     object_files = [
         file
@@ -123,12 +143,63 @@ def main() -> None:
             eda_pl_df = eda_polars(pl_df, semantic_layer, dealership_name, object_name)
             pd_df = eda_pl_df.to_pandas()
             pd_df.to_excel(writer, sheet_name=object_name, index=False)
+        if rules_flag == "y":
+            rule_summary, rule_samples = evaluate_rules(
+                objects,
+                default_rules(semantic_layer, dealership_name),
+            )
+            rule_summary.to_pandas().to_excel(
+                writer,
+                sheet_name="quality_rules",
+                index=False,
+            )
+            rule_samples.to_pandas().to_excel(
+                writer,
+                sheet_name="quality_rule_samples",
+                index=False,
+            )
+            for failed_rule in rule_summary.filter(pl.col("failures") > 0).iter_rows(
+                named=True,
+            ):
+                log.warning(
+                    "%d of %d %s rows fail %s",
+                    failed_rule["failures"],
+                    failed_rule["rows"],
+                    failed_rule["object"],
+                    failed_rule["rule"],
+                )
+        if coverage_flag == "y":
+            join_coverage = profile_foreign_keys(
+                {name: pl_df.lazy() for name, pl_df in objects.items()},
+                [*foreign_keys(semantic_layer, dealership_name), *EXTRA_JOIN_KEYS],
+            )
+            join_coverage.to_pandas().to_excel(
+                writer,
+                sheet_name="join_coverage",
+                index=False,
+            )
     log.info("Finished EDA and saved results to Excel file")
 
+    if linkage_flag == "y" and SOURCE_FIELDS.keys() & objects.keys():
+        lifecycle = link_serials({dealership_name: objects})
+        lifecycle.write_parquet(
+            f"data/dealers/{dealership_name}/eda/equipment_lifecycle.parquet",
+        )
+        log.info(
+            "Linked equipment serial numbers: %s",
+            conflict_summary(lifecycle).to_dicts(),
+        )
+
     if mapping_flag == "y":
         log.info("Starting mapping quality check")
         objects_to_map = MAPPING_OBJECTS[dealership_name]
-        clean_make_model_data = CleanMakeModelData()
+        clean_make_model_data = CleanMakeModelData(
+            CATALOG_SNAPSHOT_PATH,
+            refresh_snapshot=refresh_flag == "y",
+            collect_metrics=metrics_flag == "y",
+            num_threads=encoder_threads,
+        )
+        clean_make_model_data.build_catalog_index(CATALOG_INDEX_PATH)
         for obj in objects_to_map:
             object_pl = objects[obj["name"]]
             if clean_make_model_data.aggregated_data.shape[0] == 0:
@@ -174,7 +245,8 @@ def run_mapping_quality(
         The column name for the group.
 
     file_name : str
-        The name of the file to save the results to.
+        The name of the file to save the results to. Per-tier match metrics
+        are written next to it as JSON and Prometheus text when enabled.
 
     Returns
     -------
@@ -182,32 +254,41 @@ def run_mapping_quality(
 
     """
     matched = 0
-    idx = 1
     unique_pl_df = pl_df.select([make_col, model_col, group_col]).unique()
-    results = []
-    for row in unique_pl_df.iter_rows(named=True):
+    clean_make_model.metrics.reset()
+    clean_make_model.prepare_semantic_scores(
+        unique_pl_df[group_col].drop_nulls().unique().to_list(),
+    )
+    rows = []
+    for idx, row in enumerate(unique_pl_df.iter_rows(named=True), start=1):
         make = row[make_col] if row[make_col] else ""
         model = row[model_col] if row[model_col] else ""
         group = row[group_col] if row[group_col] else ""
         if make and model:
-            result = clean_make_model.clean_make_model_data(
-                make,
-                model,
-                group=group,
-            )
+            rows.append((make, model, group))
+        else:
+            log.warning("Row %d has missing make or model", idx)
+
+    results = []
+    # Rows are resolved in chunks, each querying the catalog index once
+    for start in range(0, len(rows), MAPPING_CHUNK_SIZE):
+        chunk = rows[start : start + MAPPING_CHUNK_SIZE]
+        makes, models, groups = (list(values) for values in zip(*chunk, strict=True))
+        for make, model, group, result in zip(
+            makes,
+            models,
+            groups,
+            clean_make_model.clean_make_model_batch(makes, models, groups),
+            strict=True,
+        ):
             if result["best_fit_score"] > 0:
                 matched += 1
             result["original_make"] = make
             result["original_model"] = model
             result["original_group"] = group
             results.append(result)
-        else:
-            log.warning("Row %d has missing make or model", idx)
-
-        if idx % 5000 == 0:
-            log.info("Matched %d rows of %d", matched, idx)
-            log.info("Total of %d rows processed of %d", idx, unique_pl_df.height)
-        idx += 1
+        log.info("Matched %d rows of %d", matched, len(results))
+        log.info("Total of %d rows processed of %d", len(results), len(rows))
 
     match_rate = matched / unique_pl_df.height
     log.info("Make/model match rate for %s: %f", file_name, match_rate)
@@ -227,6 +308,17 @@ def run_mapping_quality(
     results_df.to_pandas().to_csv(
         f"data/{file_name}_mapping_quality_results.csv", index=False
     )
+    if clean_make_model.metrics.enabled:
+        for suffix in ("json", "prom"):
+            clean_make_model.metrics.write(
+                f"data/{file_name}_match_metrics.{suffix}",
+                prefix="make_model_match",
+            )
+        log.info(
+            "Match tier metrics for %s: %s",
+            file_name,
+            clean_make_model.metrics.to_dict(),
+        )
 
 
 def parse_inputs() -> argparse.Namespace:
@@ -249,6 +341,53 @@ def parse_inputs() -> argparse.Namespace:
         default="n",
         help="Whether to perform a full mapping check which can take some time (y/n)",
     )
+    parser.add_argument(
+        "--match-metrics",
+        type=str,
+        required=False,
+        choices=["y", "n"],
+        default="y",
+        help="Whether to collect per-tier match metrics during the mapping check (y/n)",
+    )
+    parser.add_argument(
+        "--refresh-catalog",
+        type=str,
+        required=False,
+        choices=["y", "n"],
+        default="n",
+        help="Whether to refetch the catalog snapshot even if it is recent (y/n)",
+    )
+    parser.add_argument(
+        "--encoder-threads",
+        type=int,
+        required=False,
+        default=None,
+        help="CPU threads used to encode text during the mapping check",
+    )
+    parser.add_argument(
+        "--serial-linkage",
+        type=str,
+        required=False,
+        choices=["y", "n"],
+        default="y",
+        help="Whether to link equipment records by serial number (y/n)",
+    )
+    parser.add_argument(
+        "--quality-rules",
+        type=str,
+        required=False,
+        choices=["y", "n"],
+        default="y",
+        help="Whether to check every row against the data-quality rules (y/n)",
+    )
+    parser.add_argument(
+        "--join-coverage",
+        type=str,
+        required=False,
+        choices=["y", "n"],
+        default="y",
+        help="Whether to profile orphan rates and fan-out of every foreign key (y/n)",
+    )
     return parser.parse_args()
 
 
@@ -0,0 +1,86 @@
+"""Links accounts across dealers and writes a global customer id per account."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from pathlib import Path
+
+from src.transformation.entity_resolution import (
+    MATCH_THRESHOLD,
+    AccountResolver,
+    stack_accounts,
+)
+from src.transformation.translate import translate_csv_to_common_model
+
+log = logging.getLogger(__name__)
+
+DEALERS = ["koenig", "ave-plp", "greenway", "akrs"]
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+
+
+def main() -> None:
+    """Translate every dealer's accounts and resolve them into customers."""
+    args = parse_inputs()
+
+    accounts = {}
+    for dealer in args.dealers:
+        csv_path = Path(f"data/dealers/{dealer}/account.csv")
+        if not csv_path.exists():
+            log.warning("No account export for %s, skipping", dealer)
+            continue
+        accounts[dealer] = translate_csv_to_common_model(
+            str(csv_path),
+            dealer,
+            SEMANTIC_LAYER_PATH,
+            "account",
+        )
+    log.info("Finished translating account files for %d dealers", len(accounts))
+
+    resolver = AccountResolver(args.threshold)
+    customers = resolver.resolve(stack_accounts(accounts))
+    customers.write_parquet(args.output)
+    metrics_path = str(Path(args.output).with_suffix("")) + "_metrics.json"
+    with Path(metrics_path).open("w") as f:
+        json.dump(resolver.metrics, f, indent=2)
+    log.info(
+        "Saved global customer ids to %s, blocking kept %.6f%% of pairs",
+        args.output,
+        100 * (1 - resolver.metrics["reduction_ratio"]),
+    )
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Resolve accounts across dealers.")
+    parser.add_argument(
+        "--dealers",
+        type=str,
+        nargs="+",
+        choices=DEALERS,
+        default=DEALERS,
+        help="The dealers whose accounts are resolved",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=MATCH_THRESHOLD,
+        help="The minimum match score for two accounts to be linked",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="data/global_customer_ids.parquet",
+        help="Path of the Parquet file with the global customer ids",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,154 @@
+"""Materializes a dealer's point-in-time features for new cutoffs."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from datetime import date
+
+import polars as pl
+
+from src.features.activity import (
+    ACTIVITY_SOURCES,
+    ENTITY,
+    EQUIPMENT_LEVEL,
+    LEVEL_KEYS,
+    ActivityAggregator,
+)
+from src.features.feature_store import CUTOFF, EVENT_SOURCES, FeatureStore
+from src.features.funnel import funnel_feature_function
+from src.features.rfm import monthly_cutoffs
+from src.transformation.dataset_builder import load_objects
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+
+
+def main() -> None:
+    """Translate a dealer's objects and add missing cutoffs to its feature store."""
+    args = parse_inputs()
+    dealership_name = args.dealership_name
+
+    object_names = [
+        "account",
+        "quote",
+        *{source.object for source in (*EVENT_SOURCES, *ACTIVITY_SOURCES)},
+    ]
+    # Only the accounts are needed, every source skips a missing object
+    objects = load_objects(
+        dealership_name,
+        object_names,
+        f"data/dealers/{dealership_name}",
+        SEMANTIC_LAYER_PATH,
+        optional=tuple(name for name in object_names if name != "account"),
+    )
+    log.info("Finished translating CSV files to common model")
+
+    accounts = objects["account"].select("account_id").unique().collect()["account_id"]
+    cutoffs = monthly_cutoffs(
+        date.fromisoformat(args.start),
+        date.fromisoformat(args.end),
+        args.every,
+    )
+    activity_path = args.activity_path or f"data/dealers/{dealership_name}/activity"
+    activity = ActivityAggregator.load(activity_path)
+    appended = activity.append(objects)
+    activity.save(activity_path)
+    log.info("Added %d activity events", appended)
+
+    store = FeatureStore(
+        args.output or f"data/dealers/{dealership_name}/features",
+        label_horizon_months=args.label_horizon,
+    )
+    store.register(activity.feature_function())
+    if {"quote", "dealer_stock_unit"} <= objects.keys():
+        store.register(funnel_feature_function())
+    else:
+        log.warning("No quote or dealer_stock_unit object, skipping funnel features")
+    new_cutoffs = store.update(
+        objects,
+        accounts,
+        cutoffs,
+        overwrite=args.overwrite == "y",
+    )
+
+    # Service activity per equipment unit is keyed by equipment, not account
+    if new_cutoffs:
+        equipment = (
+            activity.state.filter(pl.col("level") == EQUIPMENT_LEVEL)
+            .select(pl.col(ENTITY).unique().alias(LEVEL_KEYS[EQUIPMENT_LEVEL]))
+            .join(pl.DataFrame({CUTOFF: new_cutoffs}), how="cross")
+        )
+        activity.features(equipment, EQUIPMENT_LEVEL).collect().write_parquet(
+            f"{activity_path}/equipment_features",
+            partition_by=CUTOFF,
+        )
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Materialize point-in-time features per account and cutoff.",
+    )
+    parser.add_argument(
+        "--dealership-name",
+        "-d",
+        type=str,
+        required=True,
+        choices=["koenig", "ave-plp", "greenway", "akrs"],
+        help="Name of the dealership",
+    )
+    parser.add_argument(
+        "--start",
+        type=str,
+        required=True,
+        help="First cutoff, as YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--end",
+        type=str,
+        required=True,
+        help="Last possible cutoff, as YYYY-MM-DD",
+    )
+    parser.add_argument(
+        "--every",
+        type=str,
+        default="1mo",
+        help="Spacing of the cutoffs as a Polars duration, e.g. 1mo or 1q",
+    )
+    parser.add_argument(
+        "--label-horizon",
+        type=int,
+        default=12,
+        help="Months after a cutoff a purchase is labelled for",
+    )
+    parser.add_argument(
+        "--overwrite",
+        type=str,
+        default="n",
+        choices=["y", "n"],
+        help="Recompute cutoffs that are already materialized",
+    )
+    parser.add_argument(
+        "--activity-path",
+        type=str,
+        default="",
+        help="Directory of the daily activity, defaults to the dealer's data directory",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="",
+        help="Directory of the feature store, defaults to the dealer's data directory",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,69 @@
+"""Serves a dealer's published lead lists over HTTP."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src.models.lead_serving import DEFAULT_CHECK_INTERVAL, LeadServer, make_http_server
+
+log = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Answer `GET /leads` requests until interrupted."""
+    args = parse_inputs()
+    serving_path = (
+        args.serving_path or f"data/dealers/{args.dealership_name}/lead_serving"
+    )
+    server = LeadServer(serving_path, args.check_interval)
+    http_server = make_http_server(server, args.host, args.port)
+    log.info(
+        "Serving %d lead lists of version %s on %s:%d",
+        len(server.index),
+        server.version,
+        args.host,
+        http_server.server_port,
+    )
+    try:
+        http_server.serve_forever()
+    except KeyboardInterrupt:
+        log.info("Stopping the lead server")
+    finally:
+        http_server.server_close()
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Serve ranked lead lists.")
+    parser.add_argument(
+        "--dealership-name",
+        "-d",
+        type=str,
+        required=True,
+        choices=["koenig", "ave-plp", "greenway", "akrs"],
+        help="Name of the dealership",
+    )
+    parser.add_argument(
+        "--serving-path",
+        type=str,
+        default="",
+        help="Directory of the published lead lists, defaults to the dealer's data",
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--check-interval",
+        type=float,
+        default=DEFAULT_CHECK_INTERVAL,
+        help="Seconds between checks for newly published lead lists",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,87 @@
+"""Trains a bagged purchase-propensity model from a training table."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+import polars as pl
+
+from src.models.bagging import DEFAULT_MEMBERS, train_bagged_model
+from src.models.propensity import FEATURE_COLUMNS, LABEL, save_model
+
+log = logging.getLogger(__name__)
+
+
+def main() -> None:
+    """Fit the bagged ensemble and save it for the scoring pipeline."""
+    args = parse_inputs()
+    feature_columns = tuple(args.features)
+    table = pl.read_parquet(args.input, columns=[*feature_columns, args.label])
+    ensemble, metrics = train_bagged_model(
+        table,
+        feature_columns,
+        args.label,
+        n_members=args.members,
+        n_jobs=args.n_jobs,
+    )
+    save_model(ensemble, args.output, feature_columns, metrics)
+    log.info("Saved %d members to %s", len(ensemble), args.output)
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Train a bagged purchase-propensity model.",
+    )
+    parser.add_argument(
+        "--input",
+        "-i",
+        type=str,
+        required=True,
+        help="Parquet training table with the features and the label",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        required=True,
+        help="Directory of the model",
+    )
+    parser.add_argument(
+        "--features",
+        "-f",
+        type=str,
+        nargs="+",
+        default=list(FEATURE_COLUMNS),
+        help="Feature columns of the model",
+    )
+    parser.add_argument(
+        "--label",
+        type=str,
+        default=LABEL,
+        help="Boolean label column",
+    )
+    parser.add_argument(
+        "--members",
+        "-m",
+        type=int,
+        default=DEFAULT_MEMBERS,
+        help="Number of bagged members",
+    )
+    parser.add_argument(
+        "--n-jobs",
+        "-j",
+        type=int,
+        default=-1,
+        help="Worker processes fitting members, -1 for one per core",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,101 @@
+"""Updates the dealers' fiscal-year revenue rollups and reconciles them."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+from pathlib import Path
+
+from src.features.rollups import RevenueRollup, reconcile_sales_history
+from src.transformation.dataset_builder import load_objects
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+DEALERS = ["koenig", "ave-plp", "greenway", "akrs"]
+
+
+def main() -> None:
+    """Roll up each dealer's stock-unit sales and flag sales_history gaps."""
+    args = parse_inputs()
+    rollups = RevenueRollup(args.output)
+
+    for dealership_name in args.dealership_names:
+        dealer_path = f"data/dealers/{dealership_name}"
+        objects = load_objects(
+            dealership_name,
+            ["dealer_stock_unit", "sales_history"],
+            dealer_path,
+            SEMANTIC_LAYER_PATH,
+        )
+        rollups.update(
+            dealership_name,
+            objects["dealer_stock_unit"],
+            args.fiscal_year_first_month,
+            rebuild=args.rebuild == "y",
+        )
+        discrepancies = reconcile_sales_history(
+            rollups.read([dealership_name]),
+            objects["sales_history"],
+            args.threshold,
+        )
+        report_path = Path(dealer_path) / "reports"
+        report_path.mkdir(parents=True, exist_ok=True)
+        discrepancies.write_csv(report_path / "rollup_discrepancies.csv")
+        log.info(
+            "Found %d account fiscal years of %s differing by more than %.0f%%",
+            discrepancies.height,
+            dealership_name,
+            args.threshold * 100,
+        )
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Update fiscal-year revenue rollups of stock-unit sales.",
+    )
+    parser.add_argument(
+        "--dealership-names",
+        "-d",
+        type=str,
+        nargs="+",
+        default=DEALERS,
+        choices=DEALERS,
+        help="Names of the dealerships, all of them by default",
+    )
+    parser.add_argument(
+        "--fiscal-year-first-month",
+        type=int,
+        default=None,
+        help="First month of the fiscal year, defaults to each dealer's own",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.85,
+        help="Relative difference above which a fiscal year is reported",
+    )
+    parser.add_argument(
+        "--rebuild",
+        type=str,
+        default="n",
+        choices=["y", "n"],
+        help="Recompute every fiscal year, e.g. after changing a fiscal calendar",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="data/rollups",
+        help="Directory of the rollup partitions",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,124 @@
+"""Scores a dealer's accounts and writes ranked lead lists per rep."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from pathlib import Path
+
+import polars as pl
+
+from src.models.lead_serving import lead_owners, publish_lead_index
+from src.models.propensity import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_TOP_K,
+    PropensityScorer,
+    rank_leads,
+    write_lead_lists,
+)
+from src.transformation.dataset_builder import load_objects
+
+log = logging.getLogger(__name__)
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+
+
+def main() -> None:
+    """Score a dealer's feature table and write its lead lists."""
+    args = parse_inputs()
+    dealership_name = args.dealership_name
+    dealer_path = f"data/dealers/{dealership_name}"
+
+    scorer = PropensityScorer.load(args.model)
+    scores = scorer.score_table(
+        args.features or f"{dealer_path}/propensity_features.parquet",
+        batch_size=args.batch_size,
+    )
+    objects = load_objects(
+        dealership_name,
+        ["account"],
+        dealer_path,
+        SEMANTIC_LAYER_PATH,
+    )
+    owners = lead_owners(objects["account"])
+    scores = (
+        scores.with_columns(pl.col("account_id").cast(pl.Utf8))
+        .join(owners, on="account_id", how="left")
+        .with_columns(pl.lit(dealership_name).alias("dealer"))
+    )
+    leads = rank_leads(scores, top_k=args.top_k or None)
+    output = args.output or f"{dealer_path}/lead_lists"
+    write_lead_lists(leads, output)
+    with (Path(output) / "_scoring_metrics.json").open("w") as f:
+        json.dump(scorer.metrics, f, indent=2)
+    log.info("Saved %d leads to %s", leads.height, output)
+
+    publish_lead_index(
+        scores,
+        args.serving_path or f"{dealer_path}/lead_serving",
+        args.top_k or None,
+    )
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Score accounts and write ranked lead lists per rep.",
+    )
+    parser.add_argument(
+        "--dealership-name",
+        "-d",
+        type=str,
+        required=True,
+        choices=["koenig", "ave-plp", "greenway", "akrs"],
+        help="Name of the dealership",
+    )
+    parser.add_argument(
+        "--model",
+        "-m",
+        type=str,
+        required=True,
+        help="Directory of the persisted model",
+    )
+    parser.add_argument(
+        "--features",
+        "-f",
+        type=str,
+        default="",
+        help="Parquet feature table, defaults to the dealer's data directory",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows read and scored at once",
+    )
+    parser.add_argument(
+        "--top-k",
+        type=int,
+        default=DEFAULT_TOP_K,
+        help="Leads kept per rep and product group, 0 keeps all",
+    )
+    parser.add_argument(
+        "--serving-path",
+        type=str,
+        default="",
+        help="Directory the lead server reads, defaults to the dealer's data directory",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="",
+        help="Directory of the lead lists, defaults to the dealer's data directory",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
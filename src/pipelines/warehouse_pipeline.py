@@ -0,0 +1,70 @@
+"""Translates the dealers' raw CSV exports into the local Parquet warehouse."""
+
+from __future__ import annotations
+
+import argparse
+import logging
+
+from src.transformation.warehouse import DEFAULT_WAREHOUSE_PATH, Warehouse
+
+log = logging.getLogger(__name__)
+
+DEALERS = ["koenig", "ave-plp", "greenway", "akrs"]
+
+
+def main() -> None:
+    """Store every semantic layer object of each dealer as Parquet."""
+    args = parse_inputs()
+    warehouse = Warehouse(args.output)
+
+    for dealership_name in args.dealership_names:
+        written = warehouse.ingest(
+            dealership_name,
+            f"data/dealers/{dealership_name}",
+            args.objects or None,
+        )
+        log.info(
+            "Stored %d objects, %d rows of %s",
+            len(written),
+            sum(written.values()),
+            dealership_name,
+        )
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(
+        description="Translate dealer CSV exports into the Parquet warehouse.",
+    )
+    parser.add_argument(
+        "--dealership-names",
+        "-d",
+        type=str,
+        nargs="+",
+        default=DEALERS,
+        choices=DEALERS,
+        help="Names of the dealerships, all of them by default",
+    )
+    parser.add_argument(
+        "--objects",
+        type=str,
+        nargs="*",
+        default=[],
+        help="Objects to ingest, every one with a CSV file by default",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default=DEFAULT_WAREHOUSE_PATH,
+        help="Directory of the warehouse",
+    )
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,547 @@
+"""Generates synthetic raw dealer data conforming to the semantic layer.
+
+Columns are named with the dealer's `api_name` for every field of the object
+and hold raw CSV-style values for the field type, so the output can be fed
+through `translate_csv_to_common_model` like a real dealer export. Make, model
+and group fields draw from `EQUIPMENT`, which `make_fake_catalog` also uses, so
+generated equipment resolves against the fake catalog the way real data
+resolves against the TZ catalog.
+
+Keys are consistent across objects: row `i` of an object always has the same
+primary key, and a foreign key to an object picks one of the rows that object
+is generated with, so account, customer_equipment, dealer_stock_unit and task
+exports join like real ones. Output is written in chunks, so multi-GB files
+only need one chunk in memory, and the same seed and chunk size always give
+the same output.
+
+For example, `python -m src.synthetic.dealer_data -d koenig -o <dir> --rows
+1000000 --object-rows account=100000 --format parquet` writes one file per
+object.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+import pyarrow.parquet as pq
+
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+DEFAULT_NULL_RATE = 0.05
+DEFAULT_CARDINALITY = 50
+FIRST_DATE = date(2010, 1, 1)
+DATE_RANGE_DAYS = 15 * 365
+FIRST_MODEL_YEAR = 1990
+LAST_MODEL_YEAR = 2025
+
+# (make, model, category, subcategory, dealer group)
+EQUIPMENT = [
+    ("John Deere", "8R 370", "Tractors", "Row Crop Tractors", "ROW CROP TRACTOR"),
+    ("John Deere", "9RX 640", "Tractors", "4WD Tractors", "4WD TRACTOR"),
+    ("John Deere", "X9 1100", "Harvesting", "Combines", "COMBINE"),
+    ("John Deere", "S780", "Harvesting", "Combines", "COMBINE"),
+    ("John Deere", "DB60", "Planting", "Planters", "PLANTER"),
+    ("John Deere", "R4045", "Application", "Self-Propelled Sprayers", "SPRAYER"),
+    ("John Deere", "XUV835M", "Utility Vehicles", "Utility Vehicles", "GATOR"),
+    ("John Deere", "X380", "Lawn & Garden", "Lawn Tractors", "LAWN TRACTOR"),
+    ("John Deere", "1025R", "Tractors", "Compact Tractors", "COMPACT TRACTOR"),
+    ("John Deere", "332G", "Construction", "Skid Steers", "SKID STEER"),
+    ("John Deere", "560M", "Hay & Forage", "Round Balers", "ROUND BALER"),
+    ("Case IH", "Magnum 340", "Tractors", "Row Crop Tractors", "ROW CROP TRACTOR"),
+    ("Case IH", "Axial-Flow 8250", "Harvesting", "Combines", "COMBINE"),
+    ("Kinze", "3660", "Planting", "Planters", "PLANTER"),
+    ("Great Plains", "3000TT", "Tillage", "Disks", "DISK"),
+    ("Geringhoff", "NorthStar 1222", "Harvesting", "Corn Heads", "CORN HEAD"),
+    ("Stihl", "MS 271", "Outdoor Power", "Chainsaws", "HANDHELD"),
+    ("Bobcat", "S770", "Construction", "Skid Steers", "SKID STEER"),
+    ("Kubota", "M7-172", "Tractors", "Row Crop Tractors", "ROW CROP TRACTOR"),
+    ("Vermeer", "604R", "Hay & Forage", "Round Balers", "ROUND BALER"),
+]
+EQUIPMENT_FIELD_SUFFIXES = {
+    "make": 0,
+    "model": 1,
+    "group": 4,
+    "variant": 4,
+}
+# Salesforce key prefixes of the standard objects, custom objects get "a" plus
+# the first two letters of their name
+KEY_PREFIXES = {"account": "001", "user": "005", "task": "00T"}
+SALESFORCE_ID_LENGTH = 18
+DEFAULT_ROWS = 10_000
+DEFAULT_CHUNK_SIZE = 500_000
+DEFAULT_OBJECTS = ("account", "customer_equipment", "dealer_stock_unit", "task")
+OUTPUT_FORMATS = ("csv", "parquet")
+
+log = logging.getLogger(__name__)
+
+
+def load_semantic_layer(semantic_layer_path: str = SEMANTIC_LAYER_PATH) -> dict:
+    """Read the semantic layer JSON.
+
+    Parameters
+    ----------
+    semantic_layer_path : str
+        The path to the semantic layer JSON file.
+
+    Returns
+    -------
+    dict
+        The semantic layer keyed by object and field name.
+
+    """
+    with Path(semantic_layer_path).open(encoding="utf-8") as f:
+        return json.load(f)
+
+
+def object_columns(
+    semantic_layer: dict,
+    dealer: str,
+    object_type: str,
+) -> list[tuple[str, dict, dict]]:
+    """List the raw columns a dealer exports for an object.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+    dealer : str
+        The dealer name used to identify field mappings.
+    object_type : str
+        The semantic layer object, e.g. "dealer_stock_unit".
+
+    Returns
+    -------
+    list[tuple[str, dict, dict]]
+        (field name, dealer key mapping, field definition) per column. When
+        several fields share an `api_name` only the first is kept, as
+        translation does.
+
+    """
+    columns = {}
+    for field_name, field_data in semantic_layer[object_type].items():
+        for key_mapping in field_data["keys"]:
+            if key_mapping["org"] == dealer:
+                columns.setdefault(
+                    key_mapping["api_name"],
+                    (field_name, key_mapping, field_data),
+                )
+    return list(columns.values())
+
+
+def referenced_fields(semantic_layer: dict, dealer: str) -> set[tuple[str, str]]:
+    """Find the (object, field) pairs the dealer's foreign keys point at.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+    dealer : str
+        The dealer name used to identify field mappings.
+
+    Returns
+    -------
+    set[tuple[str, str]]
+        The referenced object and field names.
+
+    """
+    return {
+        (key_mapping["foreign_key_object"], key_mapping["foreign_key_field"])
+        for fields in semantic_layer.values()
+        for field_data in fields.values()
+        if field_data.get("foreign_key")
+        for key_mapping in field_data["keys"]
+        if key_mapping["org"] == dealer and key_mapping.get("foreign_key_object")
+    }
+
+
+def _equipment_index(field_name: str) -> int | None:
+    for suffix, index in EQUIPMENT_FIELD_SUFFIXES.items():
+        if field_name.endswith(f"_{suffix}"):
+            return index
+    return None
+
+
+def key_prefix(object_type: str) -> str:
+    """Return the Salesforce-style key prefix of an object's record ids."""
+    return KEY_PREFIXES.get(object_type, f"a{object_type[:2].upper()}")
+
+
+def salesforce_ids(numbers: np.ndarray, prefix: str) -> pl.Series:
+    """Format integers as 18 character Salesforce-style record ids.
+
+    Parameters
+    ----------
+    numbers : np.ndarray
+        The record numbers.
+    prefix : str
+        The object key prefix the ids start with.
+
+    Returns
+    -------
+    pl.Series
+        The ids, e.g. "001000000000000042".
+
+    """
+    digits = (
+        pl.Series(numbers, dtype=pl.Int64)
+        .cast(pl.Utf8)
+        .str.zfill(SALESFORCE_ID_LENGTH - len(prefix))
+    )
+    return pl.select(pl.concat_str(pl.lit(prefix), digits).alias("id")).to_series()
+
+
+def key_values(
+    semantic_layer: dict,
+    object_type: str,
+    field_name: str,
+    row_numbers: np.ndarray,
+) -> pl.Series:
+    """Build the key values of some rows of an object.
+
+    Both the object itself and every foreign key pointing at it use this, so
+    references always resolve.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+    object_type : str
+        The object owning the key.
+    field_name : str
+        The key field, either the primary key or a referenced business key
+        such as a stock number.
+    row_numbers : np.ndarray
+        The row numbers within the object.
+
+    Returns
+    -------
+    pl.Series
+        Record ids for the primary key, "<FIELD>-<number>" codes otherwise.
+
+    """
+    field_data = semantic_layer.get(object_type, {}).get(field_name, {})
+    if field_data.get("primary_key"):
+        return salesforce_ids(row_numbers, key_prefix(object_type))
+    digits = pl.Series(row_numbers, dtype=pl.Int64).cast(pl.Utf8).str.zfill(8)
+    return pl.select(
+        pl.concat_str(pl.lit(f"{field_name.upper()}-"), digits).alias("key"),
+    ).to_series()
+
+
+def generate_column(  # noqa: PLR0911, PLR0913, PLR0917
+    field_name: str,
+    field_data: dict,
+    n_rows: int,
+    rng: np.random.Generator,
+    equipment_rows: np.ndarray,
+    cardinality: int = DEFAULT_CARDINALITY,
+) -> pl.Series:
+    """Generate raw values for one non-key semantic layer field.
+
+    Parameters
+    ----------
+    field_name : str
+        The common model field name, used to pick equipment values.
+    field_data : dict
+        The semantic layer field definition.
+    n_rows : int
+        The number of values.
+    rng : np.random.Generator
+        The random generator.
+    equipment_rows : np.ndarray
+        The `EQUIPMENT` row of every output row, shared by the make, model
+        and group fields so they describe the same machine.
+    cardinality : int
+        The number of distinct values for free-text string fields.
+
+    Returns
+    -------
+    pl.Series
+        Values as they would appear in a raw dealer export.
+
+    """
+    field_type = field_data.get("type", "string")
+    equipment_index = _equipment_index(field_name)
+    if equipment_index is not None and field_type == "string":
+        vocabulary = pl.Series([row[equipment_index] for row in EQUIPMENT])
+        return vocabulary.gather(equipment_rows)
+    if field_type == "float":
+        return pl.Series(np.round(rng.gamma(2.0, 5_000.0, n_rows), 2))
+    if field_type == "integer" and field_name.endswith("_year"):
+        return pl.Series(rng.integers(FIRST_MODEL_YEAR, LAST_MODEL_YEAR + 1, n_rows))
+    if field_type == "integer":
+        return pl.Series(rng.integers(0, 10_000, n_rows))
+    if field_type == "boolean":
+        return pl.Series(rng.random(n_rows) < 0.5)  # noqa: PLR2004
+    if field_type in {"date", "datetime"}:
+        days = pl.Series(rng.integers(0, DATE_RANGE_DAYS, n_rows), dtype=pl.Int64)
+        dates = pl.select(
+            pl.lit(FIRST_DATE) + pl.duration(days=days),
+        ).to_series()
+        if field_type == "date":
+            return dates.dt.strftime("%Y-%m-%d")
+        return dates.cast(pl.Datetime).dt.strftime("%Y-%m-%dT%H:%M:%S.000+0000")
+    vocabulary = pl.Series([f"{field_name} {i}" for i in range(cardinality)])
+    return vocabulary.gather(rng.integers(0, cardinality, n_rows))
+
+
+def generate_object(  # noqa: PLR0913, PLR0917
+    semantic_layer: dict,
+    dealer: str,
+    object_type: str,
+    n_rows: int,
+    seed: int = 0,
+    null_rate: float = DEFAULT_NULL_RATE,
+    *,
+    cardinality: int = DEFAULT_CARDINALITY,
+    row_counts: dict[str, int] | None = None,
+    start_row: int = 0,
+) -> pl.DataFrame:
+    """Generate a raw export of one object for a dealer.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+    dealer : str
+        The dealer name used to identify field mappings.
+    object_type : str
+        The semantic layer object, e.g. "dealer_stock_unit".
+    n_rows : int
+        The number of rows.
+    seed : int
+        Seed for the random generator.
+    null_rate : float
+        The share of values blanked out in every column except the primary
+        key.
+    cardinality : int
+        The number of distinct values for free-text string fields.
+    row_counts : dict[str, int] | None
+        The number of rows every object is generated with. Foreign keys to an
+        object pick from its first `row_counts[object]` rows, defaulting to
+        `n_rows`.
+    start_row : int
+        The row number of the first row, used when generating in chunks.
+
+    Returns
+    -------
+    pl.DataFrame
+        One column per dealer `api_name` of the object.
+
+    """
+    columns = object_columns(semantic_layer, dealer, object_type)
+    if not columns:
+        error_message = f"No columns were found for dealer '{dealer}' in {object_type}."
+        raise ValueError(error_message)
+    row_counts = row_counts or {}
+    referenced = referenced_fields(semantic_layer, dealer)
+    # Seeding from the object and the first row keeps every chunk
+    # reproducible on its own
+    rng = np.random.default_rng(
+        [seed, list(semantic_layer).index(object_type), start_row],
+    )
+    row_numbers = np.arange(start_row, start_row + n_rows)
+    equipment_rows = rng.integers(0, len(EQUIPMENT), n_rows)
+    data = {}
+    for field_name, key_mapping, field_data in columns:
+        foreign_object = key_mapping.get("foreign_key_object")
+        if field_data.get("primary_key") or (object_type, field_name) in referenced:
+            values = key_values(semantic_layer, object_type, field_name, row_numbers)
+        elif field_data.get("foreign_key") and foreign_object:
+            values = key_values(
+                semantic_layer,
+                foreign_object,
+                key_mapping["foreign_key_field"],
+                rng.integers(0, max(row_counts.get(foreign_object, n_rows), 1), n_rows),
+            )
+        else:
+            values = generate_column(
+                field_name,
+                field_data,
+                n_rows,
+                rng,
+                equipment_rows,
+                cardinality,
+            )
+        if null_rate > 0 and not field_data.get("primary_key"):
+            values = values.set(pl.Series(rng.random(n_rows) < null_rate), None)
+        data[key_mapping["api_name"]] = values.alias(key_mapping["api_name"])
+    return pl.DataFrame(data)
+
+
+def write_object(  # noqa: PLR0913, PLR0917
+    path: str,
+    semantic_layer: dict,
+    dealer: str,
+    object_type: str,
+    n_rows: int,
+    seed: int = 0,
+    *,
+    null_rate: float = DEFAULT_NULL_RATE,
+    cardinality: int = DEFAULT_CARDINALITY,
+    row_counts: dict[str, int] | None = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> None:
+    """Stream a generated object to a CSV or Parquet file chunk by chunk.
+
+    Parameters
+    ----------
+    path : str
+        The output file. A `.parquet` suffix writes Parquet, anything else
+        writes CSV.
+    semantic_layer : dict
+        The semantic layer dictionary.
+    dealer : str
+        The dealer name used to identify field mappings.
+    object_type : str
+        The semantic layer object, e.g. "dealer_stock_unit".
+    n_rows : int
+        The total number of rows.
+    seed : int
+        Seed for the random generator.
+    null_rate : float
+        The share of values blanked out in every column except the primary
+        key.
+    cardinality : int
+        The number of distinct values for free-text string fields.
+    row_counts : dict[str, int] | None
+        The number of rows every object is generated with, see
+        `generate_object`.
+    chunk_size : int
+        The number of rows generated and held in memory at a time.
+
+    """
+    row_counts = {object_type: n_rows, **(row_counts or {})}
+    parquet = path.endswith(".parquet")
+    writer = None
+    with Path(path).open("wb") as f:
+        for start_row in range(0, n_rows, chunk_size):
+            chunk = generate_object(
+                semantic_layer,
+                dealer,
+                object_type,
+                min(chunk_size, n_rows - start_row),
+                seed,
+                null_rate,
+                cardinality=cardinality,
+                row_counts=row_counts,
+                start_row=start_row,
+            )
+            if parquet:
+                table = chunk.to_arrow()
+                writer = writer or pq.ParquetWriter(f, table.schema)
+                writer.write_table(table)
+            else:
+                chunk.write_csv(f, include_header=start_row == 0)
+        if writer is not None:
+            writer.close()
+    log.info("Wrote %d %s rows for %s to %s", n_rows, object_type, dealer, path)
+
+
+def make_fake_catalog(n_rows: int, seed: int = 0) -> pl.DataFrame:
+    """Generate a TZ-shaped make/model catalog that covers `EQUIPMENT`.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of catalog rows, at least the size of `EQUIPMENT`.
+    seed : int
+        Seed for the random generator.
+
+    Returns
+    -------
+    pl.DataFrame
+        The id, make, model, category, subcategory and total_units columns
+        returned by the catalog query.
+
+    """
+    rng = np.random.default_rng(seed)
+    n_extra = max(n_rows - len(EQUIPMENT), 0)
+    base = rng.integers(0, len(EQUIPMENT), n_extra)
+    rows = [row[:4] for row in EQUIPMENT] + [
+        (
+            EQUIPMENT[i][0],
+            f"{EQUIPMENT[i][1]}-{number}",
+            EQUIPMENT[i][2],
+            EQUIPMENT[i][3],
+        )
+        for number, i in enumerate(base)
+    ]
+    return pl.DataFrame(
+        rows,
+        schema=["make", "model", "category", "subcategory"],
+        orient="row",
+    ).with_columns(
+        pl.int_range(pl.len()).alias("id"),
+        pl.Series("total_units", rng.integers(1, 500, len(rows))),
+    )
+
+
+def parse_inputs() -> argparse.Namespace:
+    """Parse kwargs from the command line."""
+    parser = argparse.ArgumentParser(description="Generate synthetic dealer data.")
+    parser.add_argument("--dealership-name", "-d", type=str, required=True)
+    parser.add_argument("--output-dir", "-o", type=str, required=True)
+    parser.add_argument(
+        "--objects",
+        type=str,
+        default=",".join(DEFAULT_OBJECTS),
+        help="Comma separated semantic layer objects to generate",
+    )
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS)
+    parser.add_argument(
+        "--object-rows",
+        type=str,
+        default="",
+        help="Per-object row counts overriding --rows, e.g. account=1000,task=50000",
+    )
+    parser.add_argument("--null-rate", type=float, default=DEFAULT_NULL_RATE)
+    parser.add_argument("--cardinality", type=int, default=DEFAULT_CARDINALITY)
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--format", type=str, choices=OUTPUT_FORMATS, default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--semantic-layer",
+        type=str,
+        default=SEMANTIC_LAYER_PATH,
+    )
+    return parser.parse_args()
+
+
+def main() -> None:
+    """Write one synthetic export per requested object."""
+    args = parse_inputs()
+    semantic_layer = load_semantic_layer(args.semantic_layer)
+    objects = args.objects.split(",")
+    row_counts = dict.fromkeys(objects, args.rows)
+    for pair in filter(None, args.object_rows.split(",")):
+        object_type, rows = pair.split("=")
+        row_counts[object_type] = int(rows)
+    output_dir = Path(args.output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    for object_type in objects:
+        write_object(
+            str(output_dir / f"{object_type}.{args.format}"),
+            semantic_layer,
+            args.dealership_name,
+            object_type,
+            row_counts[object_type],
+            args.seed,
+            null_rate=args.null_rate,
+            cardinality=args.cardinality,
+            row_counts=row_counts,
+            chunk_size=args.chunk_size,
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    main()
@@ -0,0 +1,306 @@
+"""Contains an approximate-nearest-neighbour index over catalog embeddings.
+
+The index is an inverted file (IVF) over L2-normalized vectors: a spherical
+k-means coarse quantizer splits the catalog into lists, and a query only scores
+the vectors in its `n_probe` closest lists. Everything is plain NumPy so the
+index can be saved to and loaded from a single `.npz` file.
+"""
+
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_N_PROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLES_PER_LIST = 256
+ASSIGNMENT_CHUNK_SIZE = 65_536
+
+log = logging.getLogger(__name__)
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize the rows of a 2D array so dot products are cosine scores.
+
+    Parameters
+    ----------
+    vectors : np.ndarray
+        The vectors to normalize, one per row.
+
+    Returns
+    -------
+    np.ndarray
+        Float32 copy of the vectors with unit length rows.
+
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+
+def brute_force_query(
+    embeddings: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    """Find the exact top-k cosine neighbours, used as the recall reference.
+
+    Parameters
+    ----------
+    embeddings : np.ndarray
+        The indexed vectors, one per row.
+    queries : np.ndarray
+        The query vectors, one per row.
+    k : int
+        The number of neighbours to return per query.
+
+    Returns
+    -------
+    tuple[np.ndarray, np.ndarray]
+        Row ids and scores of the neighbours, each of shape (n_queries, k).
+
+    """
+    scores = normalize_rows(queries) @ normalize_rows(embeddings).T
+    return _top_k(scores, np.arange(scores.shape[1]), k)
+
+
+def _top_k(
+    scores: np.ndarray,
+    ids: np.ndarray,
+    k: int,
+) -> tuple[np.ndarray, np.ndarray]:
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(np.float32)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1)
+    top = np.take_along_axis(part, order, axis=1)
+    top_ids = ids[top] if ids.ndim == 1 else np.take_along_axis(ids, top, axis=1)
+    return top_ids, np.take_along_axis(part_scores, order, axis=1)
+
+
+class AnnIndex:
+    """Inverted-file index for batched cosine nearest-neighbour queries."""
+
+    def __init__(self, n_lists: int | None = None, seed: int = 0) -> None:
+        """Initialize the AnnIndex class.
+
+        Parameters
+        ----------
+        n_lists : int | None
+            The number of inverted lists. Defaults to roughly sqrt(n) at build.
+        seed : int
+            Seed for the k-means initialisation and training sample.
+
+        """
+        self.n_lists = n_lists
+        self.seed = seed
+        self.centroids = np.empty((0, 0), dtype=np.float32)
+        self.vectors = np.empty((0, 0), dtype=np.float32)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.offsets = np.zeros(1, dtype=np.int64)
+        # Identifies the data the ids refer to, so a stale index can be detected
+        self.fingerprint = ""
+
+    def __len__(self) -> int:
+        """Return the number of indexed vectors."""
+        return self.ids.shape[0]
+
+    def build(self, embeddings: np.ndarray, fingerprint: str = "") -> AnnIndex:
+        """Train the coarse quantizer and bucket every embedding into a list.
+
+        Parameters
+        ----------
+        embeddings : np.ndarray
+            The vectors to index, one per row. Row positions become the ids
+            returned by `query`.
+        fingerprint : str
+            Optional identifier of the rows the embeddings were computed from,
+            saved with the index.
+
+        Returns
+        -------
+        AnnIndex
+            The built index.
+
+        """
+        vectors = normalize_rows(embeddings)
+        n_rows = vectors.shape[0]
+        if n_rows == 0:
+            error_message = "Cannot build an index from zero embeddings."
+            raise ValueError(error_message)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n_rows)))
+        n_lists = min(n_lists, n_rows)
+
+        self.centroids = self._train_centroids(vectors, n_lists)
+        assignments = self._assign(vectors)
+        order = np.argsort(assignments, kind="stable")
+        counts = np.bincount(assignments, minlength=n_lists)
+
+        self.n_lists = n_lists
+        self.vectors = vectors[order]
+        self.ids = order.astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self.fingerprint = fingerprint
+        log.info("Built ANN index with %d vectors in %d lists", n_rows, n_lists)
+        return self
+
+    def query(
+        self,
+        queries: np.ndarray,
+        k: int = 10,
+        n_probe: int = DEFAULT_N_PROBE,
+        labels: np.ndarray | None = None,
+        query_labels: np.ndarray | None = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Find the approximate top-k neighbours for a batch of queries.
+
+        Parameters
+        ----------
+        queries : np.ndarray
+            The query vectors, one per row.
+        k : int
+            The number of neighbours to return per query.
+        n_probe : int
+            The number of closest lists scanned per query. Higher is slower but
+            closer to the exact result; `n_probe >= n_lists` is exact.
+        labels : np.ndarray | None
+            Optional integer label of every indexed id, indexed by id. With
+            `query_labels`, a query only scores vectors carrying its label, so
+            the filter applies before the top-k rather than after it.
+        query_labels : np.ndarray | None
+            The label of every query, required with `labels`.
+
+        Returns
+        -------
+        tuple[np.ndarray, np.ndarray]
+            Row ids and cosine scores of the neighbours, each of shape
+            (n_queries, k) and sorted best first. Missing neighbours have id -1
+            and score -inf.
+
+        """
+        queries = normalize_rows(np.atleast_2d(queries))
+        n_queries = queries.shape[0]
+        best_ids = np.full((n_queries, k), -1, dtype=np.int64)
+        best_scores = np.full((n_queries, k), -np.inf, dtype=np.float32)
+        if len(self) == 0 or n_queries == 0 or k == 0:
+            return best_ids, best_scores
+
+        if (labels is None) != (query_labels is None):
+            error_message = "Pass both labels and query_labels, or neither."
+            raise ValueError(error_message)
+        list_labels = None if labels is None else np.asarray(labels)[self.ids]
+
+        n_probe = min(n_probe, self.n_lists)
+        probes, _ = _top_k(
+            queries @ self.centroids.T,
+            np.arange(self.n_lists),
+            n_probe,
+        )
+        # Score list by list so every list is a single matrix multiply against
+        # all the queries probing it, then merge into the running top-k.
+        list_ids = probes.ravel()
+        order = np.argsort(list_ids, kind="stable")
+        list_ids = list_ids[order]
+        query_ids = np.repeat(np.arange(n_queries), n_probe)[order]
+        boundaries = np.searchsorted(list_ids, np.arange(self.n_lists + 1))
+        for list_id in range(self.n_lists):
+            members = query_ids[boundaries[list_id] : boundaries[list_id + 1]]
+            start, end = self.offsets[list_id], self.offsets[list_id + 1]
+            if members.size == 0 or start == end:
+                continue
+            scores = queries[members] @ self.vectors[start:end].T
+            if list_labels is not None:
+                other = list_labels[None, start:end] != query_labels[members, None]
+                scores[other] = -np.inf
+            ids = np.broadcast_to(self.ids[start:end], scores.shape)
+            merged_ids, merged_scores = _top_k(
+                np.concatenate([best_scores[members], scores], axis=1),
+                np.concatenate([best_ids[members], ids], axis=1),
+                k,
+            )
+            width = merged_ids.shape[1]
+            best_ids[members, :width] = merged_ids
+            best_scores[members, :width] = merged_scores
+        # Filtered out vectors can fill the top-k of queries with few matches
+        best_ids[np.isneginf(best_scores)] = -1
+        return best_ids, best_scores
+
+    def save(self, path: str) -> None:
+        """Save the index to a `.npz` file.
+
+        Parameters
+        ----------
+        path : str
+            The file path to write to. The index is written next to it and
+            renamed, so a reader never loads a partly written index.
+
+        """
+        temporary_path = Path(path).with_name(f".{Path(path).name}.tmp")
+        with temporary_path.open("wb") as f:
+            np.savez(
+                f,
+                centroids=self.centroids,
+                vectors=self.vectors,
+                ids=self.ids,
+                offsets=self.offsets,
+                seed=np.int64(self.seed),
+                fingerprint=np.str_(self.fingerprint),
+            )
+        temporary_path.replace(path)
+
+    @classmethod
+    def load(cls, path: str) -> AnnIndex:
+        """Load an index written by `save`.
+
+        Parameters
+        ----------
+        path : str
+            The file path to read from.
+
+        Returns
+        -------
+        AnnIndex
+            The loaded index.
+
+        """
+        with np.load(path) as data:
+            index = cls(n_lists=data["centroids"].shape[0], seed=int(data["seed"]))
+            index.centroids = data["centroids"]
+            index.vectors = data["vectors"]
+            index.ids = data["ids"]
+            index.offsets = data["offsets"]
+            if "fingerprint" in data:
+                index.fingerprint = str(data["fingerprint"])
+        return index
+
+    def _train_centroids(self, vectors: np.ndarray, n_lists: int) -> np.ndarray:
+        rng = np.random.default_rng(self.seed)
+        n_samples = min(vectors.shape[0], n_lists * KMEANS_SAMPLES_PER_LIST)
+        sample = vectors[rng.choice(vectors.shape[0], n_samples, replace=False)]
+        centroids = sample[rng.choice(n_samples, n_lists, replace=False)].copy()
+        for _ in range(KMEANS_ITERATIONS):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            counts = np.bincount(assignments, minlength=n_lists)
+            # Re-seed empty lists from random samples so every list is used
+            empty = counts == 0
+            sums[empty] = sample[rng.choice(n_samples, int(empty.sum()))]
+            centroids = normalize_rows(sums)
+        return centroids
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        assignments = np.empty(vectors.shape[0], dtype=np.int64)
+        for start in range(0, vectors.shape[0], ASSIGNMENT_CHUNK_SIZE):
+            chunk = vectors[start : start + ASSIGNMENT_CHUNK_SIZE]
+            assignments[start : start + chunk.shape[0]] = np.argmax(
+                chunk @ self.centroids.T,
+                axis=1,
+            )
+        return assignments
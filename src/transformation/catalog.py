@@ -0,0 +1,471 @@
+"""Contains a compact, memory-mappable representation of the TZ catalog.
+
+The catalog used to live in every worker as a Polars DataFrame of strings.
+`CompactCatalog` keeps it as flat NumPy arrays instead:
+
+- make, category and subcategory are dictionary encoded, one int32 code per row
+  plus a small list of distinct values;
+- models are stored as a single UTF-8 byte buffer with int64 offsets;
+- exact-match lookups use a sorted array of 64-bit hashes of the canonical
+  (make_key, model_key) pair, so no per-key Python objects are needed.
+
+Row positions are the catalog row ids carried by resolution results. A snapshot
+is a directory of `.npy` files plus a JSON file with the dictionaries; loading
+it with `mmap=True` maps the arrays read-only, so forked workers share the same
+pages instead of holding a copy each. Strings are only decoded for the rows a
+caller asks for.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from pathlib import Path
+
+import numpy as np
+import polars as pl
+
+from src.transformation.normalize import (
+    MAKE_KEY,
+    MODEL_KEY,
+    add_make_model_keys,
+    make_model_key,
+    normalize_make_expr,
+)
+
+CATALOG_ROW_ID = "catalog_row_id"
+DICTIONARY_COLUMNS = ("make", "category", "subcategory")
+# Optional integer columns of the catalog query kept alongside the strings
+INTEGER_COLUMNS = ("id", "total_units")
+DICTIONARIES_FILE_NAME = "dictionaries.json"
+
+log = logging.getLogger(__name__)
+
+
+def key_hash(make_key: str | None, model_key: str | None) -> int:
+    """Hash a canonical (make_key, model_key) pair to a stable 64-bit integer.
+
+    Parameters
+    ----------
+    make_key : str | None
+        The canonical make key.
+    model_key : str | None
+        The canonical model key.
+
+    Returns
+    -------
+    int
+        The unsigned 64-bit hash, stable across processes and runs.
+
+    """
+    key = f"{make_key or ''}\x00{model_key or ''}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class CompactCatalog:
+    """Array-backed catalog with dictionary-encoded columns and row ids."""
+
+    def __init__(
+        self,
+        arrays: dict[str, np.ndarray],
+        dictionaries: dict[str, list[str]],
+    ) -> None:
+        """Initialize the CompactCatalog class.
+
+        Use `from_frame` or `load` rather than calling this directly.
+
+        Parameters
+        ----------
+        arrays : dict[str, np.ndarray]
+            The code, offset, byte and key index arrays.
+        dictionaries : dict[str, list[str]]
+            The distinct values of every dictionary-encoded column, plus the
+            canonical make key of every make.
+
+        """
+        self.arrays = arrays
+        self.dictionaries = dictionaries
+        # Object arrays to decode codes with, built once per catalog. Missing
+        # values have code -1, which picks the trailing None.
+        self.dictionary_values = {
+            column: np.array([*dictionaries[column], None], dtype=object)
+            for column in (*DICTIONARY_COLUMNS, MAKE_KEY)
+        }
+        # Most lookups miss, so decoding no rows returns a shared empty frame
+        self._empty_frame = pl.DataFrame(schema=self.decoded_schema)
+
+    def __len__(self) -> int:
+        """Return the number of catalog rows."""
+        return self.arrays["model_offsets"].shape[0] - 1
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the catalog arrays in bytes."""
+        return sum(array.nbytes for array in self.arrays.values())
+
+    @property
+    def integer_columns(self) -> list[str]:
+        """The optional integer columns present in this catalog."""
+        return [column for column in INTEGER_COLUMNS if column in self.arrays]
+
+    @property
+    def decoded_schema(self) -> dict[str, pl.DataType]:
+        """The columns and dtypes of decoded rows."""
+        return {
+            CATALOG_ROW_ID: pl.Int64,
+            **dict.fromkeys(self.integer_columns, pl.Int64),
+            "make": pl.Utf8,
+            "model": pl.Utf8,
+            "category": pl.Utf8,
+            "subcategory": pl.Utf8,
+        }
+
+    @classmethod
+    def from_frame(cls, df: pl.DataFrame) -> CompactCatalog:
+        """Encode a catalog DataFrame.
+
+        Parameters
+        ----------
+        df : pl.DataFrame
+            The catalog with make, model, category and subcategory columns and
+            optionally the integer columns in `INTEGER_COLUMNS`.
+
+        Returns
+        -------
+        CompactCatalog
+            The encoded catalog. Row ids are the row positions in `df`.
+
+        """
+        arrays = {}
+        dictionaries = {}
+        for column in DICTIONARY_COLUMNS:
+            values = df[column].cast(pl.Utf8)
+            # Dense ranks follow sorted order, so they index the sorted uniques
+            dictionaries[column] = values.drop_nulls().unique().sort().to_list()
+            arrays[f"{column}_codes"] = (
+                (values.rank("dense") - 1).fill_null(-1).cast(pl.Int32).to_numpy()
+            )
+        dictionaries[MAKE_KEY] = (
+            pl.Series("make", dictionaries["make"], dtype=pl.Utf8)
+            .to_frame()
+            .select(normalize_make_expr("make"))
+            .to_series()
+            .to_list()
+        )
+
+        models = [(model or "").encode() for model in df["model"].cast(pl.Utf8)]
+        arrays["model_offsets"] = np.concatenate(
+            [[0], np.cumsum([len(model) for model in models])],
+        ).astype(np.int64)
+        arrays["model_bytes"] = np.frombuffer(b"".join(models), dtype=np.uint8)
+
+        for column in INTEGER_COLUMNS:
+            if column in df.columns:
+                arrays[column] = df[column].fill_null(-1).cast(pl.Int64).to_numpy()
+
+        keyed = add_make_model_keys(df.select("make", "model"))
+        hashes = np.fromiter(
+            (
+                key_hash(make_key, model_key)
+                for make_key, model_key in zip(
+                    keyed[MAKE_KEY],
+                    keyed[MODEL_KEY],
+                    strict=True,
+                )
+            ),
+            dtype=np.uint64,
+            count=keyed.height,
+        )
+        # A stable sort keeps rows sharing a key in catalog order
+        order = np.argsort(hashes, kind="stable")
+        arrays["key_hashes"] = hashes[order]
+        arrays["key_row_ids"] = order.astype(np.int64)
+        return cls(arrays, dictionaries)
+
+    def save(self, path: str) -> None:
+        """Write the catalog as a snapshot directory.
+
+        Parameters
+        ----------
+        path : str
+            The directory to write to. It is created if missing.
+
+        """
+        directory = Path(path)
+        directory.mkdir(parents=True, exist_ok=True)
+        for name, array in self.arrays.items():
+            np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+        with (directory / DICTIONARIES_FILE_NAME).open("w") as f:
+            json.dump(self.dictionaries, f)
+        log.info("Saved catalog snapshot of %d rows to %s", len(self), path)
+
+    @classmethod
+    def load(cls, path: str, *, mmap: bool = True) -> CompactCatalog:
+        """Load a snapshot written by `save`.
+
+        Parameters
+        ----------
+        path : str
+            The snapshot directory.
+        mmap : bool
+            Whether to memory-map the arrays read-only instead of reading them
+            into memory. Mapped pages are shared by every process using the
+            snapshot, including forked workers.
+
+        Returns
+        -------
+        CompactCatalog
+            The loaded catalog.
+
+        """
+        directory = Path(path)
+        with (directory / DICTIONARIES_FILE_NAME).open("rb") as f:
+            dictionaries = json.load(f)
+        arrays = {
+            file.stem: np.load(file, mmap_mode="r" if mmap else None)
+            for file in sorted(directory.glob("*.npy"))
+        }
+        catalog = cls(arrays, dictionaries)
+        log.info(
+            "Loaded catalog snapshot of %d rows (%.1f MB) from %s",
+            len(catalog),
+            catalog.nbytes / 1e6,
+            path,
+        )
+        return catalog
+
+    def lookup(self, make: str, model: str) -> np.ndarray:
+        """Find the rows whose canonical make and model keys match.
+
+        Parameters
+        ----------
+        make : str
+            The make of the equipment.
+        model : str
+            The model of the equipment.
+
+        Returns
+        -------
+        np.ndarray
+            The matching catalog row ids in catalog order.
+
+        """
+        return self.lookup_keys(*make_model_key(make, model))
+
+    def lookup_keys(self, make_key: str | None, model_key: str | None) -> np.ndarray:
+        """Find the rows with the given canonical make and model keys.
+
+        Parameters
+        ----------
+        make_key : str | None
+            The canonical make key.
+        model_key : str | None
+            The canonical model key.
+
+        Returns
+        -------
+        np.ndarray
+            The matching catalog row ids in catalog order.
+
+        """
+        target = np.uint64(key_hash(make_key, model_key))
+        hashes = self.arrays["key_hashes"]
+        start = np.searchsorted(hashes, target, side="left")
+        end = np.searchsorted(hashes, target, side="right")
+        return np.asarray(self.arrays["key_row_ids"][start:end])
+
+    def models(self, row_ids: np.ndarray | list[int]) -> list[str]:
+        """Decode the model strings of some rows.
+
+        Parameters
+        ----------
+        row_ids : np.ndarray | list[int]
+            The catalog row ids.
+
+        Returns
+        -------
+        list[str]
+            The models in the order of `row_ids`.
+
+        """
+        offsets = self.arrays["model_offsets"]
+        model_bytes = self.arrays["model_bytes"]
+        return [
+            model_bytes[offsets[row_id] : offsets[row_id + 1]].tobytes().decode()
+            for row_id in row_ids
+        ]
+
+    def make_keys(self, row_ids: np.ndarray | list[int]) -> list[str | None]:
+        """Return the canonical make keys of some rows.
+
+        Parameters
+        ----------
+        row_ids : np.ndarray | list[int]
+            The catalog row ids.
+
+        Returns
+        -------
+        list[str | None]
+            The make keys in the order of `row_ids`, None for a missing make.
+
+        """
+        codes = self.arrays["make_codes"][np.asarray(row_ids, dtype=np.int64)]
+        return self.dictionary_values[MAKE_KEY][codes].tolist()
+
+    def make_key_labels(self) -> tuple[np.ndarray, dict[str, int]]:
+        """Label every row with an integer identifying its canonical make key.
+
+        Makes spelled differently share a label when their keys match, so the
+        labels can filter neighbour queries down to the same make.
+
+        Returns
+        -------
+        tuple[np.ndarray, dict[str, int]]
+            The label of every row, -1 for a missing make, and the label of
+            every make key.
+
+        """
+        labels: dict[str, int] = {}
+        make_labels = [
+            labels.setdefault(make_key, len(labels)) if make_key else -1
+            for make_key in self.dictionaries[MAKE_KEY]
+        ]
+        # Missing makes have code -1, which picks the trailing -1
+        make_labels = np.array([*make_labels, -1], dtype=np.int64)
+        return make_labels[self.arrays["make_codes"]], labels
+
+    def decode(self, row_ids: np.ndarray | list[int]) -> pl.DataFrame:
+        """Decode some rows back into a DataFrame of strings.
+
+        Parameters
+        ----------
+        row_ids : np.ndarray | list[int]
+            The catalog row ids to decode.
+
+        Returns
+        -------
+        pl.DataFrame
+            The `catalog_row_id`, the integer columns, make, model, category
+            and subcategory of the rows, in the order of `row_ids`.
+
+        """
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        if row_ids.size == 0:
+            return self._empty_frame
+        columns = {CATALOG_ROW_ID: row_ids}
+        columns.update(
+            {column: self.arrays[column][row_ids] for column in self.integer_columns},
+        )
+        codes = {
+            column: self.arrays[f"{column}_codes"][row_ids]
+            for column in DICTIONARY_COLUMNS
+        }
+        columns["make"] = self.dictionary_values["make"][codes["make"]].tolist()
+        columns["model"] = self.models(row_ids)
+        for column in ("category", "subcategory"):
+            columns[column] = self.dictionary_values[column][codes[column]].tolist()
+        # A single constructor call in the final column order, as building
+        # and reordering Series costs more than decoding a few rows
+        return pl.DataFrame(columns, schema=self.decoded_schema)
+
+    def fingerprint(self) -> str:
+        """Hash the catalog's rows, in order, to identify derived artefacts.
+
+        Returns
+        -------
+        str
+            A hex digest of the make, model, category and subcategory of every
+            row. It changes whenever the catalog's rows or their order change.
+
+        """
+        digest = hashlib.blake2b(digest_size=16)
+        for column in DICTIONARY_COLUMNS:
+            digest.update(json.dumps(self.dictionaries[column]).encode())
+            digest.update(np.ascontiguousarray(self.arrays[f"{column}_codes"]))
+        digest.update(np.ascontiguousarray(self.arrays["model_offsets"]))
+        digest.update(np.ascontiguousarray(self.arrays["model_bytes"]))
+        return digest.hexdigest()
+
+    def to_frame(self) -> pl.DataFrame:
+        """Decode the whole catalog into a DataFrame of strings."""
+        return self.decode(np.arange(len(self)))
+
+    def category_subcategory_pairs(self) -> list[str]:
+        """Return the distinct "category-subcategory" strings of the catalog.
+
+        Returns
+        -------
+        list[str]
+            The pairs in order of first appearance, skipping rows with a
+            missing category or subcategory.
+
+        """
+        category_codes = np.asarray(self.arrays["category_codes"], dtype=np.int64)
+        subcategory_codes = np.asarray(self.arrays["subcategory_codes"], dtype=np.int64)
+        present = (category_codes >= 0) & (subcategory_codes >= 0)
+        pairs = category_codes * len(self.dictionaries["subcategory"]) + (
+            subcategory_codes
+        )
+        _, first = np.unique(pairs[present], return_index=True)
+        rows = np.flatnonzero(present)[np.sort(first)]
+        categories = self.dictionaries["category"]
+        subcategories = self.dictionaries["subcategory"]
+        return [
+            f"{categories[category_codes[row]]}-{subcategories[subcategory_codes[row]]}"
+            for row in rows
+        ]
+
+    def category_subcategories(
+        self,
+        row_ids: np.ndarray | list[int],
+    ) -> list[str | None]:
+        """Return the "category-subcategory" string of some rows.
+
+        Parameters
+        ----------
+        row_ids : np.ndarray | list[int]
+            The catalog row ids.
+
+        Returns
+        -------
+        list[str | None]
+            The pairs in the order of `row_ids`, None where the category or
+            subcategory is missing.
+
+        """
+        row_ids = np.asarray(row_ids, dtype=np.int64)
+        categories = self.dictionary_values["category"][
+            self.arrays["category_codes"][row_ids]
+        ]
+        subcategories = self.dictionary_values["subcategory"][
+            self.arrays["subcategory_codes"][row_ids]
+        ]
+        return [
+            None
+            if category is None or subcategory is None
+            else f"{category}-{subcategory}"
+            for category, subcategory in zip(categories, subcategories, strict=True)
+        ]
+
+    def descriptions(self) -> list[str]:
+        """Describe every row as "category subcategory make model".
+
+        Returns
+        -------
+        list[str]
+            One description per catalog row, skipping missing values.
+
+        """
+        return (
+            self.to_frame()
+            .select(
+                pl.concat_str(
+                    ["category", "subcategory", "make", "model"],
+                    separator=" ",
+                    ignore_nulls=True,
+                ),
+            )
+            .to_series()
+            .to_list()
+        )
@@ -1,18 +1,48 @@
 """Contains functionality to map Anvil equipment data to TZ Cat + Subcat."""
 
 import logging
+import os
+import time
+from functools import lru_cache
+from pathlib import Path
 
 import numpy as np
 import polars as pl
-from sentence_transformers import SentenceTransformer, util
+from sentence_transformers import SentenceTransformer
 
+from src.transformation.ann_index import AnnIndex
+from src.transformation.catalog import (
+    CATALOG_ROW_ID,
+    DICTIONARIES_FILE_NAME,
+    CompactCatalog,
+)
+from src.transformation.embedding import (
+    SENTENCE_MODEL_NAME,
+    BatchEncoder,
+    load_sentence_model,
+    torch_threads,
+)
+from src.transformation.normalize import (
+    MAKE_KEY,
+    MODEL_KEY,
+    add_make_model_keys,
+    make_model_key,
+    make_model_keys,
+)
 from src.utils.io import read_from_databricks
-
-SENTENCE_MODEL = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+from src.utils.metrics import StageMetrics
 
 MAX_CHARACTERS_IN_ACROYNM = 3
 MIN_SIMILARITY_DEVIATION = 0.02
 BEST_SCORE_THRESHOLD = 0.5
+CATALOG_NEIGHBOUR_K = 10
+CATALOG_NEIGHBOUR_THRESHOLD = 0.7
+ENCODE_BATCH_SIZE = 256
+# Age after which a catalog snapshot is refreshed from Databricks
+SNAPSHOT_MAX_AGE_DAYS = 7
+SECONDS_PER_DAY = 86_400
+# Result fields decoded from the catalog row a result points at
+CATALOG_FIELDS = ("make", "model", "category", "subcategory")
 
 MAKE_MODEL_QUERY = """SELECT m2.id
      , m1.name AS make
@@ -32,13 +62,170 @@ ORDER BY total_units DESC"""
 log = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=1)
+def get_sentence_model() -> SentenceTransformer:
+    """Load the sentence encoder once per process, on first use.
+
+    The backend is chosen per worker, e.g. SENTENCE_MODEL_BACKEND=onnx-int8,
+    and SENTENCE_MODEL_ONNX_FILE overrides the int8 export chosen for the CPU.
+
+    Returns
+    -------
+    SentenceTransformer
+        The shared encoder.
+
+    """
+    return load_sentence_model(
+        SENTENCE_MODEL_NAME,
+        os.getenv("SENTENCE_MODEL_BACKEND", "torch"),
+        os.getenv("SENTENCE_MODEL_ONNX_FILE"),
+    )
+
+
 class CleanMakeModelData:
     """Class to clean make model data and map to TZ Cat + Subcat."""
 
-    def __init__(self) -> None:
-        """Initialize the CleanMakeModelData class."""
-        self.make_model_data = self.get_make_model_data()
+    def __init__(  # noqa: PLR0913
+        self,
+        snapshot_path: str = "",
+        *,
+        snapshot_max_age_days: float | None = SNAPSHOT_MAX_AGE_DAYS,
+        refresh_snapshot: bool = False,
+        collect_metrics: bool = True,
+        encoder: BatchEncoder | None = None,
+        num_threads: int | None = None,
+    ) -> None:
+        """Initialize the CleanMakeModelData class.
+
+        Parameters
+        ----------
+        snapshot_path : str
+            Optional catalog snapshot directory. An existing snapshot is
+            memory-mapped instead of querying Databricks, otherwise the fetched
+            catalog is saved there for the next run or worker.
+        snapshot_max_age_days : float | None
+            The age in days after which the snapshot is fetched again. None
+            keeps using an existing snapshot however old it is.
+        refresh_snapshot : bool
+            Whether to fetch the catalog and overwrite the snapshot even if it
+            is recent enough.
+        collect_metrics : bool
+            Whether to count calls, hits and latency of every matching tier in
+            `metrics`.
+        encoder : BatchEncoder | None
+            The encoder for semantic matching. Defaults to one wrapping the
+            shared sentence model.
+        num_threads : int | None
+            The CPU thread count used while encoding, including building the
+            catalog index. None keeps the encoder's setting.
+
+        """
+        if encoder is None:
+            encoder = BatchEncoder(get_sentence_model())
+        if num_threads is not None:
+            encoder.num_threads = num_threads
+        self.encoder = encoder
+        self.metrics = StageMetrics(enabled=collect_metrics)
+        if not refresh_snapshot and self._snapshot_is_recent(
+            snapshot_path,
+            snapshot_max_age_days,
+        ):
+            self.catalog = CompactCatalog.load(snapshot_path)
+        else:
+            self.make_model_data = self.get_make_model_data()
+            if snapshot_path:
+                self.catalog.save(snapshot_path)
         self.aggregated_data = pl.DataFrame()
+        # Keys of the rows being resolved, normalized in one vectorized pass
+        self._batch_keys: dict[tuple[str, str], tuple[str, str]] = {}
+
+    @property
+    def catalog(self) -> CompactCatalog:
+        """TZ make model data as a compact, array-backed catalog."""
+        return self._catalog
+
+    @catalog.setter
+    def catalog(self, catalog: CompactCatalog) -> None:
+        self._catalog = catalog
+        self._make_model_data: pl.DataFrame | None = None
+        # Index rows are catalog rows, so a new catalog needs a new index
+        self.catalog_index: AnnIndex | None = None
+        self._make_key_labels = np.empty(0, dtype=np.int64)
+        self._make_key_label_of: dict[str, int] = {}
+        self._semantic_score_matrix = np.empty((0, 0), dtype=np.float32)
+        self._group_positions: dict[str, int] = {}
+        self._subcat_positions: dict[str, int] = {}
+
+    @property
+    def make_model_data(self) -> pl.DataFrame:
+        """TZ make model data decoded from the catalog into strings, once."""
+        if self._make_model_data is None:
+            self._make_model_data = self.catalog.to_frame()
+        return self._make_model_data
+
+    @make_model_data.setter
+    def make_model_data(self, make_model_data: pl.DataFrame) -> None:
+        self.catalog = CompactCatalog.from_frame(make_model_data)
+
+    @staticmethod
+    def _snapshot_is_recent(snapshot_path: str, max_age_days: float | None) -> bool:
+        """Whether a catalog snapshot exists and is younger than the max age."""
+        dictionaries_path = Path(snapshot_path) / DICTIONARIES_FILE_NAME
+        if not snapshot_path or not dictionaries_path.exists():
+            return False
+        if max_age_days is None:
+            return True
+        age_days = (time.time() - dictionaries_path.stat().st_mtime) / SECONDS_PER_DAY
+        if age_days > max_age_days:
+            log.info(
+                "Catalog snapshot at %s is %.1f days old, refreshing",
+                snapshot_path,
+                age_days,
+            )
+            return False
+        return True
+
+    def _find_exact_matches(self, make: str, model: str) -> np.ndarray:
+        """Find the catalog row ids whose canonical make and model keys match."""
+        with self.metrics.stage("catalog_lookup") as stage:
+            row_ids = self.catalog.lookup_keys(*self._make_model_key(make, model))
+            stage.hit = row_ids.size > 0
+        return row_ids
+
+    def _make_model_key(self, make: str, model: str) -> tuple[str, str]:
+        """Return the keys normalized for the batch, else normalize this pair."""
+        keys = self._batch_keys.get((make, model))
+        return keys if keys is not None else make_model_key(make, model)
+
+    def _decode_results(self, results: list[dict]) -> list[dict]:
+        """Fill in the catalog strings of results that only carry a row id.
+
+        Matching keeps catalog row ids and leaves out the fields taken from the
+        catalog, so every row pointed at is decoded here in a single call.
+        """
+        row_ids = [
+            result[CATALOG_ROW_ID]
+            for result in results
+            if not all(field in result for field in CATALOG_FIELDS)
+        ]
+        if not row_ids:
+            return results
+        rows = self.catalog.decode(row_ids).iter_rows(named=True)
+        decoded = []
+        for result in results:
+            if all(field in result for field in CATALOG_FIELDS):
+                decoded.append(result)
+                continue
+            row = next(rows)
+            decoded.append(
+                {
+                    **{
+                        field: result.get(field, row[field]) for field in CATALOG_FIELDS
+                    },
+                    **result,
+                },
+            )
+        return decoded
 
     def clean_make_model_data(
         self,
@@ -69,70 +256,200 @@ class CleanMakeModelData:
         dict
             The cleaned make, model, category, and subcategory data.
 
+        """
+        return self.clean_make_model_batch([make], [model], [group])[0]
+
+    def clean_make_model_batch(
+        self,
+        makes: list[str],
+        models: list[str],
+        groups: list[str],
+    ) -> list[dict]:
+        """Correct and enrich a batch of make model data.
+
+        Resolves every row like `clean_make_model_data`, but the catalog
+        neighbour tier embeds and queries all the rows reaching it at once.
+
+        Parameters
+        ----------
+        makes : list[str]
+            The makes of the equipment.
+        models : list[str]
+            The models of the equipment.
+        groups : list[str]
+            The dealer designated equipment groups, may be empty strings.
+
+        Returns
+        -------
+        list[dict]
+            The cleaned make, model, category, and subcategory data per row.
+
+        """
+        rows = list(zip(makes, models, groups, strict=True))
+        # Every make spelling the tiers look up: as given, without special
+        # characters and expanded from an acronym. A single row is cheaper to
+        # normalize through the cached `make_model_key`.
+        if len(rows) > 1:
+            self._batch_keys = make_model_keys(
+                (variant, model)
+                for make, model, _ in rows
+                for variant in (
+                    make,
+                    "".join(e for e in make if e.isalnum()),
+                    self._synonym_make(make),
+                )
+                if variant
+            )
+        results = []
+        seconds = []
+        unresolved = []
+        for position, (make, model, group) in enumerate(rows):
+            start = time.perf_counter()
+            result, resolved = self._resolve_before_neighbours(make, model, group)
+            seconds.append(time.perf_counter() - start)
+            results.append(result)
+            if not resolved:
+                unresolved.append(position)
+
+        # check for nearest catalog entry by description embedding
+        if unresolved and self.catalog_index is not None:
+            start = time.perf_counter()
+            neighbour_checks = self._catalog_neighbours(
+                [makes[position] for position in unresolved],
+                [models[position] for position in unresolved],
+                [groups[position] for position in unresolved],
+            )
+            # The batch is shared evenly between the rows in it
+            share = (time.perf_counter() - start) / len(unresolved)
+            still_unresolved = []
+            for position, neighbour_check in zip(
+                unresolved,
+                neighbour_checks,
+                strict=True,
+            ):
+                hit = neighbour_check["best_fit_reason"] != "No Match"
+                self.metrics.record("catalog_neighbour", share, hit=hit)
+                seconds[position] += share
+                if hit:
+                    results[position] = neighbour_check
+                else:
+                    still_unresolved.append(position)
+            unresolved = still_unresolved
+
+        for position in unresolved:
+            start = time.perf_counter()
+            results[position] = self._resolve_after_neighbours(
+                *rows[position],
+                fallback=results[position],
+            )
+            seconds[position] += time.perf_counter() - start
+
+        for result, row_seconds in zip(results, seconds, strict=True):
+            self.metrics.record(
+                "resolve",
+                row_seconds,
+                hit=result["best_fit_reason"] != "No Match",
+            )
+        self._batch_keys = {}
+        return self._decode_results(results)
+
+    def _resolve_before_neighbours(
+        self,
+        make: str,
+        model: str,
+        group: str,
+    ) -> tuple[dict, bool]:
+        """Run the tiers before the catalog neighbour tier in order.
+
+        Returns the first hit and True, or the exact match result to fall back
+        on and False.
         """
         # check for exact match in make model data
-        exact_match = self._check_match(
-            make,
-            model,
-            group=group,
-            use_semantic_check=True,
-        )
-        synonym_make = None
-        if exact_match and exact_match[0]["best_fit_reason"] == "Exact Match":
-            return exact_match[0]
-        # check for acronym in make
-        if len(make) <= MAX_CHARACTERS_IN_ACROYNM:
-            synonym_make = self.make_synonym_list(make)
-            match_check = self._check_match(
-                synonym_make,
+        with self.metrics.stage("exact") as stage:
+            exact_match = self._check_match(
+                make,
                 model,
                 group=group,
                 use_semantic_check=True,
             )
-            if match_check and match_check[0]["best_fit_reason"] in [
-                "Acronym",
-                "Exact Match",
-            ]:
-                return match_check[0]
+            stage.hit = exact_match[0]["best_fit_reason"] == "Exact Match"
+        if stage.hit:
+            return exact_match[0], True
+        # check for acronym in make
+        synonym_make = self._synonym_make(make)
+        if synonym_make:
+            with self.metrics.stage("acronym") as stage:
+                match_check = self._check_match(
+                    synonym_make,
+                    model,
+                    group=group,
+                    use_semantic_check=True,
+                )
+                stage.hit = match_check[0]["best_fit_reason"] in [
+                    "Acronym",
+                    "Exact Match",
+                ]
+            if stage.hit:
+                return match_check[0], True
 
         # check for most most likely based on aggregated data
         if self.aggregated_data.shape[0] > 0:
-            aggregated_check = self.check_aggregated_data(make, model, group)
-            if aggregated_check and aggregated_check["category"] != "Unknown":
-                return aggregated_check
+            with self.metrics.stage("aggregated") as stage:
+                aggregated_check = self.check_aggregated_data(make, model, group)
+                stage.hit = aggregated_check["category"] != "Unknown"
+            if stage.hit:
+                return aggregated_check, True
 
         # check for semantic match
         if group:
-            semantic_check = self._check_match(
-                synonym_make if synonym_make else make,
+            with self.metrics.stage("semantic") as stage:
+                semantic_check = self._check_match(
+                    synonym_make if synonym_make else make,
+                    model,
+                    group=group,
+                    use_semantic_check=True,
+                )
+                stage.hit = semantic_check[0]["best_fit_reason"].startswith("Semantic")
+            if stage.hit:
+                return semantic_check[0], True
+
+        with self.metrics.stage("special_characters") as stage:
+            check_no_special_chars = self.check_with_no_special_characters(
+                make,
                 model,
-                group=group,
-                use_semantic_check=True,
+                group,
             )
-            if semantic_check and semantic_check[0]["best_fit_reason"].startswith(
-                "Semantic"
-            ):
-                return semantic_check[0]
-
-        check_no_special_chars = self.check_with_no_special_characters(
-            make,
-            model,
-            group,
-        )
-        if check_no_special_chars and (
-            check_no_special_chars["best_fit_reason"] != "No Match"
-        ):
-            return check_no_special_chars
+            stage.hit = check_no_special_chars["best_fit_reason"] != "No Match"
+        if stage.hit:
+            return check_no_special_chars, True
+        return exact_match[0], False
 
+    def _resolve_after_neighbours(
+        self,
+        make: str,
+        model: str,
+        group: str,
+        fallback: dict,
+    ) -> dict:
+        """Run the tiers after the catalog neighbour tier, else the fallback."""
         # check for best guess based on group
         if group:
-            best_guess = self.get_best_guess_cat_subcat(
-                synonym_make if synonym_make else make, model, group
-            )
-            if best_guess and best_guess["category"] != "Unknown":
+            synonym_make = self._synonym_make(make)
+            with self.metrics.stage("best_guess") as stage:
+                best_guess = self.get_best_guess_cat_subcat(
+                    synonym_make if synonym_make else make, model, group
+                )
+                stage.hit = best_guess["category"] != "Unknown"
+            if stage.hit:
                 return best_guess
 
-        return exact_match[0]
+        return fallback
+
+    def _synonym_make(self, make: str) -> str | None:
+        """Return the full name for a make short enough to be an acronym."""
+        if len(make) <= MAX_CHARACTERS_IN_ACROYNM:
+            return self.make_synonym_list(make)
+        return None
 
     def create_aggregated_data(
         self,
@@ -143,27 +460,39 @@ class CleanMakeModelData:
     ) -> None:
         """Create aggregated data for make model data."""
         temp_data = []
-        make_model_data = input_data[[make_col, model_col]].unique()
+        # Normalize the dealer columns once and find the most common group for
+        # every canonical make/model in a single pass
+        keyed_data = add_make_model_keys(input_data, make_col, model_col)
+        common_groups = (
+            keyed_data.drop_nulls(group_col)
+            .group_by([MAKE_KEY, MODEL_KEY, group_col])
+            .agg(pl.len().alias("count"))
+            .sort("count", descending=True)
+            .group_by([MAKE_KEY, MODEL_KEY], maintain_order=True)
+            .agg(pl.col(group_col).first())
+        )
+        make_model_data = (
+            keyed_data.select(make_col, model_col, MAKE_KEY, MODEL_KEY)
+            .unique()
+            .join(common_groups, on=[MAKE_KEY, MODEL_KEY], how="left")
+        )
+        self.prepare_semantic_scores(common_groups[group_col].to_list())
+        self._batch_keys = dict(
+            zip(
+                make_model_data.select(make_col, model_col).iter_rows(),
+                make_model_data.select(MAKE_KEY, MODEL_KEY).iter_rows(),
+                strict=True,
+            ),
+        )
         # Run _check_match for each row in input_data
-        for i in range(make_model_data.shape[0]):
-            make = make_model_data[make_col][i]
-            model = make_model_data[model_col][i]
+        for row in make_model_data.iter_rows(named=True):
+            make = row[make_col]
+            model = row[model_col]
             if not make or not model:
                 continue
             match = self._check_match(make, model, use_semantic_check=False)
             if match:
-                group = (
-                    input_data.filter(
-                        (pl.col(make_col).str.to_lowercase() == make.lower())
-                        & (pl.col(model_col).str.to_lowercase() == model.lower()),
-                    )
-                    .drop_nulls(group_col)
-                    .group_by(group_col)
-                    .agg(pl.count(group_col).alias("count"))
-                    .sort("count", descending=True)
-                    .to_numpy()
-                )
-                group = group[0][0] if group.any() else ""
+                group = row[group_col] or ""
                 if len(match) > 1 and group:
                     match_dict = self._check_match(
                         make,
@@ -176,38 +505,193 @@ class CleanMakeModelData:
                 match_dict["group"] = group
                 temp_data.append(match_dict)
 
-        self.aggregated_data = pl.DataFrame(temp_data)
+        self._batch_keys = {}
+        self.aggregated_data = pl.DataFrame(self._decode_results(temp_data))
+
+    def build_catalog_index(self, index_path: str = "") -> None:
+        """Build or load the ANN index over catalog description embeddings.
+
+        Each catalog row is described as "category subcategory make model". The
+        index ids are catalog row positions, and the catalog query orders rows
+        by unit count, which changes between refreshes. The index is therefore
+        saved with the catalog's fingerprint and only loaded from `index_path`
+        while that still matches, otherwise it is rebuilt and saved there.
+
+        Parameters
+        ----------
+        index_path : str
+            Optional `.npz` path to load the index from and save it to.
 
-    def _semantic_matching(self, group: str, group_pl: pl.DataFrame) -> dict:
-        subcats = (
-            group_pl.with_columns(
-                (pl.col("category") + "-" + pl.col("subcategory")).alias("combined")
+        """
+        self._make_key_labels, self._make_key_label_of = self.catalog.make_key_labels()
+        fingerprint = self.catalog.fingerprint()
+        if index_path and Path(index_path).exists():
+            index = AnnIndex.load(index_path)
+            if index.fingerprint == fingerprint:
+                self.catalog_index = index
+                return
+            log.warning("Catalog index at %s is stale, rebuilding", index_path)
+
+        descriptions = self.catalog.descriptions()
+        with torch_threads(self.encoder.num_threads):
+            embeddings = self.encoder.model.encode(
+                descriptions,
+                batch_size=ENCODE_BATCH_SIZE,
+                show_progress_bar=False,
+                normalize_embeddings=True,
             )
-            .select("combined")
-            .unique()
-            .to_series()
-            .to_list()
+        self.catalog_index = AnnIndex().build(embeddings, fingerprint)
+        if index_path:
+            self.catalog_index.save(index_path)
+
+    def check_catalog_neighbours(
+        self,
+        makes: list[str],
+        models: list[str],
+        groups: list[str],
+        k: int = CATALOG_NEIGHBOUR_K,
+    ) -> list[dict]:
+        """Find the closest catalog entries for a batch of equipment.
+
+        Used for rows with no exact make/model hit. Each row is embedded as
+        "group make model" and queried against every catalog entry with the
+        same canonical make, as a resolution must not replace the dealer's
+        make; rows whose make is not in the catalog get no match.
+
+        Parameters
+        ----------
+        makes : list[str]
+            The makes of the equipment.
+        models : list[str]
+            The models of the equipment.
+        groups : list[str]
+            The dealer designated equipment groups, may be empty strings.
+        k : int
+            The number of same-make neighbours to consider per row.
+
+        Returns
+        -------
+        list[dict]
+            The cleaned make, model, category, and subcategory data per row.
+
+        """
+        return self._decode_results(
+            self._catalog_neighbours(makes, models, groups, k=k),
         )
-        best_score = -1
-        best_subcat = ""
-        best_fit_reason = ""
-        scores = []
-        group_embedding = SENTENCE_MODEL.encode(
-            group, convert_to_tensor=True, show_progress_bar=False
+
+    def _catalog_neighbours(
+        self,
+        makes: list[str],
+        models: list[str],
+        groups: list[str],
+        k: int = CATALOG_NEIGHBOUR_K,
+    ) -> list[dict]:
+        """Find the closest catalog row ids, see `check_catalog_neighbours`."""
+        if self.catalog_index is None:
+            error_message = "Call build_catalog_index before querying neighbours."
+            raise ValueError(error_message)
+        no_match = {
+            "category": "Unknown",
+            "subcategory": "Unknown",
+            "best_fit_reason": "No Match",
+            "best_fit_score": -1,
+            CATALOG_ROW_ID: None,
+        }
+        results = [
+            {"make": make, "model": model, **no_match}
+            for make, model in zip(makes, models, strict=True)
+        ]
+        # Rows whose make is not in the catalog have no candidates to query
+        keys = make_model_keys(zip(makes, models, strict=True))
+        query_labels = np.array(
+            [
+                self._make_key_label_of.get(keys[make, model][0], -1)
+                for make, model in zip(makes, models, strict=True)
+            ],
+            dtype=np.int64,
         )
-        for subcat in subcats:
-            embedding = SENTENCE_MODEL.encode(
-                subcat, convert_to_tensor=True, show_progress_bar=False
-            )
-            sim_score = util.pytorch_cos_sim(group_embedding, embedding)
-            scores.append(sim_score.item())
-            if sim_score > best_score:
-                best_score = sim_score.item()
-                best_subcat = "-".join(subcat.split("-")[1:])
-                best_fit_reason = "Semantic - Best Match"
+        positions = np.flatnonzero(query_labels >= 0)
+        if positions.size == 0:
+            return results
+        queries = [
+            " ".join(value for value in (groups[i], makes[i], models[i]) if value)
+            for i in positions
+        ]
+        embeddings = self.encoder.encode(queries)
+        # Other makes are filtered out before the top-k, so a same-make
+        # candidate ranked below k among all makes is still found
+        neighbour_ids, neighbour_scores = self.catalog_index.query(
+            embeddings,
+            k=k,
+            labels=self._make_key_labels,
+            query_labels=query_labels[positions],
+        )
+        for position, row_id, score in zip(
+            positions,
+            neighbour_ids[:, 0],
+            neighbour_scores[:, 0],
+            strict=True,
+        ):
+            if row_id >= 0 and score >= CATALOG_NEIGHBOUR_THRESHOLD:
+                results[position] = {
+                    "best_fit_reason": "Semantic - Catalog Nearest Neighbour",
+                    "best_fit_score": float(score),
+                    CATALOG_ROW_ID: int(row_id),
+                }
+        return results
+
+    def prepare_semantic_scores(self, groups: list[str]) -> None:
+        """Score dealer groups against every catalog subcategory in one pass.
+
+        All distinct groups and catalog "category-subcategory" strings are
+        encoded in batches and scored with a single matrix multiply, so
+        semantic matching during a resolution pass only looks scores up.
+        Groups from earlier calls are kept.
+
+        Parameters
+        ----------
+        groups : list[str]
+            The dealer designated equipment groups of the resolution pass.
+
+        """
+        groups = list(
+            dict.fromkeys([*self._group_positions, *(g for g in groups if g)]),
+        )
+        subcats = self.catalog.category_subcategory_pairs()
+        self._semantic_score_matrix = self.encoder.similarity(groups, subcats)
+        self._group_positions = {group: i for i, group in enumerate(groups)}
+        self._subcat_positions = {subcat: i for i, subcat in enumerate(subcats)}
+        log.info(
+            "Prepared semantic scores for %d groups x %d subcategories",
+            len(groups),
+            len(subcats),
+        )
+
+    def _semantic_scores(self, group: str, subcats: list[str]) -> np.ndarray:
+        group_position = self._group_positions.get(group)
+        if group_position is not None and all(
+            subcat in self._subcat_positions for subcat in subcats
+        ):
+            return self._semantic_score_matrix[
+                group_position,
+                [self._subcat_positions[subcat] for subcat in subcats],
+            ]
+        return self.encoder.similarity([group], subcats)[0]
+
+    def _semantic_matching(self, group: str, row_ids: np.ndarray) -> dict:
+        pairs = self.catalog.category_subcategories(row_ids)
+        subcats = [pair for pair in dict.fromkeys(pairs) if pair is not None]
+        scores = self._semantic_scores(group, subcats).tolist()
+        best_index = int(np.argmax(scores))
+        best_score = scores[best_index]
+        # The first row with the best subcategory, else the most frequent row
+        subcategory_codes = self.catalog.arrays["subcategory_codes"][row_ids]
+        best_code = subcategory_codes[pairs.index(subcats[best_index])]
+        best_row_id = row_ids[int(np.argmax(subcategory_codes == best_code))]
+        best_fit_reason = "Semantic - Best Match"
 
         if best_score < BEST_SCORE_THRESHOLD:
-            best_subcat = group_pl["subcategory"][0]
+            best_row_id = row_ids[0]
             best_fit_reason = "Semantic - Most Frequent (No Good Match)"
 
         # check if best score is very similar to the other scores
@@ -218,18 +702,13 @@ class CleanMakeModelData:
         ):  # Case where the same equipment is listed twice in a subcategory
             second_best_score = 1
         if best_score - second_best_score < MIN_SIMILARITY_DEVIATION:
-            best_subcat = group_pl["subcategory"][0]
+            best_row_id = row_ids[0]
             best_fit_reason = "Semantic - Most Frequent (No Clear Best Match)"
 
-        best_fit = group_pl.filter(pl.col("subcategory") == best_subcat)
-
         return {
-            "make": best_fit["make"][0],
-            "model": best_fit["model"][0],
-            "category": best_fit["category"][0],
-            "subcategory": best_fit["subcategory"][0],
             "best_fit_reason": best_fit_reason,
             "best_fit_score": best_score,
+            CATALOG_ROW_ID: int(best_row_id),
         }
 
     def get_best_guess_cat_subcat(self, make: str, model: str, group: str) -> dict:
@@ -279,6 +758,7 @@ class CleanMakeModelData:
                 "subcategory": group_subcategory[0],
                 "best_fit_reason": "No Match - Estimate Cat/Subcat",
                 "best_fit_score": -1,
+                CATALOG_ROW_ID: None,
             }
         return {
             "make": make,
@@ -287,6 +767,7 @@ class CleanMakeModelData:
             "subcategory": "Unknown",
             "best_fit_reason": "No Match",
             "best_fit_score": -1,
+            CATALOG_ROW_ID: None,
         }
 
     def check_aggregated_data(self, make: str, model: str, group: str) -> dict:
@@ -319,6 +800,11 @@ class CleanMakeModelData:
                 "subcategory": match["subcategory"][0],
                 "best_fit_reason": "Exact Match",
                 "best_fit_score": 1,
+                CATALOG_ROW_ID: (
+                    match[CATALOG_ROW_ID][0]
+                    if CATALOG_ROW_ID in match.columns
+                    else None
+                ),
             }
 
         # Assume there are no good matches, get common cat/subcat\
@@ -355,6 +841,7 @@ class CleanMakeModelData:
                 "subcategory": group_subcategory[0],
                 "best_fit_reason": "Aggregated Most Likely",
                 "best_fit_score": -1,
+                CATALOG_ROW_ID: None,
             }
         return {
             "make": make,
@@ -363,6 +850,7 @@ class CleanMakeModelData:
             "subcategory": "Unknown",
             "best_fit_reason": "No Match",
             "best_fit_score": -1,
+            CATALOG_ROW_ID: None,
         }
 
     def _check_match(
@@ -399,12 +887,11 @@ class CleanMakeModelData:
         list
             The cleaned make, model, category, and subcategory data as a list in case
             there are the same make and model but different category and/or subcategory.
+            Matches carry a catalog row id instead of the catalog fields, which
+            `_decode_results` fills in.
 
         """
-        exact_match = self.make_model_data.filter(
-            (pl.col("make").str.to_lowercase() == make.lower())
-            & (pl.col("model").str.to_lowercase() == model.lower()),
-        )
+        exact_match = self._find_exact_matches(make, model)
         # check for acronym in make
         if len(make) <= MAX_CHARACTERS_IN_ACROYNM:
             synonym_make = self.make_synonym_list(make)
@@ -416,22 +903,22 @@ class CleanMakeModelData:
                 best_match_reason="Acronym",
             )
 
-        if use_semantic_check and group and exact_match.shape[0] > 1:
+        if use_semantic_check and group and exact_match.size > 1:
             return [self._semantic_matching(group, exact_match)]
 
-        if exact_match.shape[0] > 0:
+        if exact_match.size > 0:
             if not best_match_reason:
                 best_match_reason = "Exact Match"
+            # The category and subcategory are decoded from the row ids later
             return [
                 {
                     "make": make,
                     "model": model,
-                    "category": exact_match["category"][i],
-                    "subcategory": exact_match["subcategory"][i],
                     "best_fit_reason": best_match_reason,
                     "best_fit_score": 1,
+                    CATALOG_ROW_ID: int(row_id),
                 }
-                for i in range(exact_match.shape[0])
+                for row_id in exact_match
             ]
         return [
             {
@@ -441,6 +928,7 @@ class CleanMakeModelData:
                 "subcategory": "Unknown",
                 "best_fit_reason": "No Match",
                 "best_fit_score": -1,
+                CATALOG_ROW_ID: None,
             },
         ]
 
@@ -0,0 +1,530 @@
+"""Contains a declarative builder for per-dealer modeling tables.
+
+A `DatasetSpec` names a root object, the objects to join onto it and the
+objects to aggregate onto it. The join keys are not spelled out: they come from
+the `foreign_key_object` / `foreign_key_field` metadata of the semantic layer,
+so the same spec builds the account -> customer_equipment -> dealer_stock_unit
+-> user chain for every dealer. The whole table is planned as one lazy query,
+which lets Polars push filters and column selections down to the inputs, and
+is materialized with a single `collect()`.
+
+Joins along a one-to-many key multiply rows. Before collecting, the builder
+estimates the rows every join produces from the key counts of its inputs and
+logs them, warning about joins that fan out, so a blowup shows up in the log
+rather than as an out-of-memory worker.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+
+from src.transformation.semantic_layer import check_raw_files
+from src.transformation.translate import scan_csv_to_common_model
+
+# Average rows a join produces per input row before a warning is logged
+FAN_OUT_WARNING = 5.0
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class ForeignKey:
+    """A foreign key field of an object referencing a field of another."""
+
+    object: str
+    field: str
+    foreign_object: str
+    foreign_field: str
+
+
+@dataclass(frozen=True)
+class JoinStep:
+    """An object joined onto the dataset along a foreign key.
+
+    `via` names the foreign key field to join on, on either side, and is only
+    needed when the object can be reached along more than one foreign key.
+    `columns` selects the object's columns, and `filter` is applied to the
+    object before the join.
+    """
+
+    object: str
+    via: str | None = None
+    columns: tuple[str, ...] | None = None
+    filter: pl.Expr | None = None
+    how: str = "left"
+
+
+@dataclass(frozen=True)
+class Aggregation:
+    """An object aggregated per foreign key and joined onto the dataset."""
+
+    object: str
+    aggs: tuple[pl.Expr, ...]
+    via: str | None = None
+    filter: pl.Expr | None = None
+
+
+@dataclass(frozen=True)
+class DatasetSpec:
+    """A modeling table: a root object, joined objects and aggregated objects."""
+
+    root: str
+    columns: tuple[str, ...] | None = None
+    joins: tuple[JoinStep, ...] = ()
+    aggregations: tuple[Aggregation, ...] = ()
+    filter: pl.Expr | None = None
+
+
+@dataclass(frozen=True)
+class _Join:
+    """A join resolved against the semantic layer."""
+
+    object: str
+    left_object: str
+    left_field: str
+    right_field: str
+
+
+# The account-level chain built by hand in the dataset notebooks
+ACCOUNT_DATASET = DatasetSpec(
+    root="account",
+    columns=(
+        "account_id",
+        "account_number",
+        "account_owner_id",
+        "customer_segment",
+        "type_of_equipment",
+        "customer_loyalty",
+        "customer_business_class",
+        "engagement_level",
+    ),
+    joins=(
+        JoinStep(
+            "customer_equipment",
+            columns=(
+                "customer_equipment_id",
+                "account_id",
+                "dealer_stock_number",
+                "dealer_stock_unit",
+                "ce_status",
+                "ce_sale_date",
+                "ce_sale_amount",
+                "ce_last_service_date",
+            ),
+        ),
+        JoinStep(
+            "dealer_stock_unit",
+            via="dealer_stock_unit",
+            columns=(
+                "dealer_stock_unit_id",
+                "dsu_status",
+                "dsu_group",
+                "dsu_model_year",
+                "dsu_make",
+                "dsu_model",
+                "dsu_new_used",
+                "dsu_sale_price",
+                "dsu_sales_date",
+                "dsu_invoice_number",
+                "dsu_sold_by",
+            ),
+        ),
+        JoinStep(
+            "user",
+            via="account_owner_id",
+            columns=("user_id", "user_branch_location", "user_title", "user_active"),
+        ),
+    ),
+    aggregations=(
+        Aggregation(
+            "task",
+            via="task_account_id",
+            aggs=(
+                pl.col("task_id").count().alias("task_count"),
+                pl.col("task_activity_date").max().alias("last_task_date"),
+                pl.col("task_activity_date").min().alias("first_task_date"),
+            ),
+            filter=(pl.col("task_status") == "Completed")
+            & (
+                pl.col("task_subtype").is_in(["Email", "Call"])
+                | pl.col("task_subject").str.contains("Call Report")
+            ),
+        ),
+    ),
+)
+
+
+def foreign_keys(semantic_layer: dict, dealer: str) -> list[ForeignKey]:
+    """List the foreign keys a dealer maps in the semantic layer.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+    dealer : str
+        The dealer name used to identify field mappings in the semantic layer.
+
+    Returns
+    -------
+    list[ForeignKey]
+        One foreign key per field the dealer maps with a foreign key object.
+
+    """
+    keys = []
+    for object_name, fields in semantic_layer.items():
+        for field_name, field_data in fields.items():
+            for key_mapping in field_data["keys"]:
+                if key_mapping["org"] == dealer and key_mapping["foreign_key_object"]:
+                    keys.append(
+                        ForeignKey(
+                            object_name,
+                            field_name,
+                            key_mapping["foreign_key_object"],
+                            key_mapping["foreign_key_field"],
+                        ),
+                    )
+                    break
+    return keys
+
+
+def load_objects(
+    dealer: str,
+    object_names: list[str],
+    data_path: str,
+    semantic_layer_path: str,
+    optional: tuple[str, ...] = (),
+) -> dict[str, pl.LazyFrame]:
+    """Plan the translation of the raw CSV of each object of a dealer.
+
+    The semantic layer and the header and dtypes of every CSV are checked
+    first, so a bad mapping or file fails before any translation starts. The
+    objects are lazy scans, so the filters and columns of a dataset plan are
+    pushed down to the CSV readers.
+
+    Parameters
+    ----------
+    dealer : str
+        The dealer name.
+    object_names : list[str]
+        The objects to load, read from `<data_path>/<object-name>.csv`.
+    data_path : str
+        The directory holding the dealer's raw CSV files.
+    semantic_layer_path : str
+        The path to the semantic layer JSON file.
+    optional : tuple[str, ...]
+        The objects a dealer may not export, left out when their CSV is
+        missing.
+
+    Returns
+    -------
+    dict[str, pl.LazyFrame]
+        The translated objects by name.
+
+    Raises
+    ------
+    ValueError
+        If the semantic layer or any of the CSV files is invalid.
+
+    """
+    warnings = check_raw_files(
+        dealer,
+        object_names,
+        data_path,
+        semantic_layer_path,
+        optional,
+    )
+    missing = {issue.object for issue in warnings if issue.check == "file"}
+    return {
+        name: scan_csv_to_common_model(
+            str(Path(data_path) / f"{name.replace('_', '-')}.csv"),
+            dealer,
+            semantic_layer_path,
+            name,
+        )
+        for name in object_names
+        if name not in missing
+    }
+
+
+class DatasetBuilder:
+    """Plan and build modeling tables from a dealer's translated objects."""
+
+    def __init__(self, semantic_layer: dict, dealer: str) -> None:
+        """Initialize the DatasetBuilder class.
+
+        Parameters
+        ----------
+        semantic_layer : dict
+            The semantic layer dictionary.
+        dealer : str
+            The dealer name used to identify foreign keys in the semantic layer.
+
+        """
+        self.dealer = dealer
+        self.foreign_keys = foreign_keys(semantic_layer, dealer)
+
+    def resolve_join(
+        self,
+        joined: list[str],
+        object_name: str,
+        via: str | None,
+    ) -> _Join:
+        """Find the foreign key joining an object onto the joined objects.
+
+        Parameters
+        ----------
+        joined : list[str]
+            The objects already in the dataset.
+        object_name : str
+            The object to join.
+        via : str | None
+            The foreign key field to join on, on either side.
+
+        Returns
+        -------
+        _Join
+            The object and field on the dataset side and the field on the
+            object side.
+
+        """
+        candidates = [
+            _Join(object_name, key.foreign_object, key.foreign_field, key.field)
+            for key in self.foreign_keys
+            if key.object == object_name and key.foreign_object in joined
+        ] + [
+            _Join(object_name, key.object, key.field, key.foreign_field)
+            for key in self.foreign_keys
+            if key.foreign_object == object_name and key.object in joined
+        ]
+        if via is not None:
+            candidates = [
+                join
+                for join in candidates
+                if via in {join.left_field, join.right_field}
+            ]
+        if len(candidates) != 1:
+            found = [
+                f"{join.left_object}.{join.left_field} -> {join.right_field}"
+                for join in candidates
+            ]
+            error_message = (
+                f"Expected one foreign key joining '{object_name}' onto {joined} "
+                f"for dealer '{self.dealer}', found {found}."
+            )
+            raise ValueError(error_message)
+        return candidates[0]
+
+    def plan(
+        self,
+        spec: DatasetSpec,
+        objects: dict[str, pl.DataFrame | pl.LazyFrame],
+    ) -> pl.LazyFrame:
+        """Plan a modeling table as one lazy query.
+
+        Parameters
+        ----------
+        spec : DatasetSpec
+            The dataset to build.
+        objects : dict[str, pl.DataFrame | pl.LazyFrame]
+            The dealer's translated objects by name.
+
+        Returns
+        -------
+        pl.LazyFrame
+            The query producing the table. Joined columns that clash with a
+            column already in the dataset are suffixed with `_<object>`.
+
+        """
+        dataset = self._select(
+            objects[spec.root].lazy(),
+            spec.root,
+            spec.columns,
+        )
+        # Name of every (object, field) in the dataset, since clashes get renamed
+        names = {(spec.root, column): column for column in dataset.collect_schema()}
+        joined = [spec.root]
+        for step in [*spec.joins, *spec.aggregations]:
+            join = self.resolve_join(joined, step.object, step.via)
+            right = objects[step.object].lazy()
+            if step.filter is not None:
+                right = right.filter(step.filter)
+            if isinstance(step, Aggregation):
+                right = right.group_by(join.right_field).agg(*step.aggs)
+            else:
+                right = self._select(
+                    right,
+                    step.object,
+                    step.columns,
+                    join.right_field,
+                )
+            existing = set(dataset.collect_schema())
+            renames = {
+                column: f"{column}_{step.object}"
+                for column in right.collect_schema()
+                if column in existing
+            }
+            dataset = dataset.join(
+                right.rename(renames),
+                left_on=names[join.left_object, join.left_field],
+                right_on=renames.get(join.right_field, join.right_field),
+                how=getattr(step, "how", "left"),
+                coalesce=False,
+            )
+            names.update(
+                {
+                    (step.object, column): renames.get(column, column)
+                    for column in right.collect_schema()
+                },
+            )
+            joined.append(step.object)
+        if spec.filter is not None:
+            dataset = dataset.filter(spec.filter)
+        return dataset
+
+    def estimate_join_sizes(
+        self,
+        spec: DatasetSpec,
+        objects: dict[str, pl.DataFrame | pl.LazyFrame],
+    ) -> pl.DataFrame:
+        """Estimate the rows every join of a dataset produces.
+
+        The fan-out of a join is the average number of rows each row on the
+        dataset side produces, from the key counts of the two objects joined.
+        Joins are assumed independent, so the estimates multiply.
+
+        Parameters
+        ----------
+        spec : DatasetSpec
+            The dataset to build.
+        objects : dict[str, pl.DataFrame | pl.LazyFrame]
+            The dealer's translated objects by name.
+
+        Returns
+        -------
+        pl.DataFrame
+            One row per join with the objects and fields joined, the fan-out
+            and the estimated rows after the join.
+
+        """
+        joined = [spec.root]
+        queries = []
+        joins = []
+        for step in [*spec.joins, *spec.aggregations]:
+            join = self.resolve_join(joined, step.object, step.via)
+            right = objects[step.object].lazy()
+            if step.filter is not None:
+                right = right.filter(step.filter)
+            right_counts = (
+                right.group_by(pl.col(join.right_field).alias("key"))
+                .agg(pl.len().alias("right_count"))
+                .drop_nulls("key")
+            )
+            if isinstance(step, Aggregation):
+                # Aggregated objects add one row per key at most
+                right_counts = right_counts.with_columns(pl.lit(1).alias("right_count"))
+            unmatched_rows = 1 if getattr(step, "how", "left") == "left" else 0
+            queries.append(
+                objects[join.left_object]
+                .lazy()
+                .select(pl.col(join.left_field).alias("key"))
+                .join(right_counts, on="key", how="left")
+                .select(
+                    pl.len().alias("left_rows"),
+                    pl.col("right_count").fill_null(unmatched_rows).sum().alias("rows"),
+                ),
+            )
+            joins.append(join)
+            joined.append(step.object)
+
+        rows = objects[spec.root].lazy().select(pl.len()).collect().item()
+        estimates = []
+        for join, counts in zip(joins, pl.collect_all(queries), strict=True):
+            left_rows = counts["left_rows"][0]
+            fan_out = counts["rows"][0] / left_rows if left_rows else 0.0
+            rows = round(rows * fan_out)
+            estimates.append(
+                {
+                    "object": join.object,
+                    "left_object": join.left_object,
+                    "left_field": join.left_field,
+                    "right_field": join.right_field,
+                    "fan_out": fan_out,
+                    "estimated_rows": rows,
+                },
+            )
+        return pl.DataFrame(estimates)
+
+    def build(
+        self,
+        spec: DatasetSpec,
+        objects: dict[str, pl.DataFrame | pl.LazyFrame],
+        *,
+        log_estimates: bool = True,
+    ) -> pl.DataFrame:
+        """Build a modeling table with a single collect.
+
+        Parameters
+        ----------
+        spec : DatasetSpec
+            The dataset to build.
+        objects : dict[str, pl.DataFrame | pl.LazyFrame]
+            The dealer's translated objects by name.
+        log_estimates : bool
+            Whether to log the estimated size of every join first.
+
+        Returns
+        -------
+        pl.DataFrame
+            The modeling table.
+
+        """
+        if log_estimates and (spec.joins or spec.aggregations):
+            for estimate in self.estimate_join_sizes(spec, objects).iter_rows(
+                named=True,
+            ):
+                log.info(
+                    "Join %s.%s -> %s.%s for %s: %.2f rows per row, ~%d rows",
+                    estimate["left_object"],
+                    estimate["left_field"],
+                    estimate["object"],
+                    estimate["right_field"],
+                    self.dealer,
+                    estimate["fan_out"],
+                    estimate["estimated_rows"],
+                )
+                if estimate["fan_out"] > FAN_OUT_WARNING:
+                    log.warning(
+                        "Join onto %s fans out %.1fx for %s",
+                        estimate["object"],
+                        estimate["fan_out"],
+                        self.dealer,
+                    )
+        return self.plan(spec, objects).collect()
+
+    def _select(
+        self,
+        frame: pl.LazyFrame,
+        object_name: str,
+        columns: tuple[str, ...] | None,
+        key: str | None = None,
+    ) -> pl.LazyFrame:
+        if columns is None:
+            return frame
+        schema = frame.collect_schema()
+        selected = [column for column in columns if column in schema]
+        missing = [column for column in columns if column not in schema]
+        if missing:
+            # Fields the dealer does not map are left out rather than failing
+            log.warning(
+                "Leaving out %s.%s, which %s does not map",
+                object_name,
+                missing,
+                self.dealer,
+            )
+        if key is not None and key not in selected:
+            selected.append(key)
+        return frame.select(selected)
@@ -0,0 +1,354 @@
+"""Contains the sentence encoder backends and a batch encoding service.
+
+Semantic matching used to encode the dealer group and every candidate
+subcategory one string at a time. `BatchEncoder` instead collects the distinct
+strings of a resolution pass, encodes only the ones it has not seen in
+length-sorted batches, and caches the normalized vectors so scoring is a matrix
+multiply. The cache keeps the most recently used vectors up to a size limit.
+
+`load_sentence_model` selects the encoder backend. CPU-only workers can use the
+ONNX Runtime export of the model, optionally int8 quantized, or a dynamically
+int8-quantized PyTorch model. Every backend must stay within
+`COSINE_TOLERANCE` of the PyTorch reference embeddings.
+"""
+
+from __future__ import annotations
+
+import logging
+import platform
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+SENTENCE_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+ENCODER_BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+# ONNX exports of the model with int8 weights shipped in the model repository,
+# each tuned for an instruction set, from the most to the least specific
+ONNX_INT8_FILE_NAMES = {
+    "arm64": "onnx/model_qint8_arm64.onnx",
+    "avx512_vnni": "onnx/model_qint8_avx512_vnni.onnx",
+    "avx512f": "onnx/model_qint8_avx512.onnx",
+    "avx2": "onnx/model_quint8_avx2.onnx",
+}
+ARM_MACHINES = ("arm64", "aarch64")
+CPU_INFO_PATH = "/proc/cpuinfo"
+# Minimum cosine similarity between a backend's embedding and the PyTorch
+# reference embedding of the same string
+COSINE_TOLERANCE = 0.98
+
+DEFAULT_BATCH_SIZE = 64
+# Cached embeddings kept per encoder, about 1.5 KB each for a 384-dim model
+DEFAULT_CACHE_SIZE = 50_000
+BATCH_SIZE_CANDIDATES = (16, 32, 64, 128, 256)
+
+log = logging.getLogger(__name__)
+
+
+def cpu_flags() -> set[str]:
+    """Read the instruction set flags of the CPU.
+
+    Returns
+    -------
+    set[str]
+        The flags listed in /proc/cpuinfo, or an empty set where it is not
+        available, e.g. on macOS.
+
+    """
+    try:
+        with Path(CPU_INFO_PATH).open(encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.partition(":")[2].split())
+    except OSError:
+        pass
+    return set()
+
+
+def onnx_int8_file_name(
+    machine: str | None = None,
+    flags: set[str] | None = None,
+) -> str:
+    """Choose the int8 ONNX export that runs well on a CPU.
+
+    Parameters
+    ----------
+    machine : str | None
+        The machine architecture. None uses `platform.machine()`.
+    flags : set[str] | None
+        The CPU's instruction set flags. None uses `cpu_flags()`.
+
+    Returns
+    -------
+    str
+        The export for ARM CPUs, or for the most specific x86 instruction set
+        the CPU supports, falling back to AVX2.
+
+    """
+    machine = (machine or platform.machine()).lower()
+    if machine in ARM_MACHINES:
+        return ONNX_INT8_FILE_NAMES["arm64"]
+    flags = cpu_flags() if flags is None else flags
+    for flag, file_name in ONNX_INT8_FILE_NAMES.items():
+        if flag in flags:
+            return file_name
+    return ONNX_INT8_FILE_NAMES["avx2"]
+
+
+def load_sentence_model(
+    model_name: str = SENTENCE_MODEL_NAME,
+    backend: str = "torch",
+    onnx_file_name: str | None = None,
+) -> SentenceTransformer:
+    """Load the sentence encoder with the requested inference backend.
+
+    Parameters
+    ----------
+    model_name : str
+        The sentence-transformers model to load.
+    backend : str
+        One of "torch" (reference), "torch-int8" (dynamic int8 quantization of
+        the linear layers), "onnx" (ONNX Runtime) or "onnx-int8" (ONNX Runtime
+        with the int8 quantized export). The ONNX backends need the
+        `sentence-transformers[onnx]` extra.
+    onnx_file_name : str | None
+        The int8 export the "onnx-int8" backend loads from the model
+        repository. None chooses one for this CPU with `onnx_int8_file_name`.
+
+    Returns
+    -------
+    SentenceTransformer
+        The loaded encoder.
+
+    """
+    if backend not in ENCODER_BACKENDS:
+        error_message = (
+            f"Unknown encoder backend '{backend}', expected one of {ENCODER_BACKENDS}."
+        )
+        raise ValueError(error_message)
+    log.info("Loading %s with the %s backend", model_name, backend)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend == "onnx-int8":
+        onnx_file_name = onnx_file_name or onnx_int8_file_name()
+        log.info("Using the int8 export %s", onnx_file_name)
+        return SentenceTransformer(
+            model_name,
+            backend="onnx",
+            model_kwargs={"file_name": onnx_file_name},
+        )
+    if backend == "torch-int8":
+        model = SentenceTransformer(model_name, device="cpu")
+        return torch.ao.quantization.quantize_dynamic(
+            model,
+            {torch.nn.Linear},
+            dtype=torch.qint8,
+        )
+    return SentenceTransformer(model_name)
+
+
+def embedding_agreement(
+    reference: SentenceTransformer,
+    candidate: SentenceTransformer,
+    texts: list[str],
+) -> dict:
+    """Compare the embeddings of two encoders on the same strings.
+
+    Parameters
+    ----------
+    reference : SentenceTransformer
+        The reference encoder, normally the "torch" backend.
+    candidate : SentenceTransformer
+        The encoder to check.
+    texts : list[str]
+        The strings to embed with both encoders.
+
+    Returns
+    -------
+    dict
+        Minimum and mean cosine similarity between paired embeddings and
+        whether the minimum is within `COSINE_TOLERANCE`.
+
+    """
+    reference_embeddings = BatchEncoder(reference).encode(texts)
+    candidate_embeddings = BatchEncoder(candidate).encode(texts)
+    cosines = np.sum(reference_embeddings * candidate_embeddings, axis=1)
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "within_tolerance": bool(cosines.min() >= COSINE_TOLERANCE),
+    }
+
+
+@contextmanager
+def torch_threads(num_threads: int | None) -> Iterator[None]:
+    """Temporarily set the number of CPU threads torch uses.
+
+    Parameters
+    ----------
+    num_threads : int | None
+        The intra-op thread count. None leaves the torch default untouched.
+
+    """
+    if num_threads is None:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(num_threads)
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+
+class BatchEncoder:
+    """Encode distinct strings in batches and cache their normalized vectors."""
+
+    def __init__(
+        self,
+        model: SentenceTransformer,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        num_threads: int | None = None,
+        cache_size: int = DEFAULT_CACHE_SIZE,
+    ) -> None:
+        """Initialize the BatchEncoder class.
+
+        Parameters
+        ----------
+        model : SentenceTransformer
+            The sentence encoder.
+        batch_size : int
+            The number of strings per forward pass.
+        num_threads : int | None
+            The CPU thread count used while encoding. None uses the torch
+            default.
+        cache_size : int
+            The number of embeddings cached. The least recently used ones are
+            evicted beyond it.
+
+        """
+        self.model = model
+        self.batch_size = batch_size
+        self.num_threads = num_threads
+        self.cache_size = cache_size
+        self._cache: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    def __len__(self) -> int:
+        """Return the number of cached embeddings."""
+        return len(self._cache)
+
+    def encode(self, texts: list[str]) -> np.ndarray:
+        """Encode strings, reusing cached vectors for ones already seen.
+
+        Parameters
+        ----------
+        texts : list[str]
+            The strings to encode. Duplicates are encoded once.
+
+        Returns
+        -------
+        np.ndarray
+            L2-normalized embeddings in the order of `texts`.
+
+        """
+        vectors = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            vector = self._cache.get(text)
+            if vector is None:
+                missing.append(text)
+            else:
+                self._cache.move_to_end(text)
+                vectors[text] = vector
+        if missing:
+            # Sorting by length keeps similar lengths together so batches waste
+            # less compute on padding
+            missing.sort(key=len)
+            with torch_threads(self.num_threads):
+                embeddings = self.model.encode(
+                    missing,
+                    batch_size=self.batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                )
+            vectors.update(zip(missing, embeddings, strict=True))
+            self._cache.update(zip(missing, embeddings, strict=True))
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.stack([vectors[text] for text in texts])
+
+    def similarity(self, left: list[str], right: list[str]) -> np.ndarray:
+        """Score every left string against every right string.
+
+        Parameters
+        ----------
+        left : list[str]
+            The strings for the rows of the result.
+        right : list[str]
+            The strings for the columns of the result.
+
+        Returns
+        -------
+        np.ndarray
+            Cosine similarities of shape (len(left), len(right)).
+
+        """
+        if not left or not right:
+            return np.empty((len(left), len(right)), dtype=np.float32)
+        return self.encode(left) @ self.encode(right).T
+
+    def tune_batch_size(
+        self,
+        sample: list[str],
+        candidates: tuple[int, ...] = BATCH_SIZE_CANDIDATES,
+    ) -> int:
+        """Pick the batch size with the best throughput on a sample.
+
+        The sample is encoded once per candidate without touching the cache and
+        the fastest batch size is kept for later calls.
+
+        Parameters
+        ----------
+        sample : list[str]
+            Representative strings to time.
+        candidates : tuple[int, ...]
+            The batch sizes to try.
+
+        Returns
+        -------
+        int
+            The chosen batch size.
+
+        """
+        sample = sorted(set(sample), key=len)
+        if not sample:
+            return self.batch_size
+        timings = {}
+        with torch_threads(self.num_threads):
+            for batch_size in candidates:
+                start = time.perf_counter()
+                self.model.encode(
+                    sample,
+                    batch_size=batch_size,
+                    show_progress_bar=False,
+                    convert_to_numpy=True,
+                )
+                timings[batch_size] = time.perf_counter() - start
+        self.batch_size = min(timings, key=timings.get)
+        log.info(
+            "Tuned encoder batch size to %d (%.0f strings/s)",
+            self.batch_size,
+            len(sample) / timings[self.batch_size],
+        )
+        return self.batch_size
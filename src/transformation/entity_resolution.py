@@ -0,0 +1,503 @@
+"""Contains cross-dealer entity resolution over translated account objects.
+
+The same farm is usually an account at several dealers, keyed differently at
+each ("Smith, John" in one org, "JOHN SMITH FARMS INC" in another). Comparing
+every pair of accounts is quadratic, so accounts are first put into blocks that
+share a normalized key (name prefix and zip, name prefix and county, or phone)
+and only pairs within a block are scored. Blocks are processed in partitions
+holding a bounded number of candidate pairs, so memory stays flat however many
+accounts are resolved. Scoring is vectorized over all pairs of a partition, and
+matched pairs are clustered with a union-find into a global customer id.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import time
+
+import numpy as np
+import polars as pl
+
+DEALER = "dealer"
+ACCOUNT_ID = "account_id"
+GLOBAL_CUSTOMER_ID = "global_customer_id"
+CLUSTER_SIZE = "cluster_size"
+NODE = "node"
+BLOCK_KEY = "block_key"
+
+ACCOUNT_COLUMNS = (
+    ACCOUNT_ID,
+    "account_name",
+    "account_phone",
+    "county",
+    "billing_postal_code",
+)
+# Each rule blocks on the concatenation of its normalized columns. A row with a
+# null in any of them is not blocked by that rule.
+BLOCKING_RULES = {
+    "name_zip": ("name_prefix", "zip5"),
+    "name_county": ("name_prefix", "county_key"),
+    "phone": ("phone_key",),
+}
+# Weight of each comparison in the match score. Only comparisons where both
+# accounts have a value count, and a pair needs a name or phone to be scored.
+MATCH_WEIGHTS = {"name": 0.6, "phone": 0.25, "zip": 0.1, "county": 0.05}
+MATCH_THRESHOLD = 0.75
+MAX_BLOCK_SIZE = 1_000
+MAX_PAIRS_PER_PARTITION = 2_000_000
+NAME_PREFIX_LENGTH = 4
+MIN_PHONE_DIGITS = 7
+PHONE_DIGITS = 10
+ZIP_DIGITS = 5
+NAME_STOPWORDS = ["and", "co", "company", "corp", "inc", "llc", "ltd", "the"]
+
+log = logging.getLogger(__name__)
+
+
+def stack_accounts(accounts: dict[str, pl.DataFrame]) -> pl.DataFrame:
+    """Stack translated account objects of several dealers into one frame.
+
+    Parameters
+    ----------
+    accounts : dict[str, pl.DataFrame]
+        Translated account objects keyed by dealer. Columns of
+        `ACCOUNT_COLUMNS` a dealer does not export are filled with nulls.
+
+    Returns
+    -------
+    pl.DataFrame
+        The dealer column followed by `ACCOUNT_COLUMNS` as strings.
+
+    """
+    frames = [
+        df.select(
+            pl.lit(dealer).alias(DEALER),
+            *[
+                (pl.col(column) if column in df.columns else pl.lit(None))
+                .cast(pl.Utf8)
+                .alias(column)
+                for column in ACCOUNT_COLUMNS
+            ],
+        )
+        for dealer, df in accounts.items()
+    ]
+    if not frames:
+        error_message = "At least one dealer's accounts are needed."
+        raise ValueError(error_message)
+    return pl.concat(frames)
+
+
+def normalize_accounts(accounts: pl.DataFrame) -> pl.DataFrame:
+    """Build the normalized name, phone, zip and county keys of every account.
+
+    Parameters
+    ----------
+    accounts : pl.DataFrame
+        Accounts as returned by `stack_accounts`.
+
+    Returns
+    -------
+    pl.DataFrame
+        One row per account with a `node` row number, the dealer, the account
+        id, the sorted name tokens and the blocking keys.
+
+    """
+    name_tokens = (
+        pl.col("account_name")
+        .str.to_lowercase()
+        .str.replace_all(r"[^a-z0-9]+", " ")
+        .str.strip_chars()
+        .str.split(" ")
+        .list.eval(
+            pl.element().filter(
+                (pl.element() != "") & ~pl.element().is_in(NAME_STOPWORDS),
+            ),
+        )
+        .list.unique()
+        .list.sort()
+    )
+    phone_digits = pl.col("account_phone").str.replace_all(r"\D", "")
+    zip_digits = pl.col("billing_postal_code").str.replace_all(r"\D", "")
+    return (
+        accounts.with_row_index(NODE)
+        .with_columns(
+            name_tokens.alias("name_tokens"),
+            pl.when(phone_digits.str.len_chars() >= MIN_PHONE_DIGITS)
+            .then(phone_digits.str.slice(-PHONE_DIGITS))
+            .alias("phone_key"),
+            pl.when(zip_digits.str.len_chars() >= ZIP_DIGITS)
+            .then(zip_digits.str.slice(0, ZIP_DIGITS))
+            .alias("zip5"),
+            pl.col("county")
+            .str.to_lowercase()
+            .str.replace_all(r"\bcounty\b|[^a-z]", "")
+            .replace("", None)
+            .alias("county_key"),
+        )
+        .with_columns(
+            pl.when(pl.col("name_tokens").list.len() > 0)
+            .then(pl.col("name_tokens").list.join(" ").str.slice(0, NAME_PREFIX_LENGTH))
+            .alias("name_prefix"),
+        )
+        .select(
+            NODE,
+            DEALER,
+            ACCOUNT_ID,
+            "name_tokens",
+            "name_prefix",
+            "phone_key",
+            "zip5",
+            "county_key",
+        )
+    )
+
+
+class UnionFind:
+    """Disjoint sets over integer nodes, with the smallest node as each root."""
+
+    def __init__(self, n_nodes: int) -> None:
+        """Initialize the UnionFind class.
+
+        Parameters
+        ----------
+        n_nodes : int
+            The number of nodes, each starting in its own set.
+
+        """
+        self.parent = np.arange(n_nodes, dtype=np.int64)
+
+    def find(self, node: int) -> int:
+        """Find the root of a node, halving the path on the way."""
+        parent = self.parent
+        while parent[node] != node:
+            parent[node] = parent[parent[node]]
+            node = parent[node]
+        return int(node)
+
+    def union(self, left: np.ndarray, right: np.ndarray) -> None:
+        """Merge the sets of each pair of nodes.
+
+        Parameters
+        ----------
+        left : np.ndarray
+            First node of every pair.
+        right : np.ndarray
+            Second node of every pair.
+
+        """
+        for left_node, right_node in zip(left.tolist(), right.tolist(), strict=True):
+            left_root = self.find(left_node)
+            right_root = self.find(right_node)
+            if left_root != right_root:
+                self.parent[max(left_root, right_root)] = min(left_root, right_root)
+
+    def roots(self) -> np.ndarray:
+        """Resolve the root of every node at once.
+
+        Returns
+        -------
+        np.ndarray
+            The root of each node, by node.
+
+        """
+        roots = self.parent.copy()
+        while True:
+            next_roots = roots[roots]
+            if np.array_equal(next_roots, roots):
+                return roots
+            roots = next_roots
+
+
+def _global_customer_id(key: str) -> str:
+    return hashlib.blake2b(key.encode("utf-8"), digest_size=8).hexdigest()
+
+
+class AccountResolver:
+    """Link accounts across dealers and assign each a global customer id."""
+
+    def __init__(  # noqa: PLR0913
+        self,
+        threshold: float = MATCH_THRESHOLD,
+        *,
+        weights: dict[str, float] | None = None,
+        blocking_rules: dict[str, tuple[str, ...]] | None = None,
+        max_block_size: int = MAX_BLOCK_SIZE,
+        max_pairs_per_partition: int = MAX_PAIRS_PER_PARTITION,
+        cross_dealer_only: bool = True,
+    ) -> None:
+        """Initialize the AccountResolver class.
+
+        Parameters
+        ----------
+        threshold : float
+            The minimum match score for two accounts to be linked.
+        weights : dict[str, float] | None
+            Weights of the name, phone, zip and county comparisons. Defaults to
+            `MATCH_WEIGHTS`.
+        blocking_rules : dict[str, tuple[str, ...]] | None
+            Blocking rules by name. Defaults to `BLOCKING_RULES`.
+        max_block_size : int
+            Blocks with more accounts than this are skipped, since a key shared
+            by that many accounts (e.g. a dealer's own phone number) does not
+            identify a customer.
+        max_pairs_per_partition : int
+            The number of candidate pairs scored at once, which bounds memory.
+        cross_dealer_only : bool
+            Whether to only compare accounts of different dealers.
+
+        """
+        self.threshold = threshold
+        self.weights = weights or MATCH_WEIGHTS
+        self.blocking_rules = blocking_rules or BLOCKING_RULES
+        self.max_block_size = max_block_size
+        self.max_pairs_per_partition = max_pairs_per_partition
+        self.cross_dealer_only = cross_dealer_only
+        self.metrics: dict[str, float] = {}
+        self._skipped_blocks = 0
+
+    def resolve(self, accounts: pl.DataFrame) -> pl.DataFrame:
+        """Cluster accounts into customers.
+
+        Parameters
+        ----------
+        accounts : pl.DataFrame
+            Accounts as returned by `stack_accounts`.
+
+        Returns
+        -------
+        pl.DataFrame
+            The dealer, account id, global customer id and cluster size of every
+            account. Metrics of the run are left in `metrics`.
+
+        """
+        start = time.perf_counter()
+        features = normalize_accounts(accounts)
+        blocks = self.build_blocks(features)
+        union_find = UnionFind(features.height)
+        pairs_compared = 0
+        matched_pairs = 0
+        for _, partition in blocks.group_by("partition", maintain_order=True):
+            pairs = self._candidate_pairs(partition)
+            pairs_compared += pairs.height
+            matches = pairs.filter(self.score_pairs(features, pairs) >= self.threshold)
+            matched_pairs += matches.height
+            union_find.union(
+                matches[NODE].to_numpy(),
+                matches[f"{NODE}_right"].to_numpy(),
+            )
+
+        result = self._assign_ids(features, union_find.roots())
+        self.metrics = self._summarize(features, blocks, result)
+        self.metrics.update(
+            {
+                "pairs_compared": pairs_compared,
+                "matched_pairs": matched_pairs,
+                "reduction_ratio": 1 - pairs_compared / self.metrics["possible_pairs"]
+                if self.metrics["possible_pairs"]
+                else 0.0,
+                "seconds": time.perf_counter() - start,
+            },
+        )
+        log.info(
+            "Resolved %d accounts into %d customers comparing %d of %d pairs",
+            features.height,
+            self.metrics["clusters"],
+            pairs_compared,
+            self.metrics["possible_pairs"],
+        )
+        return result
+
+    def build_blocks(self, features: pl.DataFrame) -> pl.DataFrame:
+        """Assign every account to its blocks, and every block to a partition.
+
+        Parameters
+        ----------
+        features : pl.DataFrame
+            Accounts as returned by `normalize_accounts`.
+
+        Returns
+        -------
+        pl.DataFrame
+            One row per account and block with the node, dealer, block key,
+            block size and partition. Blocks that cannot hold a candidate pair
+            or are larger than `max_block_size` are left out.
+
+        """
+        memberships = pl.concat(
+            [
+                features.select(
+                    NODE,
+                    DEALER,
+                    pl.concat_str(
+                        [pl.lit(rule), *[pl.col(column) for column in columns]],
+                        separator="|",
+                    ).alias(BLOCK_KEY),
+                ).drop_nulls(BLOCK_KEY)
+                for rule, columns in self.blocking_rules.items()
+            ],
+        ).unique([NODE, BLOCK_KEY])
+        sizes = memberships.group_by(BLOCK_KEY).agg(
+            pl.len().alias("block_size"),
+            pl.col(DEALER).n_unique().alias("block_dealers"),
+        )
+        if self.cross_dealer_only:
+            sizes = sizes.filter(pl.col("block_dealers") > 1)
+        else:
+            sizes = sizes.filter(pl.col("block_size") > 1)
+        oversized = sizes.filter(pl.col("block_size") > self.max_block_size)
+        if not oversized.is_empty():
+            log.warning(
+                "Skipping %d blocks with more than %d accounts",
+                oversized.height,
+                self.max_block_size,
+            )
+        self._skipped_blocks = oversized.height
+        sizes = (
+            sizes.filter(pl.col("block_size") <= self.max_block_size)
+            .sort(BLOCK_KEY)
+            .with_columns(
+                (
+                    (pl.col("block_size") * (pl.col("block_size") - 1) // 2)
+                    .cum_sum()
+                    .shift(fill_value=0)
+                    // self.max_pairs_per_partition
+                ).alias("partition"),
+            )
+        )
+        return memberships.join(
+            sizes.select(BLOCK_KEY, "block_size", "partition"),
+            on=BLOCK_KEY,
+        )
+
+    def _candidate_pairs(self, partition: pl.DataFrame) -> pl.DataFrame:
+        members = partition.select(NODE, DEALER, BLOCK_KEY)
+        pairs = members.join(members, on=BLOCK_KEY, suffix="_right").filter(
+            pl.col(NODE) < pl.col(f"{NODE}_right"),
+        )
+        if self.cross_dealer_only:
+            pairs = pairs.filter(pl.col(DEALER) != pl.col(f"{DEALER}_right"))
+        # A pair sharing several blocks of the partition is scored once
+        return pairs.select(NODE, f"{NODE}_right").unique()
+
+    def score_pairs(self, features: pl.DataFrame, pairs: pl.DataFrame) -> pl.Series:
+        """Score candidate pairs of accounts in one vectorized pass.
+
+        Parameters
+        ----------
+        features : pl.DataFrame
+            Accounts as returned by `normalize_accounts`.
+        pairs : pl.DataFrame
+            Candidate pairs as `node` and `node_right` columns.
+
+        Returns
+        -------
+        pl.Series
+            The weighted share of comparisons that agree, by pair. The name
+            comparison is the Jaccard similarity of the name tokens.
+
+        """
+        columns = ["name_tokens", "phone_key", "zip5", "county_key"]
+        left = features.select(columns)[pairs[NODE]]
+        right = features.select(columns)[pairs[f"{NODE}_right"]]
+        compared = left.hstack(right.rename(lambda c: f"{c}_right").get_columns())
+        similarities = {
+            "name": pl.col("name_tokens")
+            .list.set_intersection(pl.col("name_tokens_right"))
+            .list.len()
+            / pl.col("name_tokens")
+            .list.set_union(pl.col("name_tokens_right"))
+            .list.len(),
+            "phone": (pl.col("phone_key") == pl.col("phone_key_right")).cast(
+                pl.Float64,
+            ),
+            "zip": (pl.col("zip5") == pl.col("zip5_right")).cast(pl.Float64),
+            "county": (pl.col("county_key") == pl.col("county_key_right")).cast(
+                pl.Float64,
+            ),
+        }
+        # Empty token lists give NaN, which counts as not compared
+        similarities["name"] = similarities["name"].fill_nan(None)
+        weighted = pl.sum_horizontal(
+            [
+                (similarity * self.weights[name]).fill_null(0)
+                for name, similarity in similarities.items()
+            ],
+        )
+        total_weight = pl.sum_horizontal(
+            [
+                similarity.is_not_null().cast(pl.Float64) * self.weights[name]
+                for name, similarity in similarities.items()
+            ],
+        )
+        identified = (
+            similarities["name"].is_not_null() | similarities["phone"].is_not_null()
+        )
+        return compared.select(
+            pl.when(identified & (total_weight > 0))
+            .then(weighted / total_weight)
+            .otherwise(0.0)
+            .alias("score"),
+        ).to_series()
+
+    @staticmethod
+    def _assign_ids(features: pl.DataFrame, roots: np.ndarray) -> pl.DataFrame:
+        clustered = features.select(NODE, DEALER, ACCOUNT_ID).with_columns(
+            pl.Series("root", roots),
+            pl.concat_str(
+                [
+                    pl.col(DEALER),
+                    pl.col(ACCOUNT_ID).fill_null(pl.col(NODE).cast(pl.Utf8)),
+                ],
+                separator="|",
+            ).alias("member_key"),
+        )
+        # The id derives from the smallest member key, so it does not depend on
+        # the order accounts were read in
+        clusters = clustered.group_by("root").agg(
+            pl.col("member_key").min(),
+            pl.len().alias(CLUSTER_SIZE),
+        )
+        clusters = clusters.with_columns(
+            pl.Series(
+                GLOBAL_CUSTOMER_ID,
+                [_global_customer_id(key) for key in clusters["member_key"]],
+                dtype=pl.Utf8,
+            ),
+        )
+        return (
+            clustered.join(clusters.drop("member_key"), on="root")
+            .sort(NODE)
+            .select(DEALER, ACCOUNT_ID, GLOBAL_CUSTOMER_ID, CLUSTER_SIZE)
+        )
+
+    def _summarize(
+        self,
+        features: pl.DataFrame,
+        blocks: pl.DataFrame,
+        result: pl.DataFrame,
+    ) -> dict[str, float]:
+        n_accounts = features.height
+        if self.cross_dealer_only:
+            dealer_sizes = features[DEALER].value_counts()["count"].to_numpy()
+            possible_pairs = (n_accounts**2 - int((dealer_sizes**2).sum())) // 2
+        else:
+            possible_pairs = n_accounts * (n_accounts - 1) // 2
+        block_sizes = blocks.unique(BLOCK_KEY)["block_size"].to_numpy().astype(np.int64)
+        clusters = result.group_by(GLOBAL_CUSTOMER_ID).agg(
+            pl.len().alias("size"),
+            pl.col(DEALER).n_unique().alias("dealers"),
+        )
+        return {
+            "accounts": n_accounts,
+            "dealers": features[DEALER].n_unique(),
+            "possible_pairs": possible_pairs,
+            "blocks": len(block_sizes),
+            "skipped_blocks": self._skipped_blocks,
+            "max_block_size": int(block_sizes.max()) if len(block_sizes) else 0,
+            "candidate_pairs": int((block_sizes * (block_sizes - 1) // 2).sum()),
+            "partitions": blocks["partition"].n_unique(),
+            "clusters": clusters.height,
+            "linked_accounts": int(clusters.filter(pl.col("size") > 1)["size"].sum()),
+            "multi_dealer_clusters": clusters.filter(pl.col("dealers") > 1).height,
+        }
@@ -0,0 +1,177 @@
+"""Contains functionality to build canonical make and model keys for matching.
+
+Dealers key the same machine many ways ("8270R" vs "8270 R", "S-680" vs "S680",
+"X300 2015", "9570R S/N 1RW9570RAKD012345"). The expressions in this module
+reduce make and model columns to canonical keys in a single vectorized pass so
+lookups against the TZ catalog compare keys instead of raw strings.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+MAKE_KEY = "make_key"
+MODEL_KEY = "model_key"
+
+# Serial / PIN noise appended to the model, e.g. "8270R S/N 1RW8270R..." or
+# "S680 (PIN: 1H0S680...)". Everything from the marker to the end is dropped.
+SERIAL_NOISE_PATTERN = (
+    r"[\s,;(\[]+(?:s/n|sn|serial|ser|pin)\b\s*(?:no\b|num\b|number\b)?[\s#:.]*.*$"
+)
+# Trailing model year, e.g. "X300 (2015)" or "X300 2015". A bare trailing year is
+# only dropped when the rest of the model still carries a digit, so catalog
+# models such as "Gator 2030" or "Series 2000" keep their number.
+BRACKETED_YEAR_PATTERN = r"\s*[(\[](?:19[5-9]\d|20[0-4]\d)[)\]]$"
+YEAR_NOISE_PATTERN = r"\s+(?:19[5-9]\d|20[0-4]\d)$"
+NON_ALPHANUMERIC_PATTERN = r"[^a-z0-9]"
+
+KEY_CACHE_SIZE = 65_536
+
+
+def _to_expr(column: str | pl.Expr) -> pl.Expr:
+    return pl.col(column) if isinstance(column, str) else column
+
+
+def normalize_make_expr(make: str | pl.Expr) -> pl.Expr:
+    """Build an expression producing the canonical make key.
+
+    Parameters
+    ----------
+    make : str | pl.Expr
+        The make column name or an expression evaluating to the make.
+
+    Returns
+    -------
+    pl.Expr
+        Lower-cased make with everything but letters and digits removed.
+
+    """
+    return (
+        _to_expr(make)
+        .cast(pl.Utf8)
+        .str.to_lowercase()
+        .str.replace_all(NON_ALPHANUMERIC_PATTERN, "")
+    )
+
+
+def normalize_model_expr(model: str | pl.Expr) -> pl.Expr:
+    """Build an expression producing the canonical model key.
+
+    Parameters
+    ----------
+    model : str | pl.Expr
+        The model column name or an expression evaluating to the model.
+
+    Returns
+    -------
+    pl.Expr
+        Lower-cased model with trailing serial and year noise stripped and
+        everything but letters and digits removed.
+
+    """
+    model_expr = (
+        _to_expr(model)
+        .cast(pl.Utf8)
+        .str.to_lowercase()
+        .str.strip_chars()
+        .str.replace(SERIAL_NOISE_PATTERN, "")
+        .str.strip_chars()
+        .str.replace(BRACKETED_YEAR_PATTERN, "")
+    )
+    without_year = model_expr.str.replace(YEAR_NOISE_PATTERN, "")
+    return (
+        pl.when(without_year.str.contains(r"\d"))
+        .then(without_year)
+        .otherwise(model_expr)
+        .str.replace_all(NON_ALPHANUMERIC_PATTERN, "")
+    )
+
+
+def add_make_model_keys(
+    df: pl.DataFrame,
+    make_col: str = "make",
+    model_col: str = "model",
+) -> pl.DataFrame:
+    """Add canonical make and model key columns to a DataFrame.
+
+    Parameters
+    ----------
+    df : pl.DataFrame
+        The DataFrame holding the make and model columns.
+    make_col : str
+        The column name for the make.
+    model_col : str
+        The column name for the model.
+
+    Returns
+    -------
+    pl.DataFrame
+        The input DataFrame with `make_key` and `model_key` columns added.
+
+    """
+    return df.with_columns(
+        normalize_make_expr(make_col).alias(MAKE_KEY),
+        normalize_model_expr(model_col).alias(MODEL_KEY),
+    )
+
+
+def make_model_keys(
+    pairs: Iterable[tuple[str, str]],
+) -> dict[tuple[str, str], tuple[str, str]]:
+    """Normalize many makes and models in a single vectorized pass.
+
+    Row-wise callers look their keys up here instead of calling
+    `make_model_key` once per row.
+
+    Parameters
+    ----------
+    pairs : Iterable[tuple[str, str]]
+        The (make, model) pairs to normalize. Duplicates are normalized once.
+
+    Returns
+    -------
+    dict[tuple[str, str], tuple[str, str]]
+        The canonical (make_key, model_key) pair of every distinct input pair.
+
+    """
+    keyed = add_make_model_keys(
+        pl.DataFrame(
+            list(dict.fromkeys(pairs)),
+            schema={"make": pl.Utf8, "model": pl.Utf8},
+            orient="row",
+        ),
+    )
+    return {
+        (make, model): (make_key, model_key)
+        for make, model, make_key, model_key in keyed.iter_rows()
+    }
+
+
+@lru_cache(maxsize=KEY_CACHE_SIZE)
+def make_model_key(make: str, model: str) -> tuple[str, str]:
+    """Normalize a single make and model with the same rules as the columns.
+
+    Parameters
+    ----------
+    make : str
+        The make of the equipment.
+    model : str
+        The model of the equipment.
+
+    Returns
+    -------
+    tuple[str, str]
+        The canonical (make_key, model_key) pair.
+
+    """
+    keys = pl.select(
+        normalize_make_expr(pl.lit(make, dtype=pl.Utf8)).alias(MAKE_KEY),
+        normalize_model_expr(pl.lit(model, dtype=pl.Utf8)).alias(MODEL_KEY),
+    )
+    return keys[MAKE_KEY][0], keys[MODEL_KEY][0]
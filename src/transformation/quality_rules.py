@@ -0,0 +1,364 @@
+"""Contains row-level data-quality rules for translated objects.
+
+`eda_polars` summarizes every column, but bad rows, such as internal stock
+moves invoiced as "NOTAVA", sale prices far from the invoice or dates in the
+future, were found by eye in the notebooks. A `Rule` is a Polars expression
+over the fields of one object that is true for valid rows. Ranges, patterns,
+allowed values and cross-field checks are plain expressions; referential
+integrity rules are derived from the foreign keys of the semantic layer and
+look the referenced keys up with one left join per foreign key.
+
+All rules of an object are evaluated in a single `select`, which counts the
+failing rows of every rule and keeps the first failing rows as a sample, so
+checking an object is one linear pass however many rules it has. Objects are
+collected in parallel with `pl.collect_all`.
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass
+from datetime import date
+
+import polars as pl
+
+from src.features.rfm import NON_SALE_INVOICES
+from src.transformation.dataset_builder import ForeignKey, foreign_keys
+
+log = logging.getLogger(__name__)
+
+ROW = "row"
+DEFAULT_SAMPLE_SIZE = 5
+# Largest relative difference between a unit's sale price and its invoice
+PRICE_TOLERANCE = 0.25
+FIRST_MODEL_YEAR = 1900
+POSTAL_CODE_PATTERN = r"^\d{5}(-\d{4})?$"
+REFERENCE_PREFIX = "_reference_"
+
+
+@dataclass(frozen=True)
+class Rule:
+    """A row-level check of an object's fields.
+
+    Rows where `check` is false fail the rule. Rows where it is null, e.g.
+    because a field is missing, pass, as missing values are already counted
+    by the EDA report. `reference` names the object and field a foreign key
+    rule looks its field up in.
+    """
+
+    name: str
+    object: str
+    fields: tuple[str, ...]
+    check: pl.Expr
+    reference: tuple[str, str] | None = None
+
+
+def range_rule(
+    object_name: str,
+    field: str,
+    minimum: float | date | None = None,
+    maximum: float | date | None = None,
+) -> Rule:
+    """Check that a field lies within inclusive bounds."""
+    check = pl.lit(value=True)
+    if minimum is not None:
+        check &= pl.col(field) >= minimum
+    if maximum is not None:
+        check &= pl.col(field) <= maximum
+    return Rule(f"{field}_range", object_name, (field,), check)
+
+
+def pattern_rule(object_name: str, field: str, pattern: str) -> Rule:
+    """Check that a string field matches a regular expression."""
+    return Rule(
+        f"{field}_pattern",
+        object_name,
+        (field,),
+        pl.col(field).cast(pl.Utf8).str.contains(pattern),
+    )
+
+
+def values_rule(
+    object_name: str,
+    field: str,
+    values: list,
+    *,
+    allowed: bool = True,
+) -> Rule:
+    """Check that a field is one of the allowed, or none of the banned, values."""
+    is_in = pl.col(field).is_in(values)
+    if allowed:
+        return Rule(f"{field}_allowed", object_name, (field,), is_in)
+    return Rule(f"{field}_not_in", object_name, (field,), ~is_in)
+
+
+def not_future_rule(object_name: str, field: str, as_of: date) -> Rule:
+    """Check that a date or datetime field is not after `as_of`."""
+    return Rule(
+        f"{field}_not_future",
+        object_name,
+        (field,),
+        pl.col(field).cast(pl.Date) <= as_of,
+    )
+
+
+def reference_rule(foreign_key: ForeignKey) -> Rule:
+    """Check that a foreign key field references an existing record."""
+    name = f"{foreign_key.field}_reference"
+    return Rule(
+        name,
+        foreign_key.object,
+        (foreign_key.field,),
+        pl.col(f"{REFERENCE_PREFIX}{name}"),
+        (foreign_key.foreign_object, foreign_key.foreign_field),
+    )
+
+
+def default_rules(
+    semantic_layer: dict,
+    dealer: str,
+    as_of: date | None = None,
+) -> list[Rule]:
+    """List the standard rules of a dealer's objects.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+    dealer : str
+        The dealer name used to identify foreign keys in the semantic layer.
+    as_of : date | None
+        The date no event may be after. None uses today.
+
+    Returns
+    -------
+    list[Rule]
+        Invoice, price and model year rules of stock units and customer
+        equipment, postal code patterns, a not-in-the-future rule for every
+        date and datetime field and a reference rule for every foreign key
+        the dealer maps.
+
+    Raises
+    ------
+    ValueError
+        If a rule uses a field the semantic layer does not define, which
+        `evaluate_rules` would otherwise skip silently.
+
+    """
+    as_of = as_of or date.today()  # noqa: DTZ011
+    last_model_year = as_of.year + 1
+    sale_price = pl.col("dsu_sale_price")
+    invoice_amount = pl.col("dsu_invoice_amount")
+    rules = [
+        values_rule(
+            "dealer_stock_unit",
+            "dsu_invoice_number",
+            NON_SALE_INVOICES,
+            allowed=False,
+        ),
+        Rule(
+            "dsu_sale_price_matches_invoice",
+            "dealer_stock_unit",
+            ("dsu_sale_price", "dsu_invoice_amount"),
+            (sale_price - invoice_amount).abs()
+            <= PRICE_TOLERANCE
+            * pl.max_horizontal(sale_price.abs(), invoice_amount.abs()),
+        ),
+        range_rule("dealer_stock_unit", "dsu_sale_price", minimum=0),
+        range_rule(
+            "dealer_stock_unit",
+            "dsu_model_year",
+            FIRST_MODEL_YEAR,
+            last_model_year,
+        ),
+        range_rule(
+            "customer_equipment",
+            "ce_model_year",
+            FIRST_MODEL_YEAR,
+            last_model_year,
+        ),
+        range_rule("customer_equipment", "ce_hours", minimum=0),
+        range_rule("customer_equipment", "ce_sale_amount", minimum=0),
+        pattern_rule("account", "billing_postal_code", POSTAL_CODE_PATTERN),
+        pattern_rule("store", "store_postal_code", POSTAL_CODE_PATTERN),
+    ]
+    rules.extend(
+        not_future_rule(object_name, field_name, as_of)
+        for object_name, fields in semantic_layer.items()
+        for field_name, field_data in fields.items()
+        if field_data.get("type") in {"date", "datetime"}
+    )
+    rules.extend(
+        reference_rule(foreign_key)
+        for foreign_key in foreign_keys(semantic_layer, dealer)
+    )
+    unknown = sorted(
+        {
+            f"{object_name}.{field}"
+            for rule in rules
+            for object_name, field in (
+                *((rule.object, field) for field in rule.fields),
+                *([rule.reference] if rule.reference else []),
+            )
+            if field not in semantic_layer.get(object_name, {})
+        },
+    )
+    if unknown:
+        error_message = (
+            f"Quality rules use fields not in the semantic layer: {unknown}."
+        )
+        raise ValueError(error_message)
+    return rules
+
+
+def evaluate_rules(
+    objects: dict[str, pl.DataFrame | pl.LazyFrame],
+    rules: list[Rule],
+    sample_size: int = DEFAULT_SAMPLE_SIZE,
+) -> tuple[pl.DataFrame, pl.DataFrame]:
+    """Count the rows failing every rule and sample them.
+
+    Rules on fields an object does not have, or referencing an object that
+    is not loaded, are skipped.
+
+    Parameters
+    ----------
+    objects : dict[str, pl.DataFrame | pl.LazyFrame]
+        The dealer's translated objects by name.
+    rules : list[Rule]
+        The rules to evaluate.
+    sample_size : int
+        The number of failing rows kept per rule.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, pl.DataFrame]
+        Per rule the object, rule name, fields, rows, failures and failure
+        rate, and per sampled failing row the object, rule name, row number
+        in the object and the values of the rule's fields as JSON.
+
+    """
+    queries = []
+    evaluated = []
+    for object_name, object_frame in objects.items():
+        frame = object_frame.lazy().with_row_index(ROW)
+        object_rules = []
+        for rule in rules:
+            if rule.object != object_name:
+                continue
+            if not _applicable(rule, objects):
+                log.debug("Skipping rule %s of %s", rule.name, object_name)
+                continue
+            if rule.reference is not None:
+                frame = _join_reference(frame, rule, objects)
+            object_rules.append(rule)
+        if not object_rules:
+            continue
+        aggregations = [pl.len().alias("rows")]
+        for i, rule in enumerate(object_rules):
+            failed = rule.check.not_().fill_null(value=False)
+            aggregations.extend(
+                [
+                    failed.sum().alias(f"failures_{i}"),
+                    pl.struct(ROW, *rule.fields)
+                    .filter(failed)
+                    .head(sample_size)
+                    .implode()
+                    .alias(f"sample_{i}"),
+                ],
+            )
+        queries.append(frame.select(aggregations))
+        evaluated.append((object_name, object_rules))
+
+    summaries = []
+    samples = []
+    for (object_name, object_rules), result in zip(
+        evaluated,
+        pl.collect_all(queries),
+        strict=True,
+    ):
+        rows = result["rows"][0]
+        for i, rule in enumerate(object_rules):
+            failures = result[f"failures_{i}"][0]
+            summaries.append(
+                {
+                    "object": object_name,
+                    "rule": rule.name,
+                    "fields": ", ".join(rule.fields),
+                    "rows": rows,
+                    "failures": failures,
+                    "failure_rate": failures / rows if rows else 0.0,
+                },
+            )
+            samples.append(
+                result[f"sample_{i}"][0]
+                .struct.unnest()
+                .select(
+                    pl.lit(object_name).alias("object"),
+                    pl.lit(rule.name).alias("rule"),
+                    pl.col(ROW).cast(pl.Int64),
+                    pl.struct(rule.fields).struct.json_encode().alias("values"),
+                ),
+            )
+    summary = pl.DataFrame(
+        summaries,
+        schema={
+            "object": pl.Utf8,
+            "rule": pl.Utf8,
+            "fields": pl.Utf8,
+            "rows": pl.Int64,
+            "failures": pl.Int64,
+            "failure_rate": pl.Float64,
+        },
+    )
+    sample_schema = {
+        "object": pl.Utf8,
+        "rule": pl.Utf8,
+        ROW: pl.Int64,
+        "values": pl.Utf8,
+    }
+    sample = pl.concat([pl.DataFrame(schema=sample_schema), *samples])
+    return summary, sample
+
+
+def _applicable(
+    rule: Rule,
+    objects: dict[str, pl.DataFrame | pl.LazyFrame],
+) -> bool:
+    """Whether the fields a rule checks, and references, are loaded."""
+    if rule.reference is not None:
+        foreign_object, foreign_field = rule.reference
+        if foreign_object not in objects or foreign_field not in (
+            objects[foreign_object].collect_schema()
+        ):
+            return False
+    schema = objects[rule.object].collect_schema()
+    return all(field in schema for field in rule.fields)
+
+
+def _join_reference(
+    frame: pl.LazyFrame,
+    rule: Rule,
+    objects: dict[str, pl.DataFrame | pl.LazyFrame],
+) -> pl.LazyFrame:
+    """Flag whether a rule's field is a key of the referenced object."""
+    foreign_object, foreign_field = rule.reference
+    flag = f"{REFERENCE_PREFIX}{rule.name}"
+    keys = (
+        objects[foreign_object]
+        .lazy()
+        .select(pl.col(foreign_field).cast(pl.Utf8).alias(flag))
+        .drop_nulls()
+        .unique()
+    )
+    return (
+        frame.with_columns(pl.col(rule.fields[0]).cast(pl.Utf8).alias(f"{flag}_key"))
+        .join(keys, left_on=f"{flag}_key", right_on=flag, how="left", coalesce=False)
+        # Null fields are not references, so only missing keys fail
+        .with_columns(
+            pl.when(pl.col(f"{flag}_key").is_not_null())
+            .then(pl.col(flag).is_not_null())
+            .alias(flag),
+        )
+        .drop(f"{flag}_key")
+    )
@@ -0,0 +1,173 @@
+"""Contains a referential-integrity and join-coverage profiler.
+
+The exploration notebooks measured join rates one pair at a time, with
+`is_in(other[key].unique().to_list())`, which pulls every key into a Python
+list. Here every foreign key of the semantic layer, plus the joins the
+notebooks make on fields that are not declared as foreign keys, is profiled
+with a semi and an anti join between the referencing rows, grouped per key,
+and the distinct referenced keys. Each profile is a lazy query returning one
+row, and all of them are collected together, so Polars only materializes the
+distinct keys and their counts and shares the scans of objects referenced by
+several keys.
+"""
+
+from __future__ import annotations
+
+import logging
+
+import polars as pl
+
+from src.transformation.dataset_builder import ForeignKey
+
+log = logging.getLogger(__name__)
+
+KEY = "key"
+FAN_OUT_QUANTILES = (0.5, 0.9)
+# Joins the notebooks rely on that the semantic layer does not declare
+EXTRA_JOIN_KEYS = (
+    ForeignKey(
+        "customer_equipment",
+        "dealer_stock_number",
+        "dealer_stock_unit",
+        "dealer_stock_number",
+    ),
+)
+
+
+def foreign_key_profile(
+    child: pl.DataFrame | pl.LazyFrame,
+    parent: pl.DataFrame | pl.LazyFrame,
+    foreign_key: ForeignKey,
+) -> pl.LazyFrame:
+    """Plan the integrity profile of one foreign key.
+
+    Parameters
+    ----------
+    child : pl.DataFrame | pl.LazyFrame
+        The object with the foreign key field.
+    parent : pl.DataFrame | pl.LazyFrame
+        The object the foreign key references.
+    foreign_key : ForeignKey
+        The foreign key.
+
+    Returns
+    -------
+    pl.LazyFrame
+        One row with the child rows and their null, orphan and matched counts
+        and rates, the parent rows, distinct and duplicated keys and the share
+        of them referenced, and the distribution of referencing rows per
+        referenced parent key.
+
+    """
+    child_keys = (
+        child.lazy()
+        .select(pl.col(foreign_key.field).cast(pl.Utf8).alias(KEY))
+        .group_by(KEY)
+        .agg(pl.len().alias("rows"))
+    )
+    referenced = child_keys.drop_nulls(KEY)
+    parent_keys = parent.lazy().select(
+        pl.col(foreign_key.foreign_field).cast(pl.Utf8).alias(KEY),
+    )
+    distinct_parent_keys = parent_keys.drop_nulls().unique()
+    # Rows per referenced parent key, i.e. the fan-out of a join from it
+    matched = referenced.join(distinct_parent_keys, on=KEY, how="semi")
+    orphans = referenced.join(distinct_parent_keys, on=KEY, how="anti")
+
+    fan_out = pl.col("rows")
+    summaries = [
+        child_keys.select(
+            fan_out.sum().alias("child_rows"),
+            fan_out.filter(pl.col(KEY).is_null()).sum().alias("null_rows"),
+        ),
+        orphans.select(
+            fan_out.sum().alias("orphan_rows"),
+            pl.len().alias("orphan_keys"),
+        ),
+        matched.select(
+            fan_out.sum().alias("matched_rows"),
+            pl.len().alias("referenced_parent_keys"),
+            fan_out.mean().alias("fan_out_mean"),
+            *[
+                fan_out.quantile(quantile).alias(
+                    f"fan_out_p{round(100 * quantile)}",
+                )
+                for quantile in FAN_OUT_QUANTILES
+            ],
+            fan_out.max().alias("fan_out_max"),
+        ),
+        parent_keys.select(
+            pl.len().alias("parent_rows"),
+            pl.col(KEY).drop_nulls().n_unique().alias("parent_keys"),
+        ),
+    ]
+    # Every summary is a single row, so cross joining them lines them up
+    profile = summaries[0]
+    for summary in summaries[1:]:
+        profile = profile.join(summary, how="cross")
+    non_null_rows = pl.col("child_rows") - pl.col("null_rows")
+    return profile.select(
+        pl.lit(foreign_key.object).alias("object"),
+        pl.lit(foreign_key.field).alias("field"),
+        pl.lit(foreign_key.foreign_object).alias("foreign_object"),
+        pl.lit(foreign_key.foreign_field).alias("foreign_field"),
+        "child_rows",
+        "null_rows",
+        (pl.col("null_rows") / pl.col("child_rows")).alias("null_rate"),
+        "orphan_rows",
+        "orphan_keys",
+        (pl.col("orphan_rows") / non_null_rows).alias("orphan_rate"),
+        "matched_rows",
+        (pl.col("matched_rows") / pl.col("child_rows")).alias("match_rate"),
+        "parent_rows",
+        "parent_keys",
+        (pl.col("parent_rows") - pl.col("parent_keys")).alias("duplicate_parent_rows"),
+        "referenced_parent_keys",
+        (pl.col("referenced_parent_keys") / pl.col("parent_keys")).alias(
+            "parent_coverage",
+        ),
+        "fan_out_mean",
+        *[f"fan_out_p{round(100 * quantile)}" for quantile in FAN_OUT_QUANTILES],
+        "fan_out_max",
+    )
+
+
+def profile_foreign_keys(
+    objects: dict[str, pl.DataFrame | pl.LazyFrame],
+    keys: list[ForeignKey],
+) -> pl.DataFrame:
+    """Profile every foreign key whose objects and fields are loaded.
+
+    Parameters
+    ----------
+    objects : dict[str, pl.DataFrame | pl.LazyFrame]
+        The dealer's translated objects by name.
+    keys : list[ForeignKey]
+        The foreign keys to profile, e.g. from `foreign_keys` and
+        `EXTRA_JOIN_KEYS`.
+
+    Returns
+    -------
+    pl.DataFrame
+        One `foreign_key_profile` row per foreign key profiled.
+
+    """
+    schemas = {name: frame.lazy().collect_schema() for name, frame in objects.items()}
+    queries = []
+    for key in keys:
+        loaded = key.field in schemas.get(key.object, {}) and (
+            key.foreign_field in schemas.get(key.foreign_object, {})
+        )
+        if not loaded:
+            log.debug(
+                "Skipping %s.%s, its objects are not loaded",
+                key.object,
+                key.field,
+            )
+            continue
+        queries.append(
+            foreign_key_profile(objects[key.object], objects[key.foreign_object], key),
+        )
+    if not queries:
+        return pl.DataFrame()
+    return pl.concat(pl.collect_all(queries), how="vertical_relaxed")
@@ -0,0 +1,446 @@
+"""Contains a validator for the semantic layer and the raw files it maps.
+
+A bad mapping in `semantic_layer.json` used to surface only when a pipeline
+failed halfway through a large file: `translate_columns` skips types it does
+not know, a raw column mapped to two fields is renamed to whichever comes
+last, and a foreign key to a missing field fails the dataset builder's join.
+`CompiledSemanticLayer` checks the whole layer in one pass and compiles the
+per dealer and object column mappings and the raw dtypes each field type can
+be translated from.
+
+Raw files are checked against the compiled layer from their schema alone,
+read from the Parquet footer or the CSV header and the rows Polars infers
+dtypes from, the same ones `translate_csv_to_common_model` would infer.
+`check_raw_files` raises before any translation starts.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+import polars as pl
+
+log = logging.getLogger(__name__)
+
+ERROR = "error"
+WARNING = "warning"
+FIELD_KEYS = ("primary_key", "foreign_key", "type", "keys")
+MAPPING_KEYS = ("org", "object", "api_name", "foreign_key_object", "foreign_key_field")
+# Whether `translate_columns` can translate a raw dtype into each field type
+RAW_DTYPES = {
+    "string": lambda _dtype: True,
+    "float": lambda dtype: dtype.is_numeric() or dtype in (pl.Boolean, pl.Null),
+    # Floats such as 3.0 from a column with blanks cast, truncated
+    "integer": lambda dtype: dtype.is_numeric() or dtype in (pl.Boolean, pl.Null),
+    "date": lambda dtype: dtype in (pl.Utf8, pl.Null),
+    "datetime": lambda dtype: dtype in (pl.Utf8, pl.Null),
+    # 0/1 flags cast to false/true
+    "boolean": lambda dtype: dtype.is_integer() or dtype in (pl.Boolean, pl.Null),
+}
+
+
+@dataclass(frozen=True)
+class Issue:
+    """A problem found in the semantic layer or in a raw file."""
+
+    check: str
+    object: str
+    field: str | None
+    dealer: str | None
+    message: str
+    severity: str = ERROR
+
+
+@dataclass(frozen=True)
+class RawColumn:
+    """A raw column a dealer maps onto a field of the common model."""
+
+    api_name: str
+    field: str
+    type: str
+    required: bool = True
+
+
+class CompiledSemanticLayer:
+    """The semantic layer checked and compiled into per dealer mappings."""
+
+    def __init__(self, semantic_layer: dict) -> None:
+        """Initialize the CompiledSemanticLayer class.
+
+        Parameters
+        ----------
+        semantic_layer : dict
+            The semantic layer dictionary.
+
+        """
+        self.semantic_layer = semantic_layer
+        self.issues: list[Issue] = []
+        # Raw columns by (dealer, object) and api_name
+        self.columns: dict[tuple[str, str], dict[str, RawColumn]] = defaultdict(dict)
+        self._compile()
+
+    @classmethod
+    def from_path(cls, semantic_layer_path: str) -> CompiledSemanticLayer:
+        """Load and compile the semantic layer JSON file."""
+        with Path(semantic_layer_path).open(encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @property
+    def dealers(self) -> list[str]:
+        """The dealers with mappings in the semantic layer."""
+        return sorted({dealer for dealer, _ in self.columns})
+
+    def check_schema(
+        self,
+        dealer: str,
+        object_name: str,
+        schema: pl.Schema | dict[str, pl.DataType],
+    ) -> list[Issue]:
+        """Check a raw file's columns and dtypes against the dealer's mapping.
+
+        Parameters
+        ----------
+        dealer : str
+            The dealer name.
+        object_name : str
+            The object the file holds.
+        schema : pl.Schema | dict[str, pl.DataType]
+            The raw file's column names and dtypes.
+
+        Returns
+        -------
+        list[Issue]
+            Errors for a file without any mapped column, for mapped columns
+            the file lacks and for columns whose dtype cannot be translated
+            into their field's type. Missing columns of fields marked
+            `"required": false` are warnings, they are translated as nulls.
+
+        """
+        if object_name not in self.semantic_layer:
+            return [
+                Issue("object", object_name, None, dealer, "Unknown object."),
+            ]
+        columns = self.columns.get((dealer, object_name), {})
+        found = [column for column in columns.values() if column.api_name in schema]
+        if not found:
+            return [
+                Issue(
+                    "columns",
+                    object_name,
+                    None,
+                    dealer,
+                    "None of the mapped columns are in the file.",
+                ),
+            ]
+        issues = [
+            Issue(
+                "missing_column",
+                object_name,
+                column.field,
+                dealer,
+                f"Mapped column '{column.api_name}' is not in the file.",
+                ERROR if column.required else WARNING,
+            )
+            for column in columns.values()
+            if column.api_name not in schema
+        ]
+        for column in found:
+            dtype = schema[column.api_name]
+            translatable = RAW_DTYPES.get(column.type)
+            if translatable is not None and not translatable(dtype):
+                issues.append(
+                    Issue(
+                        "dtype",
+                        object_name,
+                        column.field,
+                        dealer,
+                        f"Column '{column.api_name}' is {dtype}, which cannot be "
+                        f"translated to {column.type}.",
+                    ),
+                )
+        return issues
+
+    def check_file(self, dealer: str, object_name: str, path: str) -> list[Issue]:
+        """Check a raw CSV or Parquet file from its schema alone.
+
+        Parameters
+        ----------
+        dealer : str
+            The dealer name.
+        object_name : str
+            The object the file holds.
+        path : str
+            The path of the raw file.
+
+        Returns
+        -------
+        list[Issue]
+            The issues found by `check_schema`, or an error if the file does
+            not exist.
+
+        """
+        if not Path(path).exists():
+            return [Issue("file", object_name, None, dealer, f"No file at {path}.")]
+        return self.check_schema(dealer, object_name, read_raw_schema(path))
+
+    def _compile(self) -> None:
+        for object_name, fields in self.semantic_layer.items():
+            # Fields mapped from each raw column of a dealer
+            api_fields: dict[tuple[str, str], set[str]] = defaultdict(set)
+            for field_name, field_data in fields.items():
+                self._compile_field(object_name, field_name, field_data, api_fields)
+            for (dealer, api_name), field_names in api_fields.items():
+                if len(field_names) > 1:
+                    self._add(
+                        "duplicate_api_name",
+                        object_name,
+                        None,
+                        dealer,
+                        f"'{api_name}' is mapped to {sorted(field_names)}.",
+                    )
+            primary_keys = [
+                field_name
+                for field_name, field_data in fields.items()
+                if field_data.get("primary_key")
+            ]
+            if len(primary_keys) != 1:
+                self._add(
+                    "primary_key",
+                    object_name,
+                    None,
+                    None,
+                    f"Expected one primary key, found {primary_keys}.",
+                )
+
+    def _compile_field(
+        self,
+        object_name: str,
+        field_name: str,
+        field_data: dict,
+        api_fields: dict[tuple[str, str], set[str]],
+    ) -> None:
+        missing = [key for key in FIELD_KEYS if key not in field_data]
+        if missing:
+            self._add("structure", object_name, field_name, None, f"Missing {missing}.")
+            return
+        field_type = field_data["type"]
+        if field_type not in RAW_DTYPES:
+            self._add(
+                "type",
+                object_name,
+                field_name,
+                None,
+                f"Unknown type '{field_type}', expected one of {list(RAW_DTYPES)}.",
+            )
+        required = field_data.get("required", True)
+        if not isinstance(required, bool):
+            self._add(
+                "structure",
+                object_name,
+                field_name,
+                None,
+                f"'required' must be true or false, not {required!r}.",
+            )
+        has_foreign_key = False
+        for key_mapping in field_data["keys"]:
+            missing = [key for key in MAPPING_KEYS if key not in key_mapping]
+            if missing:
+                self._add(
+                    "structure",
+                    object_name,
+                    field_name,
+                    None,
+                    f"Missing {missing}.",
+                )
+                continue
+            dealer = key_mapping["org"]
+            api_name = key_mapping["api_name"]
+            api_fields[dealer, api_name].add(field_name)
+            self.columns[dealer, object_name][api_name] = RawColumn(
+                api_name,
+                field_name,
+                field_type,
+                required=required is not False,
+            )
+            if key_mapping["foreign_key_object"] or key_mapping["foreign_key_field"]:
+                has_foreign_key = True
+                self._check_foreign_key(
+                    object_name,
+                    field_name,
+                    field_data,
+                    key_mapping,
+                )
+        if has_foreign_key != bool(field_data["foreign_key"]):
+            self._add(
+                "foreign_key_flag",
+                object_name,
+                field_name,
+                None,
+                f"foreign_key is {field_data['foreign_key']} but the "
+                f"mappings {'do' if has_foreign_key else 'do not'} name one.",
+            )
+
+    def _check_foreign_key(
+        self,
+        object_name: str,
+        field_name: str,
+        field_data: dict,
+        key_mapping: dict,
+    ) -> None:
+        dealer = key_mapping["org"]
+        foreign_object = key_mapping["foreign_key_object"]
+        foreign_field = key_mapping["foreign_key_field"]
+        referenced = self.semantic_layer.get(foreign_object, {}).get(foreign_field)
+        if referenced is None:
+            self._add(
+                "foreign_key",
+                object_name,
+                field_name,
+                dealer,
+                f"References {foreign_object}.{foreign_field}, which does not exist.",
+            )
+        elif referenced.get("type") != field_data["type"]:
+            self._add(
+                "foreign_key",
+                object_name,
+                field_name,
+                dealer,
+                f"Is {field_data['type']} but references {foreign_object}."
+                f"{foreign_field} of type {referenced.get('type')}.",
+            )
+
+    def _add(
+        self,
+        check: str,
+        object_name: str,
+        field_name: str | None,
+        dealer: str | None,
+        message: str,
+    ) -> None:
+        self.issues.append(Issue(check, object_name, field_name, dealer, message))
+
+
+def validate_semantic_layer(semantic_layer: dict) -> list[Issue]:
+    """Check the semantic layer in one pass.
+
+    Parameters
+    ----------
+    semantic_layer : dict
+        The semantic layer dictionary.
+
+    Returns
+    -------
+    list[Issue]
+        Missing keys, unknown types, raw columns a dealer maps to more than
+        one field of an object, foreign keys to missing fields or of another
+        type, `foreign_key` flags disagreeing with the mappings and objects
+        without exactly one primary key.
+
+    """
+    return CompiledSemanticLayer(semantic_layer).issues
+
+
+def read_raw_schema(path: str) -> pl.Schema:
+    """Read a raw CSV or Parquet file's column names and dtypes.
+
+    Parameters
+    ----------
+    path : str
+        The path of the raw file.
+
+    Returns
+    -------
+    pl.Schema
+        The schema from the Parquet footer, or from the CSV header and the
+        rows `pl.read_csv` infers dtypes from.
+
+    """
+    if Path(path).suffix == ".parquet":
+        return pl.read_parquet_schema(path)
+    return pl.scan_csv(path, ignore_errors=True).collect_schema()
+
+
+def issues_frame(issues: list[Issue]) -> pl.DataFrame:
+    """Collect issues into a DataFrame for reports."""
+    return pl.DataFrame(
+        [issue.__dict__ for issue in issues],
+        schema={
+            "check": pl.Utf8,
+            "object": pl.Utf8,
+            "field": pl.Utf8,
+            "dealer": pl.Utf8,
+            "message": pl.Utf8,
+            "severity": pl.Utf8,
+        },
+        orient="row",
+    )
+
+
+def check_raw_files(
+    dealer: str,
+    object_names: list[str],
+    data_path: str,
+    semantic_layer: str | CompiledSemanticLayer,
+    optional: tuple[str, ...] = (),
+) -> list[Issue]:
+    """Check the semantic layer and a dealer's raw files before translation.
+
+    Parameters
+    ----------
+    dealer : str
+        The dealer name.
+    object_names : list[str]
+        The objects to check, read from `<data_path>/<object-name>.csv`.
+    data_path : str
+        The directory holding the dealer's raw CSV files.
+    semantic_layer : str | CompiledSemanticLayer
+        The path to the semantic layer JSON file, or the compiled layer.
+    optional : tuple[str, ...]
+        The objects a dealer may not export. A missing file of one of them is
+        a warning rather than an error.
+
+    Returns
+    -------
+    list[Issue]
+        The warnings found, which are logged.
+
+    Raises
+    ------
+    ValueError
+        If the semantic layer or any of the files has an error.
+
+    """
+    if isinstance(semantic_layer, str):
+        semantic_layer = CompiledSemanticLayer.from_path(semantic_layer)
+    issues = list(semantic_layer.issues)
+    for name in object_names:
+        path = Path(data_path) / f"{name.replace('_', '-')}.csv"
+        if name in optional and not path.exists():
+            issues.append(
+                Issue("file", name, None, dealer, f"No file at {path}.", WARNING),
+            )
+            continue
+        issues.extend(semantic_layer.check_file(dealer, name, str(path)))
+    errors = [issue for issue in issues if issue.severity == ERROR]
+    if errors:
+        details = "\n".join(
+            f"  {issue.object}.{issue.field or '*'} ({issue.dealer or 'all'}): "
+            f"{issue.message}"
+            for issue in errors
+        )
+        error_message = f"Invalid inputs for dealer '{dealer}':\n{details}"
+        raise ValueError(error_message)
+    warnings = [issue for issue in issues if issue.severity == WARNING]
+    for issue in warnings:
+        log.warning(
+            "%s.%s for %s: %s",
+            issue.object,
+            issue.field,
+            dealer,
+            issue.message,
+        )
+    return warnings
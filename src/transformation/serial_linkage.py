@@ -0,0 +1,334 @@
+"""Contains the serial-number linkage of a dealer's equipment records.
+
+A machine shows up as a dealer stock unit while it is on the lot, as customer
+equipment once it is sold, and as EDA equipment when a UCC filing names it.
+The three records share a serial number, however differently it is typed
+("1RW8270RAKD012345", "1rw-8270r-akd012345", "S/N 012345"). Serials are reduced
+to a canonical key, and every record of a dealer is stacked into one long
+frame, so a single hash group-by on (dealer, serial key) links all three
+objects into one equipment-lifecycle row per machine. Records that disagree
+about the machine are flagged rather than dropped.
+"""
+
+from __future__ import annotations
+
+import polars as pl
+
+from src.transformation.normalize import normalize_make_expr
+
+DEALER = "dealer"
+SERIAL_KEY = "serial_key"
+SOURCE = "source"
+
+# Canonical record column -> field of each object carrying it
+SOURCE_FIELDS = {
+    "dealer_stock_unit": {
+        "serial_number": "dsu_serial_number",
+        "record_id": "dealer_stock_unit_id",
+        "account_id": "dsu_account_id",
+        "previous_owner_id": "dsu_previous_owner",
+        "status": "dsu_status",
+        "event_date": "dsu_sales_date",
+        "make": "dsu_make",
+        "stock_number": "dealer_stock_number",
+        "linked_stock_unit_id": None,
+        "linked_equipment_id": None,
+    },
+    "customer_equipment": {
+        "serial_number": "ce_serial_number",
+        "record_id": "customer_equipment_id",
+        "account_id": "account_id",
+        "previous_owner_id": None,
+        "status": "ce_status",
+        "event_date": "ce_sale_date",
+        "make": "ce_make",
+        "stock_number": "dealer_stock_number",
+        "linked_stock_unit_id": "dealer_stock_unit",
+        "linked_equipment_id": None,
+    },
+    "eda_equipment": {
+        "serial_number": "eda_serial_number",
+        "record_id": "eda_equipment_id",
+        "account_id": "account_id",
+        "previous_owner_id": None,
+        "status": None,
+        "event_date": "eda_ucc_file_date",
+        "make": "eda_make",
+        "stock_number": None,
+        "linked_stock_unit_id": "eda_dealer_stock_unit_id",
+        "linked_equipment_id": "eda_customer_equipment_id",
+    },
+}
+RECORD_COLUMNS = tuple(SOURCE_FIELDS["dealer_stock_unit"])
+# Short prefix of each source's columns in the lifecycle table
+SOURCE_PREFIXES = {
+    "dealer_stock_unit": "dsu",
+    "customer_equipment": "ce",
+    "eda_equipment": "eda",
+}
+SOLD_STATUSES = ["Sold", "Invoiced", "Presold"]
+TRADED_STATUSES = ["Traded"]
+OWNED_STATUSES = ["Owned"]
+MIN_SERIAL_LENGTH = 4
+# Values typed into serial fields when the serial is unknown
+PLACEHOLDER_SERIALS = ["NA", "NONE", "NULL", "UNKNOWN", "TBD", "NOSERIAL", "NOSN"]
+SERIAL_PREFIX_PATTERN = r"^(?:S/?N|SERIAL|PIN)(?:\s*(?:NO|NUM|NUMBER))?[\s#:.]*"
+CONFLICTS = (
+    "duplicate_owner",
+    "account_conflict",
+    "make_conflict",
+    "stock_number_conflict",
+    "reference_conflict",
+)
+
+
+def normalize_serial_expr(serial: str | pl.Expr) -> pl.Expr:
+    """Build an expression producing the canonical serial key.
+
+    Parameters
+    ----------
+    serial : str | pl.Expr
+        The serial column name or an expression evaluating to the serial.
+
+    Returns
+    -------
+    pl.Expr
+        Upper-cased serial without an "S/N" or "PIN" prefix, separators or
+        leading zeros. Serials shorter than `MIN_SERIAL_LENGTH` or typed as a
+        placeholder give null, since they cannot identify a machine.
+
+    """
+    serial_expr = pl.col(serial) if isinstance(serial, str) else serial
+    key = (
+        serial_expr.cast(pl.Utf8)
+        .str.to_uppercase()
+        .str.strip_chars()
+        .str.replace(SERIAL_PREFIX_PATTERN, "")
+        .str.replace_all(r"[^A-Z0-9]", "")
+        .str.strip_chars_start("0")
+    )
+    return (
+        pl.when(
+            (key.str.len_chars() >= MIN_SERIAL_LENGTH)
+            & ~key.is_in(PLACEHOLDER_SERIALS),
+        )
+        .then(key)
+        .otherwise(None)
+    )
+
+
+def _source_records(dealer: str, source: str, df: pl.DataFrame) -> pl.LazyFrame:
+    fields = SOURCE_FIELDS[source]
+    return (
+        df.lazy()
+        .select(
+            pl.lit(dealer).alias(DEALER),
+            pl.lit(source).alias(SOURCE),
+            *[
+                (pl.col(field) if field in df.columns else pl.lit(None)).alias(column)
+                for column, field in fields.items()
+                if column != "event_date"
+            ],
+            (
+                pl.col(fields["event_date"]).cast(pl.Date)
+                if fields["event_date"] in df.columns
+                else pl.lit(None, dtype=pl.Date)
+            ).alias("event_date"),
+        )
+        .with_columns(
+            *[
+                pl.col(column).cast(pl.Utf8)
+                for column in RECORD_COLUMNS
+                if column != "event_date"
+            ],
+        )
+    )
+
+
+def stack_serial_records(objects: dict[str, dict[str, pl.DataFrame]]) -> pl.LazyFrame:
+    """Stack the equipment records of every dealer into one long frame.
+
+    Parameters
+    ----------
+    objects : dict[str, dict[str, pl.DataFrame]]
+        Translated objects by dealer and object name. Objects other than the
+        ones in `SOURCE_FIELDS` are ignored, and missing fields give nulls.
+
+    Returns
+    -------
+    pl.LazyFrame
+        One row per record with a serial key, the dealer, the source object
+        and the columns of `RECORD_COLUMNS`.
+
+    """
+    records = [
+        _source_records(dealer, source, dealer_objects[source])
+        for dealer, dealer_objects in objects.items()
+        for source in SOURCE_FIELDS
+        if source in dealer_objects
+    ]
+    if not records:
+        error_message = (
+            f"None of {list(SOURCE_FIELDS)} were found to link serial numbers."
+        )
+        raise ValueError(error_message)
+    return (
+        pl.concat(records)
+        .with_columns(normalize_serial_expr("serial_number").alias(SERIAL_KEY))
+        .drop_nulls(SERIAL_KEY)
+    )
+
+
+def _from(source: str, column: str) -> pl.Expr:
+    return pl.col(column).filter(pl.col(SOURCE) == source)
+
+
+def _unmatched(values: pl.Expr, *known: pl.Expr, require_known: bool = True) -> pl.Expr:
+    """Whether any value of the group is missing from all known values.
+
+    With `require_known`, a group without known values has nothing to
+    disagree with and is not flagged.
+    """
+    missing = values.drop_nulls()
+    for known_values in known:
+        missing = missing.filter(~missing.is_in(known_values.drop_nulls().implode()))
+    unmatched = missing.len() > 0
+    if require_known:
+        has_known = pl.sum_horizontal(
+            [known_values.drop_nulls().len() for known_values in known],
+        )
+        return unmatched & (has_known > 0)
+    return unmatched
+
+
+def link_serials(objects: dict[str, dict[str, pl.DataFrame]]) -> pl.DataFrame:
+    """Link stock units, customer equipment and EDA equipment by serial.
+
+    Parameters
+    ----------
+    objects : dict[str, dict[str, pl.DataFrame]]
+        Translated objects by dealer and object name.
+
+    Returns
+    -------
+    pl.DataFrame
+        One row per dealer and serial key with, for each source, its record
+        count and the id, account, status and date of its latest record, the
+        lifecycle stage the machine reached (in_stock, sold, owned or traded),
+        one boolean per conflict in `CONFLICTS` and `has_conflict`.
+
+    """
+    # Groups keep the row order, so the first record of a source is its latest
+    records = (
+        stack_serial_records(objects)
+        .with_columns(
+            normalize_make_expr("make").alias("make_key"),
+        )
+        .sort("event_date", descending=True, nulls_last=True)
+    )
+    per_source = []
+    for source, prefix in SOURCE_PREFIXES.items():
+        is_source = pl.col(SOURCE) == source
+        per_source += [
+            is_source.sum().alias(f"{prefix}_records"),
+            *[
+                pl.col(column).filter(is_source).first().alias(f"{prefix}_{column}")
+                for column in ("record_id", "account_id", "status", "event_date")
+            ],
+        ]
+    owned = pl.col("status").is_in(OWNED_STATUSES)
+    lifecycle = (
+        records.group_by(DEALER, SERIAL_KEY)
+        .agg(
+            *per_source,
+            pl.col("previous_owner_id").drop_nulls().first(),
+            (
+                pl.col("status").is_in(TRADED_STATUSES).any()
+                | pl.col("previous_owner_id").is_not_null().any()
+            ).alias("is_traded"),
+            _from("customer_equipment", "status")
+            .is_in(OWNED_STATUSES)
+            .any()
+            .alias("is_owned"),
+            (
+                (pl.col(SOURCE) == "customer_equipment").any()
+                | pl.col("status").is_in(SOLD_STATUSES).any()
+            ).alias("is_sold"),
+            (
+                pl.col("account_id")
+                .filter((pl.col(SOURCE) == "customer_equipment") & owned)
+                .drop_nulls()
+                .n_unique()
+                > 1
+            ).alias("duplicate_owner"),
+            # The EDA filing should name an account that held the machine
+            _unmatched(
+                _from("eda_equipment", "account_id"),
+                pl.col("account_id").filter(pl.col(SOURCE) != "eda_equipment"),
+                pl.col("previous_owner_id"),
+            ).alias("account_conflict"),
+            (pl.col("make_key").drop_nulls().n_unique() > 1).alias("make_conflict"),
+            _unmatched(
+                _from("customer_equipment", "stock_number"),
+                _from("dealer_stock_unit", "stock_number"),
+            ).alias("stock_number_conflict"),
+            (
+                _unmatched(
+                    pl.col("linked_stock_unit_id"),
+                    _from("dealer_stock_unit", "record_id"),
+                    require_known=False,
+                )
+                | _unmatched(
+                    pl.col("linked_equipment_id"),
+                    _from("customer_equipment", "record_id"),
+                    require_known=False,
+                )
+            ).alias("reference_conflict"),
+        )
+        .with_columns(
+            pl.when(pl.col("is_traded"))
+            .then(pl.lit("traded"))
+            .when(pl.col("is_owned"))
+            .then(pl.lit("owned"))
+            .when(pl.col("is_sold"))
+            .then(pl.lit("sold"))
+            .otherwise(pl.lit("in_stock"))
+            .alias("lifecycle_stage"),
+            pl.any_horizontal(CONFLICTS).alias("has_conflict"),
+        )
+        .drop("is_traded", "is_owned", "is_sold")
+    )
+    return lifecycle.sort(DEALER, SERIAL_KEY).collect()
+
+
+def conflict_summary(lifecycle: pl.DataFrame) -> pl.DataFrame:
+    """Count linked serials and conflicts per dealer.
+
+    Parameters
+    ----------
+    lifecycle : pl.DataFrame
+        The lifecycle table returned by `link_serials`.
+
+    Returns
+    -------
+    pl.DataFrame
+        Per dealer the number of serials, of serials linked across more than
+        one object, per lifecycle stage and per conflict.
+
+    """
+    linked_sources = pl.sum_horizontal(
+        [(pl.col(f"{prefix}_records") > 0) for prefix in SOURCE_PREFIXES.values()],
+    )
+    return (
+        lifecycle.group_by(DEALER)
+        .agg(
+            pl.len().alias("serials"),
+            (linked_sources > 1).sum().alias("linked_serials"),
+            *[
+                (pl.col("lifecycle_stage") == stage).sum().alias(stage)
+                for stage in ("in_stock", "sold", "owned", "traded")
+            ],
+            *[pl.col(conflict).sum() for conflict in CONFLICTS],
+        )
+        .sort(DEALER)
+    )
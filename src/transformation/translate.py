@@ -3,10 +3,13 @@
 from __future__ import annotations
 
 import json
+import logging
 from pathlib import Path
 
 import polars as pl
 
+log = logging.getLogger(__name__)
+
 
 def translate_csv_to_common_model(
     csv_path: str,
@@ -33,8 +36,47 @@ def translate_csv_to_common_model(
         Translated Polars DataFrame in the common data model format.
 
     """
-    # Load the raw CSV data into a Polars DataFrame
-    df_init = pl.read_csv(csv_path, ignore_errors=True)
+    return scan_csv_to_common_model(
+        csv_path,
+        dealer,
+        semantic_layer_path,
+        object_type,
+    ).collect()
+
+
+def scan_csv_to_common_model(
+    csv_path: str,
+    dealer: str,
+    semantic_layer_path: str,
+    object_type: str,
+) -> pl.LazyFrame:
+    """Plan the translation of a raw CSV into the common data model.
+
+    Only the CSV header and the rows Polars infers dtypes from are read here.
+    The file is scanned when the plan is collected, so filters and column
+    selections downstream are pushed down to the scan. Mapped fields whose
+    column is not in the file, e.g. in exports older than the mapping, are
+    null. `check_raw_files` fails on those the semantic layer requires.
+
+    Parameters
+    ----------
+    csv_path : str
+        The path to the raw CSV file.
+    dealer : str
+        The dealer name used to identify field mappings in the semantic layer.
+    semantic_layer_path : str
+        The path to the semantic layer JSON file.
+    object_type : str
+        The object type to translate (e.g., equipment, customer, etc.)
+
+    Returns
+    -------
+    pl.LazyFrame
+        The translation as a lazy query.
+
+    """
+    # Scan the raw CSV data into a Polars LazyFrame
+    lf_init = pl.scan_csv(csv_path, ignore_errors=True)
 
     # Load the semantic layer JSON
     with Path(semantic_layer_path).open(encoding="utf-8") as f:
@@ -44,7 +86,9 @@ def translate_csv_to_common_model(
     column_mapping, column_types = create_column_mapping(semantic_layer, dealer)
 
     common_model_columns = [
-        (col, column_mapping[col]) for col in df_init.columns if col in column_mapping
+        (col, column_mapping[col])
+        for col in lf_init.collect_schema().names()
+        if col in column_mapping
     ]
     # If no columns were matched, raise an error
     if not common_model_columns:
@@ -53,31 +97,43 @@ def translate_csv_to_common_model(
         )
         raise ValueError(error_message)
 
-    # Rename the columns in the DataFrame according to the semantic layer mapping
-    df_translate = df_init.rename(dict(common_model_columns))
-
-    # Drop columns not in semantic lyayer
-    columns_to_drop = [
-        col for col in df_translate.columns if col not in column_mapping.values()
-    ]
+    found = {column for _, column in common_model_columns}
+    missing = [column for column in column_types if column not in found]
+    if missing:
+        log.warning(
+            "%s has no column for %s.%s, translating them as nulls",
+            csv_path,
+            object_type,
+            missing,
+        )
 
-    df_translate = df_translate.drop(columns_to_drop)
-    return translate_columns(df_translate, column_types)
+    # Keep and rename the columns in the semantic layer
+    lf_translate = lf_init.select(
+        *[
+            pl.col(raw_column).alias(column)
+            for raw_column, column in common_model_columns
+        ],
+        *[pl.lit(None, dtype=pl.Utf8).alias(column) for column in missing],
+    )
+    return translate_columns(lf_translate, column_types)
 
 
-def translate_columns(df_translate: pl.DataFrame, column_types: dict) -> pl.DataFrame:
+def translate_columns(
+    df_translate: pl.DataFrame | pl.LazyFrame,
+    column_types: dict,
+) -> pl.DataFrame | pl.LazyFrame:
     """Translate the columns of a Polars DF to the common data model.
 
     Parameters
     ----------
-    df_translate : pl.DataFrame
-        The Polars DataFrame to translate.
+    df_translate : pl.DataFrame | pl.LazyFrame
+        The Polars DataFrame, or LazyFrame, to translate.
     column_types : dict
         A dictionary mapping column names to their data types.
 
     Returns
     -------
-    pl.DataFrame
+    pl.DataFrame | pl.LazyFrame
 
     """
     for col, data_type in column_types.items():
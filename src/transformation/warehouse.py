@@ -0,0 +1,324 @@
+"""Contains a local Parquet warehouse of the translated semantic-layer objects.
+
+The notebooks call `translate_csv_to_common_model` on a dealer's raw CSV every
+time they need an object, re-parsing and re-casting the whole file. Here every
+object of every dealer is translated once and written to
+`<path>/<object>/dealer=<dealer>/<object>.parquet`. Reads are lazy scans over
+those partitions, so dealer filters prune whole files, column selections only
+read the requested columns and row filters are pushed down to the Parquet
+row-group statistics. The event objects are sorted by their event date before
+writing, which makes date filters such as "stock units sold since 2011" skip
+most row groups.
+
+The same files can be queried in SQL through DuckDB views, one per object.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+from functools import reduce
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import polars as pl
+
+from src.transformation.semantic_layer import check_raw_files
+from src.transformation.translate import translate_csv_to_common_model
+
+if TYPE_CHECKING:
+    import duckdb
+
+DEALER = "dealer"
+DEFAULT_WAREHOUSE_PATH = "data/warehouse"
+SEMANTIC_LAYER_PATH = "./src/transformation/semantic_layer.json"
+ROW_GROUP_SIZE = 100_000
+# Event objects are sorted by their event date, so date filters skip row groups
+SORT_COLUMNS = {
+    "dealer_stock_unit": "dsu_sales_date",
+    "task": "task_activity_date",
+    "service_requests": "service_open_date",
+    "quote": "quote_created_date",
+    "sales_history": "sales_history_year",
+}
+
+log = logging.getLogger(__name__)
+
+
+class Warehouse:
+    """Translated objects stored as Parquet partitioned by dealer."""
+
+    def __init__(
+        self,
+        path: str = DEFAULT_WAREHOUSE_PATH,
+        semantic_layer_path: str = SEMANTIC_LAYER_PATH,
+    ) -> None:
+        """Initialize the Warehouse class.
+
+        Parameters
+        ----------
+        path : str
+            The directory holding one subdirectory per object.
+        semantic_layer_path : str
+            The path to the semantic layer JSON file.
+
+        """
+        self.path = Path(path)
+        self.semantic_layer_path = semantic_layer_path
+        with Path(semantic_layer_path).open(encoding="utf-8") as f:
+            self.object_names = list(json.load(f))
+
+    def partition_path(self, dealer: str, object_name: str) -> Path:
+        """Return the Parquet file of a dealer's object."""
+        return self.path / object_name / f"{DEALER}={dealer}" / f"{object_name}.parquet"
+
+    def dealers(self, object_name: str) -> list[str]:
+        """List the dealers an object is stored for."""
+        return sorted(
+            partition.parent.name.removeprefix(f"{DEALER}=")
+            for partition in (self.path / object_name).glob(
+                f"{DEALER}=*/{object_name}.parquet",
+            )
+        )
+
+    def write_object(
+        self,
+        dealer: str,
+        object_name: str,
+        df: pl.DataFrame | pl.LazyFrame,
+    ) -> int:
+        """Replace a dealer's partition of an object.
+
+        Parameters
+        ----------
+        dealer : str
+            The dealer name.
+        object_name : str
+            The semantic layer object, e.g. "dealer_stock_unit".
+        df : pl.DataFrame | pl.LazyFrame
+            The translated object.
+
+        Returns
+        -------
+        int
+            The number of rows written.
+
+        """
+        self._check_object(object_name)
+        df = df.lazy().collect()
+        sort_column = SORT_COLUMNS.get(object_name)
+        if sort_column in df.columns:
+            df = df.sort(sort_column, nulls_last=True)
+        path = self.partition_path(dealer, object_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so readers never see a half-written partition
+        temporary_path = path.with_name(f".{path.name}.tmp")
+        df.write_parquet(temporary_path, row_group_size=ROW_GROUP_SIZE, statistics=True)
+        temporary_path.replace(path)
+        return df.height
+
+    def ingest(
+        self,
+        dealer: str,
+        data_path: str,
+        object_names: list[str] | None = None,
+    ) -> dict[str, int]:
+        """Translate a dealer's raw CSV files and store them.
+
+        Parameters
+        ----------
+        dealer : str
+            The dealer name.
+        data_path : str
+            The directory holding the dealer's `<object-name>.csv` files.
+        object_names : list[str] | None
+            The objects to ingest. None ingests every semantic layer object
+            with a CSV file.
+
+        Returns
+        -------
+        dict[str, int]
+            The number of rows written per object.
+
+        """
+        csv_paths = {}
+        for object_name in object_names or self.object_names:
+            csv_path = Path(data_path) / f"{object_name.replace('_', '-')}.csv"
+            if not csv_path.exists():
+                if object_names is not None:
+                    error_message = f"No CSV file for {object_name} at {csv_path}."
+                    raise FileNotFoundError(error_message)
+                continue
+            csv_paths[object_name] = csv_path
+        # Fail on a bad mapping or file before translating any of them
+        check_raw_files(dealer, list(csv_paths), data_path, self.semantic_layer_path)
+        written = {}
+        for object_name, csv_path in csv_paths.items():
+            df = translate_csv_to_common_model(
+                str(csv_path),
+                dealer,
+                self.semantic_layer_path,
+                object_name,
+            )
+            written[object_name] = self.write_object(dealer, object_name, df)
+            log.info(
+                "Stored %d %s rows of %s",
+                written[object_name],
+                object_name,
+                dealer,
+            )
+        return written
+
+    def scan(
+        self,
+        object_name: str,
+        dealers: str | list[str] | None = None,
+    ) -> pl.LazyFrame:
+        """Lazily scan an object across dealers.
+
+        Parameters
+        ----------
+        object_name : str
+            The semantic layer object, e.g. "dealer_stock_unit".
+        dealers : str | list[str] | None
+            The dealer or dealers to scan, all stored ones when None.
+
+        Returns
+        -------
+        pl.LazyFrame
+            The object's rows with a `dealer` column.
+
+        """
+        self._check_object(object_name)
+        if isinstance(dealers, str):
+            dealers = [dealers]
+        stored = self.dealers(object_name)
+        missing = sorted(set(dealers or []) - set(stored))
+        if missing or not stored:
+            error_message = (
+                f"{object_name} is not stored for {missing or 'any dealer'}, "
+                "ingest it first."
+            )
+            raise FileNotFoundError(error_message)
+        # Only the requested dealers' files are scanned, and dealers mapping
+        # different fields still line up with nulls for the missing columns
+        return pl.concat(
+            [
+                pl.scan_parquet(self.partition_path(dealer, object_name)).with_columns(
+                    pl.lit(dealer).alias(DEALER),
+                )
+                for dealer in dealers or stored
+            ],
+            how="diagonal_relaxed",
+        )
+
+    def load_object(
+        self,
+        dealer: str | list[str] | None,
+        object_name: str,
+        columns: list[str] | None = None,
+        filters: pl.Expr | list[pl.Expr] | None = None,
+    ) -> pl.DataFrame:
+        """Read an object with projection and predicate pushdown.
+
+        Parameters
+        ----------
+        dealer : str | list[str] | None
+            The dealer or dealers to read, all stored ones when None.
+        object_name : str
+            The semantic layer object, e.g. "dealer_stock_unit".
+        columns : list[str] | None
+            The columns to read, all of them when None. The `dealer` column is
+            always included when reading several dealers.
+        filters : pl.Expr | list[pl.Expr] | None
+            Row filters, e.g. `pl.col("dsu_sales_date") >= date(2011, 1, 1)`.
+
+        Returns
+        -------
+        pl.DataFrame
+            The matching rows.
+
+        """
+        lf = self.scan(object_name, dealer)
+        if filters is not None:
+            if isinstance(filters, pl.Expr):
+                filters = [filters]
+            lf = lf.filter(reduce(lambda left, right: left & right, filters))
+        if columns is not None:
+            if not isinstance(dealer, str):
+                columns = [DEALER, *(column for column in columns if column != DEALER)]
+            lf = lf.select(columns)
+        elif isinstance(dealer, str):
+            lf = lf.drop(DEALER)
+        return lf.collect()
+
+    def connect(self, database: str = ":memory:") -> duckdb.DuckDBPyConnection:
+        """Open a DuckDB connection with one view per stored object.
+
+        Parameters
+        ----------
+        database : str
+            The DuckDB database file, in memory by default.
+
+        Returns
+        -------
+        duckdb.DuckDBPyConnection
+            The connection, e.g. for `SELECT * FROM dealer_stock_unit WHERE
+            dealer = 'koenig'`.
+
+        """
+        # DuckDB is only needed for SQL access, the Polars reads work without it
+        import duckdb  # noqa: PLC0415
+
+        connection = duckdb.connect(database)
+        for object_name in self.object_names:
+            if not self.dealers(object_name):
+                continue
+            pattern = self.path / object_name / f"{DEALER}=*" / f"{object_name}.parquet"
+            connection.execute(
+                f"CREATE OR REPLACE VIEW {object_name} AS SELECT * FROM "  # noqa: S608
+                f"read_parquet('{pattern}', hive_partitioning = true, "
+                "union_by_name = true)",
+            )
+        return connection
+
+    def _check_object(self, object_name: str) -> None:
+        if object_name not in self.object_names:
+            error_message = (
+                f"Unknown object '{object_name}', expected one of {self.object_names}."
+            )
+            raise ValueError(error_message)
+
+
+def load_object(
+    dealer: str | list[str] | None,
+    object_name: str,
+    columns: list[str] | None = None,
+    filters: pl.Expr | list[pl.Expr] | None = None,
+    warehouse_path: str = DEFAULT_WAREHOUSE_PATH,
+) -> pl.DataFrame:
+    """Read an object from the local warehouse.
+
+    A drop-in for `translate_csv_to_common_model` once the warehouse pipeline
+    has ingested the dealers, see `Warehouse.load_object`.
+
+    Parameters
+    ----------
+    dealer : str | list[str] | None
+        The dealer or dealers to read, all stored ones when None.
+    object_name : str
+        The semantic layer object, e.g. "dealer_stock_unit".
+    columns : list[str] | None
+        The columns to read, all of them when None.
+    filters : pl.Expr | list[pl.Expr] | None
+        Row filters pushed down to the Parquet scan.
+    warehouse_path : str
+        The warehouse directory.
+
+    Returns
+    -------
+    pl.DataFrame
+        The matching rows.
+
+    """
+    return Warehouse(warehouse_path).load_object(dealer, object_name, columns, filters)
@@ -0,0 +1,216 @@
+"""Contains lightweight per-stage counters and latency metrics.
+
+`StageMetrics` tracks, for every named stage, how often it ran, how often it
+produced a hit and how long it took. Latencies are kept in a fixed-size
+reservoir sample per stage, so memory stays bounded and percentiles stay
+unbiased however many calls are recorded. Recording costs two clock reads and
+a few integer updates, and nothing at all when metrics are disabled.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+RESERVOIR_SIZE = 4096
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+@dataclass
+class StageCall:
+    """Outcome of a single stage call, set by the caller inside `stage`."""
+
+    hit: bool = False
+
+
+@dataclass
+class StageStats:
+    """Running counters and a latency reservoir for one stage."""
+
+    calls: int = 0
+    hits: int = 0
+    total_seconds: float = 0.0
+    reservoir: list[float] = field(default_factory=list)
+
+
+class StageMetrics:
+    """Collect call counts, hit counts and latencies per named stage."""
+
+    def __init__(
+        self,
+        *,
+        enabled: bool = True,
+        reservoir_size: int = RESERVOIR_SIZE,
+        seed: int = 0,
+    ) -> None:
+        """Initialize the StageMetrics class.
+
+        Parameters
+        ----------
+        enabled : bool
+            Whether to record anything. Disabled metrics make `stage` a no-op.
+        reservoir_size : int
+            The number of latency samples kept per stage for percentiles.
+        seed : int
+            Seed for the reservoir sampling.
+
+        """
+        self.enabled = enabled
+        self.reservoir_size = reservoir_size
+        self._random = random.Random(seed)  # noqa: S311
+        self.stages: dict[str, StageStats] = {}
+
+    def reset(self) -> None:
+        """Drop everything recorded so far."""
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[StageCall]:
+        """Time a block as one call of a stage.
+
+        Set `hit` on the yielded object to count the call as a hit. Stages
+        nested inside each other are timed inclusively.
+
+        Parameters
+        ----------
+        name : str
+            The stage name.
+
+        """
+        call = StageCall()
+        if not self.enabled:
+            yield call
+            return
+        start = time.perf_counter()
+        try:
+            yield call
+        finally:
+            self.record(name, time.perf_counter() - start, hit=call.hit)
+
+    def record(self, name: str, seconds: float, *, hit: bool = False) -> None:
+        """Record one call of a stage.
+
+        Parameters
+        ----------
+        name : str
+            The stage name.
+        seconds : float
+            The duration of the call.
+        hit : bool
+            Whether the call produced a hit.
+
+        """
+        if not self.enabled:
+            return
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        stats.calls += 1
+        stats.hits += hit
+        stats.total_seconds += seconds
+        if len(stats.reservoir) < self.reservoir_size:
+            stats.reservoir.append(seconds)
+        else:
+            slot = self._random.randrange(stats.calls)
+            if slot < self.reservoir_size:
+                stats.reservoir[slot] = seconds
+
+    def to_dict(self) -> dict[str, dict]:
+        """Summarize every stage.
+
+        Returns
+        -------
+        dict[str, dict]
+            Per stage: calls, hits, hit_rate, total_seconds and the p50, p95 and
+            p99 latency in seconds.
+
+        """
+        summary = {}
+        for name, stats in self.stages.items():
+            quantiles = np.quantile(stats.reservoir, QUANTILES)
+            summary[name] = {
+                "calls": stats.calls,
+                "hits": stats.hits,
+                "hit_rate": stats.hits / stats.calls,
+                "total_seconds": stats.total_seconds,
+                **{
+                    f"p{round(quantile * 100)}_seconds": float(value)
+                    for quantile, value in zip(QUANTILES, quantiles, strict=True)
+                },
+            }
+        return summary
+
+    def to_prometheus(self, prefix: str) -> str:
+        """Render every stage in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        prefix : str
+            The metric name prefix, e.g. "make_model_match".
+
+        Returns
+        -------
+        str
+            Call and hit counters plus a latency summary, labelled by stage.
+
+        """
+        summary = self.to_dict()
+        lines = [
+            f"# HELP {prefix}_calls_total Number of calls per stage.",
+            f"# TYPE {prefix}_calls_total counter",
+        ]
+        lines += [
+            f'{prefix}_calls_total{{stage="{name}"}} {stats["calls"]}'
+            for name, stats in summary.items()
+        ]
+        lines += [
+            f"# HELP {prefix}_hits_total Number of calls per stage with a hit.",
+            f"# TYPE {prefix}_hits_total counter",
+        ]
+        lines += [
+            f'{prefix}_hits_total{{stage="{name}"}} {stats["hits"]}'
+            for name, stats in summary.items()
+        ]
+        lines += [
+            f"# HELP {prefix}_seconds Latency per stage call.",
+            f"# TYPE {prefix}_seconds summary",
+        ]
+        for name, stats in summary.items():
+            lines += [
+                f'{prefix}_seconds{{stage="{name}",quantile="{quantile}"}} '
+                f"{stats[f'p{round(quantile * 100)}_seconds']}"
+                for quantile in QUANTILES
+            ]
+            lines += [
+                f'{prefix}_seconds_sum{{stage="{name}"}} {stats["total_seconds"]}',
+                f'{prefix}_seconds_count{{stage="{name}"}} {stats["calls"]}',
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str, prefix: str) -> None:
+        """Write the metrics to a file.
+
+        Parameters
+        ----------
+        path : str
+            The output path. A `.prom` suffix writes the Prometheus text
+            format, anything else writes the `to_dict` summary as JSON.
+        prefix : str
+            The metric name prefix for the Prometheus format.
+
+        """
+        with Path(path).open("w") as f:
+            if path.endswith(".prom"):
+                f.write(self.to_prometheus(prefix))
+            else:
+                json.dump(self.to_dict(), f, indent=2)
@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+
+from src.benchmarks.pipeline_benchmark import (
+    BASELINE_PATH,
+    DEFAULT_CATALOG_ROWS,
+    DEFAULT_MATCH_ROWS,
+    DEFAULT_REPEATS,
+    DEFAULT_SCALES,
+    HashingSentenceModel,
+    find_regressions,
+    run_benchmark,
+)
+
+
+def _results(rows_per_second):
+    return {
+        "results": [
+            {"name": name, "scale": 10_000, "rows": 10_000, "rows_per_second": value}
+            for name, value in rows_per_second.items()
+        ],
+    }
+
+
+def test_01_find_regressions_over_threshold():
+    baseline = _results({"translate_columns": 1000, "eda_polars": 1000})
+    results = _results({"translate_columns": 700, "eda_polars": 900, "new": 1})
+    regressions = find_regressions(results, baseline, threshold=0.2)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("translate_columns at 10000 rows")
+
+
+def test_02_hashing_model_is_deterministic():
+    model = HashingSentenceModel()
+    first = model.encode(["ROW CROP TRACTOR", "Tractors-Row Crop Tractors"])
+    second = model.encode(["ROW CROP TRACTOR", "Tractors-Row Crop Tractors"])
+    np.testing.assert_array_equal(first, second)
+    assert model.encode([]).shape == (0, model.dimension)
+
+
+def test_03_run_benchmark_offline():
+    results = run_benchmark([500], match_rows=50, catalog_rows=200, repeats=1)
+    names = {result["name"] for result in results["results"]}
+    assert names == {
+        "translate_csv_to_common_model",
+        "translate_columns",
+        "eda_polars",
+        "create_aggregated_data",
+        "clean_make_model_batch",
+    }
+    assert all(result["rows_per_second"] > 0 for result in results["results"])
+
+
+def test_04_baseline_covers_the_default_run():
+    with open(BASELINE_PATH) as f:
+        baseline = json.load(f)
+    assert baseline["settings"] == {
+        "match_rows": DEFAULT_MATCH_ROWS,
+        "catalog_rows": DEFAULT_CATALOG_ROWS,
+        "repeats": DEFAULT_REPEATS,
+        "seed": 0,
+    }
+    covered = {(result["name"], result["scale"]) for result in baseline["results"]}
+    assert {scale for _, scale in covered} == set(DEFAULT_SCALES)
+    assert len(covered) == 5 * len(DEFAULT_SCALES)
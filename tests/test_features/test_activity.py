@@ -0,0 +1,175 @@
+from datetime import date, datetime
+
+import polars as pl
+import pytest
+
+from src.features.activity import ACTIVITY_SOURCES, ActivityAggregator, daily_activity
+from src.features.feature_store import FeatureStore
+
+
+@pytest.fixture
+def objects():
+    return {
+        "task": pl.DataFrame(
+            {
+                "task_id": ["T1", "T2", "T3", "T4"],
+                "task_account_id": ["A1", "A1", "A1", "A2"],
+                "task_activity_date": [
+                    date(2020, 1, 10),
+                    date(2020, 11, 20),
+                    date(2020, 12, 31),
+                    date(2021, 1, 1),
+                ],
+            },
+        ),
+        "service_requests": pl.DataFrame(
+            {
+                "service_order_id": ["S1", "S2", "S3"],
+                "service_account_id": ["A1", "A1", "A2"],
+                "service_customer_equipment_id": ["E1", "E1", "E2"],
+                "service_open_date": [
+                    datetime(2020, 12, 1, 8),
+                    datetime(2020, 12, 1, 15),
+                    datetime(2020, 6, 1, 9),
+                ],
+                "service_invoice_value": [100.0, 50.0, 900.0],
+            },
+        ),
+    }
+
+
+def test_01_daily_buckets(objects):
+    service = ACTIVITY_SOURCES[1]
+    daily = daily_activity(
+        service,
+        objects["service_requests"],
+        "equipment",
+    ).collect()
+    assert daily.sort("entity_id").select(
+        "entity_id",
+        "day",
+        "count",
+        "amount",
+    ).rows() == [
+        ("E1", date(2020, 12, 1), 2, 150.0),
+        ("E2", date(2020, 6, 1), 1, 900.0),
+    ]
+
+
+def test_02_windowed_features(objects):
+    activity = ActivityAggregator()
+    activity.append(objects)
+    spine = pl.DataFrame(
+        {"account_id": ["A1", "A2", "A3"], "cutoff": [date(2021, 1, 1)] * 3},
+    )
+    features = activity.features(spine).collect().sort("account_id")
+    a1, a2, a3 = features.rows(named=True)
+    assert (a1["task_30d_count"], a1["task_90d_count"], a1["task_365d_count"]) == (
+        1,
+        2,
+        3,
+    )
+    assert a1["task_activity_last_date"] == date(2020, 12, 31)
+    assert a1["task_activity_days_since_last"] == 1
+    assert a1["service_30d_count"] == 0
+    assert a1["service_90d_count"] == 2
+    assert a1["service_90d_amount"] == 150.0
+    # Events on the cutoff itself are not seen
+    assert a2["task_365d_count"] == 0
+    assert a2["service_90d_amount"] == 0.0
+    assert a2["service_365d_amount"] == 900.0
+    assert a3["task_365d_count"] == 0
+    assert a3["task_activity_last_date"] is None
+
+    equipment = activity.features(
+        pl.DataFrame({"customer_equipment_id": ["E1"], "cutoff": [date(2021, 1, 1)]}),
+        "equipment",
+    ).collect()
+    assert equipment["service_90d_amount"].to_list() == [150.0]
+    assert "task_30d_count" not in equipment.columns
+
+
+def test_03_incremental_append_matches_full_build(objects, tmp_path):
+    full = ActivityAggregator()
+    full.append(objects)
+
+    activity = ActivityAggregator()
+    activity.append(
+        {
+            "task": objects["task"].head(2),
+            "service_requests": objects["service_requests"],
+        },
+    )
+    activity.save(str(tmp_path))
+    activity = ActivityAggregator.load(str(tmp_path))
+    # Only the two later tasks are new
+    assert activity.append(objects) == 2
+    keys = ["level", "source", "entity_id", "day"]
+    assert activity.state.sort(keys).equals(full.state.sort(keys))
+
+
+def test_04_feature_store_integration(objects, tmp_path):
+    activity = ActivityAggregator()
+    activity.append(objects)
+    store = FeatureStore(str(tmp_path))
+    store.register(activity.feature_function())
+    features = store.compute(
+        objects,
+        ["A1", "A2"],
+        [date(2020, 12, 1), date(2021, 1, 1)],
+    )
+    assert features.height == 4
+    row = features.filter(
+        pl.col("account_id") == "A1",
+        pl.col("cutoff") == date(2020, 12, 1),
+    ).row(0, named=True)
+    assert row["tasks_count"] == 2
+    assert row["task_30d_count"] == 1
+    assert row["service_365d_count"] == 0
+
+
+def test_05_unmapped_levels_and_dates_are_skipped(objects):
+    # Koenig dates service requests by their close date and has no equipment id
+    objects["service_requests"] = (
+        objects["service_requests"]
+        .drop("service_customer_equipment_id")
+        .rename({"service_open_date": "service_close_date"})
+    )
+    objects["task"] = objects["task"].drop("task_activity_date")
+    activity = ActivityAggregator()
+    assert activity.append(objects) == 3
+    assert activity.state.select("level", "source").unique().rows() == [
+        ("account", "service"),
+    ]
+    spine = pl.DataFrame({"account_id": ["A1"], "cutoff": [date(2021, 1, 1)]})
+    features = activity.features(spine).collect()
+    assert features["service_90d_amount"].to_list() == [150.0]
+
+
+def test_06_late_and_future_events(objects, tmp_path):
+    activity = ActivityAggregator()
+    future_task = pl.DataFrame(
+        {
+            "task_id": ["T9"],
+            "task_account_id": ["A1"],
+            "task_activity_date": [date(2021, 6, 1)],
+        },
+    )
+    objects["task"] = pl.concat([objects["task"].head(2), future_task])
+    # The task scheduled ahead waits for its day
+    assert activity.append(objects, as_of=date(2021, 1, 1)) == 5
+    activity.save(str(tmp_path))
+    activity = ActivityAggregator.load(str(tmp_path))
+    late_task = pl.DataFrame(
+        {
+            "task_id": ["T5"],
+            "task_account_id": ["A1"],
+            "task_activity_date": [date(2020, 11, 20)],
+        },
+    )
+    objects["task"] = pl.concat([objects["task"], late_task])
+    assert activity.append(objects, as_of=date(2021, 1, 2)) == 1
+    spine = pl.DataFrame({"account_id": ["A1"], "cutoff": [date(2021, 1, 1)]})
+    assert activity.features(spine).collect()["task_90d_count"].to_list() == [2]
+    assert activity.append(objects, as_of=date(2021, 6, 2)) == 1
+    assert activity.append(objects, as_of=date(2021, 6, 2)) == 0
@@ -0,0 +1,111 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from src.features.cohorts import CohortAnalysis
+
+
+@pytest.fixture
+def events():
+    return pl.DataFrame(
+        {
+            "account_id": ["A", "A", "A", "B", "B", "A"],
+            "product_group": [
+                "LARGE TRACTOR",
+                "LARGE TRACTOR",
+                "COMBINES",
+                "COMBINES",
+                "COMBINES",
+                "LARGE TRACTOR",
+            ],
+            "event_date": [
+                date(2015, 8, 1),
+                date(2018, 3, 1),
+                date(2016, 1, 1),
+                date(2017, 5, 1),
+                date(2019, 5, 1),
+                date(2021, 3, 1),
+            ],
+            "amount": [100.0, 120.0, 300.0, 250.0, 260.0, 130.0],
+        },
+    )
+
+
+def test_01_intervals_for_all_groups_in_one_pass(events):
+    intervals = CohortAnalysis().update(events)
+    tractors = intervals.filter(
+        (pl.col("account_id") == "A") & (pl.col("product_group") == "LARGE TRACTOR"),
+    )
+    assert tractors["cohort_id"].to_list() == ["2015_Q3"] * 3
+    assert tractors["purchase_number"].to_list() == [1, 2, 3]
+    assert tractors["years_from_previous_purchase"].to_list() == [None, 3, 3]
+    combines = intervals.filter(pl.col("product_group") == "COMBINES")
+    assert combines["cohort_year"].to_list() == [2015, 2017, 2017]
+    assert combines["years_from_previous_purchase"].to_list() == [None, None, 2]
+
+
+def test_02_incremental_update_matches_full_rebuild(events):
+    full = CohortAnalysis()
+    full_intervals = full.update(events)
+    incremental = CohortAnalysis()
+    old = events.filter(pl.col("event_date") < date(2018, 1, 1))
+    incremental.update(old)
+    new_intervals = incremental.update(
+        events.filter(pl.col("event_date") >= date(2018, 1, 1)),
+    )
+    assert new_intervals.equals(
+        full_intervals.filter(pl.col("event_date") >= date(2018, 1, 1)),
+    )
+    assert incremental.summary().equals(full.summary())
+
+
+def test_03_summary_and_persistence(events, tmp_path):
+    cohorts = CohortAnalysis()
+    cohorts.update(events)
+    cohorts.save(str(tmp_path))
+    summary = CohortAnalysis.load(str(tmp_path)).summary(["LARGE TRACTOR"])
+    assert summary.row(0, named=True) == {
+        "product_group": "LARGE TRACTOR",
+        "cohort_year": 2015,
+        "accounts": 1,
+        "repeat_accounts": 1,
+        "purchases": 3,
+        "mean_days_between_purchases": (943 + 1096) / 2,
+        "mean_years_between_purchases": 3.0,
+    }
+
+
+def test_04_late_invoices_fail(events):
+    cohorts = CohortAnalysis()
+    cohorts.update(events)
+    with pytest.raises(ValueError, match="predate"):
+        cohorts.update(events.head(1))
+
+
+def test_05_rerunning_the_history_only_adds_unseen_invoices(events, tmp_path):
+    events = events.with_row_index("invoice_id").with_columns(
+        pl.col("invoice_id").cast(pl.Utf8),
+    )
+    cohorts = CohortAnalysis()
+    cohorts.update(cohorts.unseen(events.head(5)))
+    cohorts.save(str(tmp_path))
+    cohorts = CohortAnalysis.load(str(tmp_path))
+    new = cohorts.update(cohorts.unseen(events))
+    assert new["invoice_id"].to_list() == ["5"]
+    assert cohorts.update(cohorts.unseen(events)).is_empty()
+    full = CohortAnalysis()
+    full.update(events)
+    assert cohorts.summary().equals(full.summary())
+    # A backdated invoice is not dropped silently
+    backdated = pl.DataFrame(
+        {
+            "invoice_id": ["6"],
+            "account_id": ["B"],
+            "product_group": ["COMBINES"],
+            "event_date": [date(2018, 1, 1)],
+            "amount": [10.0],
+        },
+    )
+    with pytest.raises(ValueError, match="predate"):
+        cohorts.update(cohorts.unseen(pl.concat([events, backdated])))
@@ -0,0 +1,124 @@
+from datetime import date, datetime
+
+import polars as pl
+import pytest
+
+from src.features.feature_store import FeatureStore, LeakageError, check_point_in_time
+
+
+@pytest.fixture
+def objects():
+    return {
+        "dealer_stock_unit": pl.DataFrame(
+            {
+                "dsu_account_id": ["A", "A", "B", "A"],
+                "dsu_sales_date": [
+                    date(2022, 3, 1),
+                    date(2022, 12, 31),
+                    date(2023, 1, 1),
+                    date(2023, 6, 1),
+                ],
+                "dsu_sale_price": [100.0, 50.0, 70.0, 30.0],
+                "dsu_invoice_number": ["I1", "I2", "I3", "I4"],
+            },
+        ),
+        "task": pl.DataFrame(
+            {
+                "task_account_id": ["A", "B"],
+                "task_activity_date": [date(2022, 6, 1), date(2023, 2, 1)],
+            },
+        ),
+        "service_requests": pl.DataFrame(
+            {
+                "service_account_id": ["B", "B"],
+                "service_open_date": [
+                    datetime(2022, 12, 31, 23, 0),
+                    datetime(2023, 1, 1, 8, 0),
+                ],
+                "service_invoice_value": [10.0, 20.0],
+            },
+        ),
+    }
+
+
+def test_01_features_only_use_events_before_cutoff(objects):
+    store = FeatureStore("unused", label_horizon_months=1)
+    features = store.compute(objects, ["A", "B"], [date(2023, 1, 1)])
+    a, b = features.rows(named=True)
+    assert a["stock_unit_sales_count"] == 2
+    assert a["stock_unit_sales_amount"] == 150.0
+    assert a["stock_unit_sales_days_since_last"] == 1
+    assert a["tasks_count"] == 1
+    assert b["stock_unit_sales_count"] == 0
+    assert b["stock_unit_sales_last_date"] is None
+    assert b["service_requests_amount"] == 10.0
+    assert b["label_purchase"] is True
+    assert b["label_purchase_amount"] == 70.0
+    assert a["label_purchase"] is False
+
+
+def test_02_labels_are_null_until_the_horizon_is_observed(objects):
+    features = FeatureStore("unused").compute(objects, ["A"], [date(2023, 1, 1)])
+    assert features["label_purchase"][0] is None
+
+
+def test_03_update_only_computes_new_cutoffs(objects, tmp_path):
+    store = FeatureStore(str(tmp_path / "features"))
+    assert store.update(objects, ["A", "B"], [date(2022, 7, 1)]) == [date(2022, 7, 1)]
+    new = store.update(objects, ["A", "B"], [date(2022, 7, 1), date(2023, 3, 1)])
+    assert new == [date(2023, 3, 1)]
+    assert store.cutoffs() == [date(2022, 7, 1), date(2023, 3, 1)]
+    features = store.read().collect()
+    assert features.height == 4
+    assert features.filter(pl.col("cutoff") == date(2022, 7, 1))[
+        "tasks_count"
+    ].to_list() == [1, 0]
+
+
+def test_04_future_events_fail(objects):
+    def leaky_features(objects, spine):
+        return spine.join(
+            objects["task"]
+            .lazy()
+            .select(
+                pl.col("task_account_id").alias("account_id"),
+                pl.col("task_activity_date").alias("any_task_last_date"),
+            ),
+            on="account_id",
+        )
+
+    store = FeatureStore("unused")
+    store.register(leaky_features)
+    with pytest.raises(LeakageError, match="any_task_last_date"):
+        store.compute(objects, ["A", "B"], [date(2022, 7, 1)])
+    check_point_in_time(
+        store.compute(objects, ["A"], [date(2022, 7, 1)]).drop("any_task_last_date"),
+    )
+
+
+def test_05_sources_fall_back_or_skip_on_unmapped_columns(objects):
+    # Koenig maps the close date of service requests but not the open date
+    objects["service_requests"] = objects["service_requests"].rename(
+        {"service_open_date": "service_close_date"},
+    )
+    objects["quote"] = pl.DataFrame({"quote_customer_account_id": ["A"]})
+    features = FeatureStore("unused").compute(objects, ["B"], [date(2023, 1, 1)])
+    assert features["service_requests_amount"].to_list() == [10.0]
+    assert "quotes_count" not in features.columns
+
+
+def test_06_feature_functions_must_report_their_last_dates(objects):
+    def undated_features(objects, spine):
+        return spine.join(
+            objects["task"]
+            .lazy()
+            .group_by(pl.col("task_account_id").alias("account_id"))
+            .len("task_total"),
+            on="account_id",
+            how="left",
+        )
+
+    store = FeatureStore("unused")
+    store.register(undated_features)
+    with pytest.raises(ValueError, match="undated_features has no `_last_date`"):
+        store.compute(objects, ["A", "B"], [date(2022, 7, 1)])
@@ -0,0 +1,111 @@
+from datetime import date, datetime
+
+import polars as pl
+import pytest
+
+from src.features.feature_store import FeatureStore
+from src.features.funnel import (
+    funnel_feature_function,
+    funnel_features,
+    link_quotes_to_sales,
+    quote_events,
+)
+from src.features.rfm import stock_unit_sales
+
+
+@pytest.fixture
+def objects():
+    return {
+        "quote": pl.DataFrame(
+            {
+                "quote_id": [1, 2, 3, 4, 5],
+                "quote_customer_account_id": ["A1", "A1", "A1", "A2", "A3"],
+                "quote_created_date": [
+                    datetime(2020, 1, 1, 9),
+                    datetime(2020, 3, 1, 9),
+                    datetime(2020, 6, 1, 9),
+                    datetime(2019, 1, 1, 9),
+                    datetime(2020, 5, 1, 9),
+                ],
+                "quote_po_number": [None, "PO-2", None, None, "PO-5"],
+            },
+        ),
+        "dealer_stock_unit": pl.DataFrame(
+            {
+                "dsu_account_id": ["A1", "A1", "A2", "A9"],
+                "dsu_group": ["COMBINES", "HAY", "HAY", "HAY"],
+                "dsu_sales_date": [
+                    date(2020, 2, 1),
+                    date(2020, 4, 1),
+                    date(2020, 6, 1),
+                    date(2020, 1, 1),
+                ],
+                "dsu_sale_price": [100.0, 50.0, 10.0, 1.0],
+                "dsu_invoice_number": ["I1", "I2", "I3", "I4"],
+            },
+        ),
+    }
+
+
+def test_01_link_quotes_to_first_later_sale(objects):
+    links = (
+        link_quotes_to_sales(
+            quote_events(objects["quote"]),
+            stock_unit_sales(objects["dealer_stock_unit"]),
+        )
+        .collect()
+        .sort("quote_id")
+    )
+    assert links["sale_date"].to_list() == [
+        date(2020, 2, 1),
+        date(2020, 4, 1),
+        None,
+        # The A2 sale came 517 days after its quote
+        None,
+        None,
+    ]
+    assert links["conversion_lag_days"].to_list() == [31, 31, None, None, None]
+    assert links["close_date"][2] == date(2021, 6, 2)
+
+
+def test_02_funnel_features_before_cutoff(objects):
+    links = link_quotes_to_sales(
+        quote_events(objects["quote"]),
+        stock_unit_sales(objects["dealer_stock_unit"]),
+    )
+    spine = pl.DataFrame(
+        {
+            "account_id": ["A1", "A1", "A2", "A3", "A4"],
+            "cutoff": [
+                date(2020, 3, 15),
+                date(2020, 7, 1),
+                date(2020, 7, 1),
+                date(2020, 5, 1),
+                date(2020, 7, 1),
+            ],
+        },
+    )
+    features = funnel_features(links, spine).collect().sort("account_id", "cutoff")
+    a1_march, a1_july, a2, a3, a4 = features.rows(named=True)
+    assert a1_march["open_quotes"] == 1
+    assert a1_march["converted_quotes"] == 1
+    assert a1_march["quote_funnel_last_date"] == date(2020, 3, 1)
+    assert a1_july["open_quotes"] == 1
+    assert a1_july["quote_conversion_rate"] == 1.0
+    assert a1_july["mean_conversion_lag_days"] == 31.0
+    assert (a2["open_quotes"], a2["expired_quotes"]) == (0, 1)
+    assert a2["quote_conversion_rate"] == 0.0
+    # Quotes created on the cutoff are not seen
+    assert a3["open_quotes"] == 0
+    assert a3["quote_funnel_last_date"] is None
+    assert (a4["open_quotes"], a4["converted_quotes"]) == (0, 0)
+
+
+def test_03_feature_store_integration(objects, tmp_path):
+    store = FeatureStore(str(tmp_path))
+    store.register(funnel_feature_function())
+    features = store.compute(objects, ["A1", "A3"], [date(2020, 7, 1)])
+    row = features.filter(pl.col("account_id") == "A3").row(0, named=True)
+    assert row["open_quotes"] == 1
+    # The current PO number may have been attached after the cutoff
+    assert "open_quotes_with_po" not in features.columns
@@ -0,0 +1,128 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from src.features.rfm import (
+    monthly_cutoffs,
+    rfm_features,
+    sales_history_sales,
+    stock_unit_sales,
+)
+
+
+@pytest.fixture
+def dealer_stock_unit():
+    return pl.DataFrame(
+        {
+            "dsu_account_id": ["A1", "A1", "A1", "A2", "A2", None],
+            "dsu_group": [
+                "TRACTOR",
+                "TRACTOR",
+                "COMBINE",
+                "TRACTOR",
+                "TRACTOR",
+                "TRACTOR",
+            ],
+            "dsu_sales_date": [
+                date(2020, 1, 15),
+                date(2021, 6, 1),
+                date(2021, 12, 31),
+                date(2019, 3, 1),
+                date(2022, 2, 1),
+                date(2021, 1, 1),
+            ],
+            "dsu_sale_price": [100.0, 200.0, 1000.0, 50.0, 75.0, 10.0],
+            "dsu_invoice_number": ["I1", "I2", "I3", "I4", "NOTAVA", "I6"],
+        },
+    )
+
+
+def _wide(features):
+    return features.pivot(
+        "feature", index=["account_id", "product_group", "cutoff"], values="value"
+    ).sort(
+        "account_id",
+        "product_group",
+        "cutoff",
+    )
+
+
+def test_01_monthly_cutoffs():
+    assert monthly_cutoffs(date(2021, 11, 1), date(2022, 2, 15)) == [
+        date(2021, 11, 1),
+        date(2021, 12, 1),
+        date(2022, 1, 1),
+        date(2022, 2, 1),
+    ]
+
+
+def test_02_features_only_count_events_before_cutoff(dealer_stock_unit):
+    features = rfm_features(
+        stock_unit_sales(dealer_stock_unit),
+        [date(2021, 6, 1), date(2022, 1, 1)],
+        windows=(12,),
+    )
+    wide = _wide(features)
+    a1_tractor = wide.filter(
+        (pl.col("account_id") == "A1") & (pl.col("product_group") == "TRACTOR")
+    )
+    assert a1_tractor["frequency"].to_list() == [1.0, 2.0]
+    assert a1_tractor["monetary"].to_list() == [100.0, 300.0]
+    assert a1_tractor["recency_days"].to_list() == [503.0, 214.0]
+    assert a1_tractor["tenure_days"].to_list() == [503.0, 717.0]
+    assert a1_tractor["monetary_12m"].to_list() == [0.0, 200.0]
+
+    a1_all = wide.filter(
+        (pl.col("account_id") == "A1") & (pl.col("product_group") == "all")
+    )
+    assert a1_all["frequency"].to_list() == [1.0, 3.0]
+    assert a1_all["monetary_12m"].to_list() == [0.0, 1200.0]
+
+
+def test_03_accounts_appear_once_they_have_bought(dealer_stock_unit):
+    features = rfm_features(
+        stock_unit_sales(dealer_stock_unit), [date(2020, 1, 15), date(2022, 6, 1)]
+    )
+    first_cutoff = features.filter(pl.col("cutoff") == date(2020, 1, 15))
+    assert first_cutoff["account_id"].unique().to_list() == ["A2"]
+    # The NOTAVA move and the sale without an account are not sales
+    a2 = _wide(features).filter(
+        (pl.col("account_id") == "A2") & (pl.col("product_group") == "all")
+    )
+    assert a2["frequency"].to_list() == [1.0, 1.0]
+    assert set(features["feature"].unique()) == {
+        "recency_days",
+        "tenure_days",
+        "frequency",
+        "monetary",
+        *[
+            f"{measure}_{window}m"
+            for measure in ("frequency", "monetary")
+            for window in (3, 12, 36)
+        ],
+    }
+
+
+def test_04_sales_history_is_dated_at_year_end():
+    sales_history = pl.DataFrame(
+        {
+            "sales_history_account_id": ["A1", "A1"],
+            "sales_history_year": [2020, 2021],
+            "sales_history_parts_sales": [10.0, 20.0],
+            "sales_history_service_sales": [0.0, 5.0],
+            "sales_history_rental_sales": [None, None],
+            "sales_history_wholegood_sales": [0.0, 0.0],
+        },
+    )
+    events = (
+        sales_history_sales(sales_history).collect().sort("event_date", "product_group")
+    )
+    assert events["product_group"].to_list() == ["parts", "parts", "service"]
+    assert events["event_date"].to_list() == [
+        date(2020, 12, 31),
+        date(2021, 12, 31),
+        date(2021, 12, 31),
+    ]
+    wide = _wide(rfm_features(events, [date(2021, 12, 31)], windows=()))
+    assert wide.filter(pl.col("product_group") == "all")["monetary"].to_list() == [10.0]
@@ -0,0 +1,120 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from src.features.rollups import (
+    RevenueRollup,
+    fiscal_year_expr,
+    reconcile_sales_history,
+    stock_unit_rollup,
+)
+
+
+@pytest.fixture
+def dealer_stock_unit():
+    return pl.DataFrame(
+        {
+            "dsu_account_id": ["A0", "A0", "A0", "A1", "A1"],
+            "dsu_sales_date": [
+                date(2019, 10, 31),
+                date(2019, 11, 1),
+                date(2020, 3, 1),
+                date(2020, 5, 1),
+                date(2020, 6, 1),
+            ],
+            "dsu_group": ["COMBINES", "COMBINES", "COMBINES", "HAY", "HAY"],
+            "dsu_sale_price": [100.0, 200.0, 300.0, 50.0, 60.0],
+            "dsu_invoice_amount": [110.0, 220.0, 330.0, 55.0, 66.0],
+            "dsu_invoice_number": ["I1", "I2", "I3", "I4", "NOTAVA"],
+        },
+    )
+
+
+def test_01_fiscal_year_starts_in_november():
+    dates = pl.DataFrame({"d": [date(2020, 10, 31), date(2020, 11, 1)]})
+    assert dates.select(fiscal_year_expr("d"))["d"].to_list() == [2020, 2021]
+    assert dates.select(fiscal_year_expr("d", 1))["d"].to_list() == [2020, 2020]
+
+
+def test_02_rollup_by_fiscal_year(dealer_stock_unit):
+    rollup = (
+        stock_unit_rollup(dealer_stock_unit, "koenig")
+        .collect()
+        .sort("account_id", "fiscal_year")
+    )
+    assert rollup.select("account_id", "fiscal_year", "units", "sale_price").rows() == [
+        ("A0", 2019, 1, 100.0),
+        ("A0", 2020, 2, 500.0),
+        ("A1", 2020, 1, 50.0),
+    ]
+    calendar = stock_unit_rollup(dealer_stock_unit, "koenig", first_month=1).collect()
+    assert sorted(calendar["fiscal_year"].to_list()) == [2019, 2020, 2020]
+
+
+def test_03_update_only_rewrites_changed_years(dealer_stock_unit, tmp_path):
+    rollups = RevenueRollup(str(tmp_path))
+    assert rollups.update("koenig", dealer_stock_unit.head(3)) == [2019, 2020]
+    closed = tmp_path / "dealer=koenig" / "fiscal_year=2019" / "rollup.parquet"
+    modified = closed.stat().st_mtime_ns
+
+    later = pl.DataFrame(
+        {
+            "dsu_account_id": ["A0", "A2"],
+            "dsu_sales_date": [date(2020, 9, 1), date(2020, 12, 1)],
+            "dsu_group": ["COMBINES", "HAY"],
+            "dsu_sale_price": [400.0, 70.0],
+            "dsu_invoice_amount": [440.0, 77.0],
+            "dsu_invoice_number": ["I5", "I6"],
+        },
+    )
+    assert rollups.update("koenig", pl.concat([dealer_stock_unit, later])) == [
+        2020,
+        2021,
+    ]
+    assert closed.stat().st_mtime_ns == modified
+    rows = rollups.read(["koenig"], [2020]).collect().sort("account_id")
+    assert rows.select("account_id", "units", "sale_price").rows() == [
+        ("A0", 3, 900.0),
+        ("A1", 1, 50.0),
+    ]
+    assert rollups.read().collect().height == 4
+
+
+def test_04_reconcile_sales_history(dealer_stock_unit):
+    rollup = stock_unit_rollup(dealer_stock_unit, "koenig")
+    sales_history = pl.DataFrame(
+        {
+            "sales_history_account_id": ["A0", "A0", "A1", "A2"],
+            "sales_history_year": [2019, 2020, 2020, 2020],
+            "sales_history_wholegood_sales": [110.0, 5000.0, 60.0, 0.0],
+        },
+    )
+    discrepancies = reconcile_sales_history(rollup, sales_history)
+    assert discrepancies.select("account_id", "fiscal_year").rows() == [("A0", 2020)]
+    assert discrepancies["relative_difference"][0] == pytest.approx(0.89)
+
+
+def test_05_update_rewrites_changed_and_deletes_emptied_years(
+    dealer_stock_unit,
+    tmp_path,
+):
+    rollups = RevenueRollup(str(tmp_path))
+    rollups.update("koenig", dealer_stock_unit)
+    late = pl.DataFrame(
+        {
+            "dsu_account_id": ["A1"],
+            "dsu_sales_date": [date(2019, 1, 1)],
+            "dsu_group": ["HAY"],
+            "dsu_sale_price": [10.0],
+            "dsu_invoice_amount": [11.0],
+            "dsu_invoice_number": ["I7"],
+        },
+    )
+    # A late invoice for a year before the latest one stored
+    assert rollups.update("koenig", pl.concat([dealer_stock_unit, late])) == [2019]
+    assert rollups.read(["koenig"], [2019]).collect()["units"].sum() == 2
+    assert rollups.update("koenig", pl.concat([dealer_stock_unit, late])) == []
+    # Every 2019 sale is reversed
+    assert rollups.update("koenig", dealer_stock_unit.tail(3)) == [2020]
+    assert rollups.fiscal_years("koenig") == [2020]
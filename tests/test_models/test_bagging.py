@@ -0,0 +1,71 @@
+import numpy as np
+import polars as pl
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from src.models.bagging import (
+    BaggedLogisticEnsemble,
+    balanced_bootstrap_indices,
+    fit_bagged_ensemble,
+    train_bagged_model,
+)
+from src.models.propensity import PropensityScorer, save_model
+
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    x = rng.normal(size=(3_000, 3)) * [1, 10, 100] + [0, 5, 50]
+    labels = (rng.random(3_000) < 1 / (1 + np.exp(-x[:, 0] - 2))).astype(np.int8)
+    return x, labels
+
+
+def test_01_balanced_bootstrap_indices():
+    labels = np.array([1, 0, 0, 0, 1, 0, 0])
+    indices = balanced_bootstrap_indices(labels, 5)
+    assert indices.shape == (5, 4)
+    assert (labels[indices].sum(axis=1) == 2).all()
+    with pytest.raises(ValueError, match="both buyers and non-buyers"):
+        balanced_bootstrap_indices(np.zeros(3), 2)
+
+
+def test_02_vectorized_predict_averages_members(data):
+    x, labels = data
+    ensemble = fit_bagged_ensemble(x, labels, n_members=6, n_jobs=2)
+    assert len(ensemble) == 6
+    assert ensemble.coefficients.shape == (6, 3)
+
+    scaled = (x - ensemble.mean) / ensemble.scale
+    member = LogisticRegression()
+    member.coef_ = ensemble.coefficients[:1]
+    member.intercept_ = ensemble.intercepts[:1]
+    member.classes_ = np.array([0, 1])
+    np.testing.assert_allclose(
+        ensemble.member_probabilities(x)[:, 0],
+        member.predict_proba(scaled)[:, 1],
+    )
+    np.testing.assert_allclose(
+        ensemble.predict_proba(x)[:, 1],
+        ensemble.member_probabilities(x).mean(axis=1),
+    )
+
+
+def test_03_train_save_and_score(data, tmp_path):
+    x, labels = data
+    table = pl.DataFrame(
+        {
+            "account_id": [f"A{i}" for i in range(len(labels))],
+            "product_group": ["COMBINES"] * len(labels),
+            "frequency": x[:, 0],
+            "recency_days": x[:, 1],
+            "monetary": x[:, 2],
+            "label_purchase": labels.astype(bool),
+        },
+    )
+    ensemble, metrics = train_bagged_model(table, n_members=20, n_jobs=2)
+    assert isinstance(ensemble, BaggedLogisticEnsemble)
+    assert metrics["members"] == 20
+    assert metrics["roc_auc"] > 0.7
+    save_model(ensemble, str(tmp_path), metrics=metrics)
+    scores = PropensityScorer.load(str(tmp_path)).score(table)
+    np.testing.assert_allclose(scores, ensemble.predict_proba(x)[:, 1])
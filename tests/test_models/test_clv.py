@@ -0,0 +1,138 @@
+from datetime import date
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.features.rollups import stock_unit_rollup
+from src.models import clv
+from src.models.clv import (
+    clv_feature_table,
+    encode_design_matrix,
+    predict_clv,
+    train_clv_model,
+)
+
+
+@pytest.fixture
+def objects():
+    rng = np.random.default_rng(0)
+    accounts = [f"A{i}" for i in range(60)]
+    years = list(range(2014, 2024))
+    sales_history = pl.DataFrame(
+        {
+            "sales_history_account_id": [a for a in accounts for _ in years],
+            "sales_history_year": years * len(accounts),
+        },
+    ).with_columns(
+        *[
+            pl.Series(column, rng.random(len(accounts) * len(years)) * 1e4)
+            for column in (
+                "sales_history_parts_sales",
+                "sales_history_service_sales",
+                "sales_history_rental_sales",
+                "sales_history_wholegood_sales",
+            )
+        ],
+    )
+    sales_history = sales_history.with_columns(
+        pl.sum_horizontal(pl.col("^sales_history_.*_sales$")).alias(
+            "sales_history_total_sales",
+        ),
+    )
+    dealer_stock_unit = pl.DataFrame(
+        {
+            "dsu_account_id": ["A0", "A0", "A0", "A1"],
+            "dsu_sales_date": [
+                date(2015, 3, 1),
+                date(2016, 3, 1),
+                date(2016, 11, 1),
+                date(2015, 5, 1),
+            ],
+            "dsu_group": ["COMBINES", "COMBINES", "LARGE TRACTOR", "AMS COMPONENTS"],
+            "dsu_sale_price": [100.0, 100.0, 500.0, 10.0],
+            "dsu_invoice_amount": [110.0, 110.0, 550.0, 11.0],
+            "dsu_invoice_number": ["I1", "I2", "I3", "I4"],
+        },
+    )
+    rollup = stock_unit_rollup(dealer_stock_unit, "koenig").collect()
+    account = pl.DataFrame(
+        {
+            "account_id": accounts,
+            "customer_segment": rng.choice(["Cash Grain", "Dairy"], len(accounts)),
+            "type_of_equipment": rng.choice(["New Only", "Used Only"], len(accounts)),
+            "customer_loyalty": [None] * len(accounts),
+        },
+    )
+    return sales_history, rollup, account
+
+
+def test_01_feature_table_for_all_anchor_years(objects):
+    table = clv_feature_table(*objects, anchor_years=[2016, 2017])
+    assert table.height == 120
+    row = table.row(0, named=True)
+    history = objects[0].filter(
+        (pl.col("sales_history_account_id") == "A0")
+        & pl.col("sales_history_year").is_between(2014, 2016),
+    )
+    future = objects[0].filter(
+        (pl.col("sales_history_account_id") == "A0")
+        & pl.col("sales_history_year").is_between(2017, 2019),
+    )
+    assert row["parts_sales"] == pytest.approx(
+        history["sales_history_parts_sales"].sum(),
+    )
+    assert row["future_total_sales"] == pytest.approx(
+        future["sales_history_total_sales"].sum(),
+    )
+    assert row["most_common_group"] == "COMBINES"
+    assert table.row(1, named=True)["largest_sales_group"] == "LARGE TRACTOR"
+    assert (
+        table.filter(pl.col("account_id") == "A1")["most_common_group"][0] == "Unknown"
+    )
+    assert row["customer_loyalty"] == "Unknown"
+
+
+def test_02_design_matrix_is_cached(objects, tmp_path, monkeypatch):
+    table = clv_feature_table(*objects, anchor_years=[2016, 2017])
+    first = encode_design_matrix(table, str(tmp_path))
+    # A cache hit loads the fitted encoder instead of fitting a new one
+    monkeypatch.setattr(clv, "make_encoder", None)
+    second = encode_design_matrix(table, str(tmp_path))
+    assert isinstance(second.x, np.memmap)
+    np.testing.assert_array_equal(first.x, second.x)
+    features = table.select(*clv.CATEGORICAL_COLUMNS, *clv.CONTINUOUS_COLUMNS)
+    np.testing.assert_array_equal(
+        second.encoder.transform(features),
+        first.encoder.transform(features),
+    )
+    assert len(np.unique(first.groups)) == 60
+
+
+def test_03_train_clv_model(objects, tmp_path):
+    table = clv_feature_table(*objects, anchor_years=[2016, 2017, 2018])
+    model, metrics = train_clv_model(
+        table,
+        param_grid={"learning_rate": [0.1, 0.3]},
+        n_splits=3,
+        n_jobs=2,
+        cache_dir=str(tmp_path),
+    )
+    assert len(metrics["trials"]) == 2
+    assert metrics["best_params"]["learning_rate"] in (0.1, 0.3)
+    assert metrics["iterations"] < 1000
+    assert predict_clv(model, table).shape == (table.height,)
+
+
+def test_04_unmapped_account_columns_are_unknown(objects):
+    sales_history, rollup, account = objects
+    # Only koenig maps the account categories
+    table = clv_feature_table(
+        sales_history,
+        rollup,
+        account.select("account_id"),
+        anchor_years=[2016],
+    )
+    assert table.height == 60
+    assert table["customer_segment"].unique().to_list() == ["Unknown"]
+    assert table["type_of_equipment"].unique().to_list() == ["Unknown"]
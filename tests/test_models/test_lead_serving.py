@@ -0,0 +1,102 @@
+import json
+import threading
+import urllib.request
+
+import polars as pl
+import pytest
+
+from src.models.lead_serving import (
+    LeadServer,
+    lead_owners,
+    make_http_server,
+    publish_lead_index,
+)
+
+
+@pytest.fixture
+def scores():
+    return pl.DataFrame(
+        {
+            "account_id": ["A1", "A2", "A3", "A4", "A5"],
+            "product_group": ["COMBINES"] * 4 + ["HAY"],
+            "score": [0.2, 0.9, 0.5, 0.7, 0.4],
+            "dealer": ["koenig"] * 5,
+            "primary_store_location": ["Store 1"] * 3 + [None, "Store 1"],
+            "account_owner_id": ["U1", "U1", "U1", "U2", "U1"],
+        },
+    )
+
+
+def test_01_publish_and_look_up(scores, tmp_path):
+    publish_lead_index(scores, str(tmp_path), top_k=2)
+    server = LeadServer(str(tmp_path))
+    assert len(server.index) == 3
+    key = ("koenig", "Store 1", "U1", "COMBINES")
+    leads = server.top_k(key)
+    assert leads["account_id"].to_list() == ["A2", "A3"]
+    assert leads["rank"].to_list() == [1, 2]
+    assert server.top_k(key, 1)["account_id"].to_list() == ["A2"]
+    assert server.top_k(("koenig", None, "U2", "COMBINES"))["account_id"][0] == "A4"
+    assert server.top_k(("koenig", "Store 9", "U1", "COMBINES")).height == 0
+
+
+def test_02_hot_reload(scores, tmp_path):
+    publish_lead_index(scores, str(tmp_path))
+    server = LeadServer(str(tmp_path), check_interval=0)
+    first_version = server.version
+    key = ("koenig", "Store 1", "U1", "COMBINES")
+    old_index = server.index
+
+    rescored = scores.with_columns(
+        pl.when(pl.col("account_id") == "A1")
+        .then(1.0)
+        .otherwise("score")
+        .alias("score"),
+    )
+    for _ in range(3):
+        publish_lead_index(rescored, str(tmp_path))
+    assert server.top_k(key)["account_id"].to_list() == ["A1", "A2", "A3"]
+    assert server.version != first_version
+    assert not server.reload()
+    # Lookups holding the old snapshot keep their mapped leads
+    assert old_index.top_k(key)["account_id"][0] == "A2"
+    assert len(list(tmp_path.glob("v*"))) == 2
+
+
+def test_03_http_lookup(scores, tmp_path):
+    publish_lead_index(scores, str(tmp_path))
+    http_server = make_http_server(LeadServer(str(tmp_path)), port=0)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{http_server.server_port}/leads"
+    try:
+        with urllib.request.urlopen(
+            f"{url}?dealer=koenig&primary_store_location=Store+1"
+            "&account_owner_id=U1&product_group=COMBINES&k=2",
+        ) as response:
+            body = json.load(response)
+        assert [lead["account_id"] for lead in body["leads"]] == ["A2", "A3"]
+        assert body["version"].startswith("v")
+        with urllib.request.urlopen(f"{url}?dealer=koenig&account_owner_id=U2") as r:
+            assert json.load(r)["leads"] == []
+    finally:
+        http_server.shutdown()
+        http_server.server_close()
+
+
+def test_04_owners_without_a_mapped_store(scores, tmp_path):
+    # Only koenig maps the store, other dealers' lists are keyed without one
+    account = pl.DataFrame(
+        {"account_id": ["A1", "A2", "A2"], "account_owner_id": ["U1", "U2", "U2"]},
+    )
+    owners = lead_owners(account.lazy())
+    assert owners.sort("account_id").rows() == [("A1", "U1", None), ("A2", "U2", None)]
+    publish_lead_index(
+        scores.drop("primary_store_location", "account_owner_id").join(
+            owners,
+            on="account_id",
+            how="left",
+        ),
+        str(tmp_path),
+    )
+    leads = LeadServer(str(tmp_path)).top_k(("koenig", None, "U2", "COMBINES"))
+    assert leads["account_id"].to_list() == ["A2"]
@@ -0,0 +1,65 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from src.models.propensity import (
+    PropensityScorer,
+    rank_leads,
+    save_model,
+    train_propensity_model,
+    write_lead_lists,
+)
+
+
+@pytest.fixture
+def table():
+    rng = np.random.default_rng(0)
+    rows = 2_000
+    frequency = rng.integers(1, 10, rows)
+    recency = rng.integers(0, 2_000, rows)
+    bought = rng.random(rows) < 1 / (1 + np.exp(recency / 500 - frequency / 3))
+    return pl.DataFrame(
+        {
+            "account_id": [f"A{i}" for i in range(rows)],
+            "product_group": rng.choice(["COMBINES", "LARGE TRACTOR"], rows),
+            "frequency": frequency,
+            "recency_days": recency,
+            "monetary": rng.random(rows) * 1e5,
+            "label_purchase": bought,
+        },
+    )
+
+
+def test_01_train_save_and_score_in_batches(table, tmp_path):
+    model, metrics = train_propensity_model(table)
+    assert metrics["roc_auc"] > 0.7
+    save_model(model, str(tmp_path / "model"), metrics=metrics)
+    table.write_parquet(tmp_path / "features.parquet", row_group_size=500)
+
+    scorer = PropensityScorer.load(str(tmp_path / "model"))
+    scores = scorer.score_table(str(tmp_path / "features.parquet"), batch_size=500)
+    assert scorer.metrics["batches"] == 4
+    assert scorer.metrics["rows"] == table.height
+    assert scorer.metrics["rows_per_second"] > 0
+    assert scores.columns == ["account_id", "product_group", "score"]
+    np.testing.assert_allclose(scores["score"], scorer.score(table))
+
+
+def test_02_rank_and_write_lead_lists(tmp_path):
+    scores = pl.DataFrame(
+        {
+            "dealer": ["koenig"] * 4,
+            "account_owner_id": ["U1", "U1", "U1", "U2"],
+            "product_group": ["COMBINES"] * 4,
+            "account_id": ["A", "B", "C", "D"],
+            "score": [0.2, 0.9, 0.5, 0.1],
+        },
+    )
+    leads = rank_leads(scores, top_k=2)
+    assert leads["account_id"].to_list() == ["B", "C", "D"]
+    assert leads["rank"].to_list() == [1, 2, 1]
+    write_lead_lists(leads, str(tmp_path / "leads"))
+    rep_leads = pl.read_parquet(
+        tmp_path / "leads" / "dealer=koenig" / "account_owner_id=U1",
+    )
+    assert rep_leads["account_id"].to_list() == ["B", "C"]
@@ -0,0 +1,103 @@
+import polars as pl
+
+from src.synthetic.dealer_data import (
+    EQUIPMENT,
+    generate_object,
+    load_semantic_layer,
+    make_fake_catalog,
+    object_columns,
+    write_object,
+)
+from src.transformation.translate import create_column_mapping, translate_columns
+
+
+def test_01_generate_object_uses_dealer_api_names():
+    semantic_layer = load_semantic_layer()
+    df = generate_object(semantic_layer, "koenig", "dealer_stock_unit", 1_000)
+    api_names = [
+        key_mapping["api_name"]
+        for _, key_mapping, _ in object_columns(
+            semantic_layer,
+            "koenig",
+            "dealer_stock_unit",
+        )
+    ]
+    assert df.columns == api_names
+    assert df.height == 1_000
+
+
+def test_02_generated_values_translate_to_their_types():
+    semantic_layer = load_semantic_layer()
+    column_mapping, column_types = create_column_mapping(
+        semantic_layer["dealer_stock_unit"],
+        "koenig",
+    )
+    df = generate_object(semantic_layer, "koenig", "dealer_stock_unit", 1_000)
+    translated = translate_columns(df.rename(column_mapping), column_types)
+    assert translated["dsu_check_in_date"].dtype == pl.Date
+    assert translated["dsu_check_in_date"].null_count() < 1_000
+    assert translated["dsu_model_year"].dtype == pl.Int64
+
+
+def test_03_generation_is_seeded():
+    semantic_layer = load_semantic_layer()
+    first = generate_object(semantic_layer, "akrs", "task", 500, seed=7)
+    second = generate_object(semantic_layer, "akrs", "task", 500, seed=7)
+    assert first.equals(second)
+
+
+def test_04_fake_catalog_covers_equipment():
+    catalog = make_fake_catalog(100)
+    assert catalog.height == 100
+    assert catalog.columns == [
+        "make", "model", "category", "subcategory", "id", "total_units",
+    ]
+    assert set(catalog["model"].head(len(EQUIPMENT))) == {row[1] for row in EQUIPMENT}
+
+
+def test_05_foreign_keys_resolve_across_objects():
+    semantic_layer = load_semantic_layer()
+    row_counts = {"account": 50, "customer_equipment": 400, "task": 300}
+    accounts = generate_object(semantic_layer, "koenig", "account", 50)
+    equipment = generate_object(
+        semantic_layer,
+        "koenig",
+        "customer_equipment",
+        400,
+        row_counts=row_counts,
+    )
+    tasks = generate_object(semantic_layer, "koenig", "task", 300, row_counts=row_counts)
+    assert accounts["Id"].n_unique() == 50
+    assert accounts["Id"].null_count() == 0
+    for df, column in ((equipment, "Anvil__Account__c"), (tasks, "AccountId")):
+        references = df.select(column).drop_nulls()
+        assert references.height > 0
+        assert references.join(accounts, left_on=column, right_on="Id", how="anti").is_empty()
+
+
+def test_06_null_rate_and_cardinality():
+    semantic_layer = load_semantic_layer()
+    df = generate_object(
+        semantic_layer,
+        "koenig",
+        "task",
+        5_000,
+        null_rate=0.2,
+        cardinality=3,
+    )
+    assert df["Id"].null_count() == 0
+    assert 0.15 < df["Subject"].null_count() / df.height < 0.25
+    assert df["Subject"].drop_nulls().n_unique() == 3
+
+
+def test_07_write_object_streams_chunks(tmp_path):
+    semantic_layer = load_semantic_layer()
+    csv_path = str(tmp_path / "account.csv")
+    parquet_path = str(tmp_path / "account.parquet")
+    for path in (csv_path, parquet_path):
+        write_object(path, semantic_layer, "koenig", "account", 1_050, chunk_size=200)
+    from_csv = pl.read_csv(csv_path, infer_schema=False)
+    from_parquet = pl.read_parquet(parquet_path)
+    assert from_csv.height == from_parquet.height == 1_050
+    assert from_csv["Id"].n_unique() == 1_050
+    assert from_csv["Id"].equals(from_parquet["Id"])
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+
+from src.transformation.ann_index import AnnIndex, brute_force_query
+
+
+@pytest.fixture
+def embeddings():
+    rng = np.random.default_rng(0)
+    centres = rng.normal(size=(20, 16))
+    return centres[rng.integers(0, 20, 2000)] + 0.3 * rng.normal(size=(2000, 16))
+
+
+def test_01_query_matches_brute_force_when_probing_all_lists(embeddings):
+    index = AnnIndex(n_lists=10).build(embeddings)
+    queries = embeddings[:50]
+    ids, scores = index.query(queries, k=5, n_probe=10)
+    exact_ids, exact_scores = brute_force_query(embeddings, queries, k=5)
+    np.testing.assert_array_equal(ids, exact_ids)
+    np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+    assert (ids[:, 0] == np.arange(50)).all()
+
+
+def test_02_query_recall(embeddings):
+    index = AnnIndex().build(embeddings)
+    queries = embeddings[::20]
+    ids, _ = index.query(queries, k=10, n_probe=4)
+    exact_ids, _ = brute_force_query(embeddings, queries, k=10)
+    recall = np.mean(
+        [np.intersect1d(a, b).size / 10 for a, b in zip(ids, exact_ids)],
+    )
+    assert recall > 0.9
+
+
+def test_03_query_pads_missing_neighbours(embeddings):
+    index = AnnIndex().build(embeddings[:3])
+    ids, scores = index.query(embeddings[:2], k=5)
+    assert ids.shape == (2, 5)
+    assert (ids[:, 3:] == -1).all()
+    assert np.isneginf(scores[:, 3:]).all()
+
+
+def test_04_save_and_load(embeddings, tmp_path):
+    index = AnnIndex(n_lists=8).build(embeddings, fingerprint="abc")
+    path = tmp_path / "index.npz"
+    index.save(str(path))
+    loaded = AnnIndex.load(str(path))
+    assert len(loaded) == len(index)
+    assert loaded.fingerprint == "abc"
+    np.testing.assert_array_equal(
+        loaded.query(embeddings[:10], k=3)[0],
+        index.query(embeddings[:10], k=3)[0],
+    )
+
+
+def test_05_build_rejects_empty():
+    with pytest.raises(ValueError, match="zero embeddings"):
+        AnnIndex().build(np.empty((0, 4)))
+
+
+def test_06_query_filters_labels_before_top_k(embeddings):
+    index = AnnIndex(n_lists=10).build(embeddings)
+    labels = np.arange(len(embeddings)) % 3
+    queries = embeddings[:30]
+    ids, scores = index.query(
+        queries,
+        k=5,
+        n_probe=10,
+        labels=labels,
+        query_labels=np.full(30, 1),
+    )
+    assert (labels[ids] == 1).all()
+    same_label = np.flatnonzero(labels == 1)
+    exact_ids, exact_scores = brute_force_query(embeddings[same_label], queries, k=5)
+    np.testing.assert_array_equal(ids, same_label[exact_ids])
+    np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+    # A label with fewer vectors than k pads the rest
+    ids, _ = index.query(queries[:1], k=5, labels=labels, query_labels=np.array([7]))
+    assert (ids == -1).all()
+    with pytest.raises(ValueError, match="query_labels"):
+        index.query(queries, k=5, labels=labels)
@@ -0,0 +1,101 @@
+import multiprocessing
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.transformation.catalog import CATALOG_ROW_ID, CompactCatalog
+from src.transformation.normalize import make_model_key
+
+
+@pytest.fixture
+def catalog_data():
+    return pl.DataFrame(
+        {
+            "id": [10, 11, 12, 13],
+            "make": ["John Deere", "Stihl", "John Deere", None],
+            "model": ["X300", "MS180", "X-300", "Puma"],
+            "category": ["Tractor", "Chainsaw", "Mower", "Tractor"],
+            "subcategory": ["Lawn", "Handheld", "Riding", None],
+            "total_units": [5, 3, 1, 2],
+        },
+    )
+
+
+def test_01_round_trip(catalog_data):
+    catalog = CompactCatalog.from_frame(catalog_data)
+    assert len(catalog) == catalog_data.height
+    assert catalog.arrays["make_codes"].dtype == np.int32
+    assert catalog.dictionaries["make"] == ["John Deere", "Stihl"]
+    decoded = catalog.to_frame()
+    assert decoded[CATALOG_ROW_ID].to_list() == [0, 1, 2, 3]
+    assert decoded.drop(CATALOG_ROW_ID).equals(catalog_data.select(decoded.columns[1:]))
+
+
+def test_02_lookup_uses_canonical_keys(catalog_data):
+    catalog = CompactCatalog.from_frame(catalog_data)
+    assert catalog.lookup("JOHN DEERE", "X300 2015").tolist() == [0, 2]
+    assert catalog.lookup("Stihl", "MS 180").tolist() == [1]
+    assert catalog.lookup("Unknown", "X300").size == 0
+
+
+def test_03_decode_keeps_requested_order(catalog_data):
+    catalog = CompactCatalog.from_frame(catalog_data)
+    decoded = catalog.decode([2, 0])
+    assert decoded["model"].to_list() == ["X-300", "X300"]
+    assert decoded["category"].to_list() == ["Mower", "Tractor"]
+    assert decoded[CATALOG_ROW_ID].to_list() == [2, 0]
+    assert catalog.decode([3])["subcategory"].to_list() == [None]
+    assert catalog.decode([3])["make"].to_list() == [None]
+    empty = catalog.decode([])
+    assert empty.is_empty()
+    assert empty.schema == catalog.decode([0]).schema
+
+
+def test_04_category_subcategory_pairs_skip_missing(catalog_data):
+    catalog = CompactCatalog.from_frame(catalog_data)
+    assert catalog.category_subcategory_pairs() == [
+        "Tractor-Lawn",
+        "Chainsaw-Handheld",
+        "Mower-Riding",
+    ]
+
+
+def test_05_snapshot_is_memory_mapped(catalog_data, tmp_path):
+    CompactCatalog.from_frame(catalog_data).save(str(tmp_path / "snapshot"))
+    catalog = CompactCatalog.load(str(tmp_path / "snapshot"))
+    assert all(isinstance(array, np.memmap) for array in catalog.arrays.values())
+    assert not catalog.arrays["model_bytes"].flags.writeable
+    assert catalog.lookup("John Deere", "X300").tolist() == [0, 2]
+    assert catalog.to_frame().equals(CompactCatalog.from_frame(catalog_data).to_frame())
+
+
+def _read_in_worker(catalog, queue):
+    queue.put(catalog.models([1, 2]))
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(),
+    reason="fork start method not available",
+)
+def test_06_snapshot_is_shared_with_forked_workers(catalog_data, tmp_path):
+    CompactCatalog.from_frame(catalog_data).save(str(tmp_path / "snapshot"))
+    catalog = CompactCatalog.load(str(tmp_path / "snapshot"))
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    worker = context.Process(target=_read_in_worker, args=(catalog, queue))
+    worker.start()
+    assert queue.get(timeout=5) == ["MS180", "X-300"]
+    worker.join()
+
+
+def test_07_make_key_labels_group_spellings(catalog_data):
+    catalog = CompactCatalog.from_frame(
+        catalog_data.with_columns(
+            pl.Series("make", ["John Deere", "Stihl", "JOHN DEERE", None]),
+        ),
+    )
+    labels, label_of = catalog.make_key_labels()
+    assert labels[0] == labels[2] == label_of[make_model_key("John Deere", "")[0]]
+    assert labels[1] == label_of[make_model_key("Stihl", "")[0]] != labels[0]
+    assert labels[3] == -1
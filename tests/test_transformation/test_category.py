@@ -1,7 +1,13 @@
+import os
+import time
+
+import numpy as np
 import polars as pl
 import pytest
 
+from src.transformation.catalog import DICTIONARIES_FILE_NAME
 from src.transformation.category import CleanMakeModelData
+from src.transformation.embedding import BatchEncoder
 
 
 @pytest.fixture
@@ -37,6 +43,7 @@ def sample_make_model_data():
                 "subcategory": "Lawn",
                 "best_fit_reason": "Exact Match",
                 "best_fit_score": 1,
+                "catalog_row_id": 0,
             },
         ),
         (
@@ -49,6 +56,7 @@ def sample_make_model_data():
                 "subcategory": "Handheld",
                 "best_fit_reason": "Exact Match",
                 "best_fit_score": 1,
+                "catalog_row_id": 1,
             },
         ),
         (
@@ -61,6 +69,7 @@ def sample_make_model_data():
                 "subcategory": "Unknown",
                 "best_fit_reason": "No Match",
                 "best_fit_score": -1,
+                "catalog_row_id": None,
             },
         ),
     ],
@@ -104,6 +113,7 @@ def test_02_create_aggregated_data(clean_make_model_data):
                 "subcategory": "Lawn",
                 "best_fit_reason": "Exact Match",
                 "best_fit_score": 1,
+                "catalog_row_id": None,
             },
         ),
         (
@@ -117,6 +127,7 @@ def test_02_create_aggregated_data(clean_make_model_data):
                 "subcategory": "Handheld",
                 "best_fit_reason": "Exact Match",
                 "best_fit_score": 1,
+                "catalog_row_id": None,
             },
         ),
     ],
@@ -137,7 +148,7 @@ def test_03_check_aggregated_data(
 
 def test_04_semantic_matching(clean_make_model_data):
     group = "Agriculture"
-    group_pl = pl.DataFrame(
+    clean_make_model_data.make_model_data = pl.DataFrame(
         {
             "make": ["Case IH", "John Deere"],
             "model": ["Puma", "X300"],
@@ -145,8 +156,10 @@ def test_04_semantic_matching(clean_make_model_data):
             "subcategory": ["Agriculture", "Lawn"],
         },
     )
-    result = clean_make_model_data._semantic_matching(group, group_pl)
-    assert result["subcategory"] == "Agriculture"
+    result = clean_make_model_data._semantic_matching(group, np.array([0, 1]))
+    assert result["catalog_row_id"] == 0
+    decoded = clean_make_model_data._decode_results([result])[0]
+    assert decoded["subcategory"] == "Agriculture"
 
 
 @pytest.mark.parametrize(
@@ -188,6 +201,7 @@ def test_06_get_make_model_data(mocker):
                     "subcategory": "Lawn",
                     "best_fit_reason": "Exact Match",
                     "best_fit_score": 1,
+                    "catalog_row_id": 0,
                 },
             ],
         ),
@@ -204,6 +218,7 @@ def test_06_get_make_model_data(mocker):
                     "subcategory": "Unknown",
                     "best_fit_reason": "No Match",
                     "best_fit_score": -1,
+                    "catalog_row_id": None,
                 },
             ],
         ),
@@ -225,4 +240,185 @@ def test_07_check_match(
         group=group,
         use_semantic_check=use_semantic_check,
     )
-    assert result == expected
+    assert clean_make_model_data._decode_results(result) == expected
+
+
+@pytest.mark.parametrize(
+    "make, model",
+    [("JOHN DEERE", "X-300"), ("John Deere", "X300 2015"), ("Case-IH", "PUMA")],
+)
+def test_08_check_match_normalized_variants(
+    clean_make_model_data,
+    sample_make_model_data,
+    make,
+    model,
+):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    result = clean_make_model_data._decode_results(
+        clean_make_model_data._check_match(make, model),
+    )
+    assert result[0]["best_fit_reason"] == "Exact Match"
+    assert result[0]["category"] == "Tractor"
+
+
+def test_09_check_catalog_neighbours(clean_make_model_data, sample_make_model_data):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    clean_make_model_data.build_catalog_index()
+    result = clean_make_model_data.check_catalog_neighbours(
+        ["Stihl", "Zzz", "Husqvarna"],
+        ["MS180 Chainsaw", "Unknown", "MS180 Chainsaw"],
+        ["Handheld Chainsaw", "", "Handheld Chainsaw"],
+    )
+    assert result[0]["best_fit_reason"] == "Semantic - Catalog Nearest Neighbour"
+    assert result[0]["model"] == "MS180"
+    assert result[0]["subcategory"] == "Handheld"
+    assert result[1]["best_fit_reason"] == "No Match"
+    # A neighbour of another make never replaces the dealer's make
+    assert result[2]["best_fit_reason"] == "No Match"
+    assert result[2]["make"] == "Husqvarna"
+
+
+def test_10_build_catalog_index_saves_and_loads(
+    clean_make_model_data,
+    sample_make_model_data,
+    tmp_path,
+):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    index_path = str(tmp_path / "catalog_index.npz")
+    clean_make_model_data.build_catalog_index(index_path)
+    saved = clean_make_model_data.catalog_index
+    clean_make_model_data.catalog_index = None
+    clean_make_model_data.build_catalog_index(index_path)
+    assert len(clean_make_model_data.catalog_index) == sample_make_model_data.height
+    assert clean_make_model_data.catalog_index.fingerprint == saved.fingerprint
+    # A refreshed catalog of the same size in another order is re-indexed
+    clean_make_model_data.make_model_data = sample_make_model_data.reverse()
+    clean_make_model_data.build_catalog_index(index_path)
+    assert clean_make_model_data.catalog_index.fingerprint != saved.fingerprint
+    result = clean_make_model_data.check_catalog_neighbours(
+        ["Stihl"],
+        ["MS180 Chainsaw"],
+        ["Handheld Chainsaw"],
+    )
+    assert result[0]["model"] == "MS180"
+
+
+def test_11_prepare_semantic_scores(clean_make_model_data, sample_make_model_data):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    row_ids = np.array([0, 2])
+    expected = clean_make_model_data._semantic_matching("Agriculture", row_ids)
+    clean_make_model_data.prepare_semantic_scores(["Agriculture", "Lawn", ""])
+    assert set(clean_make_model_data._group_positions) == {"Agriculture", "Lawn"}
+    assert clean_make_model_data._semantic_score_matrix.shape == (2, 3)
+    result = clean_make_model_data._semantic_matching("Agriculture", row_ids)
+    assert result["catalog_row_id"] == expected["catalog_row_id"]
+    assert result["best_fit_score"] == pytest.approx(expected["best_fit_score"])
+
+
+def test_12_clean_make_model_data_records_tier_metrics(
+    clean_make_model_data,
+    sample_make_model_data,
+):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    clean_make_model_data.clean_make_model_data("John Deere", "X300")
+    clean_make_model_data.clean_make_model_data("Unknown", "X300")
+    metrics = clean_make_model_data.metrics.to_dict()
+    assert metrics["resolve"]["calls"] == 2
+    assert metrics["resolve"]["hits"] == 1
+    assert metrics["exact"]["hits"] == 1
+    assert metrics["special_characters"]["calls"] == 1
+    assert metrics["catalog_lookup"]["calls"] >= metrics["exact"]["calls"]
+
+
+def test_13_snapshot_refreshed_when_old(sample_make_model_data, tmp_path, mocker):
+    fetch = mocker.patch.object(
+        CleanMakeModelData,
+        "get_make_model_data",
+        return_value=sample_make_model_data,
+    )
+    encoder = BatchEncoder(mocker.Mock())
+    snapshot_path = str(tmp_path / "snapshot")
+    CleanMakeModelData(snapshot_path, encoder=encoder)
+    data = CleanMakeModelData(snapshot_path, encoder=encoder)
+    assert fetch.call_count == 1
+    assert data.make_model_data is data.make_model_data
+    CleanMakeModelData(snapshot_path, encoder=encoder, refresh_snapshot=True)
+    assert fetch.call_count == 2
+    week_ago = time.time() - 8 * 86_400
+    os.utime(tmp_path / "snapshot" / DICTIONARIES_FILE_NAME, (week_ago, week_ago))
+    CleanMakeModelData(snapshot_path, encoder=encoder, snapshot_max_age_days=None)
+    assert fetch.call_count == 2
+    CleanMakeModelData(snapshot_path, encoder=encoder)
+    assert fetch.call_count == 3
+
+
+def test_14_check_catalog_neighbours_filters_make_before_top_k(
+    clean_make_model_data,
+):
+    # Closer rows of another make outnumber k and would hide the Stihl row
+    clean_make_model_data.make_model_data = pl.DataFrame(
+        {
+            "make": ["Husqvarna"] * 20 + ["Stihl"],
+            "model": [f"MS180 Chainsaw {i}" for i in range(20)] + ["MS180"],
+            "category": ["Chainsaw"] * 21,
+            "subcategory": ["Handheld"] * 21,
+        },
+    )
+    clean_make_model_data.build_catalog_index()
+    result = clean_make_model_data.check_catalog_neighbours(
+        ["Stihl"],
+        ["MS180 Chainsaw"],
+        ["Handheld Chainsaw"],
+        k=5,
+    )
+    assert result[0]["make"] == "Stihl"
+    assert result[0]["catalog_row_id"] == 20
+
+
+
+def test_15_clean_make_model_batch_queries_neighbours_once(
+    clean_make_model_data,
+    sample_make_model_data,
+    mocker,
+):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    clean_make_model_data.build_catalog_index()
+    query = mocker.spy(clean_make_model_data.catalog_index, "query")
+    result = clean_make_model_data.clean_make_model_batch(
+        ["John Deere", "Stihl", "Case IH"],
+        ["X300", "MS180 Chainsaw", "Puma Tractor"],
+        ["", "Handheld Chainsaw", "Agriculture Tractor"],
+    )
+    assert result[0]["best_fit_reason"] == "Exact Match"
+    assert [row["make"] for row in result] == ["John Deere", "Stihl", "Case IH"]
+    assert query.call_count == 1
+    metrics = clean_make_model_data.metrics.to_dict()
+    assert metrics["resolve"]["calls"] == 3
+    assert metrics["catalog_neighbour"]["calls"] == 2
+
+
+def test_16_num_threads_set_on_encoder(sample_make_model_data, mocker):
+    mocker.patch.object(
+        CleanMakeModelData,
+        "get_make_model_data",
+        return_value=sample_make_model_data,
+    )
+    encoder = BatchEncoder(mocker.Mock())
+    clean_make_model_data = CleanMakeModelData(encoder=encoder, num_threads=2)
+    assert clean_make_model_data.encoder.num_threads == 2
+
+
+def test_17_clean_make_model_batch_decodes_once(
+    clean_make_model_data,
+    sample_make_model_data,
+    mocker,
+):
+    clean_make_model_data.make_model_data = sample_make_model_data
+    decode = mocker.spy(clean_make_model_data.catalog, "decode")
+    result = clean_make_model_data.clean_make_model_batch(
+        ["John Deere", "Stihl", "Unknown"],
+        ["X300", "MS180", "X300"],
+        ["", "", ""],
+    )
+    assert [row["category"] for row in result] == ["Tractor", "Chainsaw", "Unknown"]
+    assert decode.call_count == 1
@@ -0,0 +1,177 @@
+import json
+import logging
+
+import polars as pl
+import pytest
+
+from src.synthetic.dealer_data import write_object
+from src.transformation.dataset_builder import (
+    ACCOUNT_DATASET,
+    Aggregation,
+    DatasetBuilder,
+    DatasetSpec,
+    JoinStep,
+    foreign_keys,
+    load_objects,
+)
+
+
+@pytest.fixture
+def semantic_layer():
+    with open("src/transformation/semantic_layer.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def objects():
+    return {
+        "account": pl.DataFrame(
+            {
+                "account_id": ["A1", "A2", "A3"],
+                "account_owner_id": ["U1", "U2", None],
+                "customer_segment": ["Cash Grain", "Dairy", None],
+            },
+        ),
+        "customer_equipment": pl.DataFrame(
+            {
+                "customer_equipment_id": ["C1", "C2", "C3"],
+                "account_id": ["A1", "A1", "A2"],
+                "dealer_stock_unit": ["D1", "D2", None],
+                "ce_status": ["Owned", "Owned", "Traded"],
+            },
+        ),
+        "dealer_stock_unit": pl.DataFrame(
+            {
+                "dealer_stock_unit_id": ["D1", "D2", "D3"],
+                "dsu_account_id": ["A1", "A1", "A3"],
+                "dsu_sale_price": [100.0, 250.0, 75.0],
+            },
+        ),
+        "user": pl.DataFrame(
+            {"user_id": ["U1", "U2"], "user_title": ["Sales", "Manager"]},
+        ),
+        "task": pl.DataFrame(
+            {
+                "task_id": ["T1", "T2", "T3", "T4"],
+                "task_account_id": ["A1", "A1", "A2", "A2"],
+                "task_status": ["Completed", "Completed", "Completed", "Open"],
+                "task_subtype": ["Call", "Email", "Task", "Call"],
+                "task_subject": ["", "", "Call Report", ""],
+                "task_activity_date": ["2024-01-01", "2024-03-01", "2024-02-01", None],
+            },
+        ),
+    }
+
+
+def test_01_foreign_keys(semantic_layer):
+    keys = foreign_keys(semantic_layer, "koenig")
+    ce_keys = {
+        (key.field, key.foreign_object, key.foreign_field)
+        for key in keys
+        if key.object == "customer_equipment"
+    }
+    assert ce_keys == {
+        ("dealer_stock_unit", "dealer_stock_unit", "dealer_stock_unit_id"),
+        ("account_id", "account", "account_id"),
+    }
+
+
+def test_02_resolve_join_needs_unambiguous_key(semantic_layer):
+    builder = DatasetBuilder(semantic_layer, "koenig")
+    join = builder.resolve_join(["account"], "customer_equipment", None)
+    assert (join.left_object, join.left_field, join.right_field) == (
+        "account",
+        "account_id",
+        "account_id",
+    )
+    with pytest.raises(ValueError, match="Expected one foreign key"):
+        builder.resolve_join(
+            ["account", "customer_equipment"], "dealer_stock_unit", None
+        )
+    join = builder.resolve_join(
+        ["account", "customer_equipment"], "dealer_stock_unit", "dealer_stock_unit"
+    )
+    assert (join.left_object, join.right_field) == (
+        "customer_equipment",
+        "dealer_stock_unit_id",
+    )
+
+
+def test_03_build_account_dataset(semantic_layer, objects):
+    dataset = DatasetBuilder(semantic_layer, "koenig").build(ACCOUNT_DATASET, objects)
+    dataset = dataset.sort("account_id", "customer_equipment_id", nulls_last=True)
+    assert dataset["account_id"].to_list() == ["A1", "A1", "A2", "A3"]
+    assert dataset["account_id_customer_equipment"].to_list() == [
+        "A1",
+        "A1",
+        "A2",
+        None,
+    ]
+    assert dataset["dsu_sale_price"].to_list() == [100.0, 250.0, None, None]
+    assert dataset["user_title"].to_list() == ["Sales", "Sales", "Manager", None]
+    assert dataset["task_count"].to_list() == [2, 2, 1, None]
+    assert dataset["last_task_date"].to_list() == [
+        "2024-03-01",
+        "2024-03-01",
+        "2024-02-01",
+        None,
+    ]
+
+
+def test_04_estimates_are_logged(semantic_layer, objects, caplog):
+    builder = DatasetBuilder(semantic_layer, "koenig")
+    spec = DatasetSpec(
+        root="account",
+        joins=(JoinStep("dealer_stock_unit", via="dsu_account_id"),),
+        aggregations=(
+            Aggregation("task", via="task_account_id", aggs=(pl.len().alias("tasks"),)),
+        ),
+    )
+    estimates = builder.estimate_join_sizes(spec, objects)
+    assert estimates["fan_out"].to_list() == pytest.approx([4 / 3, 1.0])
+    assert estimates["estimated_rows"].to_list() == [4, 4]
+    with caplog.at_level(logging.INFO):
+        dataset = builder.build(spec, objects)
+    assert dataset.height == 4
+    assert "account.account_id -> dealer_stock_unit.dsu_account_id" in caplog.text
+
+
+def test_05_load_objects_scans_only_the_selected_columns(
+    semantic_layer,
+    tmp_path,
+    caplog,
+):
+    write_object(str(tmp_path / "account.csv"), semantic_layer, "akrs", "account", 50)
+    objects = load_objects(
+        "akrs",
+        ["account"],
+        str(tmp_path),
+        "src/transformation/semantic_layer.json",
+    )
+    assert isinstance(objects["account"], pl.LazyFrame)
+    spec = DatasetSpec(root="account", columns=("account_id", "customer_segment"))
+    with caplog.at_level(logging.WARNING):
+        plan = DatasetBuilder(semantic_layer, "akrs").plan(spec, objects)
+    # customer_segment is only mapped for koenig
+    assert "account.['customer_segment']" in caplog.text
+    assert "PROJECT 1/" in plan.explain()
+    assert plan.collect().columns == ["account_id"]
+
+
+def test_06_load_objects_leaves_out_missing_optional_files(semantic_layer, tmp_path):
+    write_object(str(tmp_path / "account.csv"), semantic_layer, "akrs", "account", 5)
+    objects = load_objects(
+        "akrs",
+        ["account", "quote"],
+        str(tmp_path),
+        "src/transformation/semantic_layer.json",
+        optional=("quote",),
+    )
+    assert list(objects) == ["account"]
+    with pytest.raises(ValueError, match="No file at"):
+        load_objects(
+            "akrs",
+            ["account", "quote"],
+            str(tmp_path),
+            "src/transformation/semantic_layer.json",
+        )
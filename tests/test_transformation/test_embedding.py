@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from src.transformation.embedding import BatchEncoder
+
+
+class CountingModel:
+    def __init__(self):
+        self.calls = []
+
+    def encode(self, texts, batch_size, **kwargs):
+        self.calls.append((list(texts), batch_size))
+        return np.array([[len(text), 1.0] for text in texts], dtype=np.float32)
+
+
+@pytest.fixture
+def model():
+    return CountingModel()
+
+
+def test_01_encode_deduplicates_and_caches(model):
+    encoder = BatchEncoder(model, batch_size=8)
+    first = encoder.encode(["Lawn", "Tractor", "Lawn"])
+    assert first.shape == (3, 2)
+    np.testing.assert_array_equal(first[0], first[2])
+    assert model.calls == [(["Lawn", "Tractor"], 8)]
+
+    encoder.encode(["Tractor", "Combine"])
+    assert model.calls[-1] == (["Combine"], 8)
+    assert len(encoder) == 3
+
+
+def test_02_similarity_shape(model):
+    encoder = BatchEncoder(model)
+    scores = encoder.similarity(["a", "bb"], ["a", "bb", "ccc"])
+    assert scores.shape == (2, 3)
+    assert encoder.similarity([], ["a"]).shape == (0, 1)
+
+
+def test_03_tune_batch_size(model):
+    encoder = BatchEncoder(model, batch_size=8)
+    chosen = encoder.tune_batch_size(["a", "bb", "ccc"], candidates=(4, 16))
+    assert chosen in {4, 16}
+    assert encoder.batch_size == chosen
+    assert len(encoder) == 0
+
+
+def test_04_cache_evicts_least_recently_used(model):
+    encoder = BatchEncoder(model, cache_size=2)
+    encoder.encode(["a", "bb"])
+    encoder.encode(["a", "ccc"])
+    assert len(encoder) == 2
+    encoder.encode(["a"])
+    assert model.calls[-1][0] == ["ccc"]
+    encoder.encode(["bb"])
+    assert model.calls[-1][0] == ["bb"]
+    # A call with more strings than the cache holds still returns them all
+    result = encoder.encode(["dddd", "eeeee", "ffffff"])
+    assert result[:, 0].tolist() == [4, 5, 6]
+    assert len(encoder) == 2
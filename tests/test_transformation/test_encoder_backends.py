@@ -0,0 +1,152 @@
+import importlib.util
+
+import numpy as np
+import polars as pl
+import pytest
+
+from src.transformation.category import CleanMakeModelData
+from src.transformation.embedding import (
+    COSINE_TOLERANCE,
+    ONNX_INT8_FILE_NAMES,
+    BatchEncoder,
+    embedding_agreement,
+    load_sentence_model,
+    onnx_int8_file_name,
+)
+
+# Dealer groups and same-model catalog candidates whose semantic choices must
+# not change when the encoder backend changes
+SEMANTIC_FIXTURES = [
+    (
+        "ROW CROP TRACTOR",
+        {
+            "category": ["Tractors", "Tractors", "Lawn & Garden"],
+            "subcategory": ["Row Crop Tractors", "4WD Tractors", "Lawn Tractors"],
+        },
+    ),
+    (
+        "COMBINE",
+        {
+            "category": ["Harvesting", "Harvesting"],
+            "subcategory": ["Combines", "Corn Heads"],
+        },
+    ),
+    (
+        "PLANTER",
+        {
+            "category": ["Planting", "Tillage"],
+            "subcategory": ["Planters", "Disks"],
+        },
+    ),
+    (
+        "GATOR",
+        {
+            "category": ["Utility Vehicles", "Lawn & Garden"],
+            "subcategory": ["Utility Vehicles", "Riding Mowers"],
+        },
+    ),
+    (
+        "SKID STEER",
+        {
+            "category": ["Construction", "Construction"],
+            "subcategory": ["Skid Steers", "Excavators"],
+        },
+    ),
+]
+BACKENDS = [
+    pytest.param("torch-int8"),
+    pytest.param(
+        "onnx",
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec("onnxruntime") is None,
+            reason="onnxruntime is not installed",
+        ),
+    ),
+    pytest.param(
+        "onnx-int8",
+        marks=pytest.mark.skipif(
+            importlib.util.find_spec("onnxruntime") is None,
+            reason="onnxruntime is not installed",
+        ),
+    ),
+]
+
+
+@pytest.fixture(scope="module")
+def reference_model():
+    return load_sentence_model(backend="torch")
+
+
+def _semantic_choices(clean_make_model_data, model):
+    clean_make_model_data.encoder = BatchEncoder(model)
+    choices = []
+    for group, candidates in SEMANTIC_FIXTURES:
+        clean_make_model_data.make_model_data = pl.DataFrame(
+            {
+                "make": ["John Deere"] * len(candidates["category"]),
+                "model": ["X"] * len(candidates["category"]),
+                **candidates,
+            },
+        )
+        result = clean_make_model_data._semantic_matching(
+            group,
+            np.arange(len(candidates["category"])),
+        )
+        result = clean_make_model_data._decode_results([result])[0]
+        choices.append((result["subcategory"], result["best_fit_reason"]))
+    return choices
+
+
+def test_01_load_sentence_model_rejects_unknown_backend():
+    with pytest.raises(ValueError, match="Unknown encoder backend"):
+        load_sentence_model(backend="tensorrt")
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_02_backend_embeddings_within_tolerance(reference_model, backend):
+    texts = [group for group, _ in SEMANTIC_FIXTURES] + [
+        f"{category}-{subcategory}"
+        for _, candidates in SEMANTIC_FIXTURES
+        for category, subcategory in zip(
+            candidates["category"],
+            candidates["subcategory"],
+        )
+    ]
+    agreement = embedding_agreement(
+        reference_model,
+        load_sentence_model(backend=backend),
+        texts,
+    )
+    assert agreement["min_cosine"] >= COSINE_TOLERANCE
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_03_backend_semantic_choices_unchanged(reference_model, backend, mocker):
+    mocker.patch(
+        "src.transformation.category.read_from_databricks",
+        return_value=pl.DataFrame(
+            {"make": [], "model": [], "category": [], "subcategory": []},
+            schema={col: pl.Utf8 for col in ["make", "model", "category", "subcategory"]},
+        ),
+    )
+    clean_make_model_data = CleanMakeModelData()
+    expected = _semantic_choices(clean_make_model_data, reference_model)
+    result = _semantic_choices(
+        clean_make_model_data,
+        load_sentence_model(backend=backend),
+    )
+    assert result == expected
+
+
+@pytest.mark.parametrize(
+    "machine, flags, expected",
+    [
+        ("aarch64", set(), "arm64"),
+        ("x86_64", {"avx2", "avx512f", "avx512_vnni"}, "avx512_vnni"),
+        ("x86_64", {"avx2", "avx512f"}, "avx512f"),
+        # No flags, e.g. without /proc/cpuinfo, uses the most portable export
+        ("x86_64", set(), "avx2"),
+    ],
+)
+def test_04_onnx_int8_file_name_follows_cpu_features(machine, flags, expected):
+    assert onnx_int8_file_name(machine, flags) == ONNX_INT8_FILE_NAMES[expected]
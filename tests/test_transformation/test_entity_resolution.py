@@ -0,0 +1,78 @@
+import numpy as np
+import polars as pl
+import pytest
+
+from src.transformation.entity_resolution import (
+    GLOBAL_CUSTOMER_ID,
+    AccountResolver,
+    UnionFind,
+    normalize_accounts,
+    stack_accounts,
+)
+
+
+@pytest.fixture
+def accounts():
+    koenig = pl.DataFrame(
+        {
+            "account_id": ["K1", "K2", "K3"],
+            "account_name": ["Smith, John", "Acme Farms Inc", "Jones Dairy"],
+            "account_phone": ["(515) 555-1234", None, None],
+            "county": ["Story County", "Polk", "Story"],
+            "billing_postal_code": ["50010-1234", "50309", "50010"],
+        },
+    )
+    akrs = pl.DataFrame(
+        {
+            "account_id": ["A1", "A2", "A3"],
+            "account_name": ["JOHN SMITH", "ACME FARMS", "Brown Cattle"],
+            "account_phone": ["515.555.1234", None, None],
+            "billing_postal_code": ["50010", "50309", "50010"],
+        },
+    )
+    return stack_accounts({"koenig": koenig, "akrs": akrs})
+
+
+def test_01_normalize_accounts(accounts):
+    features = normalize_accounts(accounts)
+    assert features["name_tokens"][0].to_list() == ["john", "smith"]
+    assert features["name_tokens"][1].to_list() == ["acme", "farms"]
+    assert features["phone_key"].to_list()[:2] == ["5155551234", None]
+    assert features["zip5"][0] == "50010"
+    assert features["county_key"].to_list()[:3] == ["story", "polk", "story"]
+    assert features["county_key"][3] is None
+
+
+def test_02_union_find_roots():
+    union_find = UnionFind(6)
+    union_find.union(np.array([4, 1, 2]), np.array([5, 2, 4]))
+    assert union_find.roots().tolist() == [0, 1, 1, 3, 1, 1]
+
+
+def test_03_resolve_links_across_dealers(accounts):
+    resolver = AccountResolver()
+    customers = resolver.resolve(accounts)
+    ids = dict(zip(customers["account_id"], customers[GLOBAL_CUSTOMER_ID]))
+    assert ids["K1"] == ids["A1"]
+    assert ids["K2"] == ids["A2"]
+    assert len({ids["K3"], ids["A3"], ids["K1"], ids["K2"]}) == 4
+    assert resolver.metrics["clusters"] == 4
+    assert resolver.metrics["multi_dealer_clusters"] == 2
+    assert resolver.metrics["pairs_compared"] < resolver.metrics["possible_pairs"]
+    assert 0 < resolver.metrics["reduction_ratio"] < 1
+
+
+def test_04_ids_do_not_depend_on_order_or_partitions(accounts):
+    customers = AccountResolver().resolve(accounts)
+    resolver = AccountResolver(max_pairs_per_partition=1)
+    shuffled = resolver.resolve(accounts.reverse())
+    assert resolver.metrics["partitions"] > 1
+    assert shuffled.sort("account_id").equals(customers.sort("account_id"))
+
+
+def test_05_oversized_blocks_are_skipped(accounts):
+    resolver = AccountResolver(max_block_size=1)
+    customers = resolver.resolve(accounts)
+    assert customers[GLOBAL_CUSTOMER_ID].n_unique() == accounts.height
+    assert resolver.metrics["skipped_blocks"] > 0
+    assert resolver.metrics["pairs_compared"] == 0
@@ -0,0 +1,49 @@
+import polars as pl
+import pytest
+
+from src.transformation.normalize import (
+    MAKE_KEY,
+    MODEL_KEY,
+    add_make_model_keys,
+    make_model_key,
+    make_model_keys,
+)
+
+
+@pytest.mark.parametrize(
+    "make, model, expected",
+    [
+        ("John Deere", "8270R", ("johndeere", "8270r")),
+        ("JOHN DEERE", "8270 R", ("johndeere", "8270r")),
+        ("Case IH", "S-680", ("caseih", "s680")),
+        ("J&M", "X300 2015", ("jm", "x300")),
+        ("John Deere", "X300 (2015)", ("johndeere", "x300")),
+        ("John Deere", "9570R S/N 1RW9570RAKD012345", ("johndeere", "9570r")),
+        ("Case IH", "S680 (PIN: 1H0S680)", ("caseih", "s680")),
+        ("John Deere", "Gator 2030", ("johndeere", "gator2030")),
+        ("New Holland", "2020", ("newholland", "2020")),
+    ],
+)
+def test_01_make_model_key(make, model, expected):
+    assert make_model_key(make, model) == expected
+
+
+def test_02_add_make_model_keys_matches_scalar():
+    df = pl.DataFrame(
+        {
+            "dsu_make": ["John Deere", "Case IH", None],
+            "dsu_model": ["8270 R", "S-680 2019", "X300"],
+        },
+    )
+    result = add_make_model_keys(df, "dsu_make", "dsu_model")
+    assert result.columns == ["dsu_make", "dsu_model", MAKE_KEY, MODEL_KEY]
+    assert result.row(0)[2:] == make_model_key("John Deere", "8270 R")
+    assert result.row(1)[2:] == make_model_key("Case IH", "S-680 2019")
+    assert result[MAKE_KEY][2] is None
+
+
+def test_03_make_model_keys_matches_scalar():
+    pairs = [("John Deere", "8270 R"), ("Case IH", "S-680 2019"), ("John Deere", "8270 R")]
+    keys = make_model_keys(pairs)
+    assert keys == {pair: make_model_key(*pair) for pair in pairs}
+    assert make_model_keys([]) == {}
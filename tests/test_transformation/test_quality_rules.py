@@ -0,0 +1,107 @@
+import json
+from datetime import date
+
+import polars as pl
+import pytest
+
+from src.transformation.quality_rules import (
+    Rule,
+    default_rules,
+    evaluate_rules,
+    pattern_rule,
+    range_rule,
+    values_rule,
+)
+
+
+@pytest.fixture
+def semantic_layer():
+    with open("src/transformation/semantic_layer.json") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def objects():
+    return {
+        "dealer_stock_unit": pl.DataFrame(
+            {
+                "dealer_stock_unit_id": ["S1", "S2", "S3", "S4"],
+                "dsu_invoice_number": ["I1", "NOTAVA", "N/A", None],
+                "dsu_sale_price": [100.0, 50.0, -5.0, None],
+                "dsu_invoice_amount": [110.0, 10.0, None, 20.0],
+                "dsu_sales_date": [
+                    date(2020, 1, 1),
+                    date(2031, 1, 1),
+                    None,
+                    date(2021, 1, 1),
+                ],
+                "dsu_account_id": ["A1", "A2", "A9", None],
+            },
+        ),
+        "account": pl.DataFrame(
+            {
+                "account_id": ["A1", "A2"],
+                "billing_postal_code": ["50010", "5001"],
+            },
+        ),
+    }
+
+
+def test_01_rules_count_and_sample_failures(objects):
+    rules = [
+        values_rule(
+            "dealer_stock_unit",
+            "dsu_invoice_number",
+            ["NOTAVA", "N/A"],
+            allowed=False,
+        ),
+        range_rule("dealer_stock_unit", "dsu_sale_price", minimum=0),
+        pattern_rule("account", "billing_postal_code", r"^\d{5}$"),
+        Rule(
+            "price_below_invoice",
+            "dealer_stock_unit",
+            ("dsu_sale_price", "dsu_invoice_amount"),
+            pl.col("dsu_sale_price") <= pl.col("dsu_invoice_amount"),
+        ),
+        # Skipped, as no object has the field
+        range_rule("dealer_stock_unit", "dsu_hours_or_units", minimum=0),
+    ]
+    summary, samples = evaluate_rules(objects, rules, sample_size=1)
+    assert dict(zip(summary["rule"], summary["failures"], strict=True)) == {
+        "dsu_invoice_number_not_in": 2,
+        "dsu_sale_price_range": 1,
+        "price_below_invoice": 1,
+        "billing_postal_code_pattern": 1,
+    }
+    assert summary.filter(pl.col("object") == "account")["failure_rate"][0] == 0.5
+    invoice_samples = samples.filter(pl.col("rule") == "dsu_invoice_number_not_in")
+    assert invoice_samples["row"].to_list() == [1]
+    assert json.loads(invoice_samples["values"][0]) == {"dsu_invoice_number": "NOTAVA"}
+
+
+def test_02_default_rules(objects, semantic_layer):
+    rules = default_rules(semantic_layer, "koenig", as_of=date(2025, 1, 1))
+    summary, samples = evaluate_rules(objects, rules)
+    failures = dict(zip(summary["rule"], summary["failures"], strict=True))
+    assert failures["dsu_sales_date_not_future"] == 1
+    assert failures["dsu_sale_price_matches_invoice"] == 1
+    # A9 is not an account, a missing account id is not a reference
+    assert failures["dsu_account_id_reference"] == 1
+    reference_samples = samples.filter(pl.col("rule") == "dsu_account_id_reference")
+    assert reference_samples["row"].to_list() == [2]
+
+
+def test_03_reference_rules_need_the_referenced_object(objects, semantic_layer):
+    rules = default_rules(semantic_layer, "koenig")
+    summary, _ = evaluate_rules(
+        {"dealer_stock_unit": objects["dealer_stock_unit"].lazy()},
+        rules,
+    )
+    assert "dsu_account_id_reference" not in summary["rule"].to_list()
+    assert summary["rows"].unique().to_list() == [4]
+
+
+def test_04_default_rules_fields_are_in_the_semantic_layer(semantic_layer):
+    del semantic_layer["dealer_stock_unit"]["dsu_model_year"]
+    with pytest.raises(ValueError, match=r"dealer_stock_unit\.dsu_model_year"):
+        default_rules(semantic_layer, "koenig")
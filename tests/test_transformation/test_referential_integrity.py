@@ -0,0 +1,55 @@
+import polars as pl
+import pytest
+
+from src.transformation.dataset_builder import ForeignKey
+from src.transformation.referential_integrity import (
+    EXTRA_JOIN_KEYS,
+    foreign_key_profile,
+    profile_foreign_keys,
+)
+
+
+@pytest.fixture
+def objects():
+    return {
+        "customer_equipment": pl.DataFrame(
+            {
+                "customer_equipment_id": ["E1", "E2", "E3", "E4", "E5"],
+                "account_id": ["A1", "A1", "A2", "A9", None],
+                "dealer_stock_number": ["S1", "S2", None, "S9", "S1"],
+            },
+        ),
+        "account": pl.DataFrame({"account_id": ["A1", "A2", "A3", "A3"]}),
+        "dealer_stock_unit": pl.DataFrame({"dealer_stock_number": ["S1", "S2", "S3"]}),
+    }
+
+
+def test_01_orphans_coverage_and_fan_out(objects):
+    key = ForeignKey("customer_equipment", "account_id", "account", "account_id")
+    profile = foreign_key_profile(
+        objects["customer_equipment"].lazy(),
+        objects["account"].lazy(),
+        key,
+    ).collect()
+    row = profile.row(0, named=True)
+    assert (row["child_rows"], row["null_rows"], row["orphan_rows"]) == (5, 1, 1)
+    assert row["orphan_rate"] == 0.25
+    assert row["match_rate"] == 0.6
+    assert (row["parent_keys"], row["duplicate_parent_rows"]) == (3, 1)
+    assert row["parent_coverage"] == pytest.approx(2 / 3)
+    assert (row["fan_out_mean"], row["fan_out_max"]) == (1.5, 2)
+
+
+def test_02_profile_all_loaded_keys(objects):
+    keys = [
+        ForeignKey("customer_equipment", "account_id", "account", "account_id"),
+        # Not loaded, so skipped
+        ForeignKey("task", "task_account_id", "account", "account_id"),
+        *EXTRA_JOIN_KEYS,
+    ]
+    profiles = profile_foreign_keys(objects, keys)
+    assert profiles["field"].to_list() == ["account_id", "dealer_stock_number"]
+    stock_numbers = profiles.row(1, named=True)
+    assert stock_numbers["matched_rows"] == 3
+    assert stock_numbers["orphan_keys"] == 1
+    assert profile_foreign_keys({}, keys).is_empty()
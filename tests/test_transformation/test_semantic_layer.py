@@ -1,5 +1,14 @@
 import json
 
+import polars as pl
+import pytest
+
+from src.transformation.semantic_layer import (
+    CompiledSemanticLayer,
+    check_raw_files,
+    validate_semantic_layer,
+)
+
 
 # Load the semantic layer JSON file
 def load_json():
@@ -30,3 +39,154 @@ def test_validate_semantic_layer_structure():
         # Validate each field within the object
         for field_name, field_data in object_data.items():
             validate_field(field_data)
+
+
+def test_semantic_layer_has_no_issues():
+    assert validate_semantic_layer(load_json()) == []
+
+
+def test_validate_semantic_layer_finds_bad_mappings():
+    def mapping(api_name, foreign_object=None, foreign_field=None):
+        return {
+            "org": "koenig",
+            "object": "Raw",
+            "api_name": api_name,
+            "foreign_key_object": foreign_object,
+            "foreign_key_field": foreign_field,
+        }
+
+    def field(keys, *, primary_key=False, foreign_key=False, field_type="string"):
+        return {
+            "primary_key": primary_key,
+            "foreign_key": foreign_key,
+            "type": field_type,
+            "keys": keys,
+        }
+
+    semantic_layer = {
+        "account": {
+            "account_id": field([mapping("Id")], primary_key=True),
+            "account_name": field([mapping("Name")]),
+            "account_alias": field([mapping("Name")]),
+            "account_sales": field([mapping("Sales")], field_type="double"),
+            "account_owner_id": field(
+                [mapping("OwnerId", "user", "user_key")],
+                foreign_key=True,
+            ),
+            "account_parent_id": field([mapping("ParentId", "account", "account_id")]),
+        },
+    }
+    issues = {
+        (issue.check, issue.field) for issue in validate_semantic_layer(semantic_layer)
+    }
+    assert issues == {
+        ("duplicate_api_name", None),
+        ("type", "account_sales"),
+        ("foreign_key", "account_owner_id"),
+        ("foreign_key_flag", "account_parent_id"),
+    }
+
+
+def test_check_raw_files_before_translation(tmp_path):
+    semantic_layer = load_json()
+    compiled = CompiledSemanticLayer(semantic_layer)
+    columns = compiled.columns["koenig", "dealer_stock_unit"]
+    api_names = {column.field: name for name, column in columns.items()}
+    pl.DataFrame(
+        {
+            api_names["dealer_stock_unit_id"]: ["a1", "a2"],
+            api_names["dsu_sale_price"]: ["100.0", "call for price"],
+        },
+    ).write_csv(tmp_path / "dealer-stock-unit.csv")
+    pl.DataFrame({api_names["dealer_stock_unit_id"]: ["a1"]}).write_parquet(
+        tmp_path / "dsu.parquet",
+    )
+
+    issues = compiled.check_file(
+        "koenig",
+        "dealer_stock_unit",
+        str(tmp_path / "dealer-stock-unit.csv"),
+    )
+    dtype_errors = [issue for issue in issues if issue.check == "dtype"]
+    assert [issue.field for issue in dtype_errors] == ["dsu_sale_price"]
+    parquet_issues = compiled.check_file(
+        "koenig",
+        "dealer_stock_unit",
+        str(tmp_path / "dsu.parquet"),
+    )
+    assert {(issue.check, issue.severity) for issue in parquet_issues} == {
+        ("missing_column", "error"),
+    }
+    with pytest.raises(ValueError, match="dsu_sale_price"):
+        check_raw_files(
+            "koenig",
+            ["dealer_stock_unit"],
+            str(tmp_path),
+            "src/transformation/semantic_layer.json",
+        )
+
+
+def test_check_raw_files_fails_on_missing_columns(tmp_path):
+    compiled = CompiledSemanticLayer(load_json())
+    columns = compiled.columns["koenig", "dealer_stock_unit"]
+    # Every mapped column but the sale price, read back with inferred dtypes
+    pl.DataFrame(
+        {
+            name: ["1"]
+            for name, column in columns.items()
+            if column.field != "dsu_sale_price"
+        },
+    ).write_csv(tmp_path / "dealer-stock-unit.csv")
+    with pytest.raises(ValueError, match="dsu_sale_price.*is not in the file"):
+        check_raw_files(
+            "koenig",
+            ["dealer_stock_unit"],
+            str(tmp_path),
+            compiled,
+        )
+
+
+def test_check_schema_accepts_dtypes_translate_columns_casts():
+    def field(api_name, field_type):
+        return {
+            "primary_key": False,
+            "foreign_key": False,
+            "type": field_type,
+            "keys": [
+                {
+                    "org": "koenig",
+                    "object": "Raw",
+                    "api_name": api_name,
+                    "foreign_key_object": None,
+                    "foreign_key_field": None,
+                },
+            ],
+        }
+
+    compiled = CompiledSemanticLayer(
+        {
+            "raw": {
+                "raw_count": field("Count", "integer"),
+                "raw_flag": field("Flag", "boolean"),
+                "raw_date": field("Date", "date"),
+            },
+        },
+    )
+    schema = {"Count": pl.Float64, "Flag": pl.Int64, "Date": pl.Int64}
+    issues = compiled.check_schema("koenig", "raw", schema)
+    assert [(issue.check, issue.field) for issue in issues] == [("dtype", "raw_date")]
+
+
+def test_optional_fields_may_be_missing(tmp_path):
+    compiled = CompiledSemanticLayer(load_json())
+    columns = compiled.columns["koenig", "account"]
+    # Account exports made before Name and Phone were extracted
+    pl.DataFrame(
+        {
+            name: ["1"]
+            for name, column in columns.items()
+            if column.field not in {"account_name", "account_phone"}
+        },
+    ).write_csv(tmp_path / "account.csv")
+    warnings = check_raw_files("koenig", ["account"], str(tmp_path), compiled)
+    assert {issue.field for issue in warnings} == {"account_name", "account_phone"}
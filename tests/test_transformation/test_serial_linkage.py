@@ -0,0 +1,95 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from src.transformation.serial_linkage import (
+    conflict_summary,
+    link_serials,
+    normalize_serial_expr,
+)
+
+
+@pytest.fixture
+def objects():
+    dealer_stock_unit = pl.DataFrame(
+        {
+            "dealer_stock_unit_id": ["D1", "D2", "D3"],
+            "dsu_serial_number": ["1RW8270RAKD012345", "S/N 0000998877", "N/A"],
+            "dsu_account_id": ["A1", None, None],
+            "dsu_previous_owner": [None, "A2", None],
+            "dsu_status": ["Sold", "Inventory", "Inventory"],
+            "dsu_sales_date": [date(2020, 1, 1), None, None],
+            "dsu_make": ["John Deere", "Case IH", "Kubota"],
+            "dealer_stock_number": ["S1", "S2", "S3"],
+        },
+    )
+    customer_equipment = pl.DataFrame(
+        {
+            "customer_equipment_id": ["C1", "C2", "C3"],
+            "ce_serial_number": ["1rw-8270r-akd012345", "998877", "ZZZZ1"],
+            "account_id": ["A1", "A2", "A3"],
+            "ce_status": ["Owned", "Traded", "Owned"],
+            "ce_sale_date": [date(2020, 1, 2), date(2018, 1, 1), None],
+            "ce_make": ["JOHN DEERE", "Case-IH", "Kubota"],
+            "dealer_stock_number": ["S1", "S9", None],
+            "dealer_stock_unit": ["D1", None, "D7"],
+        },
+    )
+    eda_equipment = pl.DataFrame(
+        {
+            "eda_equipment_id": ["E1"],
+            "eda_serial_number": ["1RW8270RAKD012345"],
+            "account_id": ["A5"],
+            "eda_ucc_file_date": [date(2020, 2, 1)],
+            "eda_make": ["John Deere"],
+            "eda_customer_equipment_id": ["C1"],
+        },
+    )
+    return {
+        "koenig": {
+            "dealer_stock_unit": dealer_stock_unit,
+            "customer_equipment": customer_equipment,
+            "eda_equipment": eda_equipment,
+        },
+    }
+
+
+def test_01_normalize_serial():
+    serials = pl.DataFrame(
+        {"serial": ["1rw-8270r-akd012345", "S/N: 000123456", "PIN 1H0S680", "N/A", "12", None]},
+    )
+    keys = serials.select(normalize_serial_expr("serial"))["serial"].to_list()
+    assert keys == ["1RW8270RAKD012345", "123456", "1H0S680", None, None, None]
+
+
+def test_02_link_serials_builds_lifecycle(objects):
+    lifecycle = link_serials(objects)
+    assert lifecycle["serial_key"].to_list() == ["1RW8270RAKD012345", "998877", "ZZZZ1"]
+    first = lifecycle.row(0, named=True)
+    assert (first["dsu_record_id"], first["ce_record_id"], first["eda_record_id"]) == (
+        "D1",
+        "C1",
+        "E1",
+    )
+    assert lifecycle["lifecycle_stage"].to_list() == ["owned", "traded", "owned"]
+    assert lifecycle["previous_owner_id"].to_list() == [None, "A2", None]
+
+
+def test_03_link_serials_flags_conflicts(objects):
+    lifecycle = link_serials(objects)
+    assert lifecycle["account_conflict"].to_list() == [True, False, False]
+    assert lifecycle["make_conflict"].to_list() == [False, False, False]
+    assert lifecycle["stock_number_conflict"].to_list() == [False, True, False]
+    assert lifecycle["reference_conflict"].to_list() == [False, False, True]
+    assert lifecycle["has_conflict"].to_list() == [True, True, True]
+
+    summary = conflict_summary(lifecycle).row(0, named=True)
+    assert summary["serials"] == 3
+    assert summary["linked_serials"] == 2
+    assert summary["traded"] == 1
+
+
+def test_04_link_serials_needs_equipment_objects():
+    with pytest.raises(ValueError, match="were found to link serial numbers"):
+        link_serials({"koenig": {"account": pl.DataFrame({"account_id": ["A1"]})}})
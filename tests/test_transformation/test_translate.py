@@ -176,3 +176,30 @@ def test_07_translate_csv_column_types_datetime(tmp_path):
     assert result["model"].dtype == pl.Utf8
     assert result["manufacture_date"].dtype == pl.Date
     assert result["last_service"].dtype == pl.Datetime
+
+
+def test_08_translate_csv_missing_mapped_column(sample_csv, tmp_path, caplog):
+    # An export older than the mapping of `sold`
+    semantic_layer_path = tmp_path / "semantic_layer_new_field.json"
+    semantic_data = {
+        "equipment": {
+            "make": {
+                "keys": [{"org": "sample_dealer", "api_name": "make"}],
+                "type": "string",
+            },
+            "sold": {
+                "keys": [{"org": "sample_dealer", "api_name": "sold"}],
+                "type": "date",
+            },
+        },
+    }
+    semantic_layer_path.write_text(json.dumps(semantic_data))
+    result = translate_csv_to_common_model(
+        sample_csv,
+        "sample_dealer",
+        str(semantic_layer_path),
+        "equipment",
+    )
+    assert result.schema == {"make": pl.Utf8, "sold": pl.Date}
+    assert result["sold"].to_list() == [None]
+    assert "['sold']" in caplog.text
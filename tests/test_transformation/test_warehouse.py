@@ -0,0 +1,80 @@
+from datetime import date
+
+import polars as pl
+import pytest
+
+from src.synthetic.dealer_data import generate_object, load_semantic_layer
+from src.transformation.translate import translate_csv_to_common_model
+from src.transformation.warehouse import SEMANTIC_LAYER_PATH, Warehouse
+
+
+@pytest.fixture
+def warehouse(tmp_path):
+    semantic_layer = load_semantic_layer()
+    warehouse = Warehouse(str(tmp_path / "warehouse"))
+    for seed, dealer in enumerate(["koenig", "greenway"]):
+        data_path = tmp_path / dealer
+        data_path.mkdir()
+        for object_name in ("dealer_stock_unit", "account"):
+            generate_object(
+                semantic_layer,
+                dealer,
+                object_name,
+                500,
+                seed,
+            ).write_csv(data_path / f"{object_name.replace('_', '-')}.csv")
+        warehouse.ingest(dealer, str(data_path))
+    return warehouse
+
+
+def test_01_load_object_matches_translation(warehouse, tmp_path):
+    expected = translate_csv_to_common_model(
+        str(tmp_path / "koenig" / "dealer-stock-unit.csv"),
+        "koenig",
+        SEMANTIC_LAYER_PATH,
+        "dealer_stock_unit",
+    ).sort("dealer_stock_unit_id")
+    loaded = warehouse.load_object("koenig", "dealer_stock_unit").sort(
+        "dealer_stock_unit_id",
+    )
+    assert loaded.equals(expected.select(loaded.columns))
+    assert warehouse.dealers("account") == ["greenway", "koenig"]
+    assert warehouse.dealers("quote") == []
+
+
+def test_02_pushdown_across_dealers(warehouse):
+    since = pl.col("dsu_sales_date") >= date(2011, 1, 1)
+    sold = warehouse.load_object(
+        None,
+        "dealer_stock_unit",
+        ["dealer_stock_unit_id", "dsu_sales_date"],
+        since,
+    )
+    assert sold.columns == ["dealer", "dealer_stock_unit_id", "dsu_sales_date"]
+    assert set(sold["dealer"]) == {"koenig", "greenway"}
+    assert sold["dsu_sales_date"].min() >= date(2011, 1, 1)
+    expected = warehouse.scan("dealer_stock_unit").filter(since).collect()
+    assert sold.height == expected.height
+    plan = (
+        warehouse.scan("dealer_stock_unit", "koenig")
+        .filter(since)
+        .select("dealer_stock_unit_id")
+        .explain()
+    )
+    assert "SELECTION" in plan
+
+
+def test_03_unknown_objects_and_dealers(warehouse):
+    with pytest.raises(ValueError, match="Unknown object"):
+        warehouse.load_object("koenig", "tractor")
+    with pytest.raises(FileNotFoundError, match="akrs"):
+        warehouse.load_object("akrs", "account")
+
+
+def test_04_duckdb_views(warehouse):
+    pytest.importorskip("duckdb")
+    connection = warehouse.connect()
+    count = connection.execute(
+        "SELECT count(*) FROM dealer_stock_unit WHERE dealer = 'greenway'",
+    ).fetchone()[0]
+    assert count == 500
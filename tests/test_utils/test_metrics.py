@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from src.utils.metrics import StageMetrics
+
+
+def test_01_stage_counts_calls_and_hits():
+    metrics = StageMetrics()
+    for hit in (True, False, True):
+        with metrics.stage("exact") as stage:
+            stage.hit = hit
+    summary = metrics.to_dict()["exact"]
+    assert summary["calls"] == 3
+    assert summary["hits"] == 2
+    assert summary["hit_rate"] == pytest.approx(2 / 3)
+    assert summary["total_seconds"] >= 0
+
+
+def test_02_percentiles_from_reservoir():
+    metrics = StageMetrics(reservoir_size=100)
+    for millisecond in range(1, 1001):
+        metrics.record("semantic", millisecond / 1000)
+    summary = metrics.to_dict()["semantic"]
+    assert len(metrics.stages["semantic"].reservoir) == 100
+    assert summary["calls"] == 1000
+    assert summary["total_seconds"] == pytest.approx(500.5)
+    assert 0.3 < summary["p50_seconds"] < 0.7
+    assert summary["p50_seconds"] <= summary["p95_seconds"] <= summary["p99_seconds"]
+
+
+def test_03_disabled_metrics_record_nothing():
+    metrics = StageMetrics(enabled=False)
+    with metrics.stage("exact") as stage:
+        stage.hit = True
+    metrics.record("exact", 1.0, hit=True)
+    assert stage.hit
+    assert metrics.to_dict() == {}
+
+
+def test_04_prometheus_text():
+    metrics = StageMetrics()
+    metrics.record("exact", 0.5, hit=True)
+    text = metrics.to_prometheus("make_model_match")
+    assert "# TYPE make_model_match_calls_total counter" in text
+    assert 'make_model_match_calls_total{stage="exact"} 1' in text
+    assert 'make_model_match_hits_total{stage="exact"} 1' in text
+    assert 'make_model_match_seconds{stage="exact",quantile="0.99"} 0.5' in text
+    assert 'make_model_match_seconds_count{stage="exact"} 1' in text
+
+
+def test_05_write_json_and_prometheus(tmp_path):
+    metrics = StageMetrics()
+    metrics.record("exact", 0.25, hit=False)
+    metrics.write(str(tmp_path / "metrics.json"), prefix="match")
+    metrics.write(str(tmp_path / "metrics.prom"), prefix="match")
+    assert json.loads((tmp_path / "metrics.json").read_text())["exact"]["calls"] == 1
+    assert (tmp_path / "metrics.prom").read_text().startswith("# HELP match_calls")